@@ -44,6 +44,9 @@ def create_app(config_name='default'):
     login_manager.init_app(app)
     migrate.init_app(app, db)
     socketio.init_app(app, async_mode='eventlet')
+
+    from app.utils.cache import init_cache
+    init_cache(app)
     
     # Configure login manager
     login_manager.login_view = 'auth.login'
@@ -79,6 +82,7 @@ def create_app(config_name='default'):
     from app.pawnings import pawnings_bp
     from app.reports import reports_bp
     from app.settings import settings_bp
+    from app.jobs import jobs_bp
 
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(main_bp, url_prefix='/')
@@ -88,6 +92,7 @@ def create_app(config_name='default'):
     app.register_blueprint(pawnings_bp, url_prefix='/pawnings')
     app.register_blueprint(reports_bp, url_prefix='/reports')
     app.register_blueprint(settings_bp, url_prefix='/settings')
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
 
     if messaging_enabled:
         from app.messages import messages_bp
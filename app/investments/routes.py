@@ -9,6 +9,7 @@ from app.investments import investments_bp
 from app.models import Investment, InvestmentTransaction, Customer, ActivityLog, SystemSettings
 from app.investments.forms import InvestmentForm, InvestmentTransactionForm
 from app.utils.decorators import permission_required
+from app.utils.concurrency import retry_on_conflict
 from app.utils.helpers import generate_investment_number, get_current_branch_id, should_filter_by_branch, get_branch_filter_for_query
 
 def _display_borrowing_id(investment_number):
@@ -376,40 +377,42 @@ def add_transaction(id):
     form = InvestmentTransactionForm()
     
     if form.validate_on_submit():
-        transaction = InvestmentTransaction(
-            investment_id=investment.id,
-            transaction_date=form.transaction_date.data,
-            transaction_type=form.transaction_type.data,
-            amount=form.amount.data,
-            balance_after=Decimal('0.00'),
-            payment_method=form.payment_method.data,
-            reference_number=form.reference_number.data,
-            notes=form.notes.data,
-            processed_by=current_user.id
-        )
-        
-        db.session.add(transaction)
+        def add():
+            # Balances are rebuilt from the stored transactions, so a retry
+            # after a concurrent transaction starts from the current ones
+            transaction = InvestmentTransaction(
+                investment_id=investment.id,
+                transaction_date=form.transaction_date.data,
+                transaction_type=form.transaction_type.data,
+                amount=form.amount.data,
+                balance_after=Decimal('0.00'),
+                payment_method=form.payment_method.data,
+                reference_number=form.reference_number.data,
+                notes=form.notes.data,
+                processed_by=current_user.id
+            )
 
-        try:
+            db.session.add(transaction)
             _recalculate_investment_transaction_balances(investment)
+
+            # Log activity
+            log = ActivityLog(
+                user_id=current_user.id,
+                action='add_investment_transaction',
+                entity_type='investment',
+                entity_id=investment.id,
+                description=f'Added {form.transaction_type.data} for borrower: {investment.investment_number}',
+                ip_address=request.remote_addr
+            )
+            db.session.add(log)
+
+        try:
+            retry_on_conflict(add)
         except ValueError as exc:
             db.session.rollback()
             flash(str(exc), 'danger')
             return redirect(url_for('investments.add_transaction', id=id))
         
-        # Log activity
-        log = ActivityLog(
-            user_id=current_user.id,
-            action='add_investment_transaction',
-            entity_type='investment',
-            entity_id=investment.id,
-            description=f'Added {form.transaction_type.data} for borrower: {investment.investment_number}',
-            ip_address=request.remote_addr
-        )
-        db.session.add(log)
-        
-        db.session.commit()
-        
         flash('Transaction added successfully!', 'success')
         return redirect(url_for('investments.view_investment', id=id))
 
@@ -0,0 +1,84 @@
+"""Queueing exports as background jobs
+
+An export view decorated with background_job() still runs in the request as
+before; called with ?background=1 it records an ExportJob instead and returns
+at once. The worker later replays the same request (see app.jobs.worker).
+"""
+import json
+from functools import wraps
+
+from flask import current_app, flash, jsonify, redirect, request, session, url_for
+from flask_login import current_user
+
+from app import db
+
+
+class JobLimitError(Exception):
+    """The user already has as many unfinished jobs as JOB_QUEUE_LIMIT allows"""
+
+
+def enqueue(title):
+    """Record an ExportJob replaying the current request without ?background"""
+    from app.models import ExportJob
+
+    pending = ExportJob.query.filter(
+        ExportJob.user_id == current_user.id,
+        ExportJob.status.in_(['queued', 'running'])
+    ).count()
+    limit = current_app.config['JOB_QUEUE_LIMIT']
+    if pending >= limit:
+        raise JobLimitError(f'You already have {pending} export(s) in progress. '
+                            'Wait for one to finish before starting another.')
+
+    args = request.args.to_dict(flat=False)
+    args.pop('background', None)
+    branch_id = session.get('current_branch_id')
+    job = ExportJob(
+        user_id=current_user.id,
+        branch_id=branch_id or current_user.branch_id,
+        endpoint=request.endpoint,
+        title=title,
+        params=json.dumps({'path': request.path, 'args': args, 'current_branch_id': branch_id}),
+        status='queued',
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _wants_json():
+    best = request.accept_mimetypes.best_match(['text/html', 'application/json'])
+    return best == 'application/json'
+
+
+def background_job(title):
+    """Allow a GET export view to be queued with ?background=1
+
+    title may use the view's URL arguments, e.g. 'Receipt entry PDF ({loan_frequency})'.
+    Queueing answers 202 with the job id for JSON clients and otherwise
+    redirects to the jobs page.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.args.get('background') != '1':
+                return f(*args, **kwargs)
+
+            try:
+                job = enqueue(title.format(**kwargs))
+            except JobLimitError as exc:
+                if _wants_json():
+                    return jsonify({'success': False, 'message': str(exc)}), 429
+                flash(str(exc), 'warning')
+                return redirect(url_for('jobs.list_jobs'))
+
+            if _wants_json():
+                return jsonify({
+                    'success': True,
+                    'job_id': job.id,
+                    'status_url': url_for('jobs.job_status', id=job.id),
+                }), 202
+            flash(f'{job.title} is being generated. Download it here when it is ready.', 'info')
+            return redirect(url_for('jobs.list_jobs'))
+        return decorated_function
+    return decorator
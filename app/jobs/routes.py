@@ -0,0 +1,48 @@
+"""Background export job routes"""
+import os
+
+from flask import abort, flash, jsonify, redirect, render_template, send_file, url_for
+from flask_login import current_user, login_required
+
+from app.jobs import jobs_bp
+from app.models import ExportJob
+
+
+def _own_job(id):
+    job = ExportJob.query.get_or_404(id)
+    if job.user_id != current_user.id:
+        abort(404)
+    return job
+
+
+@jobs_bp.route('/')
+@login_required
+def list_jobs():
+    """The current user's recent exports"""
+    jobs = current_user.export_jobs.order_by(ExportJob.id.desc()).limit(50).all()
+    return render_template('jobs/list.html',
+                         title='My Exports',
+                         jobs=jobs,
+                         pending=any(job.is_pending for job in jobs))
+
+
+@jobs_bp.route('/<int:id>/status')
+@login_required
+def job_status(id):
+    """Job status as JSON, with a download URL once the file is ready"""
+    job = _own_job(id)
+    data = job.to_dict()
+    if job.status == 'done':
+        data['download_url'] = url_for('jobs.download', id=job.id)
+    return jsonify(data)
+
+
+@jobs_bp.route('/<int:id>/download')
+@login_required
+def download(id):
+    """Download a finished export"""
+    job = _own_job(id)
+    if job.status != 'done' or not job.file_path or not os.path.exists(job.file_path):
+        flash('This export is not available for download.', 'warning')
+        return redirect(url_for('jobs.list_jobs'))
+    return send_file(job.file_path, mimetype=job.mimetype, as_attachment=True, download_name=job.filename)
@@ -0,0 +1,171 @@
+"""Background export worker
+
+Run with `python run.py job-worker`; start more processes for more
+throughput. Each loop expires old files, fails jobs left running by a dead
+worker, then claims the oldest queued job whose user and branch are below
+JOB_USER_CONCURRENCY / JOB_BRANCH_CONCURRENCY running jobs. Claiming is a
+conditional UPDATE, so two workers never run the same job.
+
+A job is run by replaying its request in a test request context logged in as
+its user, so it goes through the view's own permission and branch checks and
+produces the same file as the synchronous download.
+"""
+import json
+import os
+import socket
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app, session
+from flask_login import login_user
+from sqlalchemy import update
+from werkzeug.http import parse_options_header
+
+from app import db
+
+# Queued jobs looked at per claim, oldest first
+CLAIM_WINDOW = 50
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def purge_expired(now=None):
+    """Delete files of finished jobs past expires_at; returns the number expired"""
+    from app.models import ExportJob
+
+    now = now or datetime.utcnow()
+    jobs = ExportJob.query.filter(ExportJob.status == 'done', ExportJob.expires_at < now).all()
+    for job in jobs:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        job.status = 'expired'
+        job.file_path = None
+    if jobs:
+        db.session.commit()
+    return len(jobs)
+
+
+def reap_stale(now=None):
+    """Fail jobs running for longer than JOB_TIMEOUT; returns the number failed"""
+    from app.models import ExportJob
+
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=current_app.config['JOB_TIMEOUT'])
+    result = db.session.execute(
+        update(ExportJob)
+        .where(ExportJob.status == 'running', ExportJob.started_at < cutoff)
+        .values(status='failed', error='The worker stopped before the export finished.', finished_at=now)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def claim_next(name=None):
+    """Mark the next runnable queued job as running for this worker and return it"""
+    from app.models import ExportJob
+
+    running = ExportJob.query.filter_by(status='running').with_entities(ExportJob.user_id, ExportJob.branch_id).all()
+    busy_users = Counter(user_id for user_id, _ in running)
+    busy_branches = Counter(branch_id for _, branch_id in running if branch_id)
+    user_limit = current_app.config['JOB_USER_CONCURRENCY']
+    branch_limit = current_app.config['JOB_BRANCH_CONCURRENCY']
+
+    queued = ExportJob.query.filter_by(status='queued').order_by(ExportJob.id).limit(CLAIM_WINDOW).all()
+    for job in queued:
+        if busy_users[job.user_id] >= user_limit:
+            continue
+        if job.branch_id and busy_branches[job.branch_id] >= branch_limit:
+            continue
+        result = db.session.execute(
+            update(ExportJob)
+            .where(ExportJob.id == job.id, ExportJob.status == 'queued')
+            .values(status='running', worker=name or worker_name(), started_at=datetime.utcnow())
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(ExportJob, job.id)
+    return None
+
+
+def _filename(response, job):
+    _, options = parse_options_header(response.headers.get('Content-Disposition', ''))
+    return options.get('filename') or f'export_{job.id}'
+
+
+def run_job(job):
+    """Replay a claimed job's request and store the response body as its file"""
+    from app.models import ExportJob, User
+
+    app = current_app._get_current_object()
+    job_id = job.id
+    params = json.loads(job.params)
+    user = db.session.get(User, job.user_id)
+    output_dir = app.config['JOB_OUTPUT_DIR']
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f'{job_id}-{uuid.uuid4().hex}')
+
+    values = {}
+    try:
+        if user is None or not user.is_active:
+            raise RuntimeError('The user who queued this export is no longer active.')
+        # A fresh app context gives the replay its own g (and logged-in user) and session
+        with app.app_context(), app.test_request_context(params['path'], query_string=params['args']):
+            if params.get('current_branch_id'):
+                session['current_branch_id'] = params['current_branch_id']
+            login_user(user)
+            response = app.full_dispatch_request()
+            try:
+                if response.status_code != 200:
+                    raise RuntimeError(f'The export could not be generated (HTTP {response.status_code}).')
+                size = 0
+                with open(path, 'wb') as output:
+                    for chunk in response.iter_encoded():
+                        output.write(chunk)
+                        size += len(chunk)
+            finally:
+                response.close()
+        finished = datetime.utcnow()
+        values = {
+            'status': 'done',
+            'filename': _filename(response, job),
+            'mimetype': response.mimetype,
+            'file_path': path,
+            'size': size,
+            'finished_at': finished,
+            'expires_at': finished + timedelta(seconds=app.config['JOB_FILE_TTL']),
+        }
+    except Exception as exc:  # noqa: BLE001
+        db.session.rollback()
+        if os.path.exists(path):
+            os.remove(path)
+        values = {'status': 'failed', 'error': str(exc) or exc.__class__.__name__, 'finished_at': datetime.utcnow()}
+
+    job = db.session.get(ExportJob, job_id)
+    for field, value in values.items():
+        setattr(job, field, value)
+    db.session.commit()
+    return job
+
+
+def work(once=False, poll=2.0, name=None):
+    """Process jobs until interrupted, or until the queue is empty with once
+
+    Call inside an app context. Returns the number of jobs processed.
+    """
+    name = name or worker_name()
+    processed = 0
+    while True:
+        purge_expired()
+        reap_stale()
+        job = claim_next(name)
+        if job is not None:
+            run_job(job)
+            processed += 1
+            continue
+        if once:
+            return processed
+        time.sleep(poll)
@@ -0,0 +1,223 @@
+"""Business-day calendar for daily loan due dates
+
+A BusinessCalendar combines a product's weekly rest days with the
+BusinessHoliday rows that apply to a branch. Business days are numbered by a
+closed-form weekday index, and holidays are kept as a sorted list of those
+indices, so the n-th business day after a date is found with arithmetic and
+one bisect instead of stepping day by day.
+
+Each process keeps one snapshot of the holiday table, tagged with the
+holiday_versions counter that every holiday write bumps in its own
+transaction. Requests compare the counter once each (other contexts every
+HOLIDAY_CACHE_TTL seconds) and reload the snapshot when another worker has
+changed the holidays.
+"""
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Ordinal of a Monday, used as day 0 of the weekday index
+_EPOCH = date(2000, 1, 3).toordinal()
+
+_holiday_state = {
+    'engine': None, 'migrated': False, 'checked_at': None, 'checked_version': None,
+    'loaded': False, 'version': 0, 'by_branch': {},
+}
+_NO_HOLIDAYS = {'version': None, 'by_branch': {}}
+# request.environ key of the counter read for the current request
+_VERSION_KEY = 'jaanmicro.holiday_version'
+
+
+class BusinessCalendar:
+    """Rest weekdays plus holiday dates, with O(log h) business-day arithmetic"""
+
+    def __init__(self, rest_weekdays=(), holidays=()):
+        self.rest_weekdays = frozenset(rest_weekdays)
+        self._open_weekdays = [weekday for weekday in range(7) if weekday not in self.rest_weekdays]
+        if not self._open_weekdays:
+            raise ValueError('A business calendar needs at least one open weekday')
+        self._per_week = len(self._open_weekdays)
+        # Open weekdays before each weekday, so index() is a lookup per date
+        self._open_before = [sum(1 for open_day in self._open_weekdays if open_day < weekday) for weekday in range(8)]
+
+        indices = sorted({self._index(day) for day in holidays if day.weekday() not in self.rest_weekdays})
+        self._holidays = indices
+        # holidays[i] - i is non-decreasing, which lets add_business_days bisect
+        # for the number of holidays it has to jump over
+        self._shifted = [value - position for position, value in enumerate(indices)]
+        self._holiday_set = set(indices)
+
+    def _index(self, day):
+        """Open weekdays between the epoch and day (day itself excluded)"""
+        weeks, weekday = divmod(day.toordinal() - _EPOCH, 7)
+        return weeks * self._per_week + self._open_before[weekday]
+
+    def _date(self, index):
+        weeks, position = divmod(index, self._per_week)
+        return date.fromordinal(_EPOCH + weeks * 7 + self._open_weekdays[position])
+
+    def is_business_day(self, day):
+        return day.weekday() not in self.rest_weekdays and self._index(day) not in self._holiday_set
+
+    def add_business_days(self, start, count):
+        """Return the count-th business day after start, with start rolled forward
+
+        add_business_days(d, 0) is d itself when d is a business day, otherwise
+        the next business day.
+        """
+        # Rolling forward over rest days is implicit: _index() of a rest day
+        # equals the index of the next open weekday
+        first = self._index(start)
+        before = bisect_left(self._holidays, first)
+        # Number of holidays falling inside [first, target]
+        skipped = bisect_right(self._shifted, first + count - before, lo=before) - before
+        return self._date(first + count + skipped)
+
+    def business_days_between(self, start, end):
+        """Number of business days in [start, end)"""
+        if end <= start:
+            return 0
+        first, last = self._index(start), self._index(end)
+        return (last - first) - (bisect_left(self._holidays, last) - bisect_left(self._holidays, first))
+
+
+def _load_holidays():
+    """Read BusinessHoliday rows grouped by branch_id (None = all branches)"""
+    from app import db
+    from app.models import BusinessHoliday
+
+    by_branch = {}
+    rows = db.session.query(BusinessHoliday.branch_id, BusinessHoliday.holiday_date).all()
+    for branch_id, holiday_date in rows:
+        by_branch.setdefault(branch_id, []).append(holiday_date)
+    for dates in by_branch.values():
+        dates.sort()
+    return by_branch
+
+
+def _read_version():
+    """The holiday_versions counter; None while the tables are not migrated"""
+    from sqlalchemy import inspect, select
+    from app import db
+    from app.models import HolidayVersion
+
+    table = HolidayVersion.__table__
+    # Inspect through the session's connection: SQLite pools may hand out that
+    # same connection and roll it back on release
+    connection = db.session.connection()
+    if not _holiday_state['migrated']:
+        if not inspect(connection).has_table(table.name):
+            return None
+        _holiday_state['migrated'] = True
+    return connection.execute(select(table.c.version).where(table.c.id == 1)).scalar() or 0
+
+
+def _current_version():
+    """Holiday counter, read once per request and every HOLIDAY_CACHE_TTL seconds elsewhere"""
+    from flask import current_app, has_request_context, request
+
+    if has_request_context():
+        if _VERSION_KEY not in request.environ:
+            request.environ[_VERSION_KEY] = _read_version()
+        return request.environ[_VERSION_KEY]
+
+    ttl = current_app.config.get('HOLIDAY_CACHE_TTL', 60)
+    checked_at = _holiday_state['checked_at']
+    if checked_at is None or time.monotonic() - checked_at > ttl:
+        _holiday_state.update(checked_at=time.monotonic(), checked_version=_read_version())
+    return _holiday_state['checked_version']
+
+
+def _holidays():
+    from flask import has_app_context
+    from app import db
+
+    # Detached use (no app/database) sees weekly rest days only
+    if not has_app_context():
+        return _NO_HOLIDAYS
+
+    engine = db.engine
+    if _holiday_state['engine'] is not engine:
+        _holiday_state.update(engine=engine, migrated=False, checked_at=None, loaded=False)
+        _calendar.cache_clear()
+    version = _current_version()
+    if version is None:
+        return _NO_HOLIDAYS
+    if not _holiday_state['loaded'] or _holiday_state['version'] != version:
+        _holiday_state.update(loaded=True, version=version, by_branch=_load_holidays())
+        _calendar.cache_clear()
+    return _holiday_state
+
+
+def invalidate_holidays():
+    """Drop this process's holiday snapshot; the next lookup re-reads the counter"""
+    from flask import has_request_context, request
+
+    _holiday_state.update(checked_at=None, loaded=False)
+    if has_request_context():
+        request.environ.pop(_VERSION_KEY, None)
+    _calendar.cache_clear()
+
+
+def holiday_version():
+    """The holiday_versions counter, shared by every worker, for cache keys"""
+    return _holidays()['version']
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_holiday_version(session, flush_context):
+    """Bump holiday_versions in the transaction that writes BusinessHoliday rows"""
+    from sqlalchemy import insert, update
+    from app.models import BusinessHoliday, HolidayVersion
+
+    changed = chain(session.new, session.deleted, (obj for obj in session.dirty if session.is_modified(obj)))
+    if not any(isinstance(obj, BusinessHoliday) for obj in changed):
+        return
+    table = HolidayVersion.__table__
+    connection = session.connection()
+    now = datetime.utcnow()
+    bumped = connection.execute(
+        update(table).where(table.c.id == 1).values(version=table.c.version + 1, updated_at=now)
+    ).rowcount
+    if not bumped:
+        connection.execute(insert(table).values(id=1, version=1, updated_at=now))
+    session.info['holidays_changed'] = True
+    invalidate_holidays()
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _forget_holiday_changes(session):
+    # A rolled back bump leaves this process with holidays no other worker has
+    if session.info.pop('holidays_changed', False):
+        invalidate_holidays()
+
+
+@lru_cache(maxsize=256)
+def _calendar(rest_weekdays, branch_id, version):
+    by_branch = _holiday_state['by_branch'] if version is not None else {}
+    holidays = list(by_branch.get(None, []))
+    if branch_id is not None:
+        holidays.extend(by_branch.get(branch_id, []))
+    return BusinessCalendar(rest_weekdays, holidays)
+
+
+def get_calendar(rest_weekdays, branch_id=None):
+    """Calendar for a product's rest weekdays and a branch's holidays"""
+    state = _holidays()
+    return _calendar(frozenset(rest_weekdays), branch_id, state['version'])
+
+
+def holiday_dates(branch_id=None):
+    """Sorted holiday dates that apply to a branch (global ones included)"""
+    by_branch = _holidays()['by_branch']
+    dates = set(by_branch.get(None, []))
+    if branch_id is not None:
+        dates.update(by_branch.get(branch_id, []))
+    return sorted(dates)
+
@@ -0,0 +1,183 @@
+"""End-of-day close
+
+Recomputes the stored figures of every active loan (outstanding including
+accrued interest, advance balance, completion status) and its arrears
+snapshot. Loans are split into id-range shards; each shard is loaded with
+LoanFinancialState.for_loans() and written back with bulk UPDATE/INSERT
+executemany statements, one transaction per shard. With more than one worker
+the shards run in a ProcessPoolExecutor, each process with its own app and
+database connections.
+"""
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import insert, update
+
+PHASES = ('load', 'compute', 'write')
+
+# Balance at or below which an active loan is settled (rounding allowance)
+SETTLED_TOLERANCE = Decimal('0.02')
+
+_worker_app = None
+
+
+def shard_ranges(loan_ids, shard_size):
+    """[(first_id, last_id), ...] covering sorted loan_ids, shard_size ids each"""
+    return [
+        (loan_ids[start], loan_ids[min(start + shard_size, len(loan_ids)) - 1])
+        for start in range(0, len(loan_ids), shard_size)
+    ]
+
+
+def loan_updates(state):
+    """Changed Loan columns for one state, as _refresh_loan_financial_state would set them"""
+    loan = state.loan
+    values = {
+        'outstanding_amount': state.outstanding.quantize(Decimal('0.01')),
+        'advance_balance': state.advance_balance,
+    }
+    if state.balance_due <= SETTLED_TOLERANCE:
+        values['status'] = 'completed'
+        if not loan.closing_date:
+            last_payment = state.last_payment
+            values['closing_date'] = last_payment.payment_date if last_payment else datetime.utcnow().date()
+
+    return {
+        field: value for field, value in values.items()
+        if getattr(loan, field) is None or _differs(getattr(loan, field), value)
+    }
+
+
+def _differs(current, value):
+    if isinstance(value, Decimal):
+        return Decimal(str(current)).quantize(Decimal('0.01')) != value
+    return current != value
+
+
+def close_shard(first_id, last_id):
+    """Recompute and write back the active loans with first_id <= id <= last_id
+
+    The loan UPDATE checks each row's version_id, so a payment posted while
+    the shard was computing makes the shard start over from the new figures.
+    Returns {'loans', 'updated', 'completed', 'timings': {phase: seconds}}.
+    """
+    from app import db
+    from app.models import Loan, LoanArrearsSnapshot
+    from app.loans.financial_state import LoanFinancialState
+    from app.utils.concurrency import retry_on_conflict
+
+    timings = Counter()
+
+    def close():
+        started = time.perf_counter()
+        loans = Loan.query.filter(
+            Loan.status == 'active', Loan.id >= first_id, Loan.id <= last_id
+        ).order_by(Loan.id).all()
+        states = LoanFinancialState.for_loans(loans, chunk_size=max(len(loans), 1))
+        snapshot_ids = dict(
+            db.session.query(LoanArrearsSnapshot.loan_id, LoanArrearsSnapshot.id).filter(
+                LoanArrearsSnapshot.loan_id.in_([loan.id for loan in loans])
+            ).all()
+        ) if loans else {}
+        timings['load'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        loan_rows, snapshot_updates, snapshot_inserts = [], [], []
+        changed_branches = set()
+        for loan in loans:
+            state = states[loan.id]
+            changes = loan_updates(state)
+            if changes:
+                loan_rows.append(dict(changes, id=loan.id, version_id=loan.version_id))
+                changed_branches.add(loan.branch_id)
+
+            snapshot = LoanArrearsSnapshot.values_from_state(state)
+            snapshot['refreshed_at'] = datetime.utcnow()
+            if loan.id in snapshot_ids:
+                snapshot_updates.append(dict(snapshot, id=snapshot_ids[loan.id]))
+            else:
+                snapshot_inserts.append(dict(snapshot, loan_id=loan.id))
+        timings['compute'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        # Rows were read above; the statements below replace their values wholesale
+        db.session.expunge_all()
+        if loan_rows:
+            db.session.execute(update(Loan), loan_rows)
+        if snapshot_updates:
+            db.session.execute(update(LoanArrearsSnapshot), snapshot_updates)
+        if snapshot_inserts:
+            db.session.execute(insert(LoanArrearsSnapshot), snapshot_inserts)
+        timings['write'] += time.perf_counter() - started
+        return len(loans), loan_rows, changed_branches
+
+    loan_count, loan_rows, changed_branches = retry_on_conflict(close)
+    if changed_branches:
+        # Bulk updates skip the flush events that invalidate cached reports
+        from app.reports.cache import bump_generations
+        bump_generations(changed_branches)
+
+    return {
+        'loans': loan_count,
+        'updated': len(loan_rows),
+        'completed': sum(1 for row in loan_rows if row.get('status') == 'completed'),
+        'timings': dict(timings),
+    }
+
+
+def _init_worker(config_name):
+    global _worker_app
+    from app import create_app
+
+    _worker_app = create_app(config_name)
+
+
+def _run_shard(first_id, last_id):
+    with _worker_app.app_context():
+        return close_shard(first_id, last_id)
+
+
+def close_day(config_name='development', workers=1, shard_size=1000):
+    """Run the end-of-day close over every active loan
+
+    Call inside an app context. With workers > 1, shards run in separate
+    processes that build their own app from config_name.
+
+    Returns {'loans', 'updated', 'completed', 'shards', 'seconds',
+    'loans_per_second', 'timings': {phase: seconds summed over shards}}.
+    """
+    import multiprocessing
+    from app.models import Loan
+
+    started = time.perf_counter()
+    loan_ids = [loan_id for (loan_id,) in Loan.query.filter(Loan.status == 'active').with_entities(
+        Loan.id).order_by(Loan.id).all()]
+    shards = shard_ranges(loan_ids, shard_size)
+
+    if workers > 1 and len(shards) > 1:
+        # spawn, so workers never share the parent's database connections
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=context,
+                                 initializer=_init_worker, initargs=(config_name,)) as pool:
+            results = list(pool.map(_run_shard, *zip(*shards)))
+    else:
+        results = [close_shard(first_id, last_id) for first_id, last_id in shards]
+
+    timings = Counter({phase: 0.0 for phase in PHASES})
+    for result in results:
+        timings.update(result['timings'])
+    seconds = time.perf_counter() - started
+    loans = sum(result['loans'] for result in results)
+
+    return {
+        'loans': loans,
+        'updated': sum(result['updated'] for result in results),
+        'completed': sum(result['completed'] for result in results),
+        'shards': len(shards),
+        'seconds': seconds,
+        'loans_per_second': loans / seconds if seconds else 0.0,
+        'timings': dict(timings),
+    }
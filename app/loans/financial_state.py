@@ -0,0 +1,314 @@
+"""Single-pass financial state for a loan
+
+LoanFinancialState loads a loan's receipts and schedule overrides once and
+derives outstanding, accrued interest, the FIFO schedule, advance credit,
+arrears and the next installment from them. Every figure is computed on first
+use and then kept, so a view or payment that needs all of them builds the
+schedule and queries the payments only once. Until the full schedule is
+needed, the next installment, advance and arrears stream rows from
+Loan.iter_payment_schedule() and stop at the first unpaid row or at today.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from functools import cached_property
+
+from app.utils.money import to_cents, rate_to_bp, cents_to_decimal, div_half_up
+
+
+class LoanFinancialState:
+    """Derived financial figures for one loan
+
+    ``payments`` (ordered by payment_date, id), ``overrides`` and ``schedule``
+    may be passed in pre-loaded, as for_loans() does; anything missing is
+    loaded from the loan on first use.
+    """
+
+    def __init__(self, loan, payments=None, overrides=None, schedule=None, today=None):
+        self.loan = loan
+        self._payments = payments
+        self._overrides = overrides
+        self._schedule = schedule
+        self.today = today or date.today()
+
+    @classmethod
+    def for_loans(cls, loans, chunk_size=500):
+        """States for many loans from bulk payment queries and cached schedules
+
+        Returns {loan_id: LoanFinancialState}.
+        """
+        from collections import defaultdict
+        from app.models import Loan, LoanPayment
+
+        loans = [loan for loan in loans if loan.id is not None]
+        payments_by_loan = defaultdict(list)
+        loan_ids = [loan.id for loan in loans]
+        for start in range(0, len(loan_ids), chunk_size):
+            chunk = loan_ids[start:start + chunk_size]
+            payments = LoanPayment.query.filter(LoanPayment.loan_id.in_(chunk)).order_by(
+                LoanPayment.loan_id, LoanPayment.payment_date.asc(), LoanPayment.id.asc()
+            ).all()
+            for payment in payments:
+                payments_by_loan[payment.loan_id].append(payment)
+
+        schedules = Loan.build_schedules(loans, chunk_size=chunk_size, cached=True, payments_by_loan=payments_by_loan)
+        return {
+            loan.id: cls(loan, payments=payments_by_loan[loan.id], schedule=schedules[loan.id])
+            for loan in loans
+        }
+
+    # Inputs
+
+    @property
+    def payments(self):
+        if self._payments is None:
+            from app.models import LoanPayment
+            try:
+                self._payments = self.loan.payments.order_by(
+                    LoanPayment.payment_date.asc(), LoanPayment.id.asc()
+                ).all()
+            except Exception:
+                # Detached/transient instances have no receipts to load
+                self._payments = []
+        return self._payments
+
+    @property
+    def overrides(self):
+        if self._overrides is None:
+            self._overrides = self.loan.schedule_overrides.all()
+        return self._overrides
+
+    @property
+    def schedule(self):
+        if self._schedule is None:
+            self._schedule = self.loan.generate_payment_schedule(payments=self.payments, overrides=self.overrides)
+        return self._schedule
+
+    @property
+    def last_payment(self):
+        """Latest receipt by payment date (then id), or None"""
+        return self.payments[-1] if self.payments else None
+
+    def receipts_between(self, start=None, end=None):
+        """Receipts dated within [start, end]; either bound may be None"""
+        return [
+            payment for payment in self.payments
+            if (start is None or payment.payment_date >= start) and (end is None or payment.payment_date <= end)
+        ]
+
+    # Receipt totals
+
+    @cached_property
+    def paid_principal(self):
+        return cents_to_decimal(sum(to_cents(payment.principal_amount or 0) for payment in self.payments))
+
+    @cached_property
+    def paid_interest(self):
+        return cents_to_decimal(sum(to_cents(payment.interest_amount or 0) for payment in self.payments))
+
+    @cached_property
+    def total_received(self):
+        return cents_to_decimal(sum(to_cents(payment.payment_amount or 0) for payment in self.payments))
+
+    # Balances
+
+    def _accrued_interest_cents(self, active):
+        """Interest accrued since the last receipt or disbursement (reducing balance only)"""
+        loan = self.loan
+        if not active or not loan.disbursement_date or loan.interest_type == 'flat':
+            return 0
+
+        start_date = self.last_payment.payment_date if self.last_payment else loan.disbursement_date
+        if isinstance(start_date, str):
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        elif isinstance(start_date, datetime):
+            start_date = start_date.date()
+
+        days_elapsed = (self.today - start_date).days
+        if days_elapsed <= 0:
+            return 0
+
+        current_principal = to_cents(loan.disbursed_amount or loan.loan_amount) - to_cents(self.paid_principal)
+        if current_principal <= 0:
+            return 0
+
+        # principal * rate% / 365 per day
+        return div_half_up(
+            current_principal * rate_to_bp(loan.interest_rate) * days_elapsed,
+            365 * 100 * 100,
+        )
+
+    def _outstanding_cents(self):
+        """Outstanding as if active: remaining payable, or principal plus accrued interest, with penalty"""
+        loan = self.loan
+        disbursed = to_cents(loan.disbursed_amount or loan.loan_amount)
+        product = loan.product
+        if product.monthly_structure or product.uses_flat_interest(loan.interest_type):
+            if not product.monthly_structure and product.recalculate_total:
+                # type1_9weeks always recalculates total payable with CEIL so it
+                # matches the frontend preview and corrects stale DB values
+                _, total_expected = product.calculate_totals(
+                    loan.disbursed_amount or loan.loan_amount,
+                    loan.interest_rate,
+                    interest_type=loan.interest_type,
+                    duration_weeks=loan.duration_weeks,
+                )
+            elif loan.total_payable:
+                total_expected = to_cents(loan.total_payable)
+            else:
+                total_expected = disbursed + to_cents(loan.get_total_expected_interest())
+            outstanding = total_expected - to_cents(loan.paid_amount or 0)
+        else:
+            outstanding_principal = disbursed - to_cents(self.paid_principal)
+            outstanding = outstanding_principal + self._accrued_interest_cents(True)
+
+        return max(0, outstanding + to_cents(loan.penalty_amount or 0))
+
+    @cached_property
+    def accrued_interest(self):
+        accrued = self._accrued_interest_cents(self.loan.status == 'active')
+        return cents_to_decimal(accrued) if accrued else Decimal('0')
+
+    @cached_property
+    def outstanding(self):
+        """Current outstanding; zero unless the loan is active"""
+        if self.loan.status != 'active':
+            return Decimal('0')
+        return cents_to_decimal(self._outstanding_cents())
+
+    @cached_property
+    def balance_due(self):
+        """Outstanding computed as if the loan were active, to decide completion"""
+        return cents_to_decimal(self._outstanding_cents())
+
+    # Schedule-derived figures
+
+    def rows(self):
+        """Schedule rows: the built schedule, or streamed from the allocation if not built yet"""
+        if self._schedule is not None:
+            return iter(self._schedule)
+        return self.loan.iter_payment_schedule(payments=self.payments, overrides=self.overrides)
+
+    @cached_property
+    def _allocation(self):
+        """(any rows, cents applied to installments, paid installments, first unpaid installment)
+
+        FIFO allocation has used up every receipt by the first unpaid
+        installment, so the scan stops there.
+        """
+        has_rows = False
+        applied = 0
+        paid = 0
+        for inst in self.rows():
+            has_rows = True
+            if inst.get('is_skipped', False):
+                continue
+            applied += to_cents(inst.get('paid_amount', 0))
+            if inst['status'] in ['overdue', 'partial', 'pending']:
+                return has_rows, applied, paid, inst
+            if inst['status'] == 'paid':
+                paid += 1
+        return has_rows, applied, paid, None
+
+    @cached_property
+    def advance_balance(self):
+        """Receipts not applied to any installment (never negative)"""
+        _, applied, _, _ = self._allocation
+        return cents_to_decimal(max(to_cents(self.loan.paid_amount or 0) - applied, 0))
+
+    @property
+    def next_installment(self):
+        """First payable installment not yet paid, or None"""
+        return self._allocation[3]
+
+    @cached_property
+    def next_installment_amount(self):
+        """Recommended next receipt: the next installment (or its remainder) less advance"""
+        has_rows, _, _, inst = self._allocation
+        if not has_rows:
+            return float(self.loan.installment_amount or 0)
+        if inst is None:
+            return 0.0
+
+        due = to_cents(inst['remaining_amount'] if inst['status'] == 'partial' else inst['amount'])
+        return float(cents_to_decimal(max(due - to_cents(self.advance_balance), 0)))
+
+    @cached_property
+    def paid_installments(self):
+        # Rows after the first unpaid installment receive nothing
+        return self._allocation[2]
+
+    def rows_through_today(self):
+        """Rows that can be in arrears today
+
+        Streamed rows come in due-date order unless an override moved a due
+        date, so nothing after the first row due past today can be in arrears
+        (rows go overdue by the UTC date, which may be a day ahead).
+        """
+        horizon = None
+        if self._schedule is None and not any(override.custom_due_date for override in self.overrides):
+            horizon = max(self.today, datetime.utcnow().date())
+
+        for inst in self.rows():
+            if horizon and inst['due_date'] > horizon:
+                break
+            yield inst
+
+    @cached_property
+    def arrears(self):
+        """Overdue installments and partial remainders, as Loan.get_arrears_details()"""
+        loan = self.loan
+        advance = Decimal(str(loan.advance_balance or 0))
+        if loan.status not in ['active', 'completed']:
+            return {
+                'total_overdue_amount': Decimal('0'),
+                'overdue_installments': 0,
+                'partial_overdue_amount': Decimal('0'),
+                'partial_overdue_installments': 0,
+                'days_overdue': 0,
+                'oldest_overdue_date': None,
+                'advance_balance': advance,
+            }
+
+        total_overdue = Decimal('0')
+        overdue_count = 0
+        partial_overdue = Decimal('0')
+        partial_count = 0
+        oldest_overdue_date = None
+        today = self.today
+
+        for inst in self.rows_through_today():
+            # Skipped installments are placeholders; only payable rows are arrears
+            if inst.get('is_skipped', False):
+                continue
+            if inst['status'] == 'overdue':
+                total_overdue += Decimal(str(inst['amount']))
+                overdue_count += 1
+                if oldest_overdue_date is None or inst['due_date'] < oldest_overdue_date:
+                    oldest_overdue_date = inst['due_date']
+            elif inst['status'] == 'partial' and inst['due_date'] <= today:
+                # Only the unpaid remainder of a partial installment due by today is overdue
+                remaining = Decimal(str(inst['remaining_amount']))
+                if remaining > Decimal('0'):
+                    partial_overdue += remaining
+                    partial_count += 1
+                    if oldest_overdue_date is None or inst['due_date'] < oldest_overdue_date:
+                        oldest_overdue_date = inst['due_date']
+
+        days_overdue = 0
+        if oldest_overdue_date and oldest_overdue_date <= today:
+            days_overdue = (today - oldest_overdue_date).days
+
+        return {
+            'total_overdue_amount': total_overdue + partial_overdue,
+            'overdue_installments': overdue_count,
+            'partial_overdue_amount': partial_overdue,
+            'partial_overdue_installments': partial_count,
+            'days_overdue': days_overdue,
+            'oldest_overdue_date': oldest_overdue_date,
+            'advance_balance': advance,
+        }
+
+    def apply(self):
+        """Store outstanding_amount and advance_balance on the loan"""
+        self.loan.outstanding_amount = float(self.outstanding)
+        self.loan.advance_balance = self.advance_balance
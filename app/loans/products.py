@@ -0,0 +1,177 @@
+"""Loan product registry
+
+Each loan product declares its schedule frequency, interest model, rounding
+rules and skip-day calendar once. Loans resolve their product from
+``loan_type`` through ``resolve_product`` (memoized), so hot paths read
+attributes instead of re-classifying the type string on every call.
+"""
+from functools import lru_cache
+
+from app.utils.money import to_cents, rate_to_bp, div_half_up, div_up
+
+# Schedule frequencies
+DAILY = 'Daily'
+WEEKLY = 'Weekly'
+MONTHLY = 'Monthly'
+ONE_TIME = 'One-Time'
+
+SUNDAY = 6
+SATURDAY = 5
+
+
+def _double_rate_total(principal, rate):
+    """Total payable = principal * (100 + 2 * rate) / 100"""
+    return div_half_up(principal * (10000 + rate * 2), 10000)
+
+
+def _type1_totals(principal, rate, interest_type, months, weeks, days):
+    weeks = weeks or 9
+    total_payable = _double_rate_total(principal, rate)
+    # Installment is rounded up to a whole currency unit
+    emi = div_up(total_payable, weeks * 100) * 100
+    return emi, total_payable
+
+
+def _daily54_totals(principal, rate, interest_type, months, weeks, days):
+    days = days or 54
+    total_payable = _double_rate_total(principal, rate)
+    emi = div_half_up(total_payable, days)
+    return emi, total_payable
+
+
+def _micro_totals(principal, rate, interest_type, months, weeks, days):
+    months = months or 1
+    weeks = weeks or (months * 4)
+    emi = div_half_up(principal * (10000 + rate * months), 10000 * weeks)
+    return emi, emi * weeks
+
+
+def _type4_daily_totals(principal, rate, interest_type, months, weeks, days):
+    months = months or 1
+    days = days or (months * 26)
+    emi = div_half_up(principal * (10000 + rate * months), 10000 * days)
+    return emi, emi * days
+
+
+def _special_totals(principal, rate, interest_type, months, weeks, days):
+    total_payable = principal + div_half_up(principal * rate, 10000)
+    return total_payable, total_payable
+
+
+def _monthly_totals(principal, rate, interest_type, months, weeks, days):
+    from decimal import Decimal
+
+    months = months or 1
+    # Monthly rate is rate% / 12, i.e. rate / 120000 in hundredths of a percent
+    if interest_type == 'reducing_balance' and rate > 0:
+        mr_float = rate / 120000
+        power_calc = ((1 + mr_float) ** months) / (((1 + mr_float) ** months) - 1)
+        power_num, power_den = Decimal(str(power_calc)).as_integer_ratio()
+        emi = div_half_up(principal * rate * power_num, 120000 * power_den)
+    else:
+        emi = div_half_up(principal * (120000 + rate * months), 120000 * months)
+    return emi, emi * months
+
+
+class LoanProduct:
+    """Static description of a loan product and its calculators
+
+    ``frequency`` is the schedule cadence when the matching duration is set
+    (daily needs duration_days, weekly needs duration_weeks; otherwise the
+    schedule falls back to monthly). ``flat_rate`` products always split
+    interest evenly; the rest follow the loan's interest_type.
+    ``monthly_structure`` products report outstanding as total payable less
+    paid and amortize reducing-balance interest per period.
+    """
+
+    def __init__(self, code, label, frequency, totals, flat_rate=True,
+                 monthly_structure=False, skip_weekdays=(SUNDAY,),
+                 recalculate_total=False):
+        self.code = code
+        self.label = label
+        self.frequency = frequency
+        self.flat_rate = flat_rate
+        self.monthly_structure = monthly_structure
+        self.skip_weekdays = frozenset(skip_weekdays)
+        # Recompute total payable from the rate instead of trusting the stored value
+        self.recalculate_total = recalculate_total
+        self._totals = totals
+
+    def __repr__(self):
+        return f'<LoanProduct {self.code}>'
+
+    @property
+    def is_daily(self):
+        return self.frequency == DAILY
+
+    def uses_flat_interest(self, interest_type):
+        return self.flat_rate or interest_type == 'flat'
+
+    def uses_reducing_balance(self, interest_type):
+        return self.monthly_structure and interest_type == 'reducing_balance'
+
+    def schedule_frequency(self, duration_days=None, duration_weeks=None):
+        """Return the schedule cadence for a loan with the given durations"""
+        if self.frequency == ONE_TIME:
+            return ONE_TIME
+        if self.frequency == DAILY and duration_days:
+            return DAILY
+        if self.frequency == WEEKLY and duration_weeks:
+            return WEEKLY
+        return MONTHLY
+
+    def skips_due_date(self, due_date):
+        """Return True when no installment may fall on this date"""
+        return due_date.weekday() in self.skip_weekdays
+
+    def calculate_totals(self, principal_amount, interest_rate, interest_type=None,
+                         duration_months=None, duration_weeks=None, duration_days=None):
+        """Return (installment, total_payable) in int cents; (0, 0) for no principal"""
+        principal = to_cents(principal_amount or 0)
+        if principal <= 0:
+            return 0, 0
+        return self._totals(
+            principal,
+            rate_to_bp(interest_rate or 0),
+            interest_type,
+            int(duration_months or 0),
+            int(duration_weeks or 0),
+            int(duration_days or 0),
+        )
+
+
+PRODUCTS = {product.code: product for product in [
+    LoanProduct('type1_9weeks', '9 Week Loan', WEEKLY, _type1_totals, recalculate_total=True),
+    LoanProduct('54_daily', '54 Daily Loan', DAILY, _daily54_totals),
+    LoanProduct('54_daily_monday_friday', '54 Daily Loan (Monday-Friday)', DAILY, _daily54_totals,
+                skip_weekdays=(SATURDAY, SUNDAY)),
+    LoanProduct('type4_micro', 'Micro Loan (Weekly Installment)', WEEKLY, _micro_totals),
+    LoanProduct('type4_daily', 'Daily Loan (Daily Installment)', DAILY, _type4_daily_totals),
+    LoanProduct('monthly_loan', 'Monthly Loan', MONTHLY, _monthly_totals, flat_rate=False, monthly_structure=True),
+    LoanProduct('staff_loan', 'Staff Loan (Users Only)', MONTHLY, _monthly_totals, flat_rate=False, monthly_structure=True),
+    LoanProduct('special_loan', 'Special Loan', ONE_TIME, _special_totals),
+]}
+
+DAILY_PRODUCT_CODES = [code for code, product in PRODUCTS.items() if product.is_daily]
+
+
+@lru_cache(maxsize=64)
+def resolve_product(loan_type):
+    """Return the LoanProduct for a loan_type code
+
+    Unregistered codes (legacy or free-text values) are classified once with
+    the historical substring rules and memoized like registered ones.
+    """
+    product = PRODUCTS.get(loan_type)
+    if product is not None:
+        return product
+
+    code = (loan_type or '').lower()
+    if 'daily' in code or '54' in code:
+        frequency = DAILY
+    elif 'week' in code or 'micro' in code:
+        frequency = WEEKLY
+    else:
+        frequency = MONTHLY
+    flat_rate = any(token in code for token in ('type1', '54', 'type4', 'micro', 'daily'))
+    return LoanProduct(loan_type, loan_type or '', frequency, _monthly_totals, flat_rate=flat_rate)
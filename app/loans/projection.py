@@ -0,0 +1,253 @@
+"""Vectorized schedule projection for loan portfolios
+
+Builds the contractual installment schedule (amount, principal, interest and
+due date) for many loans at once with NumPy int64 cents, one row per loan and
+one column per installment. Results match Loan.generate_payment_schedule for
+loans without overrides; payments and admin overrides are not applied, so use
+this for read-only analytics (forecasts, PAR, portfolio tables) only.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.loans.business_calendar import holiday_dates
+from app.loans.products import DAILY, WEEKLY, MONTHLY, ONE_TIME
+from app.utils.money import to_cents, rate_to_bp
+
+# Denominators turning balance (cents) * rate (hundredths of a percent) into
+# one period's interest in cents
+PERIOD_DIVISORS = {
+    MONTHLY: 12 * 100 * 100,
+    WEEKLY: 52 * 100 * 100,
+    DAILY: 365 * 100 * 100,
+    ONE_TIME: 12 * 100 * 100,
+}
+
+SCHEDULE_STATUSES = ('disbursed', 'active', 'completed')
+
+
+def _div_half_up(numerator, denominator):
+    """Element-wise integer division rounded to nearest, ties away from zero"""
+    quotient = (np.abs(numerator) * 2 + denominator) // (denominator * 2)
+    return np.where(numerator < 0, -quotient, quotient)
+
+
+class Projection:
+    """Installment matrices for a batch of loans
+
+    ``amount``, ``principal`` and ``interest`` are int64 cents and ``due_dates``
+    is datetime64[D]; cells beyond a loan's installment count are zero / NaT
+    and ``mask`` is False there.
+    """
+
+    def __init__(self, loan_ids, amount, principal, interest, due_dates, mask):
+        self.loan_ids = loan_ids
+        self.amount = amount
+        self.principal = principal
+        self.interest = interest
+        self.due_dates = due_dates
+        self.mask = mask
+
+    def __len__(self):
+        return len(self.loan_ids)
+
+    def due_through(self, as_of):
+        """Per-loan installment amount (cents) falling due on or before as_of"""
+        due = self.mask & (self.due_dates <= np.datetime64(as_of, 'D'))
+        return np.where(due, self.amount, 0).sum(axis=1)
+
+    def due_between(self, start, end):
+        """Per-loan installment amount (cents) falling due within [start, end]"""
+        due = self.mask & (self.due_dates >= np.datetime64(start, 'D')) & (self.due_dates <= np.datetime64(end, 'D'))
+        return np.where(due, self.amount, 0).sum(axis=1)
+
+    def rows(self, index):
+        """Schedule rows for one loan in generate_payment_schedule's field names"""
+        count = int(self.mask[index].sum())
+        return [{
+            'installment_number': column + 1,
+            'due_date': self.due_dates[index, column].astype(date),
+            'amount': int(self.amount[index, column]) / 100,
+            'principal': int(self.principal[index, column]) / 100,
+            'interest': int(self.interest[index, column]) / 100,
+        } for column in range(count)]
+
+
+def amortize(principal, total_payable, installment, rate, num_installments, reducing, period_divisor):
+    """Amount/principal/interest matrices for arrays of loan parameters
+
+    All money arguments are int cents and ``rate`` is hundredths of a percent.
+    Even-split loans spread principal and interest evenly, with the last
+    installment absorbing rounding; ``reducing`` rows charge interest on the
+    outstanding balance per period. Returns (amount, principal, interest, mask).
+    """
+    principal = np.asarray(principal, dtype=np.int64)
+    total_payable = np.asarray(total_payable, dtype=np.int64)
+    installment = np.asarray(installment, dtype=np.int64)
+    rate = np.asarray(rate, dtype=np.int64)
+    count = np.asarray(num_installments, dtype=np.int64)
+    reducing = np.asarray(reducing, dtype=bool)
+    period_divisor = np.asarray(period_divisor, dtype=np.int64)
+
+    width = int(count.max()) if count.size else 0
+    columns = np.arange(width, dtype=np.int64)
+    mask = columns[None, :] < count[:, None]
+    is_last = columns[None, :] == (count[:, None] - 1)
+    safe_count = np.maximum(count, 1)[:, None]
+
+    # Every installment is the fixed amount except the last, which takes the
+    # remainder of total payable
+    last_amount = total_payable - (count - 1) * installment
+    amount = np.where(is_last, last_amount[:, None], installment[:, None])
+
+    # Even split: each row takes 1/n of principal and interest; the last row
+    # takes its principal share and the rest of its amount as interest
+    total_interest = (total_payable - principal)[:, None]
+    even_principal = np.broadcast_to(_div_half_up(principal[:, None], safe_count), amount.shape)
+    even_interest = np.where(
+        is_last,
+        _div_half_up(amount * safe_count - principal[:, None], safe_count),
+        _div_half_up(total_interest, safe_count),
+    )
+
+    # Reducing balance: walk the columns, vectorized across loans
+    reducing_principal = np.zeros_like(amount)
+    reducing_interest = np.zeros_like(amount)
+    if reducing.any():
+        rows = np.flatnonzero(reducing)
+        balance = principal[rows].copy()
+        for column in range(width):
+            current = amount[rows, column]
+            interest = _div_half_up(balance * rate[rows], period_divisor[rows])
+            last = is_last[rows, column]
+            interest = np.where(last, current - balance, interest)
+            paid_principal = current - interest
+            reducing_principal[rows, column] = paid_principal
+            reducing_interest[rows, column] = interest
+            balance = balance - paid_principal
+
+    principal_matrix = np.where(reducing[:, None], reducing_principal, even_principal)
+    interest_matrix = np.where(reducing[:, None], reducing_interest, even_interest)
+    return (
+        np.where(mask, amount, 0),
+        np.where(mask, principal_matrix, 0),
+        np.where(mask, interest_matrix, 0),
+        mask,
+    )
+
+
+def _weekmask(skip_weekdays):
+    return ''.join('0' if weekday in skip_weekdays else '1' for weekday in range(7))
+
+
+def due_date_matrix(first_due, num_installments, frequencies, skip_weekdays=None, holidays=None):
+    """datetime64[D] due dates per loan and installment (NaT beyond the count)
+
+    Daily loans move to the next day outside their rest weekdays and holiday
+    dates, weekly loans step seven days and monthly loans keep the first due
+    day, clamped to the month's end.
+    """
+    first_due = np.asarray(first_due, dtype='datetime64[D]')
+    count = np.asarray(num_installments, dtype=np.int64)
+    frequencies = np.asarray(frequencies, dtype=object)
+    if skip_weekdays is None:
+        skip_weekdays = [frozenset()] * len(first_due)
+    if holidays is None:
+        holidays = [()] * len(first_due)
+
+    width = int(count.max()) if count.size else 0
+    columns = np.arange(width, dtype=np.int64)
+    mask = columns[None, :] < count[:, None]
+    dates = np.full((len(first_due), width), np.datetime64('NaT'), dtype='datetime64[D]')
+
+    weekly = frequencies == WEEKLY
+    dates[weekly] = first_due[weekly, None] + columns[None, :] * 7
+
+    monthly = (frequencies == MONTHLY) | (frequencies == ONE_TIME)
+    if monthly.any():
+        first = first_due[monthly]
+        first_month = first.astype('datetime64[M]')
+        day_offset = (first - first_month.astype('datetime64[D]')).astype(np.int64)[:, None]
+        months = first_month[:, None] + columns[None, :]
+        month_start = months.astype('datetime64[D]')
+        month_length = ((months + 1).astype('datetime64[D]') - month_start).astype(np.int64)
+        dates[monthly] = month_start + np.minimum(day_offset, month_length - 1)
+
+    daily = np.flatnonzero(frequencies == DAILY)
+    by_calendar = {}
+    for row in daily:
+        key = (_weekmask(skip_weekdays[row]), tuple(holidays[row]))
+        by_calendar.setdefault(key, []).append(row)
+    for (weekmask, calendar_holidays), rows in by_calendar.items():
+        rows = np.asarray(rows)
+        offsets = np.broadcast_to(columns, (len(rows), width))
+        calendar = np.busdaycalendar(weekmask=weekmask, holidays=list(calendar_holidays))
+        dates[rows] = np.busday_offset(first_due[rows, None], offsets, roll='forward', busdaycal=calendar)
+
+    return np.where(mask, dates, np.datetime64('NaT'))
+
+
+def _first_due_date(loan):
+    return loan.first_installment_date or loan.disbursement_date or loan.approval_date or loan.application_date
+
+
+def loan_parameters(loans):
+    """Arrays of projection inputs for Loan objects, derived as generate_payment_schedule does"""
+    params = {key: [] for key in (
+        'loan_id', 'principal', 'total_payable', 'installment', 'rate', 'num_installments',
+        'reducing', 'period_divisor', 'first_due', 'frequency', 'skip_weekdays', 'holidays',
+    )}
+    for loan in loans:
+        product = loan.product
+        first_due = _first_due_date(loan)
+        frequency = product.schedule_frequency(loan.duration_days, loan.duration_weeks)
+        if frequency == ONE_TIME:
+            count = 1
+            first_due = loan.maturity_date or first_due
+        elif frequency == DAILY:
+            count = loan.duration_days
+        elif frequency == WEEKLY:
+            count = loan.duration_weeks
+        else:
+            count = loan.duration_months
+        if loan.status not in SCHEDULE_STATUSES or not first_due:
+            count = 0
+        if isinstance(first_due, date) and hasattr(first_due, 'date'):
+            first_due = first_due.date()
+
+        principal = to_cents(loan.disbursed_amount or loan.loan_amount)
+        params['loan_id'].append(loan.id)
+        params['principal'].append(principal)
+        params['total_payable'].append(to_cents(loan.total_payable) if loan.total_payable else principal)
+        params['installment'].append(to_cents(loan.installment_amount))
+        params['rate'].append(rate_to_bp(loan.interest_rate))
+        params['num_installments'].append(count or 0)
+        params['reducing'].append(product.uses_reducing_balance(loan.interest_type))
+        params['period_divisor'].append(PERIOD_DIVISORS[frequency])
+        params['first_due'].append(first_due or date.min + timedelta(days=1))
+        params['frequency'].append(frequency)
+        params['skip_weekdays'].append(product.skip_weekdays)
+        params['holidays'].append(holiday_dates(loan.branch_id) if frequency == DAILY else ())
+    return params
+
+
+def project_loans(loans):
+    """Project contractual schedules for a sequence of Loan objects"""
+    params = loan_parameters(loans)
+    amount, principal, interest, mask = amortize(
+        params['principal'],
+        params['total_payable'],
+        params['installment'],
+        params['rate'],
+        params['num_installments'],
+        params['reducing'],
+        params['period_divisor'],
+    )
+    due_dates = due_date_matrix(
+        params['first_due'],
+        params['num_installments'],
+        params['frequency'],
+        params['skip_weekdays'],
+        params['holidays'],
+    )
+    return Projection(np.asarray(params['loan_id']), amount, principal, interest, due_dates, mask)
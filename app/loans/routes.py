@@ -1,6 +1,7 @@
 """Loan management routes"""
 from flask import render_template, redirect, url_for, flash, request, current_app, jsonify, make_response
 from flask_login import login_required, current_user
+from collections import namedtuple
 import io
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
@@ -8,9 +9,15 @@ from dateutil.relativedelta import relativedelta
 import os
 from app import db
 from app.loans import loans_bp
-from app.models import Loan, LoanPayment, Customer, ActivityLog, SystemSettings, User, LoanScheduleOverride, Branch
+from app.models import Loan, LoanPayment, Customer, ActivityLog, SystemSettings, User, LoanScheduleOverride, Branch, BusinessHoliday, LoanInstallment
+from app.loans import business_calendar  # noqa: F401 (bumps holiday_versions on holiday writes)
+from app.loans.financial_state import LoanFinancialState
+from app.loans.products import DAILY_PRODUCT_CODES, resolve_product
 from app.loans.forms import LoanForm, LoanPaymentForm, EditPaymentForm, LoanApprovalForm, StaffApprovalForm, ManagerApprovalForm, InitiateLoanForm, AdminApprovalForm, LoanStatusUpdateForm, LoanDeactivationForm
 from app.utils.decorators import permission_required, admin_required, admin_only
+from app.jobs.queue import background_job
+from app.utils.sequences import reserve_receipt_numbers
+from app.utils.concurrency import retry_on_conflict
 from app.utils.helpers import generate_loan_number, generate_customer_id, get_current_branch_id, should_filter_by_branch, generate_receipt_number
 
 
@@ -24,104 +31,108 @@ def _calculate_loan_totals_for_principal(
     duration_days=None,
 ):
     """Calculate installment amount and total payable from a principal base amount."""
-    from decimal import Decimal, ROUND_HALF_UP, ROUND_UP
-
-    principal = Decimal(str(principal_amount or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    rate = Decimal(str(interest_rate or 0))
-    months = int(duration_months or 0)
-    weeks = int(duration_weeks or 0)
-    days = int(duration_days or 0)
-
-    if principal <= 0:
-        return Decimal('0.00'), Decimal('0.00')
-
-    if loan_type == 'type1_9weeks':
-        weeks = weeks or 9
-        interest = rate * Decimal('2')
-        total_payable = (principal * (Decimal('100') + interest) / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        emi = (total_payable / Decimal(str(weeks))).quantize(Decimal('1'), rounding=ROUND_UP)
-    elif loan_type in ['54_daily', '54_daily_monday_friday']:
-        days = days or 54
-        full_interest = rate * Decimal('2')
-        total_payable = (principal * (Decimal('100') + full_interest) / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        emi = (total_payable / Decimal(str(days))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    elif loan_type == 'type4_micro':
-        months = months or 1
-        weeks = weeks or (months * 4)
-        full_interest = rate * Decimal(str(months))
-        emi = (principal * ((full_interest + Decimal('100')) / Decimal('100')) / Decimal(str(weeks))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        total_payable = (emi * Decimal(str(weeks))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    elif loan_type == 'type4_daily':
-        months = months or 1
-        days = days or (months * 26)
-        full_interest = rate * Decimal(str(months))
-        emi = (principal * ((full_interest + Decimal('100')) / Decimal('100')) / Decimal(str(days))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        total_payable = (emi * Decimal(str(days))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    elif loan_type == 'special_loan':
-        total_interest = (principal * rate / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        total_payable = (principal + total_interest).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        emi = total_payable
-    else:
-        months = months or 1
-        monthly_rate = rate / (Decimal('12') * Decimal('100'))
-        if interest_type == 'reducing_balance' and monthly_rate > 0:
-            mr_float = float(monthly_rate)
-            power_calc = ((1 + mr_float) ** months) / (((1 + mr_float) ** months) - 1)
-            emi = (principal * monthly_rate * Decimal(str(power_calc))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        else:
-            total_interest = principal * rate * Decimal(str(months)) / (Decimal('12') * Decimal('100'))
-            emi = ((principal + total_interest) / Decimal(str(months))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        total_payable = (emi * Decimal(str(months))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-    return emi, total_payable
+    from app.utils.money import cents_to_decimal
+
+    emi, total_payable = resolve_product(loan_type).calculate_totals(
+        principal_amount,
+        interest_rate,
+        interest_type=interest_type,
+        duration_months=duration_months,
+        duration_weeks=duration_weeks,
+        duration_days=duration_days,
+    )
+    return cents_to_decimal(emi), cents_to_decimal(total_payable)
 
 
 def _refresh_loan_financial_state(loan):
     """Refresh derived loan financial fields after principal/disbursement edits."""
     from decimal import Decimal, ROUND_HALF_UP
 
-    # 1) Recalculate current outstanding using model rules
-    loan.update_outstanding_amount()
+    state = loan.financial_state()
 
-    # 2) Recalculate advance balance from schedule allocation (keeps loan card
-    # and schedule "Advance out" in sync, even with skipped installments).
-    schedule = loan.generate_payment_schedule()
-    loan.advance_balance = loan.calculate_available_advance_balance(schedule=schedule)
+    # 1) Recalculate current outstanding and the advance balance from schedule
+    # allocation (keeps loan card and schedule "Advance out" in sync, even with
+    # skipped installments).
+    state.apply()
+    loan.sync_installments(state.schedule)
 
-    # 3) Rebuild historical `balance_after` in payment history from new total payable
+    # 2) Rebuild historical `balance_after` in payment history from new total payable
     running_outstanding = Decimal(str(loan.total_payable or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    payments = loan.payments.order_by(LoanPayment.payment_date.asc(), LoanPayment.id.asc()).all()
-    for payment in payments:
+    for payment in state.payments:
         pay_amount = Decimal(str(payment.payment_amount or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
         running_outstanding = (running_outstanding - pay_amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
         if running_outstanding < Decimal('0.00'):
             running_outstanding = Decimal('0.00')
         payment.balance_after = float(running_outstanding)
 
-    # 4) Keep status aligned with outstanding
-    # To properly transition from 'completed' to 'active', we need to calculate outstanding
-    # without the status guard that prevents calculation for non-active loans.
-    # Temporarily set status to 'active' to get accurate calculation.
-    original_status = loan.status
-    loan.status = 'active'
-    current_outstanding = loan.calculate_current_outstanding()
-    loan.status = original_status
-    
+    # 3) Keep status aligned with outstanding
+    _sync_completion_status(loan, state)
+
+
+def _sync_completion_status(loan, state):
+    """Complete a settled loan, or reopen a completed one that owes again.
+
+    balance_due is computed as if the loan were active so completed loans can
+    move back to active.
+    """
+    from decimal import Decimal
+
+    current_outstanding = state.balance_due
+
     if current_outstanding <= Decimal('0.02'):
         loan.status = 'completed'
         if not loan.closing_date:
-            last_payment = loan.payments.order_by(LoanPayment.payment_date.desc(), LoanPayment.id.desc()).first()
+            last_payment = state.last_payment
             loan.closing_date = last_payment.payment_date if last_payment else datetime.utcnow().date()
     elif loan.status == 'completed' and current_outstanding > Decimal('0.02'):
         loan.status = 'active'
         loan.closing_date = None
 
 
-def _get_installment_advance_breakdown(loan):
+def _rebook_payments(loan, from_date, incremental):
+    """Bring a loan up to date after a receipt dated from_date was corrected or deleted.
+
+    Call with paid_amount already adjusted. Only receipts dated on or after
+    from_date get a new balance_after, continuing from the total received
+    before that date, and only their FIFO allocation is replayed over the
+    installments (Loan.reallocate_receipts). `incremental` is
+    loan.can_append_receipt() checked before the correction; without it, or
+    when installments were never materialized, the whole history is rebuilt.
+    """
+    from decimal import Decimal, ROUND_HALF_UP
+    from sqlalchemy import func
+
+    if not incremental or not loan.reallocate_receipts(from_date):
+        _refresh_loan_financial_state(loan)
+        return
+
+    state = loan.financial_state()
+    loan.outstanding_amount = float(state.outstanding)
+    loan.refresh_arrears_snapshot(state)
+
+    # Same running balance as the full rebuild; amounts are never negative,
+    # so the running floor at zero is the floor of the total
+    received_before = db.session.query(func.coalesce(func.sum(LoanPayment.payment_amount), 0)).filter(
+        LoanPayment.loan_id == loan.id, LoanPayment.payment_date < from_date
+    ).scalar()
+    running_outstanding = (Decimal(str(loan.total_payable or 0)) - Decimal(str(received_before))).quantize(
+        Decimal('0.01'), rounding=ROUND_HALF_UP
+    )
+    running_outstanding = max(running_outstanding, Decimal('0.00'))
+    for payment in state.receipts_between(start=from_date):
+        pay_amount = Decimal(str(payment.payment_amount or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        running_outstanding = max((running_outstanding - pay_amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP), Decimal('0.00'))
+        payment.balance_after = float(running_outstanding)
+
+    _sync_completion_status(loan, state)
+
+
+def _get_installment_advance_breakdown(loan, schedule=None):
     """Return next-due and advance deduction details for payment collection UI."""
     from decimal import Decimal, ROUND_HALF_UP
 
-    schedule = loan.generate_payment_schedule()
+    if schedule is None:
+        schedule = loan.generate_payment_schedule()
     advance_balance = loan.calculate_available_advance_balance(schedule=schedule)
     if advance_balance < Decimal('0.00'):
         advance_balance = Decimal('0.00')
@@ -712,13 +723,15 @@ def view_loan(id):
             flash('Access denied: Loan not found in current branch.', 'danger')
             return redirect(url_for('loans.list_loans'))
     
-    # Calculate current outstanding amount with accrued interest
-    current_outstanding = loan.calculate_current_outstanding()
-    accrued_interest = loan.calculate_accrued_interest()
+    # Outstanding (with accrued interest), advance, arrears and the schedule
+    # all come from one load of the loan's receipts
+    state = loan.financial_state(schedule=loan.get_payment_schedule())
+    current_outstanding = state.outstanding
+    accrued_interest = state.accrued_interest
+    schedule = state.schedule
     
-    # Update the loan's stored outstanding amount to reflect current calculation
-    loan.update_outstanding_amount()
-    loan.advance_balance = loan.calculate_available_advance_balance()
+    # Update the loan's stored outstanding amount and advance to reflect current calculation
+    state.apply()
     db.session.commit()
     
     # Get guarantors
@@ -736,7 +749,7 @@ def view_loan(id):
                 }
 
     # Get arrears details
-    arrears_details = loan.get_arrears_details()
+    arrears_details = state.arrears
     
     # Get advance balance
     advance_balance = float(loan.advance_balance or 0)
@@ -744,9 +757,6 @@ def view_loan(id):
     # Get payment history for this loan
     payments = loan.payments.order_by(LoanPayment.payment_date.desc()).all()
     
-    # Generate payment schedule for display
-    schedule = loan.generate_payment_schedule()
-    
     return render_template('loans/view.html',
                          title=f'Loan: {loan.loan_number}',
                          loan=loan,
@@ -1017,6 +1027,7 @@ def approve_loan(id):
             loan.total_payable = total_payable
             loan.paid_amount = Decimal(str(loan.paid_amount or 0)).quantize(Decimal('0.01'))
             loan.update_outstanding_amount()
+            loan.sync_installments()
             
             # Log activity
             log = ActivityLog(
@@ -1269,6 +1280,7 @@ def approve_loan_admin(id):
             loan.total_payable = total_payable
             loan.paid_amount = Decimal(str(loan.paid_amount or 0)).quantize(Decimal('0.01'))
             loan.update_outstanding_amount()
+            loan.sync_installments()
             
             # Log activity
             log = ActivityLog(
@@ -1348,6 +1360,7 @@ def deactivate_loan(id):
         loan.deactivation_reason = form.deactivation_reason.data
         loan.deactivation_date = form.deactivation_date.data
         loan.deactivated_by = current_user.id
+        loan.sync_installments()
         
         # Log activity
         log = ActivityLog(
@@ -1424,6 +1437,7 @@ def change_loan_status(id):
             loan.rejection_reason = reason
 
         loan.updated_at = datetime.utcnow()
+        loan.sync_installments()
 
         # Log activity
         log = ActivityLog(
@@ -1448,159 +1462,234 @@ def change_loan_status(id):
                            form=form,
                            loan=loan)
 
-def _process_payment(loan, payment_amount, payment_date, payment_method, reference_number, notes, penalty_amount=0):
-    """Shared payment processor used by both form and quick-pay (keeps logic in one place)."""
-    from decimal import Decimal, ROUND_HALF_UP
+def _split_payment(loan, state, payment_amount):
+    """Interest and principal parts of a receipt, from the loan's state before it is added."""
+    from app.utils.money import to_cents, rate_to_bp, cents_to_decimal, div_half_up
 
-    payment_amount = Decimal(str(payment_amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    payment_cents = to_cents(payment_amount)
+    tolerance = 5
 
     # Calculate current outstanding with accrued interest
-    # For completed loans, temporarily set status to 'active' to get accurate calculation
-    original_status = loan.status
+    # Completed loans are measured as if active to get an accurate calculation
     if loan.status == 'completed':
-        loan.status = 'active'
-    current_outstanding = loan.calculate_current_outstanding()
-    loan.status = original_status
+        current_outstanding = to_cents(state.balance_due)
+    else:
+        current_outstanding = to_cents(state.outstanding)
     
-    accrued_interest = loan.calculate_accrued_interest()
+    accrued_interest = to_cents(state.accrued_interest)
 
     # Current outstanding principal (without accrued interest)
-    disbursed = Decimal(str(loan.disbursed_amount or loan.loan_amount))
-    paid_principal = loan.get_total_paid_principal()
+    disbursed = to_cents(loan.disbursed_amount or loan.loan_amount)
+    paid_principal = to_cents(state.paid_principal)
     outstanding_principal = disbursed - paid_principal
+    rate_bp = rate_to_bp(loan.interest_rate)
 
     # Check if this is a full payment or overpayment
-    is_full_payment = payment_amount >= current_outstanding or abs(payment_amount - current_outstanding) <= Decimal('0.05')
+    is_full_payment = payment_cents >= current_outstanding or abs(payment_cents - current_outstanding) <= tolerance
+
+    # Splits are exact fractions interest_num / denominator (and principal_num /
+    # denominator) of cents, rounded once at the end.
+    denominator = 1
 
     # Calculate interest and principal splits based on loan type
     if loan.interest_type == 'flat':
         # For flat interest loans, calculate fixed interest per payment
-        # Determine number of installments and period based on frequency
+        # Determine number of installments and period (as a fraction of a year) based on frequency
         if loan.installment_frequency == 'monthly':
             num_installments = loan.duration_months or 0
-            period = Decimal('1') / Decimal('12')
+            period_num, period_den = 1, 12
         elif loan.installment_frequency == 'weekly':
             num_installments = loan.duration_weeks or 0
-            period = Decimal('7') / Decimal('365')
+            period_num, period_den = 7, 365
         elif loan.installment_frequency == 'daily':
             num_installments = loan.duration_days or 0
-            period = Decimal('1') / Decimal('365')
+            period_num, period_den = 1, 365
         else:
             num_installments = loan.duration_months or 0
-            period = Decimal('1') / Decimal('12')
+            period_num, period_den = 1, 12
 
-        time_in_years = Decimal(str(num_installments)) * period
-        total_interest = (disbursed * Decimal(str(loan.interest_rate)) * time_in_years) / Decimal('100')
-        installment_interest = total_interest / Decimal(str(num_installments)) if num_installments > 0 else Decimal('0')
+        # installment interest = disbursed * rate% * period; total = that * installments
+        denominator = period_den * 100 * 100
+        installment_interest = disbursed * rate_bp * period_num if num_installments > 0 else 0
+        total_interest = disbursed * rate_bp * period_num * num_installments
 
         # For flat loans, determine if this is truly a full settlement (paying off entire remaining balance)
-        total_paid = Decimal(str(loan.paid_amount or 0))
-        total_payable = disbursed + total_interest
-        remaining_total = total_payable - total_paid
-        is_full_settlement = payment_amount >= remaining_total or abs(payment_amount - remaining_total) <= Decimal('0.05')
+        total_paid = to_cents(loan.paid_amount or 0)
+        remaining_total = (disbursed - total_paid) * denominator + total_interest
+        payment_scaled = payment_cents * denominator
+        is_full_settlement = payment_scaled >= remaining_total or abs(payment_scaled - remaining_total) <= tolerance * denominator
 
+        installment_cents = to_cents(loan.installment_amount) if loan.installment_amount else 0
         if is_full_settlement:
             # Full settlement - pay all remaining interest and principal
-            total_paid_interest = loan.get_total_paid_interest()
-            remaining_interest = total_interest - Decimal(str(total_paid_interest))
-            interest_amount = min(payment_amount, remaining_interest)
-            principal_amount = payment_amount - interest_amount
+            total_paid_interest = to_cents(state.paid_interest)
+            remaining_interest = total_interest - total_paid_interest * denominator
+            interest_num = min(payment_scaled, remaining_interest)
+            principal_num = payment_scaled - interest_num
         else:
             # Regular installment payment - use fixed interest per payment
-            if loan.installment_amount and loan.installment_amount > 0 and abs(payment_amount - Decimal(str(loan.installment_amount))) <= Decimal('0.05'):
+            if installment_cents > 0 and abs(payment_cents - installment_cents) <= tolerance:
                 # This is a regular installment payment
-                interest_amount = installment_interest
-                principal_amount = payment_amount - interest_amount
+                interest_num = installment_interest
+                principal_num = payment_scaled - interest_num
+            elif installment_cents:
+                # Partial or different amount - calculate proportionally to the installment
+                denominator *= installment_cents
+                interest_num = installment_interest * payment_cents
+                principal_num = payment_cents * denominator - interest_num
             else:
-                # Partial or different amount - calculate proportionally
-                payment_ratio = payment_amount / Decimal(str(loan.installment_amount)) if loan.installment_amount else Decimal('1')
-                interest_amount = installment_interest * payment_ratio
-                principal_amount = payment_amount - interest_amount
+                interest_num = installment_interest
+                principal_num = payment_scaled - interest_num
     else:
         # For reducing balance loans (original logic)
         if is_full_payment:
             # For full payments, pay off accrued interest first, then principal
-            interest_amount = min(payment_amount, accrued_interest)
-            principal_amount = min(payment_amount - interest_amount, outstanding_principal)
+            interest_num = min(payment_cents, accrued_interest)
+            principal_num = min(payment_cents - interest_num, outstanding_principal)
             
             # Any remaining amount goes to interest (overpayment case)
-            remaining = payment_amount - principal_amount - interest_amount
+            remaining = payment_cents - principal_num - interest_num
             if remaining > 0:
-                interest_amount += remaining
+                interest_num += remaining
         else:
             # For partial payments, split based on loan terms
             if accrued_interest > 0:
                 # Pay accrued interest first if any exists
-                interest_amount = min(payment_amount, accrued_interest)
-                principal_amount = payment_amount - interest_amount
+                interest_num = min(payment_cents, accrued_interest)
+                principal_num = payment_cents - interest_num
             else:
-                # Standard EMI split - calculate proportion
-                monthly_interest = outstanding_principal * (Decimal(str(loan.interest_rate)) / Decimal('1200'))
-                if payment_amount >= monthly_interest:
-                    interest_amount = monthly_interest
-                    principal_amount = payment_amount - interest_amount
+                # Standard EMI split - outstanding * rate% / 12 for the month
+                denominator = 12 * 100 * 100
+                monthly_interest = outstanding_principal * rate_bp
+                if payment_cents * denominator >= monthly_interest:
+                    interest_num = monthly_interest
+                    principal_num = payment_cents * denominator - interest_num
                 else:
                     # If payment is less than monthly interest, all goes to interest
-                    interest_amount = payment_amount
-                    principal_amount = Decimal('0')
+                    interest_num = payment_cents * denominator
+                    principal_num = 0
     # Ensure no negative amounts
-    interest_amount = max(Decimal('0'), interest_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-    principal_amount = max(Decimal('0'), principal_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-    
-    # Create payment record
-    payment = LoanPayment(
-        loan_id=loan.id,
-        payment_date=payment_date,
-        payment_amount=float(payment_amount),
-        principal_amount=float(principal_amount),
-        interest_amount=float(interest_amount),
-        penalty_amount=float(penalty_amount or 0),
-        payment_method=payment_method,
-        reference_number=reference_number,
-        receipt_number=generate_receipt_number(),
-        notes=notes,
-        collected_by=current_user.id
-    )
-    
-    db.session.add(payment)
-    
-    # Update loan amounts - recalculate outstanding based on new payment
-    loan.paid_amount = (Decimal(str(loan.paid_amount or 0)) + payment_amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    loan.update_outstanding_amount()  # Use our new method to calculate current outstanding
-    
-    # Calculate advance balance from schedule allocation (not due-so-far shortcut)
-    schedule = loan.generate_payment_schedule()
-    loan.advance_balance = loan.calculate_available_advance_balance(schedule=schedule)
-    
-    # Set balance_after for the payment record
-    payment.balance_after = float(loan.outstanding_amount or 0)
-    
-    # Check if loan is fully paid
-    # For accurate calculation on potentially completed loans, temporarily set status to 'active'
-    temp_status = loan.status
-    loan.status = 'active'
-    is_fully_paid = loan.calculate_current_outstanding() <= Decimal('0.02')
-    loan.status = temp_status
+    interest_amount = cents_to_decimal(max(0, div_half_up(interest_num, denominator)))
+    principal_amount = cents_to_decimal(max(0, div_half_up(principal_num, denominator)))
+
+    return interest_amount, principal_amount
+
+
+# One receipt for _post_receipts()
+Receipt = namedtuple('Receipt', 'amount payment_date payment_method reference_number notes penalty_amount '
+                                 'idempotency_key', defaults=(None,))
+
+
+def _post_receipts(loan, receipts, state=None):
+    """Add receipts to one loan and bring its balances, installments and status up to date.
+
+    Each receipt is split against the state left by the ones before it; the
+    schedule allocation, arrears snapshot and completion are worked out once,
+    after all of them. Returns the unsaved LoanPayments in receipt order, with
+    None for receipts that follow one that settled the loan. The caller
+    commits. `state` may be passed in with the loan's receipts pre-loaded.
+    """
+    from decimal import Decimal, ROUND_HALF_UP
+
+    if state is None:
+        state = loan.financial_state()
+    if not receipts:
+        return []
+
+    # Number the receipts before anything is written (see app.utils.sequences)
+    reserve_receipt_numbers('LOAN', loan.branch_id, len(receipts))
+
+    # Receipts dated on/after the latest one only extend the FIFO allocation
+    append_only = loan.can_append_receipt(min(receipt.payment_date for receipt in receipts))
+
+    payments = []
+    logs = []
+    posted_amount = Decimal('0')
+    is_fully_paid = False
+    for receipt in receipts:
+        if is_fully_paid:
+            payments.append(None)
+            continue
+
+        payment_amount = Decimal(str(receipt.amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        interest_amount, principal_amount = _split_payment(loan, state, payment_amount)
+        payment = LoanPayment(
+            loan_id=loan.id,
+            payment_date=receipt.payment_date,
+            payment_amount=float(payment_amount),
+            principal_amount=float(principal_amount),
+            interest_amount=float(interest_amount),
+            penalty_amount=float(receipt.penalty_amount or 0),
+            payment_method=receipt.payment_method,
+            reference_number=receipt.reference_number,
+            receipt_number=generate_receipt_number('LOAN', loan.branch_id),
+            notes=receipt.notes,
+            idempotency_key=receipt.idempotency_key,
+            collected_by=current_user.id
+        )
+
+        # Update loan amounts - recalculate outstanding based on new payment. The
+        # receipt joins the already loaded ones after any receipts of the same date.
+        loan.paid_amount = (Decimal(str(loan.paid_amount or 0)) + payment_amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        position = sum(1 for earlier in state.payments if earlier.payment_date <= receipt.payment_date)
+        state = loan.financial_state(payments=state.payments[:position] + [payment] + state.payments[position:])
+
+        # Set balance_after for the payment record
+        payment.balance_after = float(state.outstanding)
+
+        # Check if loan is fully paid (measured as if active, for completed loans)
+        is_fully_paid = state.balance_due <= Decimal('0.02')  # Allow for small rounding differences
+
+        posted_amount += payment_amount
+        payments.append(payment)
+        logs.append(ActivityLog(
+            user_id=current_user.id,
+            action='loan_payment',
+            entity_type='loan',
+            entity_id=loan.id,
+            description=f'Payment of {payment_amount} for loan {loan.loan_number}',
+            ip_address=request.remote_addr
+        ))
+
+    added = [payment for payment in payments if payment is not None]
+    db.session.add_all(added)
+    loan.touch_schedule(payments=True)
+    loan.outstanding_amount = float(state.outstanding)
+    
+    # Calculate advance balance from schedule allocation (not due-so-far shortcut);
+    # back-dated receipts re-run the full allocation
+    if not (append_only and loan.append_receipt(posted_amount)):
+        loan.advance_balance = state.advance_balance
+        loan.sync_installments(state.schedule)
+    else:
+        loan.refresh_arrears_snapshot(state)
     
-    if is_fully_paid:  # Allow for small rounding differences
+    if is_fully_paid:
         loan.status = 'completed'
         loan.outstanding_amount = Decimal('0')
         loan.advance_balance = Decimal('0')
-        loan.closing_date = payment_date  # Set closing date to payment date
-        
-    # Log activity
-    log = ActivityLog(
-        user_id=current_user.id,
-        action='loan_payment',
-        entity_type='loan',
-        entity_id=loan.id,
-        description=f'Payment of {payment_amount} for loan {loan.loan_number}',
-        ip_address=request.remote_addr
-    )
-    db.session.add(log)
-    
-    db.session.commit()
-    return payment
+        loan.closing_date = added[-1].payment_date  # Set closing date to the settling payment's date
+
+    db.session.add_all(logs)
+    return payments
+
+
+def _process_payment(loan, payment_amount, payment_date, payment_method, reference_number, notes, penalty_amount=0):
+    """Shared payment processor used by both form and quick-pay (keeps logic in one place).
+
+    Posted again from fresh balances when a concurrent payment updates the
+    loan first; raises ValueError if that payment changed the loan's status.
+    """
+    receipt = Receipt(payment_amount, payment_date, payment_method, reference_number, notes, penalty_amount)
+    status = loan.status
+
+    def post():
+        if loan.status != status:
+            raise ValueError(f'Loan became {loan.status} while the payment was being recorded')
+        payment, = _post_receipts(loan, [receipt])
+        return payment
+
+    return retry_on_conflict(post)
 
 
 @loans_bp.route('/<int:id>/payment', methods=['GET', 'POST'])
@@ -1624,20 +1713,26 @@ def add_payment(id):
         return redirect(url_for('loans.view_loan', id=id))
 
     form = LoanPaymentForm()
-    advance_breakdown = _get_installment_advance_breakdown(loan)
+    state = loan.financial_state(schedule=loan.get_payment_schedule())
+    advance_breakdown = _get_installment_advance_breakdown(loan, schedule=state.schedule)
 
     if form.validate_on_submit():
         payment_amount = Decimal(str(form.payment_amount.data or 0))
 
-        _process_payment(
-            loan=loan,
-            payment_amount=payment_amount,
-            payment_date=form.payment_date.data,
-            payment_method=form.payment_method.data,
-            reference_number=form.reference_number.data,
-            notes=form.notes.data,
-            penalty_amount=form.penalty_amount.data,
-        )
+        try:
+            _process_payment(
+                loan=loan,
+                payment_amount=payment_amount,
+                payment_date=form.payment_date.data,
+                payment_method=form.payment_method.data,
+                reference_number=form.reference_number.data,
+                notes=form.notes.data,
+                penalty_amount=form.penalty_amount.data,
+            )
+        except ValueError as exc:
+            db.session.rollback()
+            flash(f'Cannot add payment: {exc}', 'warning')
+            return redirect(url_for('loans.view_loan', id=id))
 
         flash(f'Payment of {payment_amount} recorded successfully!', 'success')
         return redirect(url_for('loans.view_loan', id=id))
@@ -1650,15 +1745,15 @@ def add_payment(id):
         form.payment_date.data = get_current_date()
     
     # Get current outstanding amount with accrued interest for display
-    current_outstanding = loan.calculate_current_outstanding()
-    accrued_interest = loan.calculate_accrued_interest()
+    current_outstanding = state.outstanding
+    accrued_interest = state.accrued_interest
     
     # Get arrears details for display
-    arrears_details = loan.get_arrears_details()
+    arrears_details = state.arrears
     advance_balance = float(advance_breakdown['advance_balance'])
     
     # Update stored outstanding amount to match current calculation
-    loan.update_outstanding_amount()
+    loan.outstanding_amount = float(current_outstanding)
     db.session.commit()
     
     return render_template('loans/payment.html',
@@ -2049,6 +2144,8 @@ def edit_payment(payment_id):
         old_amount = Decimal(str(payment.payment_amount))
         new_amount = Decimal(str(form.payment_amount.data)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
         diff = new_amount - old_amount
+        from_date = min(payment.payment_date, form.payment_date.data)
+        incremental = diff != 0 and loan.can_append_receipt()
 
         payment.payment_date = form.payment_date.data
         payment.payment_amount = float(new_amount)
@@ -2059,11 +2156,12 @@ def edit_payment(payment_id):
         payment.payment_method = form.payment_method.data
         payment.reference_number = form.reference_number.data
         payment.notes = form.notes.data
+        loan.touch_schedule(payments=True)
 
         # Adjust loan paid_amount by the difference
         if diff != 0:
             loan.paid_amount = (Decimal(str(loan.paid_amount or 0)) + diff).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            _refresh_loan_financial_state(loan)
+            _rebook_payments(loan, from_date, incremental)
 
         # Log activity
         log = ActivityLog(
@@ -2105,14 +2203,16 @@ def delete_payment(payment_id):
     from decimal import Decimal, ROUND_HALF_UP
     receipt_number = payment.receipt_number
     amount = Decimal(str(payment.payment_amount))
+    incremental = loan.can_append_receipt()
 
     # Reverse the payment amount from loan's paid_amount
     loan.paid_amount = (Decimal(str(loan.paid_amount or 0)) - amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
     if loan.paid_amount < 0:
         loan.paid_amount = Decimal('0')
-    _refresh_loan_financial_state(loan)
 
     db.session.delete(payment)
+    loan.touch_schedule(payments=True)
+    _rebook_payments(loan, payment.payment_date, incremental)
 
     log = ActivityLog(
         user_id=current_user.id,
@@ -2189,61 +2289,67 @@ def receipt_entry():
     monthly_loans = monthly_loans_query.order_by(Loan.created_at.desc()).all()
     staff_loans = staff_loans_query.order_by(Loan.created_at.desc()).all()
     special_loans = special_loans_query.order_by(Loan.created_at.desc()).all()
+    states = LoanFinancialState.for_loans(weekly_loans + daily_loans + monthly_loans + staff_loans + special_loans)
     
     # Get recent payments for each loan with collector info
     weekly_payments = []
     for loan in weekly_loans:
-        recent_payments = loan.payments.order_by(LoanPayment.payment_date.desc()).limit(5).all()
-        advance_balance_display = float(loan.calculate_available_advance_balance())
+        state = states[loan.id]
         weekly_payments.append({
             'loan': loan,
-            'recent_payments': recent_payments,
-            'recommended_amount': loan.get_next_installment_amount(),
-            'advance_balance_display': advance_balance_display,
+            'recent_payments': state.payments[::-1][:5],
+            'recommended_amount': state.next_installment_amount,
+            'advance_balance_display': float(state.advance_balance),
+            'arrears': state.arrears,
+            'schedule': state.schedule,
         })
     
     daily_payments = []
     for loan in daily_loans:
-        recent_payments = loan.payments.order_by(LoanPayment.payment_date.desc()).limit(5).all()
-        advance_balance_display = float(loan.calculate_available_advance_balance())
+        state = states[loan.id]
         daily_payments.append({
             'loan': loan,
-            'recent_payments': recent_payments,
-            'recommended_amount': loan.get_next_installment_amount(),
-            'advance_balance_display': advance_balance_display,
+            'recent_payments': state.payments[::-1][:5],
+            'recommended_amount': state.next_installment_amount,
+            'advance_balance_display': float(state.advance_balance),
+            'arrears': state.arrears,
+            'schedule': state.schedule,
         })
     
     monthly_payments = []
     for loan in monthly_loans:
-        recent_payments = loan.payments.order_by(LoanPayment.payment_date.desc()).limit(5).all()
-        advance_balance_display = float(loan.calculate_available_advance_balance())
+        state = states[loan.id]
         monthly_payments.append({
             'loan': loan,
-            'recent_payments': recent_payments,
-            'recommended_amount': loan.get_next_installment_amount(),
-            'advance_balance_display': advance_balance_display,
+            'recent_payments': state.payments[::-1][:5],
+            'recommended_amount': state.next_installment_amount,
+            'advance_balance_display': float(state.advance_balance),
+            'arrears': state.arrears,
+            'schedule': state.schedule,
         })
 
     staff_payments = []
     for loan in staff_loans:
-        recent_payments = loan.payments.order_by(LoanPayment.payment_date.desc()).limit(5).all()
-        advance_balance_display = float(loan.calculate_available_advance_balance())
+        state = states[loan.id]
         staff_payments.append({
             'loan': loan,
-            'recent_payments': recent_payments,
-            'recommended_amount': loan.get_next_installment_amount(),
-            'advance_balance_display': advance_balance_display,
+            'recent_payments': state.payments[::-1][:5],
+            'recommended_amount': state.next_installment_amount,
+            'advance_balance_display': float(state.advance_balance),
+            'arrears': state.arrears,
+            'schedule': state.schedule,
         })
     
     special_payments = []
     for loan in special_loans:
-        recent_payments = loan.payments.order_by(LoanPayment.payment_date.desc()).limit(5).all()
-        advance_balance_display = float(loan.calculate_available_advance_balance())
+        state = states[loan.id]
         special_payments.append({
             'loan': loan,
-            'recent_payments': recent_payments,
-            'recommended_amount': loan.get_next_installment_amount(),
-            'advance_balance_display': advance_balance_display,
+            'recent_payments': state.payments[::-1][:5],
+            'recommended_amount': state.next_installment_amount,
+            'advance_balance_display': float(state.advance_balance),
+            'arrears': state.arrears,
+            'schedule': state.schedule,
         })
     
     # Get all payments for payment history
@@ -2326,14 +2432,264 @@ def quick_pay(id):
         return jsonify({'success': False, 'message': f'Failed to record payment: {exc}'}), 500
 
 
+# Receipts accepted by one bulk posting request, and by one offline sync
+BULK_RECEIPT_LIMIT = 500
+SYNC_RECEIPT_LIMIT = 2000
+RECEIPT_PAYMENT_METHODS = [value for value, _ in LoanPaymentForm.payment_method.kwargs['choices']]
+
+
+def _query_in(query, column, values, chunk_size=500):
+    """Results of query filtered to column IN values, chunked to stay under SQLite's bound parameter limit"""
+    values = list(values)
+    results = []
+    for start in range(0, len(values), chunk_size):
+        results.extend(query.filter(column.in_(values[start:start + chunk_size])).all())
+    return results
+
+
+def _payment_result(payment):
+    return {
+        'success': True,
+        'message': 'Payment recorded successfully',
+        'loan_id': payment.loan_id,
+        'payment_id': payment.id,
+        'receipt_number': payment.receipt_number,
+        'balance_after': float(payment.balance_after or 0),
+    }
+
+
+def _post_receipt_rows(rows, default_notes, require_keys=False):
+    """Validate receipt rows and post the valid ones grouped by loan, for one commit by the caller.
+
+    Rows carrying an idempotency_key already stored (or repeated earlier in
+    the batch) are not posted again; their result is the stored receipt,
+    marked as a duplicate. Returns one result per row, in order.
+    """
+    from collections import defaultdict
+    from decimal import Decimal, InvalidOperation
+    from app.utils.helpers import get_current_date
+
+    rows = [row if isinstance(row, dict) else {} for row in rows]
+    keys = [str(row.get('idempotency_key') or '').strip() or None for row in rows]
+
+    loan_ids = {row.get('loan_id') for row in rows if isinstance(row.get('loan_id'), int)}
+    loan_numbers = {str(row['loan_number']).strip() for row in rows if row.get('loan_number')}
+    loans = _query_in(Loan.query, Loan.id, loan_ids) + _query_in(Loan.query, Loan.loan_number, loan_numbers)
+    loans_by_id = {loan.id: loan for loan in loans}
+    loans_by_number = {loan.loan_number: loan for loan in loans}
+    stored = {
+        payment.idempotency_key: payment
+        for payment in _query_in(LoanPayment.query, LoanPayment.idempotency_key, {key for key in keys if key})
+    }
+
+    current_branch_id = get_current_branch_id() if should_filter_by_branch() else None
+    today = get_current_date()
+    results = [None] * len(rows)
+    first_row_of_key = {}
+    repeats = {}
+    receipts_by_loan = defaultdict(list)
+
+    for index, (row, key) in enumerate(zip(rows, keys)):
+        result = {'row': index, 'success': False}
+        results[index] = result
+
+        if key is None and require_keys:
+            result['message'] = 'Idempotency key is required'
+            continue
+        if key is not None:
+            if len(key) > 64:
+                result['message'] = 'Idempotency key is too long'
+                continue
+            if key in stored:
+                payment = stored[key]
+                if payment.collected_by != current_user.id:
+                    result['message'] = 'Idempotency key was used by another collector'
+                    continue
+                result.update(_payment_result(payment), duplicate=True)
+                continue
+            if key in first_row_of_key:
+                repeats[index] = first_row_of_key[key]
+                continue
+            first_row_of_key[key] = index
+
+        if isinstance(row.get('loan_id'), int):
+            loan = loans_by_id.get(row['loan_id'])
+        else:
+            loan = loans_by_number.get(str(row.get('loan_number') or '').strip())
+        result['loan_id'] = loan.id if loan else None
+
+        if loan is None:
+            result['message'] = 'Loan not found'
+            continue
+        if current_branch_id and loan.branch_id != current_branch_id:
+            result['message'] = 'Access denied for this branch'
+            continue
+        if loan.status not in ['active', 'disbursed']:
+            result['message'] = 'Loan is not active'
+            continue
+        try:
+            amount = Decimal(str(row.get('amount')))
+        except (InvalidOperation, ValueError):
+            result['message'] = 'Invalid amount'
+            continue
+        if not amount.is_finite() or amount <= 0:
+            result['message'] = 'Amount must be greater than zero'
+            continue
+        try:
+            payment_date = datetime.strptime(row['payment_date'], '%Y-%m-%d').date() if row.get('payment_date') else today
+        except (TypeError, ValueError):
+            result['message'] = 'Invalid payment date'
+            continue
+        payment_method = row.get('payment_method') or 'cash'
+        if payment_method not in RECEIPT_PAYMENT_METHODS:
+            result['message'] = 'Invalid payment method'
+            continue
+        reference_number = str(row.get('reference_number') or '').strip() or None
+        if reference_number and len(reference_number) > 100:
+            result['message'] = 'Reference number is too long'
+            continue
+
+        receipt = Receipt(amount, payment_date, payment_method, reference_number,
+                          row.get('notes') or default_notes, 0, key)
+        receipts_by_loan[loan.id].append((index, receipt))
+
+    receipts_by_branch = defaultdict(int)
+    for loan_id, entries in receipts_by_loan.items():
+        receipts_by_branch[loans_by_id[loan_id].branch_id] += len(entries)
+    for branch_id, count in receipts_by_branch.items():
+        reserve_receipt_numbers('LOAN', branch_id, count)
+
+    # Receipts of all loans posted, in one query
+    payments_by_loan = defaultdict(list)
+    query = LoanPayment.query.order_by(LoanPayment.loan_id, LoanPayment.payment_date.asc(), LoanPayment.id.asc())
+    for payment in _query_in(query, LoanPayment.loan_id, receipts_by_loan):
+        payments_by_loan[payment.loan_id].append(payment)
+
+    posted = []
+    for loan_id, entries in receipts_by_loan.items():
+        loan = loans_by_id[loan_id]
+        # Same-day receipts keep the order they were entered in
+        entries.sort(key=lambda entry: (entry[1].payment_date, entry[0]))
+        state = loan.financial_state(payments=payments_by_loan[loan_id])
+        payments = _post_receipts(loan, [receipt for _, receipt in entries], state=state)
+        for (index, _), payment in zip(entries, payments):
+            if payment is None:
+                results[index]['message'] = 'Loan was fully paid by an earlier receipt'
+            else:
+                posted.append((index, payment))
+    db.session.flush()
+    for index, payment in posted:
+        results[index].update(_payment_result(payment))
+    for index, first in repeats.items():
+        results[index] = dict(results[first], row=index, duplicate=results[first]['success'])
+    return results
+
+
+def _receipt_rows_response(results, **extra):
+    posted = sum(1 for result in results if result['success'] and not result.get('duplicate'))
+    duplicates = sum(1 for result in results if result.get('duplicate'))
+    failed = len(results) - posted - duplicates
+    return jsonify({
+        'success': failed == 0,
+        'posted': posted,
+        'duplicates': duplicates,
+        'failed': failed,
+        'results': results,
+        **extra,
+    }), 200
+
+
+@loans_bp.route('/receipts/bulk', methods=['POST'])
+@login_required
+@permission_required('collect_payments')
+def bulk_receipts():
+    """Post many receipts in one transaction.
+
+    Takes {"receipts": [{"loan_id" or "loan_number", "amount", "payment_date",
+    "payment_method", "reference_number", "notes", "idempotency_key"}, ...]}
+    and returns one result per row, in order. Rows that fail validation are
+    reported and skipped; the others are grouped by loan, so each loan's
+    installments, arrears and status are brought up to date once, and
+    committed together.
+    """
+    data = request.get_json(silent=True) or {}
+    rows = data.get('receipts')
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'success': False, 'message': 'No receipts to post'}), 400
+    if len(rows) > BULK_RECEIPT_LIMIT:
+        return jsonify({'success': False, 'message': f'At most {BULK_RECEIPT_LIMIT} receipts can be posted at once'}), 400
+
+    try:
+        results = retry_on_conflict(lambda: _post_receipt_rows(rows, 'Bulk receipt entry'))
+    except Exception as exc:  # noqa: BLE001
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Failed to record payments: {exc}'}), 500
+    return _receipt_rows_response(results)
+
+
+@loans_bp.route('/receipts/sync', methods=['POST'])
+@login_required
+@permission_required('collect_payments')
+def sync_receipts():
+    """Upload collections captured offline.
+
+    Takes {"collections": [...]} with the fields of bulk_receipts(); every
+    row needs a client-generated idempotency_key, so a batch re-sent after a
+    timeout returns the receipts already stored instead of posting them
+    again. Returns the per-row results plus the current balances of every
+    loan in the batch.
+    """
+    from sqlalchemy.exc import IntegrityError
+    from app.models import LoanArrearsSnapshot
+    from app.utils.helpers import get_current_date
+
+    data = request.get_json(silent=True) or {}
+    rows = data.get('collections')
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'success': False, 'message': 'No collections to sync'}), 400
+    if len(rows) > SYNC_RECEIPT_LIMIT:
+        return jsonify({'success': False, 'message': f'At most {SYNC_RECEIPT_LIMIT} collections can be synced at once'}), 400
+
+    for attempt in range(2):
+        try:
+            results = retry_on_conflict(lambda: _post_receipt_rows(rows, 'Offline collection', require_keys=True))
+            break
+        except IntegrityError:
+            # A concurrent upload of the same batch stored some keys first;
+            # the second pass reports those rows as duplicates
+            db.session.rollback()
+            if attempt:
+                return jsonify({'success': False, 'message': 'Collections are being synced by another request'}), 409
+        except Exception as exc:  # noqa: BLE001
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Failed to sync collections: {exc}'}), 500
+
+    loan_ids = {result['loan_id'] for result in results if result.get('loan_id')}
+    query = db.session.query(Loan, LoanArrearsSnapshot.total_overdue_amount).outerjoin(
+        LoanArrearsSnapshot, LoanArrearsSnapshot.loan_id == Loan.id
+    )
+    loans = [{
+        'loan_id': loan.id,
+        'loan_number': loan.loan_number,
+        'status': loan.status,
+        'paid_amount': float(loan.paid_amount or 0),
+        'outstanding_amount': float(loan.outstanding_amount or 0),
+        'advance_balance': float(loan.advance_balance or 0),
+        'arrears_amount': float(arrears or 0),
+    } for loan, arrears in _query_in(query, Loan.id, loan_ids)]
+    return _receipt_rows_response(results, loans=loans, server_date=get_current_date().isoformat())
+
+
 @loans_bp.route('/receipt-entry/export/<loan_frequency>')
 @login_required
 @permission_required('collect_payments')
+@background_job('Receipt entry Excel ({loan_frequency})')
 def receipt_entry_export(loan_frequency):
     """Export weekly/daily/monthly/staff/special loans to Excel."""
-    import openpyxl
     from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
     from openpyxl.utils import get_column_letter
+    from sqlalchemy.orm import joinedload
+    from app.utils.exports import XlsxStream, iter_chunks
 
     frequency_map = {
         'weekly': (['type1_9weeks', 'type4_micro'], 'Weekly Loans'),
@@ -2360,22 +2716,7 @@ def receipt_entry_export(loan_frequency):
     if referrer:
         query = query.filter(Loan.referred_by == referrer)
 
-    loans = query.order_by(Loan.created_at.desc()).all()
-
-    # Build schedules and collect all unique due dates
-    loan_schedules = {}
-    for loan in loans:
-        schedule = loan.generate_payment_schedule()
-        loan_schedules[loan.id] = {
-            'num_arrears': sum(
-                1 for inst in schedule
-                if not inst.get('is_skipped') and inst['status'] == 'overdue'
-            ),
-        }
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = sheet_title
+    query = query.options(joinedload(Loan.customer)).order_by(Loan.created_at.desc())
 
     # Match Repayment.pdf header exactly (including spelling)
     weekdays = ['Monday', 'Tuesday', 'Wednessday', 'Thursday', 'Friday', 'Saturday']
@@ -2384,76 +2725,70 @@ def receipt_entry_export(loan_frequency):
     # Each weekday takes 1 column + Signature at the end
     total_cols = n_fixed + len(weekdays) + 1
 
-    header_fill  = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
-    header_font  = Font(bold=True, color='FFFFFF', size=9)
-    sub_fill     = PatternFill(start_color='2E75B6', end_color='2E75B6', fill_type='solid')
-    sub_font     = Font(bold=True, color='FFFFFF', size=8)
     thin_border  = Border(
         left=Side(style='thin'), right=Side(style='thin'),
         top=Side(style='thin'), bottom=Side(style='thin')
     )
 
-    def style_cell(cell, fill, font, h_align='center'):
-        cell.fill = fill
-        cell.font = font
-        cell.alignment = Alignment(horizontal=h_align, vertical='center', wrap_text=True)
-        cell.border = thin_border
+    export = XlsxStream()
+    # Blank tabs above weekday names, as in Repayment.pdf; borders keep them visible
+    export.add_style('tab', border=thin_border, alignment=Alignment(horizontal='center', vertical='center'))
+    export.add_style('header', fill=PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid'),
+                     font=Font(bold=True, color='FFFFFF', size=9), border=thin_border,
+                     alignment=Alignment(horizontal='center', vertical='center', wrap_text=True))
+    export.add_style('data', font=Font(size=9), border=thin_border, alignment=Alignment(horizontal='center'))
+    total_fill = PatternFill(start_color='D9D9D9', end_color='D9D9D9', fill_type='solid')
+    total_font = Font(bold=True, size=9)
+    export.add_style('total_label', fill=total_fill, font=total_font, border=thin_border, alignment=Alignment(horizontal='left'))
+    export.add_style('total', fill=total_fill, font=total_font, border=thin_border, alignment=Alignment(horizontal='center'))
 
-    # --- Row 1: empty header row (blank tabs above weekday names, as in Repayment.pdf) ---
-    for c in range(1, total_cols + 1):
-        cell = ws.cell(row=1, column=c, value='')
-        # Keep borders so the "tabs" are visible
-        cell.border = thin_border
-        cell.alignment = Alignment(horizontal='center', vertical='center')
+    # --- Column widths ---
+    fixed_widths = [14, 22, 15, 14, 14, 10]  # Loan Number, Customer, Phone, loan Amount, Installment, Arreas
+    widths = {i + 1: w for i, w in enumerate(fixed_widths)}
+    # Weekday columns (1 column each)
+    for day_idx in range(len(weekdays)):
+        widths[n_fixed + day_idx + 1] = 12
+    # Signature column
+    widths[total_cols] = 16
+
+    ws = export.sheet(sheet_title, widths=widths)
+    ws.row_heights = {1: 12, 2: 20}
+    # Freeze above data rows and keep fixed columns visible
+    ws.freeze_panes = f'{get_column_letter(n_fixed + 1)}3'
+
+    # --- Row 1: empty header row ---
+    ws.append([''] * total_cols, style='tab')
 
     # --- Row 2: actual header row (matches Repayment.pdf) ---
-    col_idx = 1
-    for name in fixed_headers:
-        cell = ws.cell(row=2, column=col_idx, value=name)
-        style_cell(cell, header_fill, header_font)
-        col_idx += 1
-
-    for day in weekdays:
-        cell = ws.cell(row=2, column=col_idx, value=day)
-        style_cell(cell, header_fill, header_font)
-        col_idx += 1
-
-    sig_col = total_cols
-    cell = ws.cell(row=2, column=sig_col, value='Signature')
-    style_cell(cell, header_fill, header_font)
-
-    # --- Data rows (start at row 3) ---
-    data_font = Font(size=9)
-    for loan in loans:
-        sched_data = loan_schedules.get(loan.id, {})
-        num_arrears = sched_data.get('num_arrears', 0)
-        customer = loan.customer
+    ws.append(fixed_headers + weekdays + ['Signature'], style='header')
+
+    # --- Data rows (start at row 3), a chunk of loans and schedules at a time ---
+    for loans in iter_chunks(query):
+        schedules = Loan.build_schedules(loans, cached=True)
+        for loan in loans:
+            num_arrears = sum(
+                1 for inst in schedules[loan.id]
+                if not inst.get('is_skipped') and inst['status'] == 'overdue'
+            )
+            customer = loan.customer
 
-        row_values = [
-            loan.loan_number,
-            customer.full_name if customer else 'N/A',
-            customer.phone_primary if customer else 'N/A',
-            float(loan.loan_amount) if loan.loan_amount else 0,
-            float(loan.installment_amount) if loan.installment_amount else 0,
-            num_arrears,
-        ]
+            row_values = [
+                loan.loan_number,
+                customer.full_name if customer else 'N/A',
+                customer.phone_primary if customer else 'N/A',
+                float(loan.loan_amount) if loan.loan_amount else 0,
+                float(loan.installment_amount) if loan.installment_amount else 0,
+                num_arrears,
+            ]
 
-        # 6 weekday blank columns + 1 blank Signature
-        row_values += [''] * len(weekdays) + ['']
+            # 6 weekday blank columns + 1 blank Signature
+            row_values += [''] * len(weekdays) + ['']
 
-        ws.append(row_values)
-        row_num = ws.max_row
-        for col_idx in range(1, total_cols + 1):
-            cell = ws.cell(row=row_num, column=col_idx)
-            cell.font = data_font
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal='center')
+            ws.append(row_values, style='data')
 
     # --- TOTAL row ---
-    total_fill = PatternFill(start_color='D9D9D9', end_color='D9D9D9', fill_type='solid')
-    total_font = Font(bold=True, size=9)
     data_start_row = 3
-    data_end_row   = ws.max_row
+    data_end_row   = ws.row_count
     total_row = []
 
     for col_idx in range(1, total_cols + 1):
@@ -2469,48 +2804,15 @@ def receipt_entry_export(loan_frequency):
         else:
             total_row.append('')
 
-    ws.append(total_row)
-    total_row_num = ws.max_row
-    for col_idx in range(1, total_cols + 1):
-        cell = ws.cell(row=total_row_num, column=col_idx)
-        cell.fill = total_fill
-        cell.font = total_font
-        cell.border = thin_border
-        cell.alignment = Alignment(horizontal='center' if col_idx > 1 else 'left')
-
-    # --- Column widths ---
-    fixed_widths = [14, 22, 15, 14, 14, 10]  # Loan Number, Customer, Phone, loan Amount, Installment, Arreas
-    for i, w in enumerate(fixed_widths):
-        ws.column_dimensions[get_column_letter(i + 1)].width = w
-
-    # Weekday columns (1 column each)
-    for day_idx in range(len(weekdays)):
-        day_col = n_fixed + day_idx + 1
-        ws.column_dimensions[get_column_letter(day_col)].width = 12
-
-    # Signature column
-    sig_col = total_cols
-    ws.column_dimensions[get_column_letter(sig_col)].width = 16
-
-    ws.row_dimensions[1].height = 12
-    ws.row_dimensions[2].height = 20
+    ws.append(total_row, style=['total_label'] + ['total'] * (total_cols - 1))
 
-    # Freeze above data rows and keep fixed columns visible
-    ws.freeze_panes = ws.cell(row=3, column=n_fixed + 1)
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename={loan_frequency}_loans_{datetime.now().strftime("%Y%m%d")}.xlsx'
-    return response
+    return export.response(f'{loan_frequency}_loans_{datetime.now().strftime("%Y%m%d")}.xlsx')
 
 
 @loans_bp.route('/receipt-entry/pdf/<loan_frequency>')
 @login_required
 @permission_required('collect_payments')
+@background_job('Receipt entry PDF ({loan_frequency})')
 def receipt_entry_pdf(loan_frequency):
     """Export receipt entry loan list to landscape PDF"""
     import html as _html
@@ -2622,8 +2924,9 @@ def receipt_entry_pdf(loan_frequency):
 
     table_data = [headers]
 
+    schedules = Loan.build_schedules(loans, cached=True)
     for idx, loan in enumerate(loans, 1):
-        arrears = loan.get_arrears_details()
+        arrears = loan.get_arrears_details(schedule=schedules[loan.id])
         if float(arrears['total_overdue_amount']) > 0:
             arrears_text = f"{settings.currency_symbol} {float(arrears['total_overdue_amount']):.2f}"
             n_inst = arrears['overdue_installments'] + arrears['partial_overdue_installments']
@@ -2728,7 +3031,7 @@ def view_schedule(id):
             return redirect(url_for('loans.list_loans'))
     
     # Generate payment schedule
-    schedule = loan.generate_payment_schedule()
+    schedule = loan.get_payment_schedule()
     
     return render_template('loans/schedule.html',
                          title=f'Payment Schedule: {loan.loan_number}',
@@ -2756,7 +3059,7 @@ def override_schedule(id):
         notes = data.get('notes', '')
         
         # Validate installment number
-        schedule = loan.generate_payment_schedule()
+        schedule = loan.get_payment_schedule()
         if installment_number < 1 or installment_number > len(schedule):
             return jsonify({'success': False, 'message': 'Invalid installment number'}), 400
         
@@ -2789,6 +3092,8 @@ def override_schedule(id):
                 notes=notes
             )
             db.session.add(override)
+        loan.touch_schedule(overrides=True)
+        loan.sync_installments()
         
         # Log activity
         log = ActivityLog(
@@ -2837,7 +3142,7 @@ def skip_installment(id):
             reschedule_date = datetime.strptime(reschedule_date_str, '%Y-%m-%d').date()
         
         # Validate installment number
-        schedule = loan.generate_payment_schedule()
+        schedule = loan.get_payment_schedule()
         valid_installments = [inst['installment_number'] for inst in schedule]
         if installment_number not in valid_installments:
             return jsonify({'success': False, 'message': 'Invalid installment number'}), 400
@@ -2869,6 +3174,8 @@ def skip_installment(id):
                 notes=notes
             )
             db.session.add(override)
+        loan.touch_schedule(overrides=True)
+        loan.sync_installments()
         
         # Log activity
         log = ActivityLog(
@@ -2884,7 +3191,7 @@ def skip_installment(id):
         db.session.commit()
         
         # Regenerate schedule to get computed principal/interest/status for the skipped installment
-        refreshed_schedule = loan.generate_payment_schedule()
+        refreshed_schedule = loan.get_payment_schedule()
         sched_item = next((x for x in refreshed_schedule if x['installment_number'] == installment_number), None)
         
         return jsonify({
@@ -2905,7 +3212,7 @@ def skip_installment(id):
 @login_required
 @admin_required
 def skip_all_daily_loans():
-    """Skip one day's installment for all active daily loans (DLS & DL types)"""
+    """Skip one day's installment for all active daily loans (DLS & DL types) by marking it a holiday"""
     try:
         data = request.get_json()
         skip_date_str = data.get('skip_date', '')
@@ -2922,7 +3229,7 @@ def skip_all_daily_loans():
 
         # Get all active daily loans (54_daily = DLS, 54_daily_monday_friday = DLMF, type4_daily = DL)
         daily_loans_query = Loan.query.filter(
-            Loan.loan_type.in_(['54_daily', '54_daily_monday_friday', 'type4_daily']),
+            Loan.loan_type.in_(DAILY_PRODUCT_CODES),
             Loan.status == 'active'
         )
 
@@ -2937,22 +3244,27 @@ def skip_all_daily_loans():
         if not daily_loans:
             return jsonify({'success': False, 'message': 'No active daily loans found'}), 404
 
+        # The skip is recorded once as a holiday for the current branch (or all
+        # branches) instead of one schedule override per loan
+        holiday_branch_id = get_current_branch_id() if should_filter_by_branch() else None
+        if BusinessHoliday.query.filter_by(holiday_date=skip_date, branch_id=holiday_branch_id).first():
+            return jsonify({'success': False, 'message': f'{skip_date_str} is already a holiday for daily loans'}), 400
+
         skipped_count = 0
         already_skipped = 0
         not_applicable = 0
         skipped_loans = []
 
+        schedules = Loan.build_schedules(daily_loans, cached=True)
         for loan in daily_loans:
-            schedule = loan.generate_payment_schedule()
+            schedule = schedules[loan.id]
 
             # Find the installment whose due_date matches the skip_date
             target_installment = None
             for inst in schedule:
                 if inst['due_date'] == skip_date and not inst['is_skipped']:
-                    # Allow skipping installments regardless of payment state.
-                    if inst['status'] in ('pending', 'overdue', 'partial', 'paid'):
-                        target_installment = inst
-                        break
+                    target_installment = inst
+                    break
                 elif inst['due_date'] == skip_date and inst['is_skipped']:
                     already_skipped += 1
                     break
@@ -2961,49 +3273,33 @@ def skip_all_daily_loans():
                 not_applicable += 1
                 continue
 
-            installment_number = target_installment['installment_number']
-
-            # Check if override already exists
-            override = LoanScheduleOverride.query.filter_by(
-                loan_id=loan.id,
-                installment_number=installment_number
-            ).first()
-
-            if override:
-                override.is_skipped = True
-                override.custom_due_date = None
-                override.reschedule_date = None
-                override.updated_by = current_user.id
-                override.updated_at = datetime.utcnow()
-                if notes:
-                    override.notes = notes
-            else:
-                override = LoanScheduleOverride(
-                    loan_id=loan.id,
-                    installment_number=installment_number,
-                    is_skipped=True,
-                    custom_due_date=None,
-                    reschedule_date=None,
-                    created_by=current_user.id,
-                    notes=notes or f'Bulk skip for {skip_date_str}'
-                )
-                db.session.add(override)
-
             skipped_count += 1
             skipped_loans.append(loan.loan_number)
 
+        holiday = BusinessHoliday(
+            holiday_date=skip_date,
+            branch_id=holiday_branch_id,
+            name=notes or f'Bulk skip for {skip_date_str}',
+            created_by=current_user.id
+        )
+        db.session.add(holiday)
+        db.session.flush()
+
+        # Installments on or after the holiday move to the next business day,
+        # for every daily loan of the holiday's branches
+        _resync_holiday_loans(holiday)
+
         # Log activity
-        if skipped_count > 0:
-            log = ActivityLog(
-                user_id=current_user.id,
-                action='skip_all_daily_loans',
-                entity_type='loan',
-                entity_id=0,
-                description=f'Bulk skipped {skipped_count} daily loan installments for {skip_date_str}',
-                ip_address=request.remote_addr
-            )
-            db.session.add(log)
-            db.session.commit()
+        log = ActivityLog(
+            user_id=current_user.id,
+            action='skip_all_daily_loans',
+            entity_type='loan',
+            entity_id=0,
+            description=f'Marked {skip_date_str} as a daily loan holiday; skipped {skipped_count} daily loan installments',
+            ip_address=request.remote_addr
+        )
+        db.session.add(log)
+        db.session.commit()
 
         return jsonify({
             'success': True,
@@ -3021,6 +3317,73 @@ def skip_all_daily_loans():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@loans_bp.route('/unskip-all-daily-loans', methods=['POST'])
+@login_required
+@admin_required
+def unskip_all_daily_loans():
+    """Undo a skip-all-daily-loans day by removing its holiday (Admin only)"""
+    try:
+        data = request.get_json()
+        skip_date_str = data.get('skip_date', '')
+        if not skip_date_str:
+            return jsonify({'success': False, 'message': 'Skip date is required'}), 400
+        skip_date = datetime.strptime(skip_date_str, '%Y-%m-%d').date()
+
+        holiday_branch_id = get_current_branch_id() if should_filter_by_branch() else None
+        holiday = BusinessHoliday.query.filter_by(holiday_date=skip_date, branch_id=holiday_branch_id).first()
+        if not holiday:
+            return jsonify({'success': False, 'message': f'{skip_date_str} is not a holiday for daily loans'}), 404
+
+        db.session.delete(holiday)
+        db.session.flush()
+
+        # Installments moved past the holiday return to their business days
+        resynced = _resync_holiday_loans(holiday)
+
+        log = ActivityLog(
+            user_id=current_user.id,
+            action='unskip_all_daily_loans',
+            entity_type='loan',
+            entity_id=0,
+            description=f'Removed the daily loan holiday on {skip_date_str}; resynced {len(resynced)} daily loans',
+            ip_address=request.remote_addr
+        )
+        db.session.add(log)
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'message': f'Removed the holiday on {skip_date_str}; {len(resynced)} daily loan(s) rescheduled',
+            'resynced_count': len(resynced),
+        })
+
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid date format: {str(e)}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+def _resync_holiday_loans(holiday):
+    """Re-materialize the active daily loans a holiday applies to
+
+    Every loan of the holiday's branch (all branches when branch_id is NULL)
+    with an installment due on or after the holiday is synced; earlier
+    schedules do not move. Returns the loans synced.
+    """
+    query = Loan.query.filter(
+        Loan.loan_type.in_(DAILY_PRODUCT_CODES),
+        Loan.status == 'active',
+        Loan.installments.any(LoanInstallment.due_date >= holiday.holiday_date),
+    )
+    if holiday.branch_id is not None:
+        query = query.filter(Loan.branch_id == holiday.branch_id)
+    loans = query.all()
+    for loan in loans:
+        loan.sync_installments()
+    return loans
+
+
 @loans_bp.route('/<int:id>/schedule/reset', methods=['POST'])
 @login_required
 @admin_required
@@ -3046,6 +3409,8 @@ def reset_installment(id):
         
         if override:
             db.session.delete(override)
+            loan.touch_schedule(overrides=True)
+            loan.sync_installments()
             
             # Log activity
             log = ActivityLog(
@@ -3061,7 +3426,7 @@ def reset_installment(id):
             db.session.commit()
             
             # Regenerate schedule to get the original due date
-            refreshed_schedule = loan.generate_payment_schedule()
+            refreshed_schedule = loan.get_payment_schedule()
             original_item = next((item for item in refreshed_schedule if item['installment_number'] == installment_number), None)
             original_due_date = original_item['due_date'].strftime('%Y-%m-%d') if original_item and original_item.get('due_date') else None
             
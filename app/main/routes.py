@@ -2,9 +2,8 @@
 from flask import render_template, redirect, url_for
 from flask_login import login_required, current_user
 from app.main import main_bp
-from app.models import Customer, Loan, Investment, Pawning, User
-from app import db
-from sqlalchemy import func
+from app.models import Customer, Loan, Pawning
+from app.main.stats import dashboard_stats
 from datetime import datetime, timedelta
 from app.utils.helpers import get_current_branch_id, get_current_branch, should_filter_by_branch
 
@@ -16,47 +15,8 @@ def dashboard():
     current_branch_id = get_current_branch_id()
     should_filter = should_filter_by_branch()
     
-    # Get statistics based on user role
-    customer_query = Customer.query.filter_by(status='active')
-    if should_filter and current_branch_id:
-        customer_query = customer_query.filter_by(branch_id=current_branch_id)
-    
-    stats = {
-        'total_customers': customer_query.count(),
-        'total_users': User.query.filter_by(is_active=True).count(),
-        'kyc_pending': customer_query.filter_by(kyc_verified=False).count(),
-    }
-    
-    # Loan statistics
-    loan_query = Loan.query.filter_by(status='active')
-    if should_filter and current_branch_id:
-        loan_query = loan_query.filter_by(branch_id=current_branch_id)
-    active_loans = loan_query.all()
-    stats['active_loans'] = len(active_loans)
-    stats['total_loan_outstanding'] = sum(float(loan.loan_amount or 0) for loan in active_loans)
-    
-    loan_disbursed_query = Loan.query.filter(Loan.status.in_(['active', 'completed']))
-    if should_filter and current_branch_id:
-        loan_disbursed_query = loan_disbursed_query.filter_by(branch_id=current_branch_id)
-    stats['total_loan_disbursed'] = db.session.query(func.sum(Loan.disbursed_amount)).filter(
-        Loan.status.in_(['active', 'completed'])
-    ).scalar() or 0
-    
-    # Investment statistics
-    investment_query = Investment.query.filter_by(status='active')
-    if should_filter and current_branch_id:
-        investment_query = investment_query.filter_by(branch_id=current_branch_id)
-    active_investments = investment_query.all()
-    stats['active_investments'] = len(active_investments)
-    stats['total_investment_amount'] = sum(inv.current_amount or 0 for inv in active_investments)
-    
-    # Pawning statistics
-    pawning_query = Pawning.query.filter_by(status='active')
-    if should_filter and current_branch_id:
-        pawning_query = pawning_query.filter_by(branch_id=current_branch_id)
-    active_pawnings = pawning_query.all()
-    stats['active_pawnings'] = len(active_pawnings)
-    stats['total_pawning_outstanding'] = sum(pawn.outstanding_principal or 0 for pawn in active_pawnings)
+    # Counters and totals for the selected branch, one aggregate query
+    stats = dashboard_stats(current_branch_id if should_filter else None)
     
     # Recent activities
     recent_loans_query = Loan.query
@@ -0,0 +1,72 @@
+"""Dashboard statistics
+
+dashboard_stats() reads every dashboard counter and total in one statement:
+customers, loans, investments and pawnings are each aggregated once with
+conditional sums, and the single-row aggregates are joined side by side.
+Results are kept per branch for DASHBOARD_CACHE_TTL seconds.
+"""
+from sqlalchemy import case, false, func, select, true
+
+from app import db
+from app.models import Customer, Investment, Loan, Pawning, User
+from app.utils.cache import dashboard_cache
+
+COUNTERS = ('total_customers', 'kyc_pending', 'total_users', 'active_loans', 'active_investments', 'active_pawnings')
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _sum_if(condition, column):
+    return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+
+def _aggregate(model, branch_id, where, *columns):
+    query = select(*columns).where(where)
+    if branch_id:
+        query = query.where(model.branch_id == branch_id)
+    return query.subquery()
+
+
+def compute_dashboard_stats(branch_id=None):
+    """Dashboard counters and totals for one branch, or all branches with None"""
+    customers = _aggregate(
+        Customer, branch_id, Customer.status == 'active',
+        func.count().label('total_customers'),
+        _count_if(Customer.kyc_verified == false()).label('kyc_pending'),
+    )
+    users = select(func.count().label('total_users')).where(User.is_active == true()).subquery()
+    loans = _aggregate(
+        Loan, branch_id, Loan.status.in_(('active', 'completed')),
+        _count_if(Loan.status == 'active').label('active_loans'),
+        _sum_if(Loan.status == 'active', Loan.loan_amount).label('total_loan_outstanding'),
+        func.coalesce(func.sum(Loan.disbursed_amount), 0).label('total_loan_disbursed'),
+    )
+    investments = _aggregate(
+        Investment, branch_id, Investment.status == 'active',
+        func.count().label('active_investments'),
+        func.coalesce(func.sum(Investment.current_amount), 0).label('total_investment_amount'),
+    )
+    pawnings = _aggregate(
+        Pawning, branch_id, Pawning.status == 'active',
+        func.count().label('active_pawnings'),
+        func.coalesce(func.sum(Pawning.outstanding_principal), 0).label('total_pawning_outstanding'),
+    )
+
+    tables = customers.join(users, true()).join(loans, true()).join(investments, true()).join(pawnings, true())
+    row = db.session.execute(select(customers, users, loans, investments, pawnings).select_from(tables)).one()
+    stats = dict(row._mapping)
+    for name in COUNTERS:
+        stats[name] = int(stats[name] or 0)
+    return stats
+
+
+def dashboard_stats(branch_id=None):
+    """compute_dashboard_stats() through the short-lived per-branch cache"""
+    key = ('dashboard', branch_id or None)
+    stats = dashboard_cache.get(key)
+    if stats is None:
+        stats = compute_dashboard_stats(branch_id)
+        dashboard_cache.set(key, stats)
+    return dict(stats)
@@ -387,6 +387,14 @@ class Loan(db.Model):
     advance_balance = db.Column(db.Numeric(15, 2), default=0)  # Overpayment credit carried forward
     documentation_fee = db.Column(db.Numeric(15, 2), default=0)  # 1% documentation cost
     
+    # Schedule cache versions, bumped whenever receipts or overrides change
+    payments_version = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    overrides_version = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    # FIFO receipt allocation cursor: first installment not yet paid off, valid
+    # while allocation_version equals payments_version (set by sync_installments)
+    allocation_installment = db.Column(db.Integer)
+    allocation_version = db.Column(db.Integer)
+    
     # Dates
     application_date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     approval_date = db.Column(db.Date)
@@ -443,6 +451,10 @@ class Loan(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     notes = db.Column(db.Text)
+    # Optimistic lock: every UPDATE checks and bumps it, so a write based on a
+    # stale read fails with StaleDataError instead of overwriting a concurrent one
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version_id}
     
     # Relationships
     payments = db.relationship('LoanPayment', backref='loan', lazy='dynamic', cascade='all, delete-orphan')
@@ -453,77 +465,30 @@ class Loan(db.Model):
     referrer = db.relationship('User', foreign_keys=[referred_by], backref='referred_loans')
     deactivator = db.relationship('User', foreign_keys=[deactivated_by], backref='deactivated_loans')
 
-    def _should_skip_daily_due_date(self, due_date):
-        """Return True when this daily loan should not schedule an installment on the date."""
-        if due_date.weekday() == 6:
-            return True
-        return self.loan_type == '54_daily_monday_friday' and due_date.weekday() == 5
-    
+    @property
+    def product(self):
+        """Resolved LoanProduct for this loan's loan_type"""
+        from app.loans.products import resolve_product
+        return resolve_product(self.loan_type)
+
+    def business_calendar(self):
+        """Business-day calendar for this loan: product rest days plus branch holidays"""
+        from app.loans.business_calendar import get_calendar
+        return get_calendar(self.product.skip_weekdays, self.branch_id)
+
     def calculate_emi(self):
         """Calculate EMI based on loan parameters and loan type"""
-        from decimal import Decimal, ROUND_HALF_UP, ROUND_DOWN, ROUND_UP
-        
-        loan_amount = Decimal(str(self.loan_amount))
-        interest_rate = Decimal(str(self.interest_rate))
+        from app.utils.money import cents_to_float
         
-        # Check if this is a Type 1 - 9 week loan
-        if self.loan_type and 'Type 1' in self.loan_type and self.duration_weeks:
-            # Type 1: Interest = Interest rate * 2
-            # Installment = ((100 + Interest) * Loan Amount) / (100 * weeks)
-            interest = interest_rate * Decimal('2')
-            installment = ((Decimal('100') + interest) * loan_amount) / (Decimal('100') * Decimal(str(self.duration_weeks)))
-            # Ceil to whole number so installment covers the total
-            return float(installment.quantize(Decimal('1'), rounding=ROUND_UP))
-        
-        # Check if this is a 54 Daily loan
-        if self.loan_type and '54' in self.loan_type and self.duration_days:
-            # Same formula as Type 1 but using days instead of weeks
-            # Installment = ((100 + Interest) * Loan Amount) / (100 * days)
-            interest = interest_rate * Decimal('2')
-            installment = ((Decimal('100') + interest) * loan_amount) / (Decimal('100') * Decimal(str(self.duration_days)))
-            # Ceil to whole number so installment covers the total
-            return float(installment.quantize(Decimal('1'), rounding=ROUND_UP))
-        
-        # Check if this is a Type 4 Micro Loan (weekly)
-        if self.loan_type and 'Micro' in self.loan_type and self.duration_weeks and self.duration_months:
-            # Type 4 Micro: Full Interest = Interest Rate * Months
-            # Weeks = Months * 4
-            # Installment = LA * ((Full Interest + 100) / 100) / Weeks
-            full_interest = interest_rate * Decimal(str(self.duration_months))
-            installment = (loan_amount * ((full_interest + Decimal('100')) / Decimal('100'))) / Decimal(str(self.duration_weeks))
-            return float(installment.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-        
-        # Check if this is a Type 4 Daily Loan
-        if self.loan_type and 'Type 4' in self.loan_type and 'Daily' in self.loan_type and self.duration_days and self.duration_months:
-            # Type 4 Daily: Full Interest = Interest Rate * Months
-            # Days = Months * 26
-            # Installment = LA * ((Full Interest + 100) / 100) / Days
-            full_interest = interest_rate * Decimal(str(self.duration_months))
-            installment = (loan_amount * ((full_interest + Decimal('100')) / Decimal('100'))) / Decimal(str(self.duration_days))
-            return float(installment.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-        
-        # Check if this is a Special Loan (single payment at end date)
-        if self.loan_type == 'special_loan':
-            total_interest = (loan_amount * interest_rate / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            return float((loan_amount + total_interest).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-        
-        # Standard calculation methods
-        if self.interest_type == 'reducing_balance':
-            # EMI = [P x R x (1+R)^N]/[(1+R)^N-1]
-            monthly_rate = interest_rate / (Decimal('12') * Decimal('100'))
-            n = self.duration_months
-            if monthly_rate > 0:
-                # Use float for power calculation, then convert back
-                mr_float = float(monthly_rate)
-                power_calc = ((1 + mr_float) ** n) / (((1 + mr_float) ** n) - 1)
-                emi = loan_amount * monthly_rate * Decimal(str(power_calc))
-            else:
-                emi = loan_amount / Decimal(str(n))
-        else:  # flat rate
-            total_interest = loan_amount * interest_rate * Decimal(str(self.duration_months)) / (Decimal('12') * Decimal('100'))
-            emi = (loan_amount + total_interest) / Decimal(str(self.duration_months))
-        
-        return float(emi.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+        emi, _ = self.product.calculate_totals(
+            self.loan_amount,
+            self.interest_rate,
+            interest_type=self.interest_type,
+            duration_months=self.duration_months,
+            duration_weeks=self.duration_weeks,
+            duration_days=self.duration_days,
+        )
+        return cents_to_float(emi)
     
     def get_total_paid_principal(self):
         """Get total principal amount paid"""
@@ -545,14 +510,7 @@ class Loan(db.Model):
         interest_rate = Decimal(str(self.interest_rate))
         
         # Check if this is a flat rate loan type (Type1 9weeks, 54 Daily, Type4 loans, Special Loan)
-        is_flat_rate_loan = (self.loan_type and (
-            'type1' in self.loan_type.lower() or 
-            '54' in self.loan_type.lower() or 
-            'type4' in self.loan_type.lower() or 
-            'micro' in self.loan_type.lower() or
-            'daily' in self.loan_type.lower() or
-            self.loan_type == 'special_loan'
-        )) or self.interest_type == 'flat'
+        is_flat_rate_loan = self.product.uses_flat_interest(self.interest_type)
         
         if is_flat_rate_loan:
             # For flat interest loans, use total_payable if available
@@ -583,119 +541,45 @@ class Loan(db.Model):
         
         return total_interest.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
     
+    def financial_state(self, **kwargs):
+        """LoanFinancialState for this loan (see app.loans.financial_state)"""
+        from app.loans.financial_state import LoanFinancialState
+        return LoanFinancialState(self, **kwargs)
+
     def calculate_accrued_interest(self):
         """Calculate accrued interest since last payment or disbursement - only for reducing balance loans"""
-        from decimal import Decimal, ROUND_HALF_UP
-        from datetime import datetime, date
-        
-        # Accrued interest only applies to reducing balance loans
-        if self.status != 'active' or not self.disbursement_date or self.interest_type == 'flat':
-            return Decimal('0')
-        
-        # Get the date from which to calculate accrued interest
-        last_payment = self.payments.order_by(LoanPayment.payment_date.desc()).first()
-        start_date = last_payment.payment_date if last_payment else self.disbursement_date
-        
-        # Calculate days since last payment/disbursement
-        if isinstance(start_date, str):
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        elif isinstance(start_date, datetime):
-            start_date = start_date.date()
-            
-        today = date.today()
-        days_elapsed = (today - start_date).days
-        
-        if days_elapsed <= 0:
-            return Decimal('0')
-        
-        # Current outstanding principal
-        disbursed = Decimal(str(self.disbursed_amount or self.loan_amount))
-        paid_principal = self.get_total_paid_principal()
-        current_principal = disbursed - paid_principal
-        
-        if current_principal <= 0:
-            return Decimal('0')
-        
-        # Calculate accrued interest
-        annual_rate = Decimal(str(self.interest_rate)) / Decimal('100')
-        daily_rate = annual_rate / Decimal('365')
-        accrued_interest = current_principal * daily_rate * Decimal(str(days_elapsed))
-        
-        return accrued_interest.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return self.financial_state().accrued_interest
     
     def calculate_current_outstanding(self):
         """Calculate current outstanding amount including accrued interest (reducing balance) or remaining balance (flat)"""
-        from decimal import Decimal, ROUND_HALF_UP
-        
-        if self.status != 'active':
-            return Decimal('0')
-        
-        # Current outstanding principal
-        disbursed = Decimal(str(self.disbursed_amount or self.loan_amount))
-        paid_principal = self.get_total_paid_principal()
-        outstanding_principal = disbursed - paid_principal
-        
-        # IMPORTANT: Special handling for monthly-structure loans
-        if self.loan_type in ['monthly_loan', 'staff_loan']:
-            # For monthly/staff loans, always show total remaining payable amount (principal + remaining interest)
-            if self.total_payable:
-                total_expected = Decimal(str(self.total_payable))
-            else:
-                total_expected = disbursed + self.get_total_expected_interest()
-            
-            total_paid = Decimal(str(self.paid_amount or 0))
-            outstanding = total_expected - total_paid
-        else:
-            # For other loan types: Type1 9weeks, 54 Daily, Type4 Micro, Type4 Daily, Special Loan
-            # Check if this is a flat rate loan type
-            is_flat_rate_loan = (self.loan_type and (
-                'type1' in self.loan_type.lower() or 
-                '54' in self.loan_type.lower() or 
-                'type4' in self.loan_type.lower() or 
-                'micro' in self.loan_type.lower() or
-                'daily' in self.loan_type.lower() or
-                self.loan_type == 'special_loan'
-            )) or self.interest_type == 'flat'
-            
-            if is_flat_rate_loan:
-                # For type1_9weeks always recalculate total_payable using CEIL so it
-                # matches the frontend preview and corrects any stale DB values.
-                if self.loan_type == 'type1_9weeks':
-                    weeks = int(self.duration_weeks or 9)
-                    rate = Decimal(str(self.interest_rate or 0))
-                    interest = rate * Decimal('2')
-                    total_expected = (disbursed * (Decimal('100') + interest) / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                elif self.total_payable:
-                    total_expected = Decimal(str(self.total_payable))
-                else:
-                    total_expected = disbursed + self.get_total_expected_interest()
-                
-                total_paid = Decimal(str(self.paid_amount or 0))
-                outstanding = total_expected - total_paid
-            else:
-                # For reducing balance loans, add accrued interest
-                accrued_interest = self.calculate_accrued_interest()
-                outstanding = outstanding_principal + accrued_interest
-        
-        # Add any penalty amount
-        penalty = Decimal(str(self.penalty_amount or 0))
-        total_outstanding = outstanding + penalty
-        
-        return max(Decimal('0'), total_outstanding.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+        return self.financial_state().outstanding
     
     def update_outstanding_amount(self):
         """Update the outstanding_amount field with current calculation"""
         self.outstanding_amount = float(self.calculate_current_outstanding())
     
-    def generate_payment_schedule(self):
-        """Generate payment schedule based on loan type and frequency"""
-        from decimal import Decimal, ROUND_HALF_UP
+    def generate_payment_schedule(self, payments=None, overrides=None):
+        """Generate payment schedule based on loan type and frequency
+
+        `payments` (ordered by payment_date, id) and `overrides` may be passed in
+        pre-loaded, as build_schedules() does, to avoid the per-loan queries.
+        Amounts are computed in integer cents (see app.utils.money).
+        """
+        return list(self.iter_payment_schedule(payments=payments, overrides=overrides))
+
+    def iter_payment_schedule(self, payments=None, overrides=None):
+        """Yield generate_payment_schedule() rows one at a time, in installment order
+
+        Receipts are allocated FIFO as rows are produced, so callers looking for
+        the first unpaid installment or the rows due by a date can stop early.
+        """
         from datetime import timedelta, datetime
         from collections import defaultdict
+        from app.utils.money import to_cents, rate_to_bp, cents_to_float, div_half_up
         
         # Allow schedule generation for disbursed, active, and completed loans
         if self.status not in ['disbursed', 'active', 'completed']:
-            return []
+            return
         
         # Determine first installment date
         first_date = self.first_installment_date
@@ -709,39 +593,36 @@ class Loan(db.Model):
                 first_date = self.application_date
             else:
                 # No valid date found, cannot generate schedule
-                return []
+                return
         
         # Load schedule overrides for this loan (admin customizations)
-        overrides = {}
-        for override in self.schedule_overrides.all():
-            overrides[override.installment_number] = override
+        if overrides is None:
+            overrides = self.schedule_overrides.all()
+        overrides = {override.installment_number: override for override in overrides}
         
-        schedule = []
-        installment_amount = Decimal(str(self.installment_amount))
-        loan_amount = Decimal(str(self.disbursed_amount or self.loan_amount))
-        total_payable = Decimal(str(self.total_payable or loan_amount))
+        installment_amount = to_cents(self.installment_amount)
+        loan_amount = to_cents(self.disbursed_amount or self.loan_amount)
+        total_payable = to_cents(self.total_payable) if self.total_payable else loan_amount
         
-        # Determine number of installments and frequency delta based on loan type
-        if self.loan_type == 'special_loan':
+        # Determine number of installments and frequency delta from the loan product
+        product = self.product
+        frequency_name = product.schedule_frequency(self.duration_days, self.duration_weeks)
+        if frequency_name == 'One-Time':
             # Special Loan: single payment at maturity date
             num_installments = 1
             frequency_delta = None
-            frequency_name = 'One-Time'
-        elif self.duration_days and ('daily' in self.loan_type.lower() or '54' in self.loan_type):
+        elif frequency_name == 'Daily':
             # Daily installments
             num_installments = self.duration_days
             frequency_delta = timedelta(days=1)
-            frequency_name = 'Daily'
-        elif self.duration_weeks and ('week' in self.loan_type.lower() or 'micro' in self.loan_type.lower()):
+        elif frequency_name == 'Weekly':
             # Weekly installments
             num_installments = self.duration_weeks
             frequency_delta = timedelta(weeks=1)
-            frequency_name = 'Weekly'
         else:
             # Monthly installments
             num_installments = self.duration_months
             frequency_delta = None  # Will use relativedelta for months
-            frequency_name = 'Monthly'
         
         # Extend schedule by the number of skipped installments so a makeup
         # installment is appended at the end for every skipped day/week/month.
@@ -750,33 +631,30 @@ class Loan(db.Model):
         # Build receipt stream for FIFO installment application.
         # Payment History remains raw receipts; schedule "Paid" is "applied to
         # this installment" and may span multiple receipts.
-        total_paid = Decimal(str(self.paid_amount or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        try:
-            payment_records = self.payments.order_by(LoanPayment.payment_date.asc(), LoanPayment.id.asc()).all()
-        except Exception:
-            # Detached/transient instances (e.g., standalone tests) may not have
-            # relationship loading available; fall back to aggregate paid amount.
-            payment_records = []
+        total_paid = to_cents(self.paid_amount or 0)
+        if payments is not None:
+            payment_records = payments
+        else:
+            try:
+                payment_records = self.payments.order_by(LoanPayment.payment_date.asc(), LoanPayment.id.asc()).all()
+            except Exception:
+                # Detached/transient instances (e.g., standalone tests) may not have
+                # relationship loading available; fall back to aggregate paid amount.
+                payment_records = []
 
         payment_entries = []
-        cash_received_by_date = defaultdict(lambda: Decimal('0.00'))
+        cash_received_by_date = defaultdict(int)
         for payment in payment_records:
-            amount = Decimal(str(payment.payment_amount or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            if amount > Decimal('0'):
-                payment_entries.append({
-                    'amount': amount,
-                    'payment_date': payment.payment_date,
-                })
+            amount = to_cents(payment.payment_amount or 0)
+            if amount > 0:
+                payment_entries.append(amount)
                 if payment.payment_date:
                     cash_received_by_date[payment.payment_date] += amount
-        if not payment_entries and total_paid > Decimal('0'):
-            payment_entries.append({
-                'amount': total_paid,
-                'payment_date': None,
-            })
+        if not payment_entries and total_paid > 0:
+            payment_entries.append(total_paid)
 
         payment_index = 0
-        carried_advance = Decimal('0.00')  # Unallocated excess from previous installment
+        carried_advance = 0  # Unallocated excess from previous installment
 
         # Calculate total interest
         total_interest = total_payable - loan_amount
@@ -786,20 +664,33 @@ class Loan(db.Model):
         # All other loan types (Type 1, 54 Daily, Type 4 Micro, Type 4 Daily,
         # Special, and monthly/staff with flat rate)
         # use even distribution of principal and interest across all installments
-        is_monthly_reducing_balance = (
-            self.loan_type in ['monthly_loan', 'staff_loan'] and 
-            self.interest_type == 'reducing_balance'
-        )
+        is_monthly_reducing_balance = product.uses_reducing_balance(self.interest_type)
+        
+        # Period interest for reducing balance is balance * rate / period_divisor,
+        # with the rate in hundredths of a percent (rate / (12 * 100) per month).
+        if is_monthly_reducing_balance:
+            rate_bp = rate_to_bp(self.interest_rate)
+            if frequency_name == 'Weekly':
+                period_divisor = 52 * 100 * 100
+            elif frequency_name == 'Daily':
+                period_divisor = 365 * 100 * 100
+            else:
+                period_divisor = 12 * 100 * 100
         
         # For reducing balance loans, we need to track the outstanding balance
         outstanding_balance = loan_amount
-        cumulative_principal_paid = Decimal('0')
-        cumulative_interest_paid = Decimal('0')
+        # Even-split rows scheduled so far; the last row takes what is left of
+        # the exact (unrounded) per-installment shares.
+        even_rows = 0
+        tolerance = 2
+        today_date = datetime.utcnow().date()
+        
+        # Daily due dates are the i-th business day from first_date (product rest
+        # days and branch holidays excluded); every row, skipped or not, uses one
+        calendar = self.business_calendar() if frequency_name == 'Daily' else None
         
         # Generate schedule
-        cumulative_expected = Decimal('0')
-        # Subtract one period so the first loop iteration lands exactly on first_date
-        current_due_date = first_date - frequency_delta if frequency_delta else first_date
+        cumulative_expected = 0
         for i in range(num_installments):
             installment_num = i + 1
             
@@ -809,50 +700,38 @@ class Loan(db.Model):
                 override_obj = overrides[installment_num]
                 current_installment = installment_amount
 
-                # Calculate what the original due date would have been (don't advance current_due_date)
-                if frequency_delta:
-                    orig_due = current_due_date + frequency_delta
-                    if frequency_name == 'Daily':
-                        while self._should_skip_daily_due_date(orig_due):
-                            orig_due = orig_due + timedelta(days=1)
-                    original_due_date = orig_due
+                # Calculate what the original due date would have been
+                if calendar:
+                    original_due_date = calendar.add_business_days(first_date, i)
+                elif frequency_delta:
+                    original_due_date = first_date + frequency_delta * i
                 else:
                     original_due_date = first_date + relativedelta(months=installment_num - 1)
                 if is_monthly_reducing_balance:
-                    interest_rate = Decimal(str(self.interest_rate))
-                    if frequency_name == 'Monthly':
-                        period_rate = interest_rate / (Decimal('12') * Decimal('100'))
-                    elif frequency_name == 'Weekly':
-                        period_rate = interest_rate / (Decimal('52') * Decimal('100'))
-                    elif frequency_name == 'Daily':
-                        period_rate = interest_rate / (Decimal('365') * Decimal('100'))
-                    else:
-                        period_rate = interest_rate / (Decimal('12') * Decimal('100'))
-                    skip_interest = (outstanding_balance * period_rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                    skip_interest = div_half_up(outstanding_balance * rate_bp, period_divisor)
                     skip_principal = current_installment - skip_interest
                 else:
-                    skip_interest = (total_interest / Decimal(str(num_installments))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                    skip_principal = (loan_amount / Decimal(str(num_installments))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                    skip_interest = div_half_up(total_interest, num_installments)
+                    skip_principal = div_half_up(loan_amount, num_installments)
 
                 # Determine status based on reschedule_date vs today
-                today_date = datetime.utcnow().date()
                 if override_obj.reschedule_date:
                     skip_status = 'overdue' if override_obj.reschedule_date < today_date else 'pending'
                 else:
                     skip_status = 'skipped'
 
-                schedule.append({
+                yield {
                     'installment_number': installment_num,
                     'due_date': original_due_date,
-                    'amount': float(current_installment.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                    'principal': float(skip_principal),
-                    'interest': float(skip_interest),
+                    'amount': cents_to_float(current_installment),
+                    'principal': cents_to_float(skip_principal),
+                    'interest': cents_to_float(skip_interest),
                     'status': skip_status,
                     'paid_amount': 0.0,
                     'remaining_amount': 0.0,
                     'cash_paid_amount': 0.0,
                     'cash_applied_amount': 0.0,
-                    'cash_received_on_due_date': float(cash_received_by_date.get(original_due_date, Decimal('0.00'))),
+                    'cash_received_on_due_date': cents_to_float(cash_received_by_date.get(original_due_date, 0)),
                     'advance_brought_amount': 0.0,
                     'advance_applied_amount': 0.0,
                     'advance_generated_amount': 0.0,
@@ -860,25 +739,18 @@ class Loan(db.Model):
                     'is_customized': True,
                     'is_skipped': True,
                     'reschedule_date': override_obj.reschedule_date,
-                })
-                # Advance current_due_date so the next installment doesn't get the same date
-                if frequency_delta:
-                    current_due_date = original_due_date
+                }
                 continue
             
             # Calculate due date - start from next period, not today
-            if self.loan_type == 'special_loan' and self.maturity_date:
+            if frequency_name == 'One-Time' and self.maturity_date:
                 # Special loan: single payment due at maturity date
                 due_date = self.maturity_date
+            elif calendar:
+                # For daily loans, skip Sundays and holidays. The Monday-Friday 54 loan also skips Saturdays.
+                due_date = calendar.add_business_days(first_date, i)
             elif frequency_delta:
-                current_due_date = current_due_date + frequency_delta
-                
-                # For daily loans, skip Sundays. The Monday-Friday 54 loan also skips Saturdays.
-                if frequency_name == 'Daily':
-                    while self._should_skip_daily_due_date(current_due_date):
-                        current_due_date = current_due_date + timedelta(days=1)
-                
-                due_date = current_due_date
+                due_date = first_date + frequency_delta * i
             else:
                 # For monthly, use relativedelta (installment_num - 1 so installment 1 = first_date)
                 due_date = first_date + relativedelta(months=installment_num - 1)
@@ -899,222 +771,439 @@ class Loan(db.Model):
             # Calculate principal and interest breakdown based on loan type
             if is_monthly_reducing_balance:
                 # For reducing balance loans, calculate interest on outstanding balance
-                interest_rate = Decimal(str(self.interest_rate))
-                
-                # Calculate monthly interest rate based on frequency
-                if frequency_name == 'Monthly':
-                    period_rate = interest_rate / (Decimal('12') * Decimal('100'))
-                elif frequency_name == 'Weekly':
-                    period_rate = interest_rate / (Decimal('52') * Decimal('100'))
-                elif frequency_name == 'Daily':
-                    period_rate = interest_rate / (Decimal('365') * Decimal('100'))
-                else:
-                    period_rate = interest_rate / (Decimal('12') * Decimal('100'))
-                
-                # Interest for this period
                 if installment_num == num_installments:
                     # Last installment: remaining principal and remaining interest
                     principal = outstanding_balance
                     interest = current_installment - principal
                 else:
-                    interest = (outstanding_balance * period_rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                    interest = div_half_up(outstanding_balance * rate_bp, period_divisor)
                     principal = current_installment - interest
                 
                 # Update outstanding balance
-                outstanding_balance = (outstanding_balance - principal).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                cumulative_principal_paid += principal
-                cumulative_interest_paid += interest
+                outstanding_balance -= principal
             else:
                 # For ALL other loan types: Type 1 (9 Week), 54 Daily, Type 4 Micro, Type 4 Daily,
                 # and monthly loans with flat rate - split principal and interest evenly across installments
-                interest_per_installment = total_interest / Decimal(str(num_installments))
-                principal_per_installment = loan_amount / Decimal(str(num_installments))
-                
-                # Adjust last installment for rounding
                 if installment_num == num_installments:
-                    # Last installment: adjust for any rounding differences
-                    principal = loan_amount - cumulative_principal_paid
-                    interest = current_installment - principal
+                    # Last installment: principal still unscheduled is
+                    # loan_amount * (n - rows) / n; interest is the rest of the installment
+                    remaining_shares = num_installments - even_rows
+                    principal = div_half_up(loan_amount * remaining_shares, num_installments)
+                    interest = div_half_up(current_installment * num_installments - loan_amount * remaining_shares, num_installments)
                 else:
-                    interest = interest_per_installment
-                    principal = principal_per_installment
-                
-                cumulative_principal_paid += principal
-                cumulative_interest_paid += interest
+                    interest = div_half_up(total_interest, num_installments)
+                    principal = div_half_up(loan_amount, num_installments)
+                even_rows += 1
             
             advance_brought = carried_advance
-            paid_for_this = Decimal('0.00')
-            tolerance = Decimal('0.02')
+            paid_for_this = 0
 
             # Always apply carried advance/receipts FIFO so overpayments are
             # reflected immediately on the next installment(s) in the schedule.
-            while paid_for_this < current_installment - tolerance and (carried_advance > Decimal('0.00') or payment_index < len(payment_entries)):
-                if carried_advance <= Decimal('0.00') and payment_index < len(payment_entries):
-                    carried_advance += payment_entries[payment_index]['amount']
+            while paid_for_this < current_installment - tolerance and (carried_advance > 0 or payment_index < len(payment_entries)):
+                if carried_advance <= 0 and payment_index < len(payment_entries):
+                    carried_advance += payment_entries[payment_index]
                     payment_index += 1
 
                 alloc = min(current_installment - paid_for_this, carried_advance)
-                if alloc <= Decimal('0.00'):
+                if alloc <= 0:
                     break
                 paid_for_this += alloc
                 carried_advance -= alloc
 
             advance_applied = min(advance_brought, paid_for_this)
             cash_applied = paid_for_this - advance_applied
-            remaining_for_this = current_installment - paid_for_this
-            if remaining_for_this < Decimal('0'):
-                remaining_for_this = Decimal('0')
+            remaining_for_this = max(current_installment - paid_for_this, 0)
 
-            advance_generated = Decimal('0.00')
+            advance_generated = 0
             if paid_for_this >= current_installment - tolerance:
-                advance_generated = carried_advance
-                if advance_generated < Decimal('0.00'):
-                    advance_generated = Decimal('0.00')
+                advance_generated = max(carried_advance, 0)
             else:
                 # No installment closure yet; don't carry synthetic credit on partials.
-                carried_advance = Decimal('0.00')
+                carried_advance = 0
             
-            if paid_for_this >= current_installment - Decimal('0.02'):
+            if paid_for_this >= current_installment - tolerance:
                 status = 'paid'
-                remaining_for_this = Decimal('0')
-            elif paid_for_this > Decimal('0'):
+                remaining_for_this = 0
+            elif paid_for_this > 0:
                 status = 'partial'
-            elif due_date <= datetime.utcnow().date():
+            elif due_date <= today_date:
                 status = 'overdue'
             else:
                 status = 'pending'
             
-            schedule.append({
+            yield {
                 'installment_number': installment_num,
                 'due_date': due_date,
-                'amount': float(current_installment.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'principal': float(principal.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'interest': float(interest.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
+                'amount': cents_to_float(current_installment),
+                'principal': cents_to_float(principal),
+                'interest': cents_to_float(interest),
                 'status': status,
-                'paid_amount': float(paid_for_this.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'remaining_amount': float(remaining_for_this.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'cash_paid_amount': float(cash_applied.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'cash_applied_amount': float(cash_applied.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'cash_received_on_due_date': float(cash_received_by_date.get(due_date, Decimal('0.00')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'advance_brought_amount': float(advance_brought.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'advance_applied_amount': float(advance_applied.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'advance_generated_amount': float(advance_generated.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'advance_carried_amount': float(advance_generated.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
+                'paid_amount': cents_to_float(paid_for_this),
+                'remaining_amount': cents_to_float(remaining_for_this),
+                'cash_paid_amount': cents_to_float(cash_applied),
+                'cash_applied_amount': cents_to_float(cash_applied),
+                'cash_received_on_due_date': cents_to_float(cash_received_by_date.get(due_date, 0)),
+                'advance_brought_amount': cents_to_float(advance_brought),
+                'advance_applied_amount': cents_to_float(advance_applied),
+                'advance_generated_amount': cents_to_float(advance_generated),
+                'advance_carried_amount': cents_to_float(advance_generated),
                 'is_customized': installment_num in overrides,  # Flag for UI
                 'is_skipped': False,
                 'reschedule_date': None,
-            })
-        
-        return schedule
-    
-    def get_arrears_details(self):
-        """Calculate arrears details for overdue payments including partial payment remainders"""
-        from decimal import Decimal
-        from datetime import date
-        
-        if self.status not in ['active', 'completed']:
-            return {
-                'total_overdue_amount': Decimal('0'),
-                'overdue_installments': 0,
-                'partial_overdue_amount': Decimal('0'),
-                'partial_overdue_installments': 0,
-                'days_overdue': 0,
-                'oldest_overdue_date': None,
-                'advance_balance': Decimal(str(self.advance_balance or 0))
             }
-        
-        schedule = self.generate_payment_schedule()
-        total_overdue = Decimal('0')
-        overdue_count = 0
-        partial_overdue = Decimal('0')
-        partial_count = 0
-        oldest_overdue_date = None
-        today = date.today()
-        
-        for installment in schedule:
-            # Skipped installments are placeholders/annotations; only
-            # payable rows should contribute to arrears.
-            if installment.get('is_skipped', False):
-                continue
-            if installment['status'] == 'overdue':
-                # Fully unpaid overdue installment
-                total_overdue += Decimal(str(installment['amount']))
-                overdue_count += 1
-                if oldest_overdue_date is None or installment['due_date'] < oldest_overdue_date:
-                    oldest_overdue_date = installment['due_date']
-            elif installment['status'] == 'partial' and installment['due_date'] <= today:
-                # Partially paid overdue installment - only the remaining amount is overdue
-                # Use <= to include installments due today that are partially paid
-                remaining = Decimal(str(installment['remaining_amount']))
-                if remaining > Decimal('0'):
-                    partial_overdue += remaining
-                    partial_count += 1
-                    if oldest_overdue_date is None or installment['due_date'] < oldest_overdue_date:
-                        oldest_overdue_date = installment['due_date']
-        
-        days_overdue = 0
-        if oldest_overdue_date and oldest_overdue_date <= today:
-            days_overdue = (today - oldest_overdue_date).days
-        
-        return {
-            'total_overdue_amount': total_overdue + partial_overdue,
-            'overdue_installments': overdue_count,
-            'partial_overdue_amount': partial_overdue,
-            'partial_overdue_installments': partial_count,
-            'days_overdue': days_overdue,
-            'oldest_overdue_date': oldest_overdue_date,
-            'advance_balance': Decimal(str(self.advance_balance or 0))
-        }
+
+    # Loan fields that feed generate_payment_schedule(); part of the cache key so
+    # edits that bypass touch_schedule() can never serve a stale schedule.
+    SCHEDULE_KEY_FIELDS = (
+        'status', 'loan_type', 'interest_type', 'interest_rate', 'loan_amount',
+        'disbursed_amount', 'total_payable', 'paid_amount', 'installment_amount',
+        'duration_months', 'duration_weeks', 'duration_days', 'first_installment_date',
+        'disbursement_date', 'approval_date', 'application_date', 'maturity_date', 'branch_id',
+    )
+
+    def touch_schedule(self, payments=False, overrides=False):
+        """Bump schedule versions so cached schedules for this loan are no longer used."""
+        if payments:
+            self.payments_version = (self.payments_version or 0) + 1
+        if overrides:
+            self.overrides_version = (self.overrides_version or 0) + 1
+
+    def schedule_cache_key(self):
+        """Key for the schedule cache: loan, payment/override versions, holidays and business date."""
+        from app.loans.business_calendar import holiday_version
+        return (
+            'schedule',
+            self.id,
+            self.payments_version or 0,
+            self.overrides_version or 0,
+            holiday_version() if self.product.is_daily else 0,
+            datetime.utcnow().date().isoformat(),
+            tuple(str(getattr(self, field)) for field in self.SCHEDULE_KEY_FIELDS),
+        )
+
+    def get_payment_schedule(self):
+        """Cached generate_payment_schedule() for read-only callers."""
+        return Loan.build_schedules([self], cached=True).get(self.id) or []
+
+    @staticmethod
+    def build_schedules(loans, chunk_size=500, cached=False, payments_by_loan=None):
+        """Generate schedules for many loans from bulk payment and override queries.
+
+        Returns {loan_id: schedule}. Payments and overrides are fetched with one
+        IN query per chunk of loans (chunked to stay under SQLite's bound
+        parameter limit) and grouped in memory; pass `payments_by_loan`
+        ({loan_id: ordered payments}) when the caller already has them. With
+        `cached`, schedules are read from and written to
+        app.utils.cache.schedule_cache and only the misses are generated.
+        """
+        from collections import defaultdict
+        from app.utils.cache import schedule_cache
+
+        loans = [loan for loan in loans if loan.id is not None]
+        schedules = {}
+        keys = {}
+        if cached and schedule_cache.enabled:
+            pending = []
+            for loan in loans:
+                keys[loan.id] = loan.schedule_cache_key()
+                schedule = schedule_cache.get(keys[loan.id])
+                if schedule is None:
+                    pending.append(loan)
+                else:
+                    # Copy rows so callers can annotate them without touching the cache
+                    schedules[loan.id] = [dict(row) for row in schedule]
+            loans = pending
+
+        preloaded = payments_by_loan is not None
+        payments_by_loan = defaultdict(list, payments_by_loan or {})
+        overrides_by_loan = defaultdict(list)
+
+        # Only loans that can produce a schedule need their rows loaded
+        loan_ids = [loan.id for loan in loans if loan.status in ['disbursed', 'active', 'completed']]
+        for start in range(0, len(loan_ids), chunk_size):
+            chunk = loan_ids[start:start + chunk_size]
+            if not preloaded:
+                payments = LoanPayment.query.filter(LoanPayment.loan_id.in_(chunk)).order_by(
+                    LoanPayment.loan_id, LoanPayment.payment_date.asc(), LoanPayment.id.asc()
+                ).all()
+                for payment in payments:
+                    payments_by_loan[payment.loan_id].append(payment)
+            for override in LoanScheduleOverride.query.filter(LoanScheduleOverride.loan_id.in_(chunk)).all():
+                overrides_by_loan[override.loan_id].append(override)
+
+        for loan in loans:
+            schedule = loan.generate_payment_schedule(
+                payments=payments_by_loan[loan.id],
+                overrides=overrides_by_loan[loan.id],
+            )
+            if loan.id in keys:
+                schedule_cache.set(keys[loan.id], [dict(row) for row in schedule])
+            schedules[loan.id] = schedule
+        return schedules
+
+    def get_arrears_details(self, schedule=None):
+        """Calculate arrears details for overdue payments including partial payment remainders"""
+        return self.financial_state(schedule=schedule).arrears
 
     def calculate_available_advance_balance(self, schedule=None):
         """Return unapplied advance credit based on schedule allocation."""
-        from decimal import Decimal, ROUND_HALF_UP
+        return self.financial_state(schedule=schedule).advance_balance
 
+    def get_next_installment_amount(self, schedule=None):
+        """Return the recommended next installment amount, adjusted for any advance balance."""
+        return self.financial_state(schedule=schedule).next_installment_amount
+
+    def sync_installments(self, schedule=None):
+        """Persist the schedule into loan_installments, writing only rows that changed.
+
+        Returns the number of rows inserted, updated or deleted. Loans that no
+        longer produce a schedule (pending, rejected, deactivated) lose their rows.
+        """
         if schedule is None:
             schedule = self.generate_payment_schedule()
 
-        total_paid = Decimal(str(self.paid_amount or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        applied_total = Decimal('0.00')
+        existing = {row.installment_number: row for row in self.installments.all()}
+        changed = 0
 
-        for installment in schedule:
-            if installment.get('is_skipped', False):
+        for inst in schedule:
+            values = LoanInstallment.values_from_schedule(inst)
+            row = existing.pop(inst['installment_number'], None)
+            if row is None:
+                db.session.add(LoanInstallment(
+                    loan_id=self.id,
+                    installment_number=inst['installment_number'],
+                    **values
+                ))
+                changed += 1
                 continue
-            applied_total += Decimal(str(installment.get('paid_amount', 0))).quantize(
-                Decimal('0.01'),
-                rounding=ROUND_HALF_UP,
-            )
 
-        advance = total_paid - applied_total
-        if advance < Decimal('0.00'):
-            advance = Decimal('0.00')
-        return advance.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            dirty = False
+            for field in LoanInstallment.SYNCED_FIELDS:
+                if getattr(row, field) != values[field]:
+                    setattr(row, field, values[field])
+                    dirty = True
+            if dirty:
+                changed += 1
 
-    def get_next_installment_amount(self):
-        """Return the recommended next installment amount, adjusted for any advance balance."""
-        from decimal import Decimal, ROUND_HALF_UP
+        for row in existing.values():
+            db.session.delete(row)
+            changed += 1
 
-        schedule = self.generate_payment_schedule()
-        if not schedule:
-            return float(self.installment_amount or 0)
+        self._set_allocation_cursor(schedule)
+        self.refresh_arrears_snapshot(self.financial_state(schedule=schedule))
+        return changed
 
-        advance = self.calculate_available_advance_balance(schedule=schedule)
-        next_due = None
-        for inst in schedule:
-            if inst.get('is_skipped', False):
+    def refresh_arrears_snapshot(self, state=None):
+        """Write this loan's loan_arrears_snapshot row from a LoanFinancialState."""
+        if state is None:
+            state = self.financial_state()
+
+        values = LoanArrearsSnapshot.values_from_state(state)
+        snapshot = self.arrears_snapshot
+        if snapshot is None:
+            snapshot = LoanArrearsSnapshot(**values)
+            self.arrears_snapshot = snapshot
+        else:
+            for field, value in values.items():
+                if getattr(snapshot, field) != value:
+                    setattr(snapshot, field, value)
+        return snapshot
+
+    def _set_allocation_cursor(self, schedule):
+        """Record where FIFO allocation stands in `schedule` for append_receipt()."""
+        payable = [inst for inst in schedule if not inst.get('is_skipped', False)]
+        if not payable:
+            self.allocation_installment = None
+            self.allocation_version = None
+            return
+
+        cursor = next((inst['installment_number'] for inst in payable if inst['status'] != 'paid'), None)
+        self.allocation_installment = cursor if cursor is not None else schedule[-1]['installment_number'] + 1
+        self.allocation_version = self.payments_version or 0
+
+    def can_append_receipt(self, payment_date=None):
+        """True when a receipt dated payment_date can be allocated from the FIFO cursor.
+
+        Call before the receipt is added, or with payment_date None before a
+        receipt is corrected (reallocate_receipts() then replays the stored
+        allocation). Back-dated receipts, stale cursors and loans whose
+        paid_amount is not backed by receipts need a full rebuild.
+        """
+        from app.utils.money import to_cents
+
+        if self.allocation_installment is None or self.allocation_version != (self.payments_version or 0):
+            return False
+        if self.status not in ['disbursed', 'active', 'completed']:
+            return False
+
+        last_date, receipts_total = self.payments.filter(LoanPayment.payment_amount > 0).with_entities(
+            func.max(LoanPayment.payment_date), func.sum(LoanPayment.payment_amount)
+        ).one()
+        if payment_date is not None and last_date is not None and payment_date < last_date:
+            return False
+        return to_cents(receipts_total or 0) == to_cents(self.paid_amount or 0)
+
+    def append_receipt(self, amount):
+        """Allocate one appended receipt forward from the FIFO cursor.
+
+        Updates only the materialized installments the receipt reaches, the
+        cursor and advance_balance; the result matches a full
+        generate_payment_schedule() + sync_installments(). Call after the
+        receipt is added, paid_amount updated and touch_schedule(payments=True).
+        Returns False, without changes, when materialized rows are missing.
+        """
+        from app.utils.money import to_cents, cents_to_decimal
+
+        tolerance = 2
+        rows = self.installments.filter(
+            LoanInstallment.installment_number >= self.allocation_installment
+        ).order_by(LoanInstallment.installment_number).all()
+        if not rows and self.installments.first() is None:
+            return False
+
+        carried = max(to_cents(amount), 0)
+        cursor = None
+        for row in rows:
+            due = to_cents(row.amount)
+            paid = to_cents(row.paid_amount)
+            if row.is_skipped or paid >= due - tolerance:
                 continue
-            if inst['status'] in ['overdue', 'partial', 'pending']:
-                next_due = inst
+            if carried <= 0:
+                cursor = row.installment_number
                 break
-        if not next_due:
-            # All paid; nothing due
-            return 0.0
 
-        base_amount = Decimal(str(next_due['remaining_amount'] if next_due['status'] == 'partial' else next_due['amount']))
-        recommended = base_amount - advance
-        if recommended < 0:
-            recommended = Decimal('0')
-        return float(recommended.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-    
+            alloc = min(due - paid, carried)
+            paid += alloc
+            carried -= alloc
+            row.paid_amount = cents_to_decimal(paid)
+            if paid >= due - tolerance:
+                row.status = 'paid'
+                row.remaining_amount = cents_to_decimal(0)
+            else:
+                row.status = 'partial'
+                row.remaining_amount = cents_to_decimal(due - paid)
+                cursor = row.installment_number
+                break
+
+        if cursor is None:
+            last = rows[-1].installment_number if rows else self.allocation_installment - 1
+            cursor = max(last + 1, self.allocation_installment)
+        self.allocation_installment = cursor
+        self.allocation_version = self.payments_version or 0
+
+        applied = db.session.query(func.sum(LoanInstallment.paid_amount)).filter(
+            LoanInstallment.loan_id == self.id,
+            LoanInstallment.is_skipped.is_(False),
+        ).scalar()
+        advance = to_cents(self.paid_amount or 0) - to_cents(applied or 0)
+        self.advance_balance = cents_to_decimal(max(advance, 0))
+        return True
+
+    # Installments read at a time while receipts are replayed
+    REPLAY_BATCH = 20
+
+    def reallocate_receipts(self, from_date):
+        """Replay the FIFO allocation of the receipts dated on or after from_date.
+
+        Receipts dated earlier keep their allocation: the installment where
+        their total runs out is found from the stored paid amounts, and the
+        later receipts are allocated from there one at a time, as
+        iter_payment_schedule() does, until they and the amounts they used to
+        cover are used up. Call after a receipt is corrected or deleted,
+        paid_amount updated and touch_schedule(payments=True), with
+        can_append_receipt() checked before the change. Returns False, without
+        changes, when materialized rows are missing.
+        """
+        from app.utils.money import to_cents, cents_to_decimal
+
+        if self.installments.first() is None:
+            return False
+
+        tolerance = 2
+        today = datetime.utcnow().date()
+        receipts = self.payments.filter(LoanPayment.payment_amount > 0).with_entities(LoanPayment.payment_amount)
+        received_before = sum(
+            to_cents(amount) for (amount,) in receipts.filter(LoanPayment.payment_date < from_date)
+        )
+        replayed = [
+            to_cents(amount) for (amount,) in receipts.filter(LoanPayment.payment_date >= from_date).order_by(
+                LoanPayment.payment_date.asc(), LoanPayment.id.asc()
+            )
+        ]
+
+        # Rows paid off by the earlier receipts alone keep their allocation
+        start, opening, applied = None, 0, 0
+        for number, amount, paid in self.installments.filter(LoanInstallment.is_skipped.is_(False)).with_entities(
+            LoanInstallment.installment_number, LoanInstallment.amount, LoanInstallment.paid_amount
+        ).order_by(LoanInstallment.installment_number):
+            paid = to_cents(paid)
+            if applied + paid > received_before or paid < to_cents(amount) - tolerance:
+                start, opening = number, received_before - applied
+                break
+            applied += paid
+
+        cursor = None
+        if start is not None:
+            carried, position, after = 0, 0, start - 1
+            stopped = False
+            while not stopped:
+                rows = self.installments.filter(
+                    LoanInstallment.installment_number > after
+                ).order_by(LoanInstallment.installment_number).limit(self.REPLAY_BATCH).all()
+                if not rows:
+                    break
+                for row in rows:
+                    after = row.installment_number
+                    if row.is_skipped:
+                        continue
+                    due = to_cents(row.amount)
+                    paid = opening if row.installment_number == start else 0
+                    exhausted = carried <= 0 and position == len(replayed)
+                    if exhausted and paid == 0 and to_cents(row.paid_amount) == 0 and due > tolerance:
+                        # Nothing left to allocate and nothing allocated here before
+                        cursor = cursor or row.installment_number
+                        stopped = True
+                        break
+
+                    while paid < due - tolerance and (carried > 0 or position < len(replayed)):
+                        if carried <= 0 and position < len(replayed):
+                            carried += replayed[position]
+                            position += 1
+                        alloc = min(due - paid, carried)
+                        if alloc <= 0:
+                            break
+                        paid += alloc
+                        carried -= alloc
+
+                    if paid >= due - tolerance:
+                        values = {'paid_amount': paid, 'remaining_amount': 0, 'status': 'paid'}
+                    else:
+                        carried = 0
+                        status = 'partial' if paid > 0 else ('overdue' if row.due_date <= today else 'pending')
+                        values = {'paid_amount': paid, 'remaining_amount': due - paid, 'status': status}
+                        cursor = cursor or row.installment_number
+                    for field, value in values.items():
+                        value = cents_to_decimal(value) if field != 'status' else value
+                        if getattr(row, field) != value:
+                            setattr(row, field, value)
+
+        if cursor is None:
+            last = db.session.query(func.max(LoanInstallment.installment_number)).filter(
+                LoanInstallment.loan_id == self.id
+            ).scalar()
+            cursor = last + 1
+        self.allocation_installment = cursor
+        self.allocation_version = self.payments_version or 0
+
+        applied = db.session.query(func.sum(LoanInstallment.paid_amount)).filter(
+            LoanInstallment.loan_id == self.id,
+            LoanInstallment.is_skipped.is_(False),
+        ).scalar()
+        advance = to_cents(self.paid_amount or 0) - to_cents(applied or 0)
+        self.advance_balance = cents_to_decimal(max(advance, 0))
+        return True
+
     def __repr__(self):
         return f'<Loan {self.loan_number}>'
 
@@ -1136,6 +1225,8 @@ class LoanPayment(db.Model):
     reference_number = db.Column(db.String(100))
     receipt_number = db.Column(db.String(100))  # Receipt number for this payment
     notes = db.Column(db.Text)
+    # Client-generated key of an offline collection; a re-sent receipt is not posted twice
+    idempotency_key = db.Column(db.String(64), unique=True)
     
     collected_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     collected_by_user = db.relationship('User', foreign_keys=[collected_by], backref='collected_payments')
@@ -1177,6 +1268,202 @@ class LoanScheduleOverride(db.Model):
     def __repr__(self):
         return f'<LoanScheduleOverride Loan:{self.loan_id} Inst:{self.installment_number}>'
 
+class LoanInstallment(db.Model):
+    """Materialized payment schedule row, kept in sync by Loan.sync_installments()"""
+    __tablename__ = 'loan_installments'
+
+    id = db.Column(db.Integer, primary_key=True)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False, index=True)
+    installment_number = db.Column(db.Integer, nullable=False)
+    due_date = db.Column(db.Date, nullable=False, index=True)
+
+    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    principal_amount = db.Column(db.Numeric(15, 2))
+    interest_amount = db.Column(db.Numeric(15, 2))
+    paid_amount = db.Column(db.Numeric(15, 2), default=0)
+    remaining_amount = db.Column(db.Numeric(15, 2), default=0)
+
+    # paid, partial, overdue, pending or skipped (overdue/pending are re-evaluated on read)
+    status = db.Column(db.String(20), nullable=False)
+    is_skipped = db.Column(db.Boolean, default=False)
+    is_customized = db.Column(db.Boolean, default=False)
+    reschedule_date = db.Column(db.Date)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    loan = db.relationship('Loan', backref=db.backref('installments', lazy='dynamic', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.UniqueConstraint('loan_id', 'installment_number', name='unique_loan_installment'),
+        db.Index('ix_loan_installments_due_date_loan_id', 'due_date', 'loan_id'),
+    )
+
+    # Columns compared/written by Loan.sync_installments()
+    SYNCED_FIELDS = (
+        'due_date', 'amount', 'principal_amount', 'interest_amount', 'paid_amount',
+        'remaining_amount', 'status', 'is_skipped', 'is_customized', 'reschedule_date',
+    )
+
+    @staticmethod
+    def values_from_schedule(inst):
+        """Map a generate_payment_schedule() row onto column values."""
+        from decimal import Decimal, ROUND_HALF_UP
+
+        def money(value):
+            return Decimal(str(value or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+        return {
+            'due_date': inst['due_date'],
+            'amount': money(inst['amount']),
+            'principal_amount': money(inst['principal']),
+            'interest_amount': money(inst['interest']),
+            'paid_amount': money(inst['paid_amount']),
+            'remaining_amount': money(inst['remaining_amount']),
+            'status': inst['status'],
+            'is_skipped': bool(inst.get('is_skipped', False)),
+            'is_customized': bool(inst.get('is_customized', False)),
+            'reschedule_date': inst.get('reschedule_date'),
+        }
+
+    @property
+    def current_status(self):
+        """Status as of today; unpaid rows roll from pending to overdue without a rewrite."""
+        if self.status not in ['overdue', 'pending']:
+            return self.status
+
+        today = datetime.utcnow().date()
+        if self.is_skipped:
+            return 'overdue' if self.reschedule_date and self.reschedule_date < today else 'pending'
+        return 'overdue' if self.due_date <= today else 'pending'
+
+    @classmethod
+    def arrears_condition(cls, today=None):
+        """SQL condition matching the rows whose current_status is overdue or partial"""
+        today = today or datetime.utcnow().date()
+        unpaid = cls.status.in_(['overdue', 'pending'])
+        return db.or_(
+            cls.status == 'partial',
+            db.and_(unpaid, cls.is_skipped.is_not(True), cls.due_date <= today),
+            db.and_(unpaid, cls.is_skipped.is_(True), cls.reschedule_date < today),
+        )
+
+    def __repr__(self):
+        return f'<LoanInstallment Loan:{self.loan_id} Inst:{self.installment_number}>'
+
+class LoanArrearsSnapshot(db.Model):
+    """Arrears figures for one loan as of a date, written by Loan.refresh_arrears_snapshot()"""
+    __tablename__ = 'loan_arrears_snapshot'
+
+    id = db.Column(db.Integer, primary_key=True)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False, unique=True)
+    as_of = db.Column(db.Date, nullable=False, index=True)
+
+    # Overdue amount includes the unpaid remainder of partial installments
+    total_overdue_amount = db.Column(db.Numeric(15, 2), default=0, index=True)
+    overdue_installments = db.Column(db.Integer, default=0)
+    partial_overdue_amount = db.Column(db.Numeric(15, 2), default=0)
+    partial_overdue_installments = db.Column(db.Integer, default=0)
+    oldest_overdue_date = db.Column(db.Date)
+    days_overdue = db.Column(db.Integer, default=0)
+
+    # Earliest and latest due date of the overdue/partial installments, for date filters
+    first_arrears_date = db.Column(db.Date)
+    last_arrears_date = db.Column(db.Date)
+
+    paid_installments = db.Column(db.Integer, default=0)
+    last_payment_date = db.Column(db.Date)
+    last_payment_amount = db.Column(db.Numeric(15, 2))
+
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    loan = db.relationship('Loan', backref=db.backref('arrears_snapshot', uselist=False, cascade='all, delete-orphan'))
+
+    @staticmethod
+    def values_from_state(state):
+        """Map a LoanFinancialState onto column values."""
+        from decimal import Decimal, ROUND_HALF_UP
+
+        def money(value):
+            return Decimal(str(value or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+        arrears = state.arrears
+        arrears_dates = [
+            inst['due_date'] for inst in state.rows_through_today()
+            if inst['status'] in ['overdue', 'partial']
+        ] if arrears['total_overdue_amount'] > 0 else []
+        last_payment = state.last_payment
+
+        return {
+            'as_of': state.today,
+            'total_overdue_amount': money(arrears['total_overdue_amount']),
+            'overdue_installments': arrears['overdue_installments'],
+            'partial_overdue_amount': money(arrears['partial_overdue_amount']),
+            'partial_overdue_installments': arrears['partial_overdue_installments'],
+            'oldest_overdue_date': arrears['oldest_overdue_date'],
+            'days_overdue': arrears['days_overdue'],
+            'first_arrears_date': min(arrears_dates) if arrears_dates else None,
+            'last_arrears_date': max(arrears_dates) if arrears_dates else None,
+            'paid_installments': state.paid_installments,
+            'last_payment_date': last_payment.payment_date if last_payment else None,
+            'last_payment_amount': money(last_payment.payment_amount) if last_payment else None,
+        }
+
+    @property
+    def num_arrears(self):
+        return (self.overdue_installments or 0) + (self.partial_overdue_installments or 0)
+
+    def days_overdue_on(self, day):
+        """Days since the oldest overdue installment, counted to day"""
+        if not self.oldest_overdue_date or self.oldest_overdue_date > day:
+            return 0
+        return (day - self.oldest_overdue_date).days
+
+    def __repr__(self):
+        return f'<LoanArrearsSnapshot Loan:{self.loan_id} {self.as_of}>'
+
+class BusinessHoliday(db.Model):
+    """Non-working day for daily loan schedules; branch_id NULL applies to every branch"""
+    __tablename__ = 'business_holidays'
+
+    id = db.Column(db.Integer, primary_key=True)
+    holiday_date = db.Column(db.Date, nullable=False, index=True)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), index=True)
+    name = db.Column(db.String(200))
+
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    branch = db.relationship('Branch', backref=db.backref('holidays', lazy='dynamic'))
+    creator = db.relationship('User', foreign_keys=[created_by])
+
+    __table_args__ = (
+        db.UniqueConstraint('holiday_date', 'branch_id', name='unique_branch_holiday'),
+    )
+
+    def __repr__(self):
+        return f'<BusinessHoliday {self.holiday_date} Branch:{self.branch_id}>'
+
+
+class HolidayVersion(db.Model):
+    """Change counter of the business_holidays table
+
+    A single row (id 1), bumped in the same transaction as every holiday
+    insert, update or delete. Workers compare it with the version of their
+    in-process holiday snapshot and schedule cache keys include it, so every
+    worker sees a holiday change at once.
+    """
+    __tablename__ = 'holiday_versions'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<HolidayVersion {self.version}>'
+
 # Investment Models
 class Investment(db.Model):
     """Investment/Savings model"""
@@ -1214,6 +1501,9 @@ class Investment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     notes = db.Column(db.Text)
+    # Optimistic lock, as on Loan
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version_id}
     
     # Relationships
     transactions = db.relationship('InvestmentTransaction', backref='investment', lazy='dynamic', cascade='all, delete-orphan')
@@ -1323,6 +1613,9 @@ class Pawning(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     notes = db.Column(db.Text)
+    # Optimistic lock, as on Loan
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version_id}
     
     # Relationships
     payments = db.relationship('PawningPayment', backref='pawning', lazy='dynamic', cascade='all, delete-orphan')
@@ -1563,3 +1856,150 @@ class ActivityLog(db.Model):
     
     def __repr__(self):
         return f'<ActivityLog {self.action}>'
+
+
+class ExportJob(db.Model):
+    """An export generated in the background by `run.py job-worker`
+
+    The worker replays the GET request that queued the job (path and query
+    string, stored in params) as the job's user, with the branch that was
+    selected when it was queued, and keeps the file until expires_at.
+    """
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), index=True)  # for per-branch limits
+    endpoint = db.Column(db.String(100), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # JSON: path, args, current_branch_id
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)  # queued, running, done, failed, expired
+    worker = db.Column(db.String(100))
+    filename = db.Column(db.String(255))
+    file_path = db.Column(db.String(500))
+    mimetype = db.Column(db.String(100))
+    size = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, index=True)
+
+    # Relationships
+    user = db.relationship('User', backref=db.backref('export_jobs', lazy='dynamic'))
+
+    @property
+    def is_pending(self):
+        return self.status in ('queued', 'running')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'status': self.status,
+            'filename': self.filename,
+            'size': self.size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.endpoint} {self.status}>'
+
+
+class ReportGeneration(db.Model):
+    """Change counter of one branch's report data
+
+    Bumped after every commit that writes loans, payments, pawnings,
+    investments or customers of the branch; cached report pages include the
+    counters of their branches in their keys. Branch 0 counts rows without a
+    branch.
+    """
+    __tablename__ = 'report_generations'
+
+    branch_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    generation = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReportGeneration {self.branch_id} {self.generation}>'
+
+
+class DailyBranchFact(db.Model):
+    """Day totals per branch, product and collector, kept by app.reports.facts
+
+    Every flush that writes loans, payments, pawnings, investments or
+    customers adds its change to these rows in the same transaction;
+    `python run.py rebuild-facts` recomputes them from the source tables.
+    """
+    __tablename__ = 'daily_branch_facts'
+    __table_args__ = (
+        db.UniqueConstraint('fact_date', 'branch_id', 'product_type', 'collector_id', name='uq_daily_branch_facts_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    fact_date = db.Column(db.Date, nullable=False, index=True)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=False, index=True)
+    product_type = db.Column(db.String(20), nullable=False)  # loan, pawning, investment, customer
+    collector_id = db.Column(db.Integer, nullable=False, default=0)  # collecting/processing user, 0 when unknown
+
+    collection_count = db.Column(db.Integer, nullable=False, default=0)
+    collections = db.Column(db.Numeric(15, 2), nullable=False, default=0)  # payments; deposits for investments
+    principal = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    interest = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    penalties = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    disbursements = db.Column(db.Numeric(15, 2), nullable=False, default=0)  # withdrawals for investments
+    new_loans = db.Column(db.Integer, nullable=False, default=0)  # loans created, pawnings and investments opened
+    new_customers = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DailyBranchFact {self.fact_date} {self.branch_id} {self.product_type} {self.collector_id}>'
+
+
+class ReceiptSequence(db.Model):
+    """Next unclaimed receipt number of one branch and product (LOAN, PWN)
+
+    Workers claim blocks of numbers from these rows; see app.utils.sequences.
+    Branch 0 numbers receipts without a branch.
+    """
+    __tablename__ = 'receipt_sequences'
+    __table_args__ = (
+        db.UniqueConstraint('branch_id', 'product', name='uq_receipt_sequences_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    branch_id = db.Column(db.Integer, nullable=False)
+    product = db.Column(db.String(10), nullable=False)
+    next_value = db.Column(db.BigInteger, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReceiptSequence {self.branch_id} {self.product} {self.next_value}>'
+
+
+class NumberSequence(db.Model):
+    """Last number issued for one customer id, loan, pawning or investment number prefix
+
+    Keyed by entity and the parts of the prefix: branch code, type code
+    (customer type or loan type code; the configured prefix for pawnings
+    and investments) and two-digit year (loans; 0 otherwise). See
+    app.utils.sequences.
+    """
+    __tablename__ = 'number_sequences'
+    __table_args__ = (
+        db.UniqueConstraint('entity', 'branch_code', 'type_code', 'year', name='uq_number_sequences_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # customer, loan, pawning, investment
+    branch_code = db.Column(db.String(20), nullable=False, default='')
+    type_code = db.Column(db.String(10), nullable=False, default='')
+    year = db.Column(db.Integer, nullable=False, default=0)
+    last_value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<NumberSequence {self.entity} {self.branch_code} {self.type_code} {self.year} {self.last_value}>'
@@ -11,6 +11,7 @@ from app.pawnings import pawnings_bp
 from app.models import Pawning, PawningPayment, Customer, ActivityLog, SystemSettings
 from app.pawnings.forms import PawningForm, PawningPaymentForm
 from app.utils.decorators import permission_required
+from app.utils.concurrency import retry_on_conflict
 from app.utils.helpers import generate_pawning_number, allowed_file, get_current_branch_id, should_filter_by_branch, generate_receipt_number
 
 @pawnings_bp.route('/')
@@ -318,82 +319,98 @@ def add_payment(id):
                                      form=form, pawning=pawning,
                                      interest_unpaid=interest_unpaid,
                                      months_elapsed=months_elapsed)
-            
+        
+        def post_payment():
+            # Balances are read again when a concurrent payment forced a retry,
+            # so every check against them runs here rather than before the first attempt
+            if pawning.status not in ['active', 'extended', 'overdue']:
+                raise ValueError('Pawning is no longer open')
+            interest_unpaid = total_interest_due - Decimal(str(pawning.total_interest_paid or 0))
             outstanding_principal = Decimal(str(pawning.outstanding_principal or 0))
             total_penalty = Decimal(str(pawning.total_penalty or 0))
-            total_due = float(outstanding_principal + interest_unpaid + total_penalty)
-            if payment_amount < total_due - 0.01:  # Allow small rounding difference
-                flash(f'Full redemption requires payment of LKR {total_due:.2f}!', 'error')
-                return render_template('pawnings/payment.html', 
-                                     title=f'Add Payment: {pawning.pawning_number}',
-                                     form=form, pawning=pawning,
-                                     interest_unpaid=interest_unpaid,
-                                     months_elapsed=months_elapsed)
-        
-        # Determine interest period
-        interest_from = pawning.last_interest_payment_date or pawning.pawning_date
-        interest_to = form.payment_date.data
-        
-        if form.interest_period_from.data and form.interest_period_to.data:
-            interest_from = form.interest_period_from.data
-            interest_to = form.interest_period_to.data
-        
-        # Create payment record
-        payment = PawningPayment(
-            pawning_id=pawning.id,
-            payment_date=form.payment_date.data,
-            payment_amount=payment_amount,
-            payment_type=payment_type,
-            interest_amount=interest_amt,
-            principal_amount=principal_amt,
-            penalty_amount=penalty_amt,
-            interest_period_from=interest_from,
-            interest_period_to=interest_to,
-            payment_method=form.payment_method.data,
-            reference_number=form.reference_number.data,
-            receipt_number=generate_receipt_number(),
-            notes=form.notes.data,
-            collected_by=current_user.id
-        )
-        
-        # Update pawning balances
-        pawning.total_interest_paid = (pawning.total_interest_paid or 0) + interest_amt
-        pawning.principal_paid = (pawning.principal_paid or 0) + principal_amt
-        pawning.outstanding_principal = (pawning.outstanding_principal or pawning.loan_amount) - principal_amt
-        pawning.total_penalty = (pawning.total_penalty or 0) - penalty_amt  # Reduce penalty balance
-        
-        # Update interest due
-        pawning.interest_due = max(0, interest_unpaid - interest_amt)
-        
-        # Update last interest payment date if interest was paid
-        if interest_amt > 0:
-            pawning.last_interest_payment_date = form.payment_date.data
-        
-        # Record balance after payment
-        payment.interest_balance_after = pawning.interest_due
-        payment.principal_balance_after = pawning.outstanding_principal
-        
-        # Update status based on payment type
-        if payment_type == 'full_redemption' or (pawning.outstanding_principal <= 0.01 and interest_unpaid - interest_amt <= 0.01):
-            pawning.status = 'redeemed'
-            pawning.redemption_date = form.payment_date.data
-            pawning.outstanding_principal = 0
-            pawning.interest_due = 0
-        
-        db.session.add(payment)
-        
-        # Log activity
-        log = ActivityLog(
-            user_id=current_user.id,
-            action='add_pawning_payment',
-            entity_type='pawning',
-            entity_id=pawning.id,
-            description=f'Added {payment_type} payment for pawning: {pawning.pawning_number} - LKR {payment_amount:.2f}',
-            ip_address=request.remote_addr
-        )
-        db.session.add(log)
-        
-        db.session.commit()
+
+            if principal_amt > outstanding_principal + Decimal('0.01'):
+                raise ValueError(f'principal exceeds the outstanding LKR {outstanding_principal:.2f}')
+            if penalty_amt > total_penalty + Decimal('0.01'):
+                raise ValueError(f'penalty exceeds the outstanding LKR {total_penalty:.2f}')
+            # Interest-only payments may be made in advance; redemptions settle what is unpaid
+            if payment_type != 'interest_payment' and interest_amt > max(interest_unpaid, Decimal('0')) + Decimal('0.01'):
+                raise ValueError(f'interest exceeds the unpaid LKR {max(interest_unpaid, Decimal("0")):.2f}')
+            if payment_type == 'full_redemption':
+                total_due = outstanding_principal + interest_unpaid + total_penalty
+                if payment_amount < total_due - Decimal('0.01'):  # Allow small rounding difference
+                    raise ValueError(f'full redemption requires payment of LKR {total_due:.2f}')
+
+            # Determine interest period
+            interest_from = pawning.last_interest_payment_date or pawning.pawning_date
+            interest_to = form.payment_date.data
+
+            if form.interest_period_from.data and form.interest_period_to.data:
+                interest_from = form.interest_period_from.data
+                interest_to = form.interest_period_to.data
+
+            # Create payment record
+            payment = PawningPayment(
+                pawning_id=pawning.id,
+                payment_date=form.payment_date.data,
+                payment_amount=payment_amount,
+                payment_type=payment_type,
+                interest_amount=interest_amt,
+                principal_amount=principal_amt,
+                penalty_amount=penalty_amt,
+                interest_period_from=interest_from,
+                interest_period_to=interest_to,
+                payment_method=form.payment_method.data,
+                reference_number=form.reference_number.data,
+                receipt_number=generate_receipt_number('PWN', pawning.branch_id),
+                notes=form.notes.data,
+                collected_by=current_user.id
+            )
+
+            # Update pawning balances
+            pawning.total_interest_paid = (pawning.total_interest_paid or 0) + interest_amt
+            pawning.principal_paid = (pawning.principal_paid or 0) + principal_amt
+            pawning.outstanding_principal = (pawning.outstanding_principal or pawning.loan_amount) - principal_amt
+            pawning.total_penalty = (pawning.total_penalty or 0) - penalty_amt  # Reduce penalty balance
+
+            # Update interest due
+            pawning.interest_due = max(0, interest_unpaid - interest_amt)
+
+            # Update last interest payment date if interest was paid
+            if interest_amt > 0:
+                pawning.last_interest_payment_date = form.payment_date.data
+
+            # Record balance after payment
+            payment.interest_balance_after = pawning.interest_due
+            payment.principal_balance_after = pawning.outstanding_principal
+
+            # Update status based on payment type
+            if payment_type == 'full_redemption' or (pawning.outstanding_principal <= 0.01 and interest_unpaid - interest_amt <= 0.01):
+                pawning.status = 'redeemed'
+                pawning.redemption_date = form.payment_date.data
+                pawning.outstanding_principal = 0
+                pawning.interest_due = 0
+
+            db.session.add(payment)
+
+            # Log activity
+            log = ActivityLog(
+                user_id=current_user.id,
+                action='add_pawning_payment',
+                entity_type='pawning',
+                entity_id=pawning.id,
+                description=f'Added {payment_type} payment for pawning: {pawning.pawning_number} - LKR {payment_amount:.2f}',
+                ip_address=request.remote_addr
+            )
+            db.session.add(log)
+            return payment
+
+        try:
+            payment = retry_on_conflict(post_payment)
+        except ValueError as exc:
+            db.session.rollback()
+            flash(f'Cannot add payment: {exc}', 'warning')
+            return redirect(url_for('pawnings.view_pawning', id=id))
         
         if payment_type == 'full_redemption':
             flash(f'Payment processed! Item redeemed and returned to customer. Receipt: {payment.receipt_number}', 'success')
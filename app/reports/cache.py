@@ -0,0 +1,203 @@
+"""Report page cache
+
+Report pages are cached as the rendered blocks of their templates, keyed by
+report, branch scope, normalised query arguments, business date and the
+report generations of the branches in scope. reports/cached_report.html puts
+the blocks back into base.html, so navigation, the user menu and flashed
+messages are still rendered per request.
+
+Writing loans, payments, schedule overrides, pawnings, investments, customers
+or holidays bumps the generations of the branches touched once the
+transaction commits, so no worker's older entries for those branches match
+any more. REPORT_CACHE_TTL bounds the age of everything else a page shows,
+such as system settings. Add ?refresh=1 to recompute a page.
+"""
+import functools
+from collections import namedtuple
+from datetime import datetime
+from itertools import chain
+
+from flask import current_app, render_template, request, session, url_for
+from flask_login import current_user
+from markupsafe import Markup
+from sqlalchemy import event, inspect, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import (BusinessHoliday, Customer, Investment, InvestmentTransaction, Loan, LoanPayment,
+                        LoanScheduleOverride, Pawning, PawningPayment, ReportGeneration)
+from app.utils.cache import report_cache
+from app.utils.helpers import get_current_date, get_current_time, get_user_accessible_branch_ids
+
+# Generation row of data without a branch; bumped for changes to all branches
+NO_BRANCH = 0
+
+ReportPage = namedtuple('ReportPage', 'title blocks computed_at')
+
+_BRANCH_MODELS = (Loan, Pawning, Investment, Customer)
+# Models whose branch is their parent's: (model, parent key, parent table)
+_CHILD_MODELS = (
+    (LoanPayment, 'loan_id', Loan.__table__),
+    (LoanScheduleOverride, 'loan_id', Loan.__table__),
+    (PawningPayment, 'pawning_id', Pawning.__table__),
+    (InvestmentTransaction, 'investment_id', Investment.__table__),
+)
+
+
+def branch_scope():
+    """Branch ids the report queries are filtered to, as get_branch_filter_for_query does; None for all"""
+    if not current_user.is_authenticated:
+        return None
+    if session.get('current_branch_id'):
+        return (session['current_branch_id'],)
+    branch_ids = get_user_accessible_branch_ids()
+    return tuple(sorted(branch_ids)) if branch_ids else None
+
+
+def generations(scope):
+    """(branch_id, generation) pairs of the branches in scope and of NO_BRANCH"""
+    table = ReportGeneration.__table__
+    query = select(table.c.branch_id, table.c.generation)
+    if scope is not None:
+        query = query.where(table.c.branch_id.in_(set(scope) | {NO_BRANCH}))
+    return tuple(sorted(tuple(row) for row in db.session.execute(query)))
+
+
+def report_key(report, permissions=()):
+    """Cache key of the current request's report page"""
+    scope = branch_scope()
+    args = tuple(sorted(
+        (name, tuple(value for value in values if value))
+        for name, values in request.args.lists()
+        if name != 'refresh' and any(values)
+    ))
+    granted = tuple(current_user.has_permission(permission) for permission in permissions)
+    return (report, scope, args, granted, get_current_date().isoformat(), generations(scope))
+
+
+def bump_generations(branch_ids=None):
+    """Invalidate cached reports of branch_ids, or of every branch with None
+
+    Runs in its own transaction; rows are created on their first bump.
+    """
+    table = ReportGeneration.__table__
+    ids = {NO_BRANCH} if branch_ids is None else set(branch_ids)
+    for attempt in range(2):
+        now = datetime.utcnow()
+        try:
+            with db.engine.begin() as conn:
+                stmt = update(table).values(generation=table.c.generation + 1, updated_at=now)
+                if branch_ids is not None:
+                    stmt = stmt.where(table.c.branch_id.in_(ids))
+                conn.execute(stmt)
+                existing = set(conn.execute(select(table.c.branch_id).where(table.c.branch_id.in_(ids))).scalars())
+                missing = ids - existing
+                if missing:
+                    conn.execute(insert(table), [
+                        {'branch_id': branch_id, 'generation': 1, 'updated_at': now} for branch_id in missing
+                    ])
+            return
+        except IntegrityError:
+            # Another worker created the row first; bump it on the second pass
+            if attempt:
+                current_app.logger.warning('Could not bump report generations for %s', sorted(ids))
+        except SQLAlchemyError:
+            current_app.logger.exception('Could not bump report generations for %s', sorted(ids))
+            return
+
+
+def _branch_values(obj, attribute):
+    """Current and replaced values of a branch or parent key"""
+    history = inspect(obj).attrs[attribute].history
+    return {value for value in chain([getattr(obj, attribute)], history.deleted or ()) if value is not None}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_branches(session, flush_context):
+    changed = chain(session.new, session.deleted, (obj for obj in session.dirty if session.is_modified(obj)))
+    branches = set()
+    parents = {}
+    everything = False
+    for obj in changed:
+        if isinstance(obj, _BRANCH_MODELS):
+            branches |= _branch_values(obj, 'branch_id')
+        elif isinstance(obj, BusinessHoliday):
+            values = _branch_values(obj, 'branch_id')
+            if obj.branch_id is None:
+                everything = True
+            branches |= values
+        else:
+            for model, key, table in _CHILD_MODELS:
+                if isinstance(obj, model):
+                    parents.setdefault(table, set()).update(_branch_values(obj, key))
+                    break
+    connection = session.connection()
+    for table, ids in parents.items():
+        if ids:
+            branches.update(connection.execute(select(table.c.branch_id).where(table.c.id.in_(ids))).scalars())
+    if everything:
+        session.info['report_branches_all'] = True
+    if branches:
+        session.info.setdefault('report_branches', set()).update(branches)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    everything = session.info.pop('report_branches_all', False)
+    branches = session.info.pop('report_branches', None)
+    if everything:
+        bump_generations()
+    elif branches:
+        bump_generations(branches)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_branches(session):
+    session.info.pop('report_branches_all', None)
+    session.info.pop('report_branches', None)
+
+
+def render_report(template_name, **context):
+    """Render the blocks of a report template into a cacheable ReportPage"""
+    template = current_app.jinja_env.get_or_select_template(template_name)
+    current_app.update_template_context(context)
+    template_context = template.new_context(context)
+    blocks = {name: ''.join(render(template_context)) for name, render in template.blocks.items()}
+    return ReportPage(context.get('title'), blocks, get_current_time())
+
+
+def _page_response(page):
+    args = request.args.to_dict(flat=False)
+    args.pop('refresh', None)
+    return render_template(
+        'reports/cached_report.html',
+        title=page.title,
+        blocks={name: Markup(html) for name, html in page.blocks.items()},
+        computed_at=page.computed_at,
+        refresh_url=url_for(request.endpoint, **(request.view_args or {}), **args, refresh=1),
+    )
+
+
+def cached_report(report, permissions=()):
+    """Serve a report view returning render_report() through report_cache
+
+    permissions are checked with current_user.has_permission and added to
+    the key, for pages that show different sections to different users.
+    Place below the access checks: a cached page is served without calling
+    the view. Responses other than a ReportPage are passed through uncached.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            key = report_key(report, permissions) if report_cache.enabled else None
+            page = report_cache.get(key) if key is not None and not request.args.get('refresh') else None
+            if page is None:
+                page = view(*args, **kwargs)
+                if not isinstance(page, ReportPage):
+                    return page
+                if key is not None:
+                    report_cache.set(key, page)
+            return _page_response(page)
+        return wrapped
+    return decorator
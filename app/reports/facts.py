@@ -0,0 +1,263 @@
+"""Daily branch facts
+
+daily_branch_facts holds day totals per (date, branch, product type,
+collector), so period reports read a few fact rows instead of scanning every
+payment. Each source row contributes fixed amounts to one or two fact rows
+(the *_facts functions below). Flush listeners keep the table current in the
+writing transaction:
+
+- a new row adds its contribution;
+- a deleted row takes it away;
+- a changed row takes away its old contribution, read from the database
+  before the flush, and adds the new one.
+
+Payment edits and deletions are therefore reflected without any code in the
+views. rebuild_facts() recomputes the whole table from the source rows with
+the same functions (`python run.py rebuild-facts`).
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from decimal import Decimal
+from functools import partial
+from types import SimpleNamespace
+
+from sqlalchemy import and_, delete, event, func, inspect, insert, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import (Customer, DailyBranchFact, Investment, InvestmentTransaction, Loan, LoanPayment, Pawning,
+                        PawningPayment)
+
+KEY = ('fact_date', 'branch_id', 'product_type', 'collector_id')
+MEASURES = ('collection_count', 'collections', 'principal', 'interest', 'penalties', 'disbursements', 'new_loans',
+            'new_customers')
+
+# Loans in these statuses have been paid out
+DISBURSED_LOAN_STATUSES = ('active', 'completed', 'defaulted', 'deactivated')
+
+INSERT_BATCH = 1000
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _payment_facts(product_type, payment, branch_id):
+    yield (_day(payment.payment_date), branch_id, product_type, payment.collected_by or 0), {
+        'collection_count': 1,
+        'collections': _money(payment.payment_amount),
+        'principal': _money(payment.principal_amount),
+        'interest': _money(payment.interest_amount),
+        'penalties': _money(payment.penalty_amount),
+    }
+
+
+def _investment_transaction_facts(transaction, branch_id):
+    key = (_day(transaction.transaction_date), branch_id, 'investment', transaction.processed_by or 0)
+    amount = _money(transaction.amount)
+    if transaction.transaction_type == 'deposit':
+        yield key, {'collection_count': 1, 'collections': amount}
+    elif transaction.transaction_type == 'withdrawal':
+        yield key, {'disbursements': amount}
+    elif transaction.transaction_type == 'interest_credit':
+        yield key, {'interest': amount}
+
+
+def _loan_facts(loan, branch_id):
+    if loan.created_at:
+        yield (_day(loan.created_at), branch_id, 'loan', loan.created_by or 0), {'new_loans': 1}
+    if loan.status in DISBURSED_LOAN_STATUSES and loan.disbursement_date:
+        yield (_day(loan.disbursement_date), branch_id, 'loan', loan.approved_by or 0), {
+            'disbursements': _money(loan.disbursed_amount or loan.loan_amount),
+        }
+
+
+def _pawning_facts(pawning, branch_id):
+    if pawning.pawning_date:
+        yield (_day(pawning.pawning_date), branch_id, 'pawning', pawning.created_by or 0), {
+            'new_loans': 1,
+            'disbursements': _money(pawning.loan_amount),
+        }
+
+
+def _investment_facts(investment, branch_id):
+    if investment.start_date:
+        yield (_day(investment.start_date), branch_id, 'investment', investment.created_by or 0), {'new_loans': 1}
+
+
+def _customer_facts(customer, branch_id):
+    if customer.created_at:
+        yield (_day(customer.created_at), branch_id, 'customer', customer.created_by or 0), {'new_customers': 1}
+
+
+# fields: columns the facts function reads; parent_key/parent: where rows
+# without a branch_id of their own get it from
+Source = namedtuple('Source', 'facts fields parent_key parent')
+
+_PAYMENT_FIELDS = ('payment_date', 'payment_amount', 'principal_amount', 'interest_amount', 'penalty_amount',
+                   'collected_by')
+
+SOURCES = {
+    LoanPayment: Source(partial(_payment_facts, 'loan'), _PAYMENT_FIELDS, 'loan_id', Loan),
+    PawningPayment: Source(partial(_payment_facts, 'pawning'), _PAYMENT_FIELDS, 'pawning_id', Pawning),
+    InvestmentTransaction: Source(_investment_transaction_facts,
+                                  ('transaction_date', 'transaction_type', 'amount', 'processed_by'),
+                                  'investment_id', Investment),
+    Loan: Source(_loan_facts, ('created_at', 'created_by', 'status', 'disbursement_date', 'approved_by',
+                               'disbursed_amount', 'loan_amount'), None, None),
+    Pawning: Source(_pawning_facts, ('pawning_date', 'created_by', 'loan_amount'), None, None),
+    Investment: Source(_investment_facts, ('start_date', 'created_by'), None, None),
+    Customer: Source(_customer_facts, ('created_at', 'created_by'), None, None),
+}
+
+
+def _source_query(model, source):
+    """Select of a source's fields plus its branch_id"""
+    table = model.__table__
+    columns = [table.c.id] + [table.c[field] for field in source.fields]
+    if source.parent is None:
+        return select(*columns, table.c.branch_id)
+    parent = source.parent.__table__
+    return select(*columns, parent.c.branch_id).join(parent, parent.c.id == table.c[source.parent_key])
+
+
+def _add(totals, rows, sign=1):
+    """Add sign times the contributions of (source, values, branch_id) rows to totals"""
+    for source, values, branch_id in rows:
+        if branch_id is None:
+            continue
+        for key, measures in source.facts(values, branch_id):
+            for name, amount in measures.items():
+                totals[key][name] += sign * amount
+
+
+@event.listens_for(Session, 'before_flush')
+def _snapshot_changed_sources(session, flush_context, instances):
+    """Read the stored values of source rows this flush changes or deletes"""
+    pending = defaultdict(list)
+    for obj in session.deleted:
+        if type(obj) in SOURCES:
+            pending[type(obj)].append(obj.id)
+    for obj in session.dirty:
+        source = SOURCES.get(type(obj))
+        if source is None or obj.id is None:
+            continue
+        state = inspect(obj)
+        fields = source.fields + ((source.parent_key or 'branch_id'),)
+        if any(state.attrs[field].history.has_changes() for field in fields):
+            pending[type(obj)].append(obj.id)
+
+    snapshots = {}
+    connection = session.connection() if pending else None
+    for model, ids in pending.items():
+        source = SOURCES[model]
+        query = _source_query(model, source).where(model.__table__.c.id.in_(ids))
+        for row in connection.execute(query):
+            snapshots[(model, row.id)] = SimpleNamespace(**row._mapping)
+    session.info['fact_snapshots'] = snapshots
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_fact_deltas(session, flush_context):
+    snapshots = session.info.pop('fact_snapshots', {})
+    old_rows = [(SOURCES[model], values, values.branch_id) for (model, _), values in snapshots.items()]
+    new_objects = [obj for obj in session.new if type(obj) in SOURCES]
+    new_objects += [obj for obj in session.dirty if (type(obj), obj.id) in snapshots]
+    if not old_rows and not new_objects:
+        return
+
+    connection = session.connection()
+    parent_ids = defaultdict(set)
+    for obj in new_objects:
+        source = SOURCES[type(obj)]
+        if source.parent is not None:
+            parent_ids[source.parent].add(getattr(obj, source.parent_key))
+    branches = {}
+    for parent, ids in parent_ids.items():
+        table = parent.__table__
+        branches[parent] = dict(connection.execute(select(table.c.id, table.c.branch_id).where(table.c.id.in_(ids))).all())
+
+    new_rows = []
+    for obj in new_objects:
+        source = SOURCES[type(obj)]
+        if source.parent is None:
+            branch_id = obj.branch_id
+        else:
+            branch_id = branches[source.parent].get(getattr(obj, source.parent_key))
+        new_rows.append((source, obj, branch_id))
+
+    totals = defaultdict(lambda: defaultdict(int))
+    _add(totals, old_rows, -1)
+    _add(totals, new_rows)
+    for key, measures in totals.items():
+        measures = {name: amount for name, amount in measures.items() if amount}
+        if measures:
+            upsert_fact(connection, key, measures)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_snapshots(session):
+    session.info.pop('fact_snapshots', None)
+
+
+def upsert_fact(connection, key, measures):
+    """Add measures to the fact row of key, creating it when missing"""
+    table = DailyBranchFact.__table__
+    values = dict(zip(KEY, key), **measures, updated_at=datetime.utcnow())
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        stmt = (postgresql if dialect == 'postgresql' else sqlite).insert(table).values(**values)
+        increments = {name: table.c[name] + stmt.excluded[name] for name in measures}
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=list(KEY), set_=dict(increments, updated_at=stmt.excluded.updated_at),
+        ))
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table).values(**values)
+        increments = {name: table.c[name] + stmt.inserted[name] for name in measures}
+        connection.execute(stmt.on_duplicate_key_update(dict(increments, updated_at=stmt.inserted.updated_at)))
+    else:
+        match = and_(*(table.c[name] == value for name, value in zip(KEY, key)))
+        increments = {name: table.c[name] + amount for name, amount in measures.items()}
+        result = connection.execute(update(table).where(match).values(increments, updated_at=values['updated_at']))
+        if not result.rowcount:
+            connection.execute(insert(table).values(**values))
+
+
+def rebuild_facts():
+    """Recompute daily_branch_facts from the source tables; returns the number of fact rows"""
+    totals = defaultdict(lambda: defaultdict(int))
+    for model, source in SOURCES.items():
+        rows = db.session.execute(_source_query(model, source).execution_options(yield_per=INSERT_BATCH))
+        _add(totals, ((source, row, row.branch_id) for row in rows))
+
+    now = datetime.utcnow()
+    rows = [
+        dict(zip(KEY, key), **{name: measures.get(name, 0) for name in MEASURES}, updated_at=now)
+        for key, measures in totals.items()
+    ]
+    table = DailyBranchFact.__table__
+    db.session.execute(delete(table))
+    for start in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(insert(table), rows[start:start + INSERT_BATCH])
+    db.session.commit()
+    return len(rows)
+
+
+def fact_totals(start_date, end_date, branch_filter=None):
+    """{product_type: {measure: total}} over fact_date in [start_date, end_date]"""
+    columns = [func.coalesce(func.sum(getattr(DailyBranchFact, name)), 0).label(name) for name in MEASURES]
+    query = db.session.query(DailyBranchFact.product_type, *columns).filter(
+        DailyBranchFact.fact_date >= start_date,
+        DailyBranchFact.fact_date <= end_date,
+    )
+    if branch_filter is not None:
+        query = query.filter(branch_filter)
+    totals = defaultdict(lambda: dict.fromkeys(MEASURES, 0))
+    for row in query.group_by(DailyBranchFact.product_type):
+        totals[row.product_type] = {name: getattr(row, name) for name in MEASURES}
+    return totals
@@ -1,19 +1,25 @@
 """Reports routes"""
-from flask import render_template, request, make_response, current_app, send_from_directory, abort
+from flask import render_template, request, current_app, send_from_directory, abort
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
-from sqlalchemy import func, extract
+from sqlalchemy import String, and_, extract, func, literal, or_, select, union_all
+from sqlalchemy.orm import joinedload
 import os
 from app import db
 from app.reports import reports_bp
-from app.models import Customer, Loan, LoanPayment, Investment, InvestmentTransaction, Pawning, PawningPayment
+from app.models import Customer, DailyBranchFact, Loan, LoanArrearsSnapshot, LoanPayment, Investment, InvestmentTransaction, Pawning, PawningPayment, User
+from app.loans.financial_state import LoanFinancialState
 from app.utils.decorators import permission_required
+from app.jobs.queue import background_job
+from app.reports.cache import cached_report, render_report
+from app.reports.facts import fact_totals
+from app.utils.exports import XlsxStream, csv_response, iter_chunks
 from app.utils.helpers import get_current_branch_id, get_branch_filter_for_query
-import io
-import csv
+import heapq
 
 @reports_bp.route('/')
 @login_required
+@cached_report('index', permissions=('view_reports', 'view_collection_reports', 'view_borrowings_report', 'manage_pawnings'))
 def index():
     """Reports dashboard"""
     # Allow access if user has either view_reports or view_collection_reports permission
@@ -78,26 +84,10 @@ def index():
     from datetime import date
     today = date.today()
     
-    todays_loan_payments_query = db.session.query(func.sum(LoanPayment.payment_amount)).join(Loan).filter(
-        LoanPayment.payment_date == today
-    )
-    if loan_branch_filter is not None:
-        todays_loan_payments_query = todays_loan_payments_query.filter(loan_branch_filter)
-    todays_loan_payments = todays_loan_payments_query.scalar() or 0
-    
-    todays_new_loans_query = Loan.query.filter(
-        func.date(Loan.created_at) == today
-    )
-    if loan_branch_filter is not None:
-        todays_new_loans_query = todays_new_loans_query.filter(loan_branch_filter)
-    todays_new_loans = todays_new_loans_query.count()
-    
-    todays_new_customers_query = Customer.query.filter(
-        func.date(Customer.created_at) == today
-    )
-    if customer_branch_filter is not None:
-        todays_new_customers_query = todays_new_customers_query.filter(customer_branch_filter)
-    todays_new_customers = todays_new_customers_query.count()
+    todays_facts = fact_totals(today, today, get_branch_filter_for_query(DailyBranchFact.branch_id))
+    todays_loan_payments = todays_facts['loan']['collections']
+    todays_new_loans = todays_facts['loan']['new_loans']
+    todays_new_customers = todays_facts['customer']['new_customers']
     
     stats = {
         'total_customers': total_customers,
@@ -113,18 +103,10 @@ def index():
         'todays_new_customers': todays_new_customers
     }
     
-    return render_template('reports/index.html', title='Reports', stats=stats)
+    return render_report('reports/index.html', title='Reports', stats=stats)
 
-@reports_bp.route('/loans')
-@login_required
-@permission_required('view_reports')
-def loan_report():
-    """Loan reports"""
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    status = request.args.get('status', '')
-    loan_purpose = request.args.get('loan_purpose', '')
-    
+def _loan_report_query(start_date, end_date, status, loan_purpose):
+    """Loans listed by the loan report for its filters, within the user's branches"""
     query = Loan.query
     
     # Apply branch filtering
@@ -140,48 +122,50 @@ def loan_report():
         query = query.filter_by(status=status)
     if loan_purpose:
         query = query.filter_by(loan_purpose=loan_purpose)
+    return query
+
+
+@reports_bp.route('/loans')
+@login_required
+@permission_required('view_reports')
+@cached_report('loans')
+def loan_report():
+    """Loan reports"""
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    status = request.args.get('status', '')
+    loan_purpose = request.args.get('loan_purpose', '')
     
-    loans = query.all()
+    loan_branch_filter = get_branch_filter_for_query(Loan.branch_id)
+    loans = _loan_report_query(start_date, end_date, status, loan_purpose).all()
+    states = LoanFinancialState.for_loans(loans)
+    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
     
     # Calculate payment stats for each loan
     loan_payments = {}
     total_arrears = 0
     for loan in loans:
-        payment_stats = db.session.query(
-            func.sum(LoanPayment.principal_amount),
-            func.sum(LoanPayment.interest_amount)
-        ).filter(LoanPayment.loan_id == loan.id)
-        
-        if start_date:
-            payment_stats = payment_stats.filter(LoanPayment.payment_date >= datetime.strptime(start_date, '%Y-%m-%d').date())
-        if end_date:
-            payment_stats = payment_stats.filter(LoanPayment.payment_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
-        
-        principal, interest = payment_stats.first()
+        state = states[loan.id]
+        receipts = state.receipts_between(start_date_obj, end_date_obj)
         from decimal import Decimal
-        principal_dec = Decimal(str(principal or 0))
-        interest_dec = Decimal(str(interest or 0))
+        principal_dec = sum((Decimal(str(payment.principal_amount or 0)) for payment in receipts), Decimal('0'))
+        interest_dec = sum((Decimal(str(payment.interest_amount or 0)) for payment in receipts), Decimal('0'))
         total_dec = principal_dec + interest_dec
         
         # Calculate expected interest based on loan type
         expected_interest = loan.get_total_expected_interest()
         interest_variance = interest_dec - expected_interest
 
-        arrears_details = loan.get_arrears_details()
+        arrears_details = state.arrears
         arrears_amount = float(arrears_details.get('total_overdue_amount', 0))
         total_arrears += arrears_amount
 
         # Count paid installments from schedule (includes skipped as not paid)
-        schedule = loan.generate_payment_schedule()
-        paid_installments = len([inst for inst in schedule if inst.get('status') == 'paid']) if schedule else 0
+        paid_installments = state.paid_installments
 
         # Last payment (respect date filters if provided)
-        last_payment_query = LoanPayment.query.filter_by(loan_id=loan.id)
-        if start_date:
-            last_payment_query = last_payment_query.filter(LoanPayment.payment_date >= datetime.strptime(start_date, '%Y-%m-%d').date())
-        if end_date:
-            last_payment_query = last_payment_query.filter(LoanPayment.payment_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
-        last_payment = last_payment_query.order_by(LoanPayment.payment_date.desc(), LoanPayment.id.desc()).first()
+        last_payment = receipts[-1] if receipts else None
         
         loan_payments[loan.id] = {
             'principal': float(principal_dec),
@@ -241,7 +225,7 @@ def loan_report():
         func.sum(Loan.loan_amount)
     ).group_by(Loan.loan_purpose).all()
     
-    return render_template('reports/loan_report.html',
+    return render_report('reports/loan_report.html',
                          title='Loan Report',
                          loans=loans,
                          loan_payments=loan_payments,
@@ -280,38 +264,26 @@ def staff_loan_report():
         query = query.filter_by(status=status)
 
     loans = query.order_by(Loan.created_at.desc()).all()
+    states = LoanFinancialState.for_loans(loans)
+    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
 
     loan_payments = {}
     total_arrears = 0.0
     for loan in loans:
-        payment_stats = db.session.query(
-            func.sum(LoanPayment.principal_amount),
-            func.sum(LoanPayment.interest_amount)
-        ).filter(LoanPayment.loan_id == loan.id)
-
-        if start_date:
-            payment_stats = payment_stats.filter(LoanPayment.payment_date >= datetime.strptime(start_date, '%Y-%m-%d').date())
-        if end_date:
-            payment_stats = payment_stats.filter(LoanPayment.payment_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
-
-        principal, interest = payment_stats.first()
-        principal_dec = Decimal(str(principal or 0))
-        interest_dec = Decimal(str(interest or 0))
+        state = states[loan.id]
+        receipts = state.receipts_between(start_date_obj, end_date_obj)
+        principal_dec = sum((Decimal(str(payment.principal_amount or 0)) for payment in receipts), Decimal('0'))
+        interest_dec = sum((Decimal(str(payment.interest_amount or 0)) for payment in receipts), Decimal('0'))
         total_dec = principal_dec + interest_dec
 
-        arrears_details = loan.get_arrears_details()
+        arrears_details = state.arrears
         arrears_amount = float(arrears_details.get('total_overdue_amount', 0))
         total_arrears += arrears_amount
 
-        schedule = loan.generate_payment_schedule()
-        paid_installments = len([inst for inst in schedule if inst.get('status') == 'paid']) if schedule else 0
+        paid_installments = state.paid_installments
 
-        last_payment_query = LoanPayment.query.filter_by(loan_id=loan.id)
-        if start_date:
-            last_payment_query = last_payment_query.filter(LoanPayment.payment_date >= datetime.strptime(start_date, '%Y-%m-%d').date())
-        if end_date:
-            last_payment_query = last_payment_query.filter(LoanPayment.payment_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
-        last_payment = last_payment_query.order_by(LoanPayment.payment_date.desc(), LoanPayment.id.desc()).first()
+        last_payment = receipts[-1] if receipts else None
 
         loan_payments[loan.id] = {
             'principal': float(principal_dec),
@@ -350,16 +322,8 @@ def staff_loan_report():
                          end_date=end_date,
                          status=status)
 
-@reports_bp.route('/collections')
-@login_required
-@permission_required('view_collection_reports')
-def collection_report():
-    """Collection reports"""
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    payment_method = request.args.get('payment_method', '')
-    collection_type = request.args.get('collection_type', '')
-    
+def _collection_report_queries(start_date, end_date, payment_method):
+    """(loan payments, pawning payments) queries of the collection report, newest first"""
     # Get branch filtering info
     loan_branch_filter = get_branch_filter_for_query(Loan.branch_id)
     pawning_branch_filter = get_branch_filter_for_query(Pawning.branch_id)
@@ -375,8 +339,6 @@ def collection_report():
     if payment_method:
         loan_query = loan_query.filter(LoanPayment.payment_method == payment_method)
     
-    loan_payments = loan_query.order_by(LoanPayment.payment_date.desc()).all() if collection_type != 'pawning' else []
-    
     # Pawning payments
     pawning_query = PawningPayment.query.join(Pawning).join(Customer)
     if pawning_branch_filter is not None:
@@ -388,110 +350,183 @@ def collection_report():
     if payment_method:
         pawning_query = pawning_query.filter(PawningPayment.payment_method == payment_method)
     
-    pawning_payments = pawning_query.order_by(PawningPayment.payment_date.desc()).all() if collection_type != 'loan' else []
-    
-    # Combine all payments
-    all_payments = []
-    for payment in loan_payments:
-        all_payments.append({
-            'payment': payment,
-            'type': 'loan',
-            'loan_id': payment.loan_id,
-            'pawning_id': None,
-            'payment_date': payment.payment_date,
-            'receipt_number': payment.receipt_number,
-            'reference_number': payment.loan.loan_number if payment.loan else 'N/A',
-            'member_name': payment.loan.customer.full_name if payment.loan and payment.loan.customer else 'N/A',
-            'amount': float(payment.payment_amount or 0),
-            'principal_amount': float(payment.principal_amount or 0),
-            'interest_amount': float(payment.interest_amount or 0),
-            'payment_method': payment.payment_method,
-            'collected_by': payment.collected_by_user if payment.collected_by_user else None
-        })
-    
-    for payment in pawning_payments:
-        all_payments.append({
-            'payment': payment,
-            'type': 'pawning',
-            'loan_id': None,
-            'pawning_id': payment.pawning_id,
-            'payment_date': payment.payment_date,
-            'receipt_number': payment.receipt_number,
-            'reference_number': payment.pawning.ticket_number if payment.pawning else 'N/A',
-            'member_name': payment.pawning.customer.full_name if payment.pawning and payment.pawning.customer else 'N/A',
-            'amount': float(payment.payment_amount or 0),
-            'principal_amount': float(payment.principal_amount or 0),
-            'interest_amount': float(payment.interest_amount or 0),
-            'payment_method': payment.payment_method,
-            'collected_by': payment.collected_by_user if payment.collected_by_user else None
-        })
-    
-    # Sort all payments by date descending
-    all_payments.sort(key=lambda x: x['payment_date'], reverse=True)
-    
-    # Calculate summary
-    total_amount = sum(p['amount'] for p in all_payments)
-    total_principal = sum(p['principal_amount'] for p in all_payments)
-    total_interest = sum(p['interest_amount'] for p in all_payments)
-    
-    summary = {
-        'total_count': len(all_payments),
-        'total_amount': total_amount,
-        'total_principal': total_principal,
-        'total_interest': total_interest
-    }
-    
-    # Collections by payment method
-    collections_by_method = {}
-    for payment in all_payments:
-        method = payment['payment_method'] or 'Not Specified'
-        if method not in collections_by_method:
-            collections_by_method[method] = {'count': 0, 'total': 0}
-        collections_by_method[method]['count'] += 1
-        collections_by_method[method]['total'] += payment['amount']
-    
+    return (loan_query.order_by(LoanPayment.payment_date.desc()),
+            pawning_query.order_by(PawningPayment.payment_date.desc()))
+
+
+# Payment rows per page of the collection report
+COLLECTION_PAGE_SIZE = 100
+
+
+def _collection_payments_select(payment_model, parent_model, parent_key, reference_column, kind,
+                                start_date, end_date, payment_method):
+    """One side of the collection report union, within the user's branches"""
+    query = select(
+        literal(kind, String).label('type'),
+        payment_model.id.label('id'),
+        payment_model.payment_date.label('payment_date'),
+        payment_model.receipt_number.label('receipt_number'),
+        reference_column.label('reference_number'),
+        Customer.full_name.label('member_name'),
+        payment_model.payment_amount.label('amount'),
+        payment_model.principal_amount.label('principal_amount'),
+        payment_model.interest_amount.label('interest_amount'),
+        payment_model.payment_method.label('payment_method'),
+        payment_model.collected_by.label('collected_by'),
+    ).join(parent_model, parent_model.id == parent_key).join(Customer, Customer.id == parent_model.customer_id)
+    branch_filter = get_branch_filter_for_query(parent_model.branch_id)
+    if branch_filter is not None:
+        query = query.where(branch_filter)
+    if start_date:
+        query = query.where(payment_model.payment_date >= datetime.strptime(start_date, '%Y-%m-%d').date())
+    if end_date:
+        query = query.where(payment_model.payment_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
+    if payment_method:
+        query = query.where(payment_model.payment_method == payment_method)
+    return query
+
+
+def _collection_union(start_date, end_date, payment_method, collection_type):
+    """Loan and pawning payments of the collection report as one subquery"""
+    parts = []
+    if collection_type != 'pawning':
+        parts.append(_collection_payments_select(LoanPayment, Loan, LoanPayment.loan_id, Loan.loan_number, 'loan',
+                                                 start_date, end_date, payment_method))
+    if collection_type != 'loan':
+        parts.append(_collection_payments_select(PawningPayment, Pawning, PawningPayment.pawning_id,
+                                                 Pawning.pawning_number, 'pawning',
+                                                 start_date, end_date, payment_method))
+    return (union_all(*parts) if len(parts) > 1 else parts[0]).subquery('collections')
+
+
+def _collection_cursor(row):
+    return f'{row.payment_date.isoformat()}:{row.type}:{row.id}'
+
+
+def _parse_collection_cursor(cursor):
+    """(date, type, id) of a _collection_cursor() string, or None if it is not one"""
+    try:
+        day, kind, payment_id = cursor.split(':')
+        return datetime.strptime(day, '%Y-%m-%d').date(), kind, int(payment_id)
+    except ValueError:
+        return None
+
+
+def _collection_page(payments, after=None, before=None, per_page=COLLECTION_PAGE_SIZE):
+    """(rows, next cursor, previous cursor) of one keyset page of the union
+
+    Rows are ordered newest first, loans before pawnings on a day, then by
+    id descending. after/before are cursors of the last/first row of a
+    neighbouring page; a malformed cursor gives the first page.
+    """
+    date_col, type_col, id_col = payments.c.payment_date, payments.c.type, payments.c.id
+    cursor = _parse_collection_cursor(after or before) if after or before else None
+    if cursor is None:
+        after = before = None
+    query = select(payments, User.full_name.label('collected_by_name')).select_from(
+        payments.outerjoin(User, User.id == payments.c.collected_by))
+    if cursor:
+        day, kind, payment_id = cursor
+        if after:
+            query = query.where(or_(date_col < day, and_(date_col == day, type_col > kind),
+                                    and_(date_col == day, type_col == kind, id_col < payment_id)))
+        else:
+            query = query.where(or_(date_col > day, and_(date_col == day, type_col < kind),
+                                    and_(date_col == day, type_col == kind, id_col > payment_id)))
+    if before:
+        order = (date_col.asc(), type_col.desc(), id_col.asc())
+    else:
+        order = (date_col.desc(), type_col.asc(), id_col.desc())
+    rows = db.session.execute(query.order_by(*order).limit(per_page + 1)).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+        has_next, has_previous = True, more
+    else:
+        has_next, has_previous = more, bool(after)
+    next_cursor = _collection_cursor(rows[-1]) if rows and has_next else None
+    previous_cursor = _collection_cursor(rows[0]) if rows and has_previous else None
+    return rows, next_cursor, previous_cursor
+
+
+@reports_bp.route('/collections')
+@login_required
+@permission_required('view_collection_reports')
+def collection_report():
+    """Collection reports"""
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    payment_method = request.args.get('payment_method', '')
+    collection_type = request.args.get('collection_type', '')
+    per_page = min(max(request.args.get('per_page', COLLECTION_PAGE_SIZE, type=int), 1), COLLECTION_PAGE_SIZE * 5)
+    
+    payments = _collection_union(start_date, end_date, payment_method, collection_type)
+    amount = func.coalesce(func.sum(payments.c.amount), 0)
+    
+    # Collections by payment method, also summed for the totals
+    method = func.coalesce(func.nullif(payments.c.payment_method, ''), 'Not Specified')
+    by_method = db.session.execute(
+        select(method.label('payment_method'), func.count().label('count'), amount.label('total'),
+               func.coalesce(func.sum(payments.c.principal_amount), 0).label('principal'),
+               func.coalesce(func.sum(payments.c.interest_amount), 0).label('interest'))
+        .group_by(method).order_by(amount.desc())
+    ).all()
     collections_by_method_list = [
-        {'payment_method': k, 'count': v['count'], 'total': v['total']}
-        for k, v in collections_by_method.items()
+        {'payment_method': row.payment_method, 'count': row.count, 'total': float(row.total)}
+        for row in by_method
     ]
+    summary = {
+        'total_count': sum(row.count for row in by_method),
+        'total_amount': sum(float(row.total) for row in by_method),
+        'total_principal': sum(float(row.principal) for row in by_method),
+        'total_interest': sum(float(row.interest) for row in by_method)
+    }
     
     # Collections by user
-    collections_by_user = {}
-    for payment in all_payments:
-        user = payment['collected_by']
-        user_name = user.full_name if user else 'Not Specified'
-        if user_name not in collections_by_user:
-            collections_by_user[user_name] = {'count': 0, 'total': 0}
-        collections_by_user[user_name]['count'] += 1
-        collections_by_user[user_name]['total'] += payment['amount']
-    
+    user_name = func.coalesce(User.full_name, 'Not Specified')
+    by_user = db.session.execute(
+        select(user_name.label('user_name'), func.count().label('count'), amount.label('total'))
+        .select_from(payments.outerjoin(User, User.id == payments.c.collected_by))
+        .group_by(user_name).order_by(amount.desc())
+    ).all()
     collections_by_user_list = [
-        {'user_name': k, 'count': v['count'], 'total': v['total']}
-        for k, v in collections_by_user.items()
+        {'user_name': row.user_name, 'count': row.count, 'total': float(row.total)}
+        for row in by_user
     ]
     
+    # One page of payment details
+    rows, next_cursor, previous_cursor = _collection_page(
+        payments, after=request.args.get('after'), before=request.args.get('before'), per_page=per_page)
+    page_payments = [{
+        'type': row.type,
+        'payment_date': row.payment_date,
+        'receipt_number': row.receipt_number,
+        'reference_number': row.reference_number or 'N/A',
+        'member_name': row.member_name or 'N/A',
+        'amount': float(row.amount or 0),
+        'principal_amount': float(row.principal_amount or 0),
+        'interest_amount': float(row.interest_amount or 0),
+        'payment_method': row.payment_method,
+        'collected_by_name': row.collected_by_name,
+    } for row in rows]
+    
     return render_template('reports/collection_report.html',
                          title='Collection Report',
-                         payments=all_payments,
+                         payments=page_payments,
                          summary=summary,
                          collections_by_method=collections_by_method_list,
                          collections_by_user=collections_by_user_list,
+                         next_cursor=next_cursor,
+                         previous_cursor=previous_cursor,
+                         per_page=per_page,
                          start_date=start_date,
                          end_date=end_date,
                          payment_method=payment_method,
                          collection_type=collection_type)
 
-@reports_bp.route('/customers')
-@login_required
-@permission_required('view_reports')
-def customer_report():
-    """Customer reports"""
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    status = request.args.get('status', '')
-    kyc_status = request.args.get('kyc_status', '')
-    district = request.args.get('district', '')
-    
+def _customer_report_query(start_date, end_date, status, kyc_status, district):
+    """Customers listed by the member report for its filters"""
     query = Customer.query
     
     # Apply branch filtering
@@ -518,23 +553,32 @@ def customer_report():
     # District filtering
     if district:
         query = query.filter_by(district=district)
+    return query
+
+
+@reports_bp.route('/customers')
+@login_required
+@permission_required('view_reports')
+@cached_report('customers')
+def customer_report():
+    """Customer reports"""
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    status = request.args.get('status', '')
+    kyc_status = request.args.get('kyc_status', '')
+    district = request.args.get('district', '')
     
+    customer_branch_filter = get_branch_filter_for_query(Customer.branch_id)
+    query = _customer_report_query(start_date, end_date, status, kyc_status, district)
     customers = query.all()
     
     # Add counts for each customer (also filtered by branch)
-    for customer in customers:
-        loan_count_query = Loan.query.filter_by(customer_id=customer.id, status='active')
-        investment_count_query = Investment.query.filter_by(customer_id=customer.id, status='active')
-        pawning_count_query = Pawning.query.filter_by(customer_id=customer.id, status='active')
-        
-        if customer_branch_filter is not None:
-            loan_count_query = loan_count_query.filter(customer_branch_filter)
-            investment_count_query = investment_count_query.filter(customer_branch_filter)
-            pawning_count_query = pawning_count_query.filter(customer_branch_filter)
-        
-        customer.active_loans_count = loan_count_query.count()
-        customer.active_investments_count = investment_count_query.count()
-        customer.active_pawnings_count = pawning_count_query.count()
+    for start in range(0, len(customers), 500):
+        chunk = customers[start:start + 500]
+        counts = _active_product_counts([customer.id for customer in chunk])
+        for customer in chunk:
+            (customer.active_loans_count, customer.active_investments_count,
+             customer.active_pawnings_count) = counts[customer.id]
     
     # Statistics
     summary = {
@@ -585,7 +629,7 @@ def customer_report():
     available_districts = districts_query.order_by(Customer.district).all()
     available_districts = [d[0] for d in available_districts if d[0]]  # Convert to list and filter out None values
     
-    return render_template('reports/customer_report.html',
+    return render_report('reports/customer_report.html',
                          title='Member Report',
                          customers=customers,
                          summary=summary,
@@ -598,15 +642,8 @@ def customer_report():
                          kyc_status=kyc_status,
                          district=district)
 
-@reports_bp.route('/investments')
-@login_required
-@permission_required('view_borrowings_report')
-def investment_report():
-    """Borrower reports"""
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    investment_type = request.args.get('investment_type', '')
-    
+def _investment_report_query(start_date, end_date, investment_type):
+    """Investments listed by the borrower report for its filters"""
     query = Investment.query
     
     # Apply branch filtering
@@ -620,8 +657,21 @@ def investment_report():
         query = query.filter(Investment.created_at <= datetime.strptime(end_date, '%Y-%m-%d'))
     if investment_type:
         query = query.filter_by(investment_type=investment_type)
+    return query
+
+
+@reports_bp.route('/investments')
+@login_required
+@permission_required('view_borrowings_report')
+@cached_report('investments')
+def investment_report():
+    """Borrower reports"""
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    investment_type = request.args.get('investment_type', '')
     
-    investments = query.all()
+    investment_branch_filter = get_branch_filter_for_query(Investment.branch_id)
+    investments = _investment_report_query(start_date, end_date, investment_type).all()
     
     # Calculate interest paid/accrued (this is expense for the company)
     total_interest_expense = sum(float(inv.current_amount - inv.principal_amount) for inv in investments if inv.current_amount and inv.current_amount > inv.principal_amount)
@@ -668,7 +718,7 @@ def investment_report():
         maturing_query = maturing_query.filter(investment_branch_filter)
     maturing_soon = maturing_query.all()
     
-    return render_template('reports/investment_report.html',
+    return render_report('reports/investment_report.html',
                          title='Borrower Report',
                          investments=investments,
                          summary=summary,
@@ -679,16 +729,8 @@ def investment_report():
                          end_date=end_date,
                          investment_type=investment_type)
 
-@reports_bp.route('/pawnings')
-@login_required
-@permission_required('manage_pawnings')
-def pawning_report():
-    """Pawning reports"""
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    status = request.args.get('status', '')
-    item_type = request.args.get('item_type', '')
-    
+def _pawning_report_query(start_date, end_date, status, item_type):
+    """Pawnings listed by the pawning report for its filters"""
     query = Pawning.query
     
     # Apply branch filtering
@@ -704,8 +746,22 @@ def pawning_report():
         query = query.filter_by(status=status)
     if item_type:
         query = query.filter_by(item_type=item_type)
+    return query
+
+
+@reports_bp.route('/pawnings')
+@login_required
+@permission_required('manage_pawnings')
+@cached_report('pawnings')
+def pawning_report():
+    """Pawning reports"""
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    status = request.args.get('status', '')
+    item_type = request.args.get('item_type', '')
     
-    pawnings = query.all()
+    pawning_branch_filter = get_branch_filter_for_query(Pawning.branch_id)
+    pawnings = _pawning_report_query(start_date, end_date, status, item_type).all()
     
     # Calculate total interest collected from pawning payments
     total_interest_collected = db.session.query(func.sum(PawningPayment.interest_amount)).join(
@@ -757,7 +813,7 @@ def pawning_report():
         overdue_query = overdue_query.filter(pawning_branch_filter)
     overdue_pawnings = overdue_query.all()
     
-    return render_template('reports/pawning_report.html',
+    return render_report('reports/pawning_report.html',
                          title='Pawning Report',
                          pawnings=pawnings,
                          summary=summary,
@@ -769,6 +825,42 @@ def pawning_report():
                          status=status,
                          item_type=item_type)
 
+def _arrears_snapshot_query(start_date_obj=None, end_date_obj=None):
+    """(Loan, LoanArrearsSnapshot) rows for active loans in arrears, branch and date filtered
+
+    Read only: snapshots are written with every receipt and installment sync
+    and refreshed for all active loans by the end-of-day close
+    (`python run.py eod-close`, or `refresh-arrears`).
+    """
+    from app.models import LoanInstallment
+
+    loan_branch_filter = get_branch_filter_for_query(Loan.branch_id)
+    query = db.session.query(Loan, LoanArrearsSnapshot).join(
+        LoanArrearsSnapshot, LoanArrearsSnapshot.loan_id == Loan.id
+    ).filter(
+        Loan.status == 'active',
+        LoanArrearsSnapshot.total_overdue_amount > 0,
+    )
+    if loan_branch_filter is not None:
+        query = query.filter(loan_branch_filter)
+    # Loans with an overdue or partial installment due within the range; the
+    # snapshot's arrears dates narrow the candidates first
+    if start_date_obj or end_date_obj:
+        in_range = db.session.query(LoanInstallment.loan_id).filter(LoanInstallment.arrears_condition())
+        if start_date_obj:
+            query = query.filter(LoanArrearsSnapshot.last_arrears_date >= start_date_obj)
+            in_range = in_range.filter(LoanInstallment.due_date >= start_date_obj)
+        if end_date_obj:
+            query = query.filter(LoanArrearsSnapshot.first_arrears_date <= end_date_obj)
+            in_range = in_range.filter(LoanInstallment.due_date <= end_date_obj)
+        query = query.filter(Loan.id.in_(in_range))
+    return query
+
+
+ARREARS_PAGE_SIZE = 100
+_NUM_ARREARS = LoanArrearsSnapshot.overdue_installments + LoanArrearsSnapshot.partial_overdue_installments
+
+
 @reports_bp.route('/arrears')
 @login_required
 @permission_required('view_reports')
@@ -780,113 +872,19 @@ def arrears_report():
     end_date = request.args.get('end_date', '')
     status = request.args.get('status', 'active')  # Default to active
     product_type = request.args.get('product_type', '')  # loan, pawning, or all
-    
-    # Get branch filtering info
-    current_branch_id = get_current_branch_id()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', ARREARS_PAGE_SIZE, type=int), 1), ARREARS_PAGE_SIZE * 5)
     
     from datetime import date, datetime
     from decimal import Decimal, ROUND_HALF_UP
+    from sqlalchemy import case
     today = date.today()
     
     start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
     end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
     
-    arrears_data = []
-    
-    # Loan arrears - active loans with overdue or partially overdue installments
-    if product_type in ['', 'loan']:
-        loan_query = Loan.query.filter_by(status='active')
-        
-        loan_branch_filter = get_branch_filter_for_query(Loan.branch_id)
-        if loan_branch_filter is not None:
-            loan_query = loan_query.filter(loan_branch_filter)
-        
-        loans = loan_query.all()
-        
-        for loan in loans:
-            from decimal import Decimal, ROUND_HALF_UP
-            
-            # Get arrears details using the schedule-based method
-            arrears_details = loan.get_arrears_details()
-            total_overdue_amount = arrears_details['total_overdue_amount']
-            
-            # Skip loans with no overdue amounts (neither past maturity nor installment overdue)
-            if total_overdue_amount <= Decimal('0'):
-                continue
-            
-            # Apply arrears date filter using overdue schedule dates
-            schedule = loan.generate_payment_schedule()
-            if start_date_obj or end_date_obj:
-                matching_overdue = [inst for inst in schedule if inst.get('status') in ['overdue', 'partial']
-                                    and (not start_date_obj or inst['due_date'] >= start_date_obj)
-                                    and (not end_date_obj or inst['due_date'] <= end_date_obj)]
-                if not matching_overdue:
-                    continue
-            
-            # Calculate outstanding amounts
-            disbursed = Decimal(str(loan.disbursed_amount or loan.loan_amount))
-            outstanding_principal = Decimal(str(loan.outstanding_amount or 0))
-            
-            # For display: principal portion of overdue vs interest portion
-            # Use the installment amount split to estimate
-            arrears_principal = outstanding_principal
-            arrears_interest = Decimal('0')
-            
-            # Total arrears
-            penalty = Decimal(str(loan.penalty_amount or 0))
-            advance_balance = Decimal(str(loan.advance_balance or 0))
-            
-            # Determine arrears type: past maturity vs installment overdue
-            is_past_maturity = bool(loan.maturity_date and loan.maturity_date < today)
-            overdue_days = arrears_details['days_overdue']
-            oldest_overdue_date = arrears_details['oldest_overdue_date']
-            
-            # The overdue amount from schedule (includes partial remainders)
-            installment_overdue_amount = float(total_overdue_amount)
-            num_arrears = arrears_details['overdue_installments'] + arrears_details['partial_overdue_installments']
-            
-            last_payment = LoanPayment.query.filter_by(loan_id=loan.id).order_by(LoanPayment.payment_date.desc(), LoanPayment.id.desc()).first()
-            referred_by = loan.referrer.full_name if loan.referrer else 'N/A'
-            schedule = loan.generate_payment_schedule()
-            paid_installments = len([inst for inst in schedule if inst.get('status') == 'paid']) if schedule else 0
-
-            arrears_data.append({
-                'product_type': 'Loan',
-                'reference_number': loan.loan_number,
-                'loan_id': loan.id,
-                'customer_name': loan.customer.full_name,
-                'customer_id': loan.customer.customer_id,
-                'customer_phone': loan.customer.phone_primary,
-                'customer_nic': loan.customer.nic_number,
-                'customer_address': f"{loan.customer.address_line1}, {loan.customer.city}, {loan.customer.district}",
-                'referred_by': referred_by,
-                'disbursement_date': loan.disbursement_date,
-                'maturity_date': loan.maturity_date,
-                'original_amount': float(disbursed),
-                'principal_outstanding': float(arrears_principal),
-                'interest_outstanding': float(arrears_interest),
-                'penalty': float(penalty),
-                'installment_overdue': installment_overdue_amount,
-                'overdue_installments': arrears_details['overdue_installments'],
-                'partial_overdue_amount': float(arrears_details['partial_overdue_amount']),
-                'partial_overdue_installments': arrears_details['partial_overdue_installments'],
-                'advance_balance': float(advance_balance),
-                'outstanding': float(outstanding_principal),
-                'overdue_amount': installment_overdue_amount,
-                'total_arrears': installment_overdue_amount,
-                'num_arrears': num_arrears,
-                'paid_installments': paid_installments,
-                'is_overdue': True,
-                'is_past_maturity': is_past_maturity,
-                'days_overdue': overdue_days,
-                'oldest_overdue_date': oldest_overdue_date,
-                'loan_type': loan.loan_type,
-                'interest_type': loan.interest_type,
-                'last_payment_date': last_payment.payment_date if last_payment else None,
-                'last_payment_amount': float(last_payment.payment_amount) if last_payment else None,
-            })
-    
     # Pawning arrears - only active pawnings past maturity date
+    pawning_data = []
     if product_type in ['', 'pawning']:
         pawning_query = Pawning.query.filter_by(status='active')
         
@@ -924,7 +922,7 @@ def arrears_report():
                 days_diff = (today - maturity_date).days
                 overdue_days = max(0, days_diff)
             
-            arrears_data.append({
+            pawning_data.append({
                 'product_type': 'Pawning',
                 'reference_number': pawning.pawning_number,
                 'loan_id': None,
@@ -960,64 +958,170 @@ def arrears_report():
                 'last_payment_amount': None,
             })
     
-    # Sort by number of arrears descending, then total arrears
-    arrears_data.sort(key=lambda x: (x['num_arrears'], x['total_arrears']), reverse=True)
+    # Loan arrears - active loans with overdue or partially overdue installments,
+    # read from the arrears snapshot and totalled in SQL
+    loan_count = 0
+    loan_totals = [Decimal('0')] * 5
+    loan_past_maturity = 0
+    loan_order = (_NUM_ARREARS.desc(), LoanArrearsSnapshot.total_overdue_amount.desc(), Loan.id.asc())
+    if product_type in ['', 'loan']:
+        loan_query = _arrears_snapshot_query(start_date_obj, end_date_obj)
+        totals = loan_query.with_entities(
+            func.count(Loan.id),
+            func.sum(LoanArrearsSnapshot.total_overdue_amount),
+            func.sum(Loan.outstanding_amount),
+            func.sum(Loan.penalty_amount),
+            func.sum(LoanArrearsSnapshot.partial_overdue_amount),
+            func.sum(_NUM_ARREARS),
+            func.sum(case((Loan.maturity_date < today, 1), else_=0)),
+        ).one()
+        loan_count = totals[0] or 0
+        loan_totals = [Decimal(str(value or 0)) for value in totals[1:6]]
+        loan_past_maturity = totals[6] or 0
+    
+    # Sort by number of arrears descending, then total arrears; loans come
+    # before pawnings with the same key
+    pawning_data.sort(key=lambda x: (x['num_arrears'], x['total_arrears']), reverse=True)
+    offset = (page - 1) * per_page
+    if not loan_count:
+        page_entries = pawning_data[offset:offset + per_page]
+    elif not pawning_data:
+        page_entries = [('loan', loan_id) for (loan_id,) in loan_query.with_entities(Loan.id).order_by(
+            *loan_order).offset(offset).limit(per_page).all()]
+    else:
+        # Only loans ranked within the first offset + per_page can reach this page
+        ranked = [
+            ((num_arrears, float(total_overdue)), ('loan', loan_id))
+            for num_arrears, total_overdue, loan_id in loan_query.with_entities(
+                _NUM_ARREARS, LoanArrearsSnapshot.total_overdue_amount, Loan.id
+            ).order_by(*loan_order).limit(offset + per_page).all()
+        ]
+        ranked.extend(((item['num_arrears'], item['total_arrears']), item) for item in pawning_data)
+        ranked.sort(key=lambda entry: entry[0], reverse=True)
+        page_entries = [entry for _, entry in ranked[offset:offset + per_page]]
+    
+    page_loan_ids = [entry[1] for entry in page_entries if isinstance(entry, tuple)]
+    page_loans = {}
+    if page_loan_ids:
+        page_loans = {
+            loan.id: (loan, snapshot)
+            for loan, snapshot in loan_query.filter(Loan.id.in_(page_loan_ids)).options(
+                joinedload(Loan.customer), joinedload(Loan.referrer)
+            ).all()
+        }
     
-    # Calculate summary statistics
-    total_arrears = sum(Decimal(str(item['total_arrears'])) for item in arrears_data)
-    total_principal = sum(Decimal(str(item['principal_outstanding'])) for item in arrears_data)
-    total_interest = sum(Decimal(str(item['interest_outstanding'])) for item in arrears_data)
-    total_penalty = sum(Decimal(str(item['penalty'])) for item in arrears_data)
-    total_installment_overdue = sum(Decimal(str(item['installment_overdue'])) for item in arrears_data)
-    total_partial = sum(Decimal(str(item['partial_overdue_amount'])) for item in arrears_data)
-    total_num_arrears = sum(item['num_arrears'] for item in arrears_data)
+    arrears_data = []
+    for entry in page_entries:
+        if not isinstance(entry, tuple):
+            arrears_data.append(entry)
+            continue
+        
+        loan, snapshot = page_loans[entry[1]]
+        disbursed = Decimal(str(loan.disbursed_amount or loan.loan_amount))
+        outstanding_principal = Decimal(str(loan.outstanding_amount or 0))
+        penalty = Decimal(str(loan.penalty_amount or 0))
+        advance_balance = Decimal(str(loan.advance_balance or 0))
+        
+        # Determine arrears type: past maturity vs installment overdue
+        is_past_maturity = bool(loan.maturity_date and loan.maturity_date < today)
+        
+        # The overdue amount from schedule (includes partial remainders)
+        installment_overdue_amount = float(snapshot.total_overdue_amount)
+        
+        arrears_data.append({
+            'product_type': 'Loan',
+            'reference_number': loan.loan_number,
+            'loan_id': loan.id,
+            'customer_name': loan.customer.full_name,
+            'customer_id': loan.customer.customer_id,
+            'customer_phone': loan.customer.phone_primary,
+            'customer_nic': loan.customer.nic_number,
+            'customer_address': f"{loan.customer.address_line1}, {loan.customer.city}, {loan.customer.district}",
+            'referred_by': loan.referrer.full_name if loan.referrer else 'N/A',
+            'disbursement_date': loan.disbursement_date,
+            'maturity_date': loan.maturity_date,
+            'original_amount': float(disbursed),
+            'principal_outstanding': float(outstanding_principal),
+            'interest_outstanding': 0.0,
+            'penalty': float(penalty),
+            'installment_overdue': installment_overdue_amount,
+            'overdue_installments': snapshot.overdue_installments,
+            'partial_overdue_amount': float(snapshot.partial_overdue_amount or 0),
+            'partial_overdue_installments': snapshot.partial_overdue_installments,
+            'advance_balance': float(advance_balance),
+            'outstanding': float(outstanding_principal),
+            'overdue_amount': installment_overdue_amount,
+            'total_arrears': installment_overdue_amount,
+            'num_arrears': snapshot.num_arrears,
+            'paid_installments': snapshot.paid_installments,
+            'is_overdue': True,
+            'is_past_maturity': is_past_maturity,
+            'days_overdue': snapshot.days_overdue_on(today),
+            'oldest_overdue_date': snapshot.oldest_overdue_date,
+            'loan_type': loan.loan_type,
+            'interest_type': loan.interest_type,
+            'last_payment_date': snapshot.last_payment_date,
+            'last_payment_amount': float(snapshot.last_payment_amount) if snapshot.last_payment_amount is not None else None,
+        })
     
-    past_maturity_items = [item for item in arrears_data if item.get('is_past_maturity')]
-    installment_only_items = [item for item in arrears_data if not item.get('is_past_maturity')]
+    # Calculate summary statistics over every page
+    loan_arrears, loan_principal, loan_penalty, loan_partial, loan_num_arrears = loan_totals
+    pawning_arrears = sum(Decimal(str(item['total_arrears'])) for item in pawning_data)
+    total_arrears = loan_arrears + pawning_arrears
+    total_principal = loan_principal + sum(Decimal(str(item['principal_outstanding'])) for item in pawning_data)
+    total_interest = sum(Decimal(str(item['interest_outstanding'])) for item in pawning_data)
+    total_penalty = loan_penalty + sum(Decimal(str(item['penalty'])) for item in pawning_data)
+    total_num_arrears = int(loan_num_arrears) + len(pawning_data)
+    total_accounts = loan_count + len(pawning_data)
+    past_maturity_accounts = loan_past_maturity + len(pawning_data)
     
     summary = {
-        'total_accounts': len(arrears_data),
+        'total_accounts': total_accounts,
         'total_arrears': float(total_arrears),
         'total_principal': float(total_principal),
         'total_interest': float(total_interest),
         'total_penalty': float(total_penalty),
-        'total_installment_overdue': float(total_installment_overdue),
-        'total_partial_overdue': float(total_partial),
+        'total_installment_overdue': float(total_arrears),
+        'total_partial_overdue': float(loan_partial),
         'total_num_arrears': total_num_arrears,
-        'overdue_accounts': len(arrears_data),
+        'overdue_accounts': total_accounts,
         'overdue_amount': float(total_arrears),
-        'past_maturity_accounts': len(past_maturity_items),
-        'installment_overdue_accounts': len(installment_only_items)
+        'past_maturity_accounts': past_maturity_accounts,
+        'installment_overdue_accounts': total_accounts - past_maturity_accounts
     }
     
     # Breakdown by product type
-    loan_arrears = [item for item in arrears_data if item['product_type'] == 'Loan']
-    pawning_arrears = [item for item in arrears_data if item['product_type'] == 'Pawning']
-    
     product_breakdown = [
         {
             'product_type': 'Loan',
-            'count': len(loan_arrears),
-            'total_arrears': sum(item['total_arrears'] for item in loan_arrears)
+            'count': loan_count,
+            'total_arrears': float(loan_arrears)
         },
         {
             'product_type': 'Pawning',
-            'count': len(pawning_arrears),
-            'total_arrears': sum(item['total_arrears'] for item in pawning_arrears)
+            'count': len(pawning_data),
+            'total_arrears': float(pawning_arrears)
         }
     ]
     
+    pagination = {
+        'page': page,
+        'per_page': per_page,
+        'total': total_accounts,
+        'pages': max((total_accounts + per_page - 1) // per_page, 1),
+    }
+    
     return render_template('reports/arrears_report.html',
                          title='Arrears Report',
                          arrears_data=arrears_data,
                          summary=summary,
                          product_breakdown=product_breakdown,
+                         pagination=pagination,
                          start_date=start_date,
                          end_date=end_date,
                          status=status,
                          product_type=product_type)
 
-
 @reports_bp.route('/documentation-charges')
 @login_required
 @permission_required('view_reports')
@@ -1068,9 +1172,9 @@ def documentation_charges_report():
 @reports_bp.route('/export/documentation-charges')
 @login_required
 @permission_required('view_reports')
+@background_job('Documentation charges Excel')
 def export_documentation_charges():
     """Export documentation charges report to Excel"""
-    import openpyxl
     from openpyxl.styles import Font, PatternFill, Alignment
     
     start_date = request.args.get('start_date', '')
@@ -1090,80 +1194,122 @@ def export_documentation_charges():
     if loan_type:
         query = query.filter(Loan.loan_type == loan_type)
     
-    loans = query.order_by(Loan.created_at.desc()).all()
+    query = query.options(joinedload(Loan.customer)).order_by(Loan.created_at.desc())
     
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Documentation Charges'
+    export = XlsxStream()
+    export.add_style('header', fill=PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid'),
+                     font=Font(bold=True, color='FFFFFF'), alignment=Alignment(horizontal='center'))
+    export.add_style('total', font=Font(bold=True))
+    ws = export.sheet('Documentation Charges')
     
     headers = [
         'Loan Number', 'Customer Name', 'NIC Number', 'Loan Type',
         'Loan Amount', 'Documentation Fee', 'Disbursed Amount',
         'Status', 'Created Date'
     ]
-    
-    header_fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF')
-    
-    ws.append(headers)
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center')
+    ws.append(headers, style='header')
     
     total_fees = 0
     total_amount = 0
     
-    for loan in loans:
-        doc_fee = float(loan.documentation_fee or 0)
-        loan_amt = float(loan.loan_amount or 0)
-        total_fees += doc_fee
-        total_amount += loan_amt
-        
-        ws.append([
-            loan.loan_number,
-            loan.customer.full_name if loan.customer else 'N/A',
-            loan.customer.nic_number if loan.customer else 'N/A',
-            loan.loan_type.replace('_', ' ').title() if loan.loan_type else 'N/A',
-            loan_amt,
-            doc_fee,
-            float(loan.disbursed_amount or 0),
-            loan.status.title() if loan.status else 'N/A',
-            loan.created_at.strftime('%Y-%m-%d') if loan.created_at else 'N/A'
-        ])
+    for loans in iter_chunks(query):
+        for loan in loans:
+            doc_fee = float(loan.documentation_fee or 0)
+            loan_amt = float(loan.loan_amount or 0)
+            total_fees += doc_fee
+            total_amount += loan_amt
+            
+            ws.append([
+                loan.loan_number,
+                loan.customer.full_name if loan.customer else 'N/A',
+                loan.customer.nic_number if loan.customer else 'N/A',
+                loan.loan_type.replace('_', ' ').title() if loan.loan_type else 'N/A',
+                loan_amt,
+                doc_fee,
+                float(loan.disbursed_amount or 0),
+                loan.status.title() if loan.status else 'N/A',
+                loan.created_at.strftime('%Y-%m-%d') if loan.created_at else 'N/A'
+            ])
     
     # Add totals row
     ws.append([])
     total_row = ['', '', '', 'TOTAL', total_amount, total_fees, '', '', '']
-    ws.append(total_row)
-    bold_font = Font(bold=True)
-    for cell in ws[ws.max_row]:
-        cell.font = bold_font
-    
-    # Auto-fit column widths
-    for col in ws.columns:
-        max_len = max((len(str(cell.value)) for cell in col if cell.value), default=10)
-        ws.column_dimensions[col[0].column_letter].width = min(max_len + 4, 40)
-    
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    ws.append(total_row, style='total')
     
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=documentation_charges_{datetime.now().strftime("%Y%m%d")}.xlsx'
-    
-    return response
+    return export.response(f'documentation_charges_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
+
+LOAN_EXPORT_HEADERS = [
+    'Loan Number', 'Customer', 'Loan Purpose', 'Calculation Type',
+    'Disbursement Date', 'Loan Amount', 'Interest Rate', 'Installment Amount',
+    'Duration', 'Paid Installments', 'Outstanding Amount', 'Arrears', 'Last Payment Date', 'Last Payment Amount', 'Total Paid', 'Status', 'Referred By', 'Created Date'
+]
+
+
+def _loan_export_rows(query):
+    """Loan export rows for a Loan query, computed a chunk of loans at a time"""
+    for loans in iter_chunks(query.options(joinedload(Loan.customer), joinedload(Loan.referrer))):
+        states = LoanFinancialState.for_loans(loans)
+        for loan in loans:
+            if loan.duration_weeks:
+                duration = f"{loan.duration_weeks} weeks"
+            elif loan.duration_months:
+                duration = f"{loan.duration_months} months"
+            else:
+                duration = 'N/A'
+
+            referred_by_name = loan.referrer.full_name if loan.referrer else 'N/A'
+
+            state = states[loan.id]
+            arrears_amount = float(state.arrears.get('total_overdue_amount', 0))
+            paid_installments = state.paid_installments
+
+            last_payment = state.last_payment
+            total_paid = state.total_received
+
+            yield [
+                loan.loan_number,
+                loan.customer.full_name if loan.customer else 'N/A',
+                loan.loan_purpose or 'N/A',
+                loan.loan_type or 'N/A',
+                loan.disbursement_date.strftime('%Y-%m-%d') if loan.disbursement_date else 'N/A',
+                float(loan.loan_amount) if loan.loan_amount else 0,
+                float(loan.interest_rate) if loan.interest_rate else 0,
+                float(loan.installment_amount) if loan.installment_amount else 0,
+                duration,
+                paid_installments,
+                float(loan.outstanding_amount) if loan.outstanding_amount else 0,
+                arrears_amount,
+                last_payment.payment_date.strftime('%Y-%m-%d') if last_payment and last_payment.payment_date else 'N/A',
+                float(last_payment.payment_amount) if last_payment else 0,
+                float(total_paid),
+                loan.status or 'N/A',
+                referred_by_name,
+                loan.created_at.strftime('%Y-%m-%d') if loan.created_at else 'N/A'
+            ]
+
+
+def _write_loan_export(query, filename):
+    """Stream the loan report workbook for a Loan query"""
+    from openpyxl.styles import Font, PatternFill, Alignment
+
+    export = XlsxStream()
+    export.add_style('header', fill=PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid'),
+                     font=Font(bold=True, color='FFFFFF'), alignment=Alignment(horizontal='center'))
+    ws = export.sheet('Loan Report')
+    ws.append(LOAN_EXPORT_HEADERS, style='header')
+    for row in _loan_export_rows(query):
+        ws.append(row)
+
+    return export.response(filename)
 
 
 @reports_bp.route('/export/loans')
 @login_required
 @permission_required('view_reports')
+@background_job('Loan report Excel')
 def export_loans():
     """Export all loans to Excel"""
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment
-
     query = Loan.query
 
     # Apply branch filtering
@@ -1171,90 +1317,15 @@ def export_loans():
     if loan_branch_filter is not None:
         query = query.filter(loan_branch_filter)
 
-    loans = query.all()
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Loan Report'
-
-    headers = [
-        'Loan Number', 'Customer', 'Loan Purpose', 'Calculation Type',
-        'Disbursement Date', 'Loan Amount', 'Interest Rate', 'Installment Amount',
-        'Duration', 'Paid Installments', 'Outstanding Amount', 'Arrears', 'Last Payment Date', 'Last Payment Amount', 'Total Paid', 'Status', 'Referred By', 'Created Date'
-    ]
-
-    header_fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF')
-
-    ws.append(headers)
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center')
-
-    for loan in loans:
-        if loan.duration_weeks:
-            duration = f"{loan.duration_weeks} weeks"
-        elif loan.duration_months:
-            duration = f"{loan.duration_months} months"
-        else:
-            duration = 'N/A'
-
-        referred_by_name = loan.referrer.full_name if loan.referrer else 'N/A'
-
-        arrears_details = loan.get_arrears_details()
-        arrears_amount = float(arrears_details.get('total_overdue_amount', 0))
-        schedule = loan.generate_payment_schedule()
-        paid_installments = len([inst for inst in schedule if inst.get('status') == 'paid']) if schedule else 0
-
-        last_payment = LoanPayment.query.filter_by(loan_id=loan.id).order_by(LoanPayment.payment_date.desc(), LoanPayment.id.desc()).first()
-        total_paid = db.session.query(func.sum(LoanPayment.payment_amount)).filter(LoanPayment.loan_id == loan.id).scalar() or 0
-
-        ws.append([
-            loan.loan_number,
-            loan.customer.full_name if loan.customer else 'N/A',
-            loan.loan_purpose or 'N/A',
-            loan.loan_type or 'N/A',
-            loan.disbursement_date.strftime('%Y-%m-%d') if loan.disbursement_date else 'N/A',
-            float(loan.loan_amount) if loan.loan_amount else 0,
-            float(loan.interest_rate) if loan.interest_rate else 0,
-            float(loan.installment_amount) if loan.installment_amount else 0,
-            duration,
-            paid_installments,
-            float(loan.outstanding_amount) if loan.outstanding_amount else 0,
-            arrears_amount,
-            last_payment.payment_date.strftime('%Y-%m-%d') if last_payment and last_payment.payment_date else 'N/A',
-            float(last_payment.payment_amount) if last_payment else 0,
-            float(total_paid),
-            loan.status or 'N/A',
-            referred_by_name,
-            loan.created_at.strftime('%Y-%m-%d') if loan.created_at else 'N/A'
-        ])
-
-    # Auto-fit column widths
-    for col in ws.columns:
-        max_len = max((len(str(cell.value)) for cell in col if cell.value), default=10)
-        ws.column_dimensions[col[0].column_letter].width = min(max_len + 4, 40)
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=loans_{datetime.now().strftime("%Y%m%d")}.xlsx'
-
-    return response
+    return _write_loan_export(query.order_by(Loan.id), f'loans_{datetime.now().strftime("%Y%m%d")}.xlsx')
 
 
 @reports_bp.route('/export/staff-loans')
 @login_required
 @permission_required('view_reports')
+@background_job('Staff loan report Excel')
 def export_staff_loans():
     """Export staff loans to Excel."""
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment
-
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
     status = request.args.get('status', '')
@@ -1272,156 +1343,63 @@ def export_staff_loans():
     if status:
         query = query.filter_by(status=status)
 
-    loans = query.order_by(Loan.created_at.desc()).all()
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Loan Report'
-
-    headers = [
-        'Loan Number', 'Customer', 'Loan Purpose', 'Calculation Type',
-        'Disbursement Date', 'Loan Amount', 'Interest Rate', 'Installment Amount',
-        'Duration', 'Paid Installments', 'Outstanding Amount', 'Arrears', 'Last Payment Date', 'Last Payment Amount', 'Total Paid', 'Status', 'Referred By', 'Created Date'
-    ]
-
-    header_fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF')
+    return _write_loan_export(query.order_by(Loan.created_at.desc()), f'staff_loans_{datetime.now().strftime("%Y%m%d")}.xlsx')
 
-    ws.append(headers)
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center')
 
-    for loan in loans:
-        if loan.duration_weeks:
-            duration = f"{loan.duration_weeks} weeks"
-        elif loan.duration_months:
-            duration = f"{loan.duration_months} months"
-        else:
-            duration = 'N/A'
+ARREARS_EXPORT_HEADERS = [
+    'Type', 'Reference #', 'Customer', 'Member ID', 'Phone', 'NIC', 'Address', 'Referred By',
+    'Loan Type', 'Disbursement Date', 'Settlement Date', 'Original Amount',
+    'Outstanding', 'Overdue Installments', 'Partial Installments', 'Paid Installments',
+    'Overdue Amount', 'Partial Overdue', 'Advance Balance', 'Days Overdue', 'Status',
+    'Last Payment Date', 'Last Payment Amount'
+]
 
-        referred_by_name = loan.referrer.full_name if loan.referrer else 'N/A'
 
-        arrears_details = loan.get_arrears_details()
-        arrears_amount = float(arrears_details.get('total_overdue_amount', 0))
-        schedule = loan.generate_payment_schedule()
-        paid_installments = len([inst for inst in schedule if inst.get('status') == 'paid']) if schedule else 0
-
-        last_payment = LoanPayment.query.filter_by(loan_id=loan.id).order_by(LoanPayment.payment_date.desc(), LoanPayment.id.desc()).first()
-        total_paid = db.session.query(func.sum(LoanPayment.payment_amount)).filter(LoanPayment.loan_id == loan.id).scalar() or 0
-
-        ws.append([
-            loan.loan_number,
-            loan.customer.full_name if loan.customer else 'N/A',
-            loan.loan_purpose or 'N/A',
-            loan.loan_type or 'N/A',
-            loan.disbursement_date.strftime('%Y-%m-%d') if loan.disbursement_date else 'N/A',
-            float(loan.loan_amount) if loan.loan_amount else 0,
-            float(loan.interest_rate) if loan.interest_rate else 0,
-            float(loan.installment_amount) if loan.installment_amount else 0,
-            duration,
-            paid_installments,
-            float(loan.outstanding_amount) if loan.outstanding_amount else 0,
-            arrears_amount,
-            last_payment.payment_date.strftime('%Y-%m-%d') if last_payment and last_payment.payment_date else 'N/A',
-            float(last_payment.payment_amount) if last_payment else 0,
-            float(total_paid),
-            loan.status or 'N/A',
-            referred_by_name,
-            loan.created_at.strftime('%Y-%m-%d') if loan.created_at else 'N/A'
-        ])
-
-    for col in ws.columns:
-        max_len = max((len(str(cell.value)) for cell in col if cell.value), default=10)
-        ws.column_dimensions[col[0].column_letter].width = min(max_len + 4, 40)
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=staff_loans_{datetime.now().strftime("%Y%m%d")}.xlsx'
-
-    return response
+def _arrears_export_rows(product_type, start_date_obj=None, end_date_obj=None):
+    """Arrears export rows, largest overdue amount first
 
-@reports_bp.route('/export/arrears')
-@login_required
-@permission_required('view_reports')
-def export_arrears():
-    """Export arrears report to CSV with full detail"""
-    from datetime import date, datetime
-    from decimal import Decimal, ROUND_HALF_UP
+    Loan rows stream from the arrears snapshot, which already sorts them; the
+    overdue pawnings are sorted in memory and merged in, after loans on ties.
+    """
+    from datetime import date
+    from decimal import Decimal
     today = date.today()
-    
-    product_type = request.args.get('product_type', '')
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
-    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
-    
-    arrears_data = []
-    
-    # Loan arrears
-    if product_type in ['', 'loan']:
-        loan_query = Loan.query.filter_by(status='active')
-        loan_branch_filter = get_branch_filter_for_query(Loan.branch_id)
-        if loan_branch_filter is not None:
-            loan_query = loan_query.filter(loan_branch_filter)
-        
-        for loan in loan_query.all():
-            details = loan.get_arrears_details()
-            total_overdue = details['total_overdue_amount']
-            if total_overdue <= Decimal('0'):
-                continue
-            
-            schedule = loan.generate_payment_schedule()
-            if start_date_obj or end_date_obj:
-                matching_overdue = [inst for inst in schedule if inst.get('status') in ['overdue', 'partial']
-                                    and (not start_date_obj or inst['due_date'] >= start_date_obj)
-                                    and (not end_date_obj or inst['due_date'] <= end_date_obj)]
-                if not matching_overdue:
-                    continue
-            
+
+    def loan_rows():
+        rows = _arrears_snapshot_query(start_date_obj, end_date_obj).options(
+            joinedload(Loan.customer), joinedload(Loan.referrer)
+        ).order_by(LoanArrearsSnapshot.total_overdue_amount.desc(), Loan.id.asc())
+        for loan, snapshot in rows.yield_per(500):
             disbursed = Decimal(str(loan.disbursed_amount or loan.loan_amount))
             is_past_maturity = loan.maturity_date and loan.maturity_date < today
-            last_payment = LoanPayment.query.filter_by(loan_id=loan.id).order_by(LoanPayment.payment_date.desc(), LoanPayment.id.desc()).first()
-            
-            arrears_data.append({
-                'type': 'Loan',
-                'reference': loan.loan_number,
-                'customer': loan.customer.full_name,
-                'customer_id': loan.customer.customer_id,
-                'phone': loan.customer.phone_primary,
-                'nic': loan.customer.nic_number,
-                'address': f"{loan.customer.address_line1}, {loan.customer.city}, {loan.customer.district}",
-                'referred_by': loan.referrer.full_name if loan.referrer else 'N/A',
-                'loan_type': loan.loan_type,
-                'disbursement_date': loan.disbursement_date.strftime('%Y-%m-%d') if loan.disbursement_date else 'N/A',
-                'maturity_date': loan.maturity_date.strftime('%Y-%m-%d') if loan.maturity_date else 'N/A',
-                'original_amount': float(disbursed),
-                'outstanding': float(loan.outstanding_amount or 0),
-                'overdue_installments': details['overdue_installments'],
-                'partial_installments': details['partial_overdue_installments'],
-                'paid_installments': len([inst for inst in loan.generate_payment_schedule() if inst.get('status') == 'paid']),
-                'overdue_amount': float(total_overdue),
-                'partial_overdue': float(details['partial_overdue_amount']),
-                'advance_balance': float(loan.advance_balance or 0),
-                'days_overdue': details['days_overdue'],
-                'status': 'Past Maturity' if is_past_maturity else 'Installment Overdue',
-                'last_payment_date': last_payment.payment_date.strftime('%Y-%m-%d') if last_payment else 'N/A',
-                'last_payment_amount': float(last_payment.payment_amount) if last_payment else '',
-            })
-    
-    # Pawning arrears
+            yield [
+                'Loan', loan.loan_number, loan.customer.full_name, loan.customer.customer_id,
+                loan.customer.phone_primary, loan.customer.nic_number,
+                f"{loan.customer.address_line1}, {loan.customer.city}, {loan.customer.district}",
+                loan.referrer.full_name if loan.referrer else 'N/A',
+                loan.loan_type,
+                loan.disbursement_date.strftime('%Y-%m-%d') if loan.disbursement_date else 'N/A',
+                loan.maturity_date.strftime('%Y-%m-%d') if loan.maturity_date else 'N/A',
+                float(disbursed),
+                float(loan.outstanding_amount or 0),
+                snapshot.overdue_installments, snapshot.partial_overdue_installments, snapshot.paid_installments,
+                float(snapshot.total_overdue_amount),
+                float(snapshot.partial_overdue_amount or 0),
+                float(loan.advance_balance or 0),
+                snapshot.days_overdue_on(today),
+                'Past Maturity' if is_past_maturity else 'Installment Overdue',
+                snapshot.last_payment_date.strftime('%Y-%m-%d') if snapshot.last_payment_date else 'N/A',
+                float(snapshot.last_payment_amount) if snapshot.last_payment_amount is not None else '',
+            ]
+
+    pawning_rows = []
     if product_type in ['', 'pawning']:
         pawning_query = Pawning.query.filter_by(status='active')
         pawning_branch_filter = get_branch_filter_for_query(Pawning.branch_id)
         if pawning_branch_filter is not None:
             pawning_query = pawning_query.filter(pawning_branch_filter)
         
-        for pawning in pawning_query.all():
+        for pawning in pawning_query.order_by(Pawning.id).all():
             maturity_date = pawning.extended_date or pawning.maturity_date
             if not (maturity_date and maturity_date < today):
                 continue
@@ -1438,149 +1416,389 @@ def export_arrears():
             total_arrears = outstanding_principal + interest_due + penalty
             overdue_days = max(0, (today - maturity_date).days) if maturity_date else 0
             
-            arrears_data.append({
-                'type': 'Pawning',
-                'reference': pawning.pawning_number,
-                'customer': pawning.customer.full_name,
-                'customer_id': pawning.customer.customer_id,
-                'phone': pawning.customer.phone_primary,
-                'nic': pawning.customer.nic_number,
-                'address': f"{pawning.customer.address_line1}, {pawning.customer.city}, {pawning.customer.district}",
-                'referred_by': 'N/A',
-                'loan_type': pawning.item_type,
-                'disbursement_date': pawning.pawning_date.strftime('%Y-%m-%d') if pawning.pawning_date else 'N/A',
-                'maturity_date': maturity_date.strftime('%Y-%m-%d') if maturity_date else 'N/A',
-                'original_amount': float(loan_amount),
-                'outstanding': float(outstanding_principal + interest_due),
-                'overdue_installments': 0,
-                'partial_installments': 0,
-                'paid_installments': 0,
-                'overdue_amount': float(total_arrears),
-                'partial_overdue': 0,
-                'advance_balance': 0,
-                'days_overdue': overdue_days,
-                'status': 'Past Maturity',
-                'last_payment_date': 'N/A',
-                'last_payment_amount': '',
-            })
-    
-    arrears_data.sort(key=lambda x: x['overdue_amount'], reverse=True)
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow([
-        'Type', 'Reference #', 'Customer', 'Member ID', 'Phone', 'NIC', 'Address', 'Referred By',
-        'Loan Type', 'Disbursement Date', 'Settlement Date', 'Original Amount',
-        'Outstanding', 'Overdue Installments', 'Partial Installments', 'Paid Installments',
-        'Overdue Amount', 'Partial Overdue', 'Advance Balance', 'Days Overdue', 'Status',
-        'Last Payment Date', 'Last Payment Amount'
-    ])
-    
-    for item in arrears_data:
-        writer.writerow([
-            item['type'], item['reference'], item['customer'], item['customer_id'],
-            item['phone'], item['nic'], item['address'], item['referred_by'], item['loan_type'],
-            item['disbursement_date'], item['maturity_date'], item['original_amount'],
-            item['outstanding'], item['overdue_installments'], item['partial_installments'], item['paid_installments'],
-            item['overdue_amount'], item['partial_overdue'], item['advance_balance'],
-            item['days_overdue'], item['status'],
-            item['last_payment_date'], item['last_payment_amount']
-        ])
-    
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename=arrears_report_{datetime.now().strftime("%Y%m%d")}.csv'
-    
-    return response
-
-@reports_bp.route('/customer/<int:customer_id>/kyc/<document_type>')
+            pawning_rows.append([
+                'Pawning', pawning.pawning_number, pawning.customer.full_name, pawning.customer.customer_id,
+                pawning.customer.phone_primary, pawning.customer.nic_number,
+                f"{pawning.customer.address_line1}, {pawning.customer.city}, {pawning.customer.district}",
+                'N/A',
+                pawning.item_type,
+                pawning.pawning_date.strftime('%Y-%m-%d') if pawning.pawning_date else 'N/A',
+                maturity_date.strftime('%Y-%m-%d') if maturity_date else 'N/A',
+                float(loan_amount),
+                float(outstanding_principal + interest_due),
+                0, 0, 0,
+                float(total_arrears),
+                0, 0,
+                overdue_days,
+                'Past Maturity',
+                'N/A', '',
+            ])
+    overdue_amount = ARREARS_EXPORT_HEADERS.index('Overdue Amount')
+    pawning_rows.sort(key=lambda row: row[overdue_amount], reverse=True)
+
+    if product_type not in ['', 'loan']:
+        return iter(pawning_rows)
+    return heapq.merge(loan_rows(), pawning_rows, key=lambda row: row[overdue_amount], reverse=True)
+
+
+@reports_bp.route('/export/arrears')
+@reports_bp.route('/export/arrears.<any(csv, "csv.gz"):fmt>')
 @login_required
 @permission_required('view_reports')
-def view_kyc_document(customer_id, document_type):
-    """View customer KYC documents"""
-    customer = Customer.query.get_or_404(customer_id)
-    
-    # Define allowed document types and their corresponding fields
-    document_fields = {
-        'nic_front': customer.nic_front_image,
-        'nic_back': customer.nic_back_image,
-        'photo': customer.photo,
-        'proof_of_address': customer.proof_of_address
-    }
-    
-    if document_type not in document_fields:
-        abort(404)
-    
-    document_path = document_fields[document_type]
-    if not document_path:
-        abort(404, description="Document not found")
-    
-    # Strip leading 'uploads/' if present (handles old DB records)
-    if document_path.startswith('uploads/'):
-        document_path = document_path[len('uploads/'):]
-    
-    # Construct full path
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'app/static/uploads')
-    full_path = os.path.join(upload_folder, document_path)
-    
-    if not os.path.exists(full_path):
-        abort(404, description="Document file not found")
-    
-    # Get directory and filename
-    directory = os.path.dirname(full_path)
-    filename = os.path.basename(full_path)
-    
-    return send_from_directory(directory, filename)
+@background_job('Arrears report CSV')
+def export_arrears(fmt='csv'):
+    """Export arrears report to CSV with full detail"""
+    product_type = request.args.get('product_type', '')
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
 
+    return csv_response(ARREARS_EXPORT_HEADERS, _arrears_export_rows(product_type, start_date_obj, end_date_obj),
+                        f'arrears_report_{datetime.now().strftime("%Y%m%d")}.csv', compress=fmt == 'csv.gz')
 
-@reports_bp.route('/daily-installments')
+def _csv_filename(name):
+    return f'{name}_{datetime.now().strftime("%Y%m%d")}.csv'
+
+
+@reports_bp.route('/export/loans.<any(csv, "csv.gz"):fmt>')
 @login_required
 @permission_required('view_reports')
-def daily_installments_report():
-    """Daily installments report — shows every loan installment due within a date range."""
-    from datetime import date
-    from decimal import Decimal
+@background_job('Loan report ({fmt})')
+def export_loans_csv(fmt):
+    """Stream the loan report, with its filters, as CSV"""
+    query = _loan_report_query(request.args.get('start_date', ''), request.args.get('end_date', ''),
+                               request.args.get('status', ''), request.args.get('loan_purpose', ''))
+    return csv_response(LOAN_EXPORT_HEADERS, _loan_export_rows(query.order_by(Loan.id)),
+                        _csv_filename('loans'), compress=fmt == 'csv.gz')
 
-    today = date.today()
-    start_date_str = request.args.get('start_date', today.strftime('%Y-%m-%d'))
-    end_date_str   = request.args.get('end_date',   today.strftime('%Y-%m-%d'))
-    loan_type_filter = request.args.get('loan_type', '')
 
-    try:
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-        end_date   = datetime.strptime(end_date_str,   '%Y-%m-%d').date()
-    except ValueError:
-        start_date = end_date = today
+@reports_bp.route('/export/collections.<any(csv, "csv.gz"):fmt>')
+@login_required
+@permission_required('view_collection_reports')
+@background_job('Collection report ({fmt})')
+def export_collections_csv(fmt):
+    """Stream the collection report, with its filters, as CSV"""
+    from sqlalchemy.orm import contains_eager
+
+    collection_type = request.args.get('collection_type', '')
+    loan_query, pawning_query = _collection_report_queries(
+        request.args.get('start_date', ''), request.args.get('end_date', ''), request.args.get('payment_method', ''))
+
+    def loan_rows():
+        if collection_type == 'pawning':
+            return
+        query = loan_query.options(
+            contains_eager(LoanPayment.loan).contains_eager(Loan.customer),
+            joinedload(LoanPayment.collected_by_user),
+        ).order_by(LoanPayment.id.desc())
+        for payment in query.yield_per(500):
+            yield payment.payment_date, 'Loan', payment.loan.loan_number, payment.loan.customer.full_name, payment
+
+    def pawning_rows():
+        if collection_type == 'loan':
+            return
+        query = pawning_query.options(
+            contains_eager(PawningPayment.pawning).contains_eager(Pawning.customer),
+            joinedload(PawningPayment.collected_by_user),
+        ).order_by(PawningPayment.id.desc())
+        for payment in query.yield_per(500):
+            yield payment.payment_date, 'Pawning', payment.pawning.pawning_number, payment.pawning.customer.full_name, payment
+
+    def rows():
+        # Both queries are newest first; merge them as the report sorts its combined list
+        for payment_date, kind, reference, member, payment in heapq.merge(
+                loan_rows(), pawning_rows(), key=lambda row: row[0], reverse=True):
+            yield [
+                payment_date.strftime('%Y-%m-%d'),
+                payment.receipt_number or '',
+                kind,
+                reference,
+                member,
+                float(payment.payment_amount or 0),
+                float(payment.principal_amount or 0),
+                float(payment.interest_amount or 0),
+                payment.payment_method or '',
+                payment.collected_by_user.full_name if payment.collected_by_user else '',
+            ]
+
+    headers = ['Date', 'Receipt #', 'Type', 'Reference #', 'Member', 'Amount', 'Principal', 'Interest', 'Method', 'Collected By']
+    return csv_response(headers, rows(), _csv_filename('collections'), compress=fmt == 'csv.gz')
+
+
+def _active_product_counts(customer_ids):
+    """{customer_id: [active loans, active investments, active pawnings]} within the user's branches"""
+    counts = {customer_id: [0, 0, 0] for customer_id in customer_ids}
+    for index, model in enumerate((Loan, Investment, Pawning)):
+        query = db.session.query(model.customer_id, func.count(model.id)).filter(
+            model.customer_id.in_(customer_ids), model.status == 'active'
+        )
+        branch_filter = get_branch_filter_for_query(model.branch_id)
+        if branch_filter is not None:
+            query = query.filter(branch_filter)
+        for customer_id, count in query.group_by(model.customer_id):
+            counts[customer_id][index] = count
+    return counts
+
+
+@reports_bp.route('/export/customers.<any(csv, "csv.gz"):fmt>')
+@login_required
+@permission_required('view_reports')
+@background_job('Member report ({fmt})')
+def export_customers_csv(fmt):
+    """Stream the member report, with its filters, as CSV"""
+    query = _customer_report_query(
+        request.args.get('start_date', ''), request.args.get('end_date', ''), request.args.get('status', ''),
+        request.args.get('kyc_status', ''), request.args.get('district', '')
+    ).order_by(Customer.id)
+
+    def rows():
+        for customers in iter_chunks(query):
+            counts = _active_product_counts([customer.id for customer in customers])
+            for customer in customers:
+                yield [
+                    customer.customer_id,
+                    customer.full_name,
+                    customer.nic_number,
+                    customer.phone_primary,
+                    customer.city or '',
+                    customer.district or '',
+                    'Verified' if customer.kyc_verified else 'Pending',
+                    *counts[customer.id],
+                    customer.created_at.strftime('%Y-%m-%d') if customer.created_at else '',
+                    customer.status or '',
+                ]
+
+    headers = ['Member ID', 'Name', 'NIC', 'Phone', 'City', 'District', 'KYC Status',
+               'Active Loans', 'Active Investments', 'Active Pawnings', 'Registration Date', 'Status']
+    return csv_response(headers, rows(), _csv_filename('customers'), compress=fmt == 'csv.gz')
+
+
+@reports_bp.route('/export/investments.<any(csv, "csv.gz"):fmt>')
+@login_required
+@permission_required('view_borrowings_report')
+@background_job('Borrower report ({fmt})')
+def export_investments_csv(fmt):
+    """Stream the borrower report, with its filters, as CSV"""
+    from app.investments.routes import _display_borrowing_id
+
+    query = _investment_report_query(
+        request.args.get('start_date', ''), request.args.get('end_date', ''), request.args.get('investment_type', '')
+    ).options(joinedload(Investment.customer)).order_by(Investment.id)
+
+    def rows():
+        for investment in query.yield_per(500):
+            yield [
+                _display_borrowing_id(investment.investment_number),
+                investment.customer.full_name if investment.customer else '',
+                investment.investment_type or '',
+                investment.start_date.strftime('%Y-%m-%d') if investment.start_date else '',
+                investment.maturity_date.strftime('%Y-%m-%d') if investment.maturity_date else '',
+                float(investment.principal_amount or 0),
+                float(investment.interest_rate or 0),
+                float(investment.current_amount if investment.current_amount else investment.principal_amount or 0),
+                float(investment.maturity_amount or 0),
+                investment.status or '',
+            ]
+
+    headers = ['Borrower #', 'Member', 'Type', 'Start Date', 'Settlement Date', 'Principal',
+               'Interest Rate', 'Current Amount', 'Maturity Amount', 'Status']
+    return csv_response(headers, rows(), _csv_filename('borrowers'), compress=fmt == 'csv.gz')
+
+
+@reports_bp.route('/export/pawnings.<any(csv, "csv.gz"):fmt>')
+@login_required
+@permission_required('manage_pawnings')
+@background_job('Pawning report ({fmt})')
+def export_pawnings_csv(fmt):
+    """Stream the pawning report, with its filters, as CSV"""
+    query = _pawning_report_query(
+        request.args.get('start_date', ''), request.args.get('end_date', ''),
+        request.args.get('status', ''), request.args.get('item_type', '')
+    ).options(joinedload(Pawning.customer)).order_by(Pawning.id)
+
+    def rows():
+        for pawning in query.yield_per(500):
+            yield [
+                pawning.pawning_number,
+                pawning.customer.full_name if pawning.customer else '',
+                pawning.item_type or '',
+                pawning.item_description or '',
+                pawning.pawning_date.strftime('%Y-%m-%d') if pawning.pawning_date else '',
+                pawning.maturity_date.strftime('%Y-%m-%d') if pawning.maturity_date else '',
+                float(pawning.loan_amount or 0),
+                float(pawning.interest_rate or 0),
+                float(pawning.outstanding_principal or 0),
+                pawning.status or '',
+            ]
+
+    headers = ['Pawning #', 'Member', 'Item Type', 'Description', 'Pawning Date', 'Maturity Date',
+               'Loan Amount', 'Interest Rate', 'Outstanding', 'Status']
+    return csv_response(headers, rows(), _csv_filename('pawnings'), compress=fmt == 'csv.gz')
+
+
+def _get_daily_installment_rows(start_date, end_date, loan_type_filter=''):
+    """Installments of active loans due within a date range, read from loan_installments."""
+    return [row for rows in _iter_daily_installment_rows(start_date, end_date, loan_type_filter) for row in rows]
+
+
+def _iter_daily_installment_rows(start_date, end_date, loan_type_filter='', chunk_size=500, with_payments=True):
+    """_get_daily_installment_rows() in lists of up to chunk_size rows, read with yield_per.
+
+    Without with_payments the rows carry no payment history.
+    """
+    from app.models import LoanInstallment
 
-    # Active loans (status active)
-    loan_query = Loan.query.filter_by(status='active')
+    # Read only: rows are written when loans are activated, edited or paid,
+    # and `python run.py sync-installments` backfills older loans
     loan_branch_filter = get_branch_filter_for_query(Loan.branch_id)
+    installment_query = db.session.query(LoanInstallment, Loan).join(
+        Loan, LoanInstallment.loan_id == Loan.id
+    ).filter(
+        Loan.status == 'active',
+        LoanInstallment.due_date >= start_date,
+        LoanInstallment.due_date <= end_date,
+        LoanInstallment.is_skipped.is_(False)
+    )
     if loan_branch_filter is not None:
-        loan_query = loan_query.filter(loan_branch_filter)
+        installment_query = installment_query.filter(loan_branch_filter)
     if loan_type_filter:
-        loan_query = loan_query.filter_by(loan_type=loan_type_filter)
+        installment_query = installment_query.filter(Loan.loan_type == loan_type_filter)
+    installment_query = installment_query.order_by(
+        LoanInstallment.due_date, Loan.loan_number, LoanInstallment.installment_number
+    )
+
+    for results in iter_chunks(installment_query, chunk_size):
+        yield _daily_installment_rows(results, with_payments)
+
 
-    loans = loan_query.all()
+def _daily_installment_rows(results, with_payments=True):
+    """Report rows for (LoanInstallment, Loan) pairs, with guarantors and payment history."""
+    loans = {loan.id: loan for _, loan in results}
 
-    # Build guarantor lookup: {customer_id: [loan_numbers they guarantee]}
-    # We also pre-fetch guarantor Customer objects keyed by id
-    from app.models import Customer as CustomerModel
+    # Build guarantor lookup: {customer_id: Customer}
     all_customer_ids = set()
-    for loan in loans:
+    for loan in loans.values():
         if loan.guarantor_ids:
             for gid in loan.guarantor_ids.split(','):
                 gid = gid.strip()
                 if gid:
                     all_customer_ids.add(int(gid))
-
     guarantor_map = {}
     if all_customer_ids:
-        gs = CustomerModel.query.filter(CustomerModel.id.in_(all_customer_ids)).all()
+        gs = Customer.query.filter(Customer.id.in_(all_customer_ids)).all()
         guarantor_map = {g.id: g for g in gs}
 
+    guarantors_by_loan = {}
+    for loan in loans.values():
+        guarantors = []
+        if loan.guarantor_ids:
+            for gid in loan.guarantor_ids.split(','):
+                gid = gid.strip()
+                if gid and int(gid) in guarantor_map:
+                    guarantors.append(guarantor_map[int(gid)])
+        guarantors_by_loan[loan.id] = guarantors
+
+    # Payment history for every listed loan in one query
+    payments_by_loan = {loan_id: [] for loan_id in loans}
+    if loans and with_payments:
+        payments = LoanPayment.query.filter(LoanPayment.loan_id.in_(list(loans))).order_by(
+            LoanPayment.payment_date.desc(), LoanPayment.id.desc()
+        ).all()
+        for payment in payments:
+            payments_by_loan[payment.loan_id].append(payment)
+
     rows = []
+    for inst, loan in results:
+        rows.append({
+            'loan': loan,
+            'installment_number': inst.installment_number,
+            'due_date': inst.due_date,
+            'amount': float(inst.amount or 0),
+            'principal': float(inst.principal_amount or 0),
+            'interest': float(inst.interest_amount or 0),
+            'paid_amount': float(inst.paid_amount or 0),
+            'remaining_amount': float(inst.remaining_amount or 0),
+            'status': inst.current_status,
+            'guarantors': guarantors_by_loan[loan.id],
+            'payments': payments_by_loan[loan.id],  # all payments for this loan (history)
+        })
+    return rows
+
+
+DAILY_INSTALLMENT_HEADERS = [
+    'Due Date', 'Loan #', 'Loan Type', 'Inst #',
+    'Customer Name', 'Member ID', 'Phone', 'NIC', 'Address',
+    'Loan Amount', 'Disbursed', 'First Install Date', 'Maturity Date',
+    'Installment Amt', 'Principal', 'Interest',
+    'Paid', 'Remaining', 'Status',
+    'Guarantor 1', 'G1 Phone', 'G1 NIC',
+    'Guarantor 2', 'G2 Phone', 'G2 NIC',
+    'Referred By', 'Staff Approver', 'Manager Approver', 'Final Approver',
+]
+
+
+def _daily_installment_export_row(r):
+    """Export columns, in DAILY_INSTALLMENT_HEADERS order, for one daily installment row"""
+    loan = r['loan']
+    gs   = r['guarantors']
+    g1 = gs[0] if len(gs) > 0 else None
+    g2 = gs[1] if len(gs) > 1 else None
+
+    return [
+        r['due_date'].strftime('%Y-%m-%d'),
+        loan.loan_number,
+        loan.loan_type or '',
+        r['installment_number'],
+        loan.customer.full_name if loan.customer else '',
+        loan.customer.customer_id if loan.customer else '',
+        loan.customer.phone_primary if loan.customer else '',
+        loan.customer.nic_number if loan.customer else '',
+        f"{loan.customer.address_line1 or ''}, {loan.customer.city or ''}" if loan.customer else '',
+        float(loan.loan_amount or 0),
+        float(loan.disbursed_amount or 0),
+        loan.first_installment_date.strftime('%Y-%m-%d') if loan.first_installment_date else '',
+        loan.maturity_date.strftime('%Y-%m-%d') if loan.maturity_date else '',
+        float(r['amount']),
+        float(r['principal']),
+        float(r['interest']),
+        float(r['paid_amount']),
+        float(r['remaining_amount']),
+        r['status'].upper(),
+        g1.full_name if g1 else '',
+        g1.phone_primary if g1 else '',
+        g1.nic_number if g1 else '',
+        g2.full_name if g2 else '',
+        g2.phone_primary if g2 else '',
+        g2.nic_number if g2 else '',
+        loan.referrer.full_name if loan.referrer else '',
+        loan.staff_approver.full_name if loan.staff_approver else '',
+        loan.manager_approver.full_name if loan.manager_approver else '',
+        loan.final_approver.full_name if loan.final_approver else '',
+    ]
+
+
+@reports_bp.route('/daily-installments')
+@login_required
+@permission_required('view_reports')
+def daily_installments_report():
+    """Daily installments report — shows every loan installment due within a date range."""
+    from datetime import date
+    from decimal import Decimal
+
+    today = date.today()
+    start_date_str = request.args.get('start_date', today.strftime('%Y-%m-%d'))
+    end_date_str   = request.args.get('end_date',   today.strftime('%Y-%m-%d'))
+    loan_type_filter = request.args.get('loan_type', '')
+
+    try:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        end_date   = datetime.strptime(end_date_str,   '%Y-%m-%d').date()
+    except ValueError:
+        start_date = end_date = today
+
+    rows = _get_daily_installment_rows(start_date, end_date, loan_type_filter)
+
     summary_total_amount   = Decimal('0')
     summary_total_paid     = Decimal('0')
     summary_total_remaining = Decimal('0')
@@ -1589,55 +1807,16 @@ def daily_installments_report():
     paid_count     = 0
     partial_count  = 0
 
-    for loan in loans:
-        schedule = loan.generate_payment_schedule()
-        payments = loan.payments.order_by(LoanPayment.payment_date.desc()).all()
-
-        # Build guarantors list for this loan
-        guarantors = []
-        if loan.guarantor_ids:
-            for gid in loan.guarantor_ids.split(','):
-                gid = gid.strip()
-                if gid and int(gid) in guarantor_map:
-                    guarantors.append(guarantor_map[int(gid)])
-
-        for inst in schedule:
-            due = inst['due_date']
-            if not (start_date <= due <= end_date):
-                continue
-            if inst.get('is_skipped'):
-                continue
-
-            amount    = Decimal(str(inst['amount']))
-            paid_amt  = Decimal(str(inst['paid_amount']))
-            remaining = Decimal(str(inst['remaining_amount']))
-            status    = inst['status']
-
-            summary_total_amount    += amount
-            summary_total_paid      += paid_amt
-            summary_total_remaining += remaining
-
-            if status == 'overdue':    overdue_count  += 1
-            elif status == 'pending':  pending_count  += 1
-            elif status == 'paid':     paid_count     += 1
-            elif status == 'partial':  partial_count  += 1
-
-            rows.append({
-                'loan': loan,
-                'installment_number': inst['installment_number'],
-                'due_date': due,
-                'amount': float(amount),
-                'principal': inst['principal'],
-                'interest': inst['interest'],
-                'paid_amount': float(paid_amt),
-                'remaining_amount': float(remaining),
-                'status': status,
-                'guarantors': guarantors,
-                'payments': payments,  # all payments for this loan (history)
-            })
+    for r in rows:
+        summary_total_amount    += Decimal(str(r['amount']))
+        summary_total_paid      += Decimal(str(r['paid_amount']))
+        summary_total_remaining += Decimal(str(r['remaining_amount']))
 
-    # Sort by due_date, then loan_number
-    rows.sort(key=lambda r: (r['due_date'], r['loan'].loan_number))
+        status = r['status']
+        if status == 'overdue':    overdue_count  += 1
+        elif status == 'pending':  pending_count  += 1
+        elif status == 'paid':     paid_count     += 1
+        elif status == 'partial':  partial_count  += 1
 
     summary = {
         'total_installments': len(rows),
@@ -1669,12 +1848,11 @@ def daily_installments_report():
 @reports_bp.route('/export/daily-installments')
 @login_required
 @permission_required('view_reports')
+@background_job('Daily installments Excel')
 def export_daily_installments():
     """Export daily installments report to Excel."""
-    import openpyxl
     from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
     from datetime import date
-    from decimal import Decimal
 
     today = date.today()
     start_date_str   = request.args.get('start_date', today.strftime('%Y-%m-%d'))
@@ -1687,65 +1865,7 @@ def export_daily_installments():
     except ValueError:
         start_date = end_date = today
 
-    loan_query = Loan.query.filter_by(status='active')
-    loan_branch_filter = get_branch_filter_for_query(Loan.branch_id)
-    if loan_branch_filter is not None:
-        loan_query = loan_query.filter(loan_branch_filter)
-    if loan_type_filter:
-        loan_query = loan_query.filter_by(loan_type=loan_type_filter)
-    loans = loan_query.all()
-
-    from app.models import Customer as CustomerModel
-    all_customer_ids = set()
-    for loan in loans:
-        if loan.guarantor_ids:
-            for gid in loan.guarantor_ids.split(','):
-                gid = gid.strip()
-                if gid:
-                    all_customer_ids.add(int(gid))
-    guarantor_map = {}
-    if all_customer_ids:
-        gs = CustomerModel.query.filter(CustomerModel.id.in_(all_customer_ids)).all()
-        guarantor_map = {g.id: g for g in gs}
-
-    rows = []
-    for loan in loans:
-        schedule = loan.generate_payment_schedule()
-        payments = loan.payments.order_by(LoanPayment.payment_date.desc()).all()
-        guarantors = []
-        if loan.guarantor_ids:
-            for gid in loan.guarantor_ids.split(','):
-                gid = gid.strip()
-                if gid and int(gid) in guarantor_map:
-                    guarantors.append(guarantor_map[int(gid)])
-
-        for inst in schedule:
-            due = inst['due_date']
-            if not (start_date <= due <= end_date):
-                continue
-            if inst.get('is_skipped'):
-                continue
-            rows.append({
-                'loan': loan,
-                'due_date': due,
-                'installment_number': inst['installment_number'],
-                'amount': inst['amount'],
-                'principal': inst['principal'],
-                'interest': inst['interest'],
-                'paid_amount': inst['paid_amount'],
-                'remaining_amount': inst['remaining_amount'],
-                'status': inst['status'],
-                'guarantors': guarantors,
-                'payments': payments,
-            })
-
-    rows.sort(key=lambda r: (r['due_date'], r['loan'].loan_number))
-
-    wb = openpyxl.Workbook()
-
-    # ── Sheet 1: Installments ──────────────────────────────────────────────
-    ws1 = wb.active
-    ws1.title = 'Installments'
+    export = XlsxStream()
 
     hdr_fill  = PatternFill(start_color='1F4E79', end_color='1F4E79', fill_type='solid')
     hdr_font  = Font(bold=True, color='FFFFFF', size=10)
@@ -1755,119 +1875,75 @@ def export_daily_installments():
     ctr = Alignment(horizontal='center', vertical='center')
     thin = Side(style='thin', color='CCCCCC')
     border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    export.add_style('header', fill=hdr_fill, font=hdr_font, alignment=ctr, border=border)
+    export.add_style('plain', border=border)
+    export.add_style('alt', border=border, fill=alt_fill)
+    export.add_style('overdue', border=border, fill=ovd_fill)
+    export.add_style('paid', border=border, fill=paid_fill)
 
-    headers1 = [
-        'Due Date', 'Loan #', 'Loan Type', 'Inst #',
-        'Customer Name', 'Member ID', 'Phone', 'NIC', 'Address',
-        'Loan Amount', 'Disbursed', 'First Install Date', 'Maturity Date',
-        'Installment Amt', 'Principal', 'Interest',
-        'Paid', 'Remaining', 'Status',
-        'Guarantor 1', 'G1 Phone', 'G1 NIC',
-        'Guarantor 2', 'G2 Phone', 'G2 NIC',
-        'Referred By', 'Staff Approver', 'Manager Approver', 'Final Approver',
-    ]
-    ws1.append(headers1)
-    for cell in ws1[1]:
-        cell.fill = hdr_fill
-        cell.font = hdr_font
-        cell.alignment = ctr
-        cell.border = border
-
-    for i, r in enumerate(rows, start=2):
-        loan = r['loan']
-        gs   = r['guarantors']
-        g1 = gs[0] if len(gs) > 0 else None
-        g2 = gs[1] if len(gs) > 1 else None
-        status = r['status']
+    # ── Sheet 1: Installments ──────────────────────────────────────────────
+    ws1 = export.sheet('Installments', padding=3, max_width=40)
+    # ── Sheet 2: Payment History ──────────────────────────────────────────
+    ws2 = export.sheet('Payment History', padding=3, max_width=35)
 
-        row_data = [
-            r['due_date'].strftime('%Y-%m-%d'),
-            loan.loan_number,
-            loan.loan_type or '',
-            r['installment_number'],
-            loan.customer.full_name if loan.customer else '',
-            loan.customer.customer_id if loan.customer else '',
-            loan.customer.phone_primary if loan.customer else '',
-            loan.customer.nic_number if loan.customer else '',
-            f"{loan.customer.address_line1 or ''}, {loan.customer.city or ''}" if loan.customer else '',
-            float(loan.loan_amount or 0),
-            float(loan.disbursed_amount or 0),
-            loan.first_installment_date.strftime('%Y-%m-%d') if loan.first_installment_date else '',
-            loan.maturity_date.strftime('%Y-%m-%d') if loan.maturity_date else '',
-            float(r['amount']),
-            float(r['principal']),
-            float(r['interest']),
-            float(r['paid_amount']),
-            float(r['remaining_amount']),
-            status.upper(),
-            g1.full_name if g1 else '',
-            g1.phone_primary if g1 else '',
-            g1.nic_number if g1 else '',
-            g2.full_name if g2 else '',
-            g2.phone_primary if g2 else '',
-            g2.nic_number if g2 else '',
-            loan.referrer.full_name if loan.referrer else '',
-            loan.staff_approver.full_name if loan.staff_approver else '',
-            loan.manager_approver.full_name if loan.manager_approver else '',
-            loan.final_approver.full_name if loan.final_approver else '',
-        ]
-        ws1.append(row_data)
-        row_fill = ovd_fill if status == 'overdue' else (paid_fill if status == 'paid' else (alt_fill if i % 2 == 0 else None))
-        for cell in ws1[i]:
-            cell.border = border
-            if row_fill:
-                cell.fill = row_fill
+    ws1.append(DAILY_INSTALLMENT_HEADERS, style='header')
+    hdr2 = ['Loan #', 'Customer', 'Payment Date', 'Receipt #', 'Amount', 'Principal', 'Interest', 'Penalty', 'Balance After', 'Method', 'Collected By']
+    ws2.append(hdr2, style='header')
+
+    seen_loans = set()  # only write each loan's history once
+    for rows in _iter_daily_installment_rows(start_date, end_date, loan_type_filter):
+        for r in rows:
+            loan = r['loan']
+            status = r['status']
+            row_data = _daily_installment_export_row(r)
+            i = ws1.row_count + 1
+            ws1.append(row_data, style='overdue' if status == 'overdue' else ('paid' if status == 'paid' else ('alt' if i % 2 == 0 else 'plain')))
+
+            if loan.id in seen_loans:
+                continue
+            seen_loans.add(loan.id)
+            for p in r['payments']:
+                seen_row = ws2.row_count + 1
+                ws2.append([
+                    loan.loan_number,
+                    loan.customer.full_name if loan.customer else '',
+                    p.payment_date.strftime('%Y-%m-%d') if p.payment_date else '',
+                    p.receipt_number or '',
+                    float(p.payment_amount or 0),
+                    float(p.principal_amount or 0),
+                    float(p.interest_amount or 0),
+                    float(p.penalty_amount or 0),
+                    float(p.balance_after or 0),
+                    p.payment_method or '',
+                    p.collected_by_user.full_name if p.collected_by else '',
+                ], style='alt' if seen_row % 2 == 0 else 'plain')
+
+    return export.response(f'daily_installments_{start_date_str}_to_{end_date_str}.xlsx')
+
+
+@reports_bp.route('/export/daily-installments.<any(csv, "csv.gz"):fmt>')
+@login_required
+@permission_required('view_reports')
+@background_job('Daily installments ({fmt})')
+def export_daily_installments_csv(fmt):
+    """Stream the daily installments report as CSV, without the payment history sheet."""
+    from datetime import date
+
+    today = date.today()
+    start_date_str   = request.args.get('start_date', today.strftime('%Y-%m-%d'))
+    end_date_str     = request.args.get('end_date',   today.strftime('%Y-%m-%d'))
+    loan_type_filter = request.args.get('loan_type', '')
+
+    try:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        end_date   = datetime.strptime(end_date_str,   '%Y-%m-%d').date()
+    except ValueError:
+        start_date = end_date = today
 
-    for col in ws1.columns:
-        max_len = max((len(str(cell.value)) for cell in col if cell.value), default=10)
-        ws1.column_dimensions[col[0].column_letter].width = min(max_len + 3, 40)
+    def rows():
+        for chunk in _iter_daily_installment_rows(start_date, end_date, loan_type_filter, with_payments=False):
+            for r in chunk:
+                yield _daily_installment_export_row(r)
 
-    # ── Sheet 2: Payment History ──────────────────────────────────────────
-    ws2 = wb.create_sheet('Payment History')
-    hdr2 = ['Loan #', 'Customer', 'Payment Date', 'Receipt #', 'Amount', 'Principal', 'Interest', 'Penalty', 'Balance After', 'Method', 'Collected By']
-    ws2.append(hdr2)
-    for cell in ws2[1]:
-        cell.fill = hdr_fill
-        cell.font = hdr_font
-        cell.alignment = ctr
-        cell.border = border
-
-    seen_loans = {r['loan'].id for r in rows}
-    seen_row = 2
-    for r in rows:
-        if r['loan'].id not in seen_loans:
-            continue
-        seen_loans.discard(r['loan'].id)  # only write each loan's history once
-        for p in r['payments']:
-            ws2.append([
-                r['loan'].loan_number,
-                r['loan'].customer.full_name if r['loan'].customer else '',
-                p.payment_date.strftime('%Y-%m-%d') if p.payment_date else '',
-                p.receipt_number or '',
-                float(p.payment_amount or 0),
-                float(p.principal_amount or 0),
-                float(p.interest_amount or 0),
-                float(p.penalty_amount or 0),
-                float(p.balance_after or 0),
-                p.payment_method or '',
-                p.collected_by_user.full_name if p.collected_by else '',
-            ])
-            for cell in ws2[seen_row]:
-                cell.border = border
-                if seen_row % 2 == 0:
-                    cell.fill = alt_fill
-            seen_row += 1
-
-    for col in ws2.columns:
-        max_len = max((len(str(cell.value)) for cell in col if cell.value), default=10)
-        ws2.column_dimensions[col[0].column_letter].width = min(max_len + 3, 35)
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    fname = f'daily_installments_{start_date_str}_to_{end_date_str}.xlsx'
-    response.headers['Content-Disposition'] = f'attachment; filename={fname}'
-    return response
+    return csv_response(DAILY_INSTALLMENT_HEADERS, rows(),
+                        f'daily_installments_{start_date_str}_to_{end_date_str}.csv', compress=fmt == 'csv.gz')
@@ -379,6 +379,14 @@ def get_role_permissions(role):
     permissions = UserForm.get_role_permissions(role)
     return jsonify(permissions)
 
+@settings_bp.route('/api/cache-stats')
+@login_required
+@admin_required
+def cache_stats():
+    """API endpoint exposing schedule and report cache sizes and hit/miss counters"""
+    from app.utils.cache import report_cache, schedule_cache
+    return jsonify({'schedule_cache': schedule_cache.stats(), 'report_cache': report_cache.stats()})
+
 @settings_bp.route('/users/bulk-update-permissions', methods=['POST'])
 @login_required
 @admin_required
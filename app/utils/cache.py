@@ -0,0 +1,288 @@
+"""In-process and shared result caches"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a size bound, optional TTL and hit/miss counters
+
+    With maxbytes the entries' pickled sizes are also kept under that total;
+    a value larger than maxbytes on its own is not stored.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, maxbytes=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def _remove(self, key):
+        self._data.pop(key, None)
+        self.nbytes -= self._sizes.pop(key, 0)
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        size = 0
+        if self.maxbytes:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            if size > self.maxbytes:
+                self.delete(key)
+                return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (value, expires_at)
+            if size:
+                self._sizes[key] = size
+                self.nbytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes and self.nbytes > self.maxbytes):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'bytes': self.nbytes,
+                'maxbytes': self.maxbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class FileSystemCache:
+    """Pickle-per-key cache in a shared directory, visible to every worker on the host
+
+    Keys carry versions, so superseded entries are never read again. Every
+    threshold // 10 writes the directory is pruned: expired entries and
+    leftover temporary files go, then the oldest entries until no more than
+    threshold remain.
+    """
+
+    # Seconds after which a temporary file is taken to be left by a dead writer
+    TMP_MAX_AGE = 300
+
+    def __init__(self, directory, ttl=None, threshold=1000):
+        self.directory = directory
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.cache')
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            if self.ttl and os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'rb') as fh:
+                stored_key, value = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return default
+        if stored_key != key:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        # Write then rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump((key, value), fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        self._writes += 1
+        if self._writes % max(self.threshold // 10, 1) == 0:
+            self.prune()
+
+    def prune(self):
+        """Delete expired entries, then the oldest ones beyond threshold; returns the number deleted"""
+        now = time.time()
+        entries = []
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+                if name.endswith('.tmp'):
+                    if mtime + self.TMP_MAX_AGE < now:
+                        os.remove(path)
+                        removed += 1
+                elif name.endswith('.cache'):
+                    if self.ttl and mtime + self.ttl < now:
+                        os.remove(path)
+                        removed += 1
+                    else:
+                        entries.append((mtime, path))
+            except OSError:
+                # Removed by another worker meanwhile
+                continue
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.threshold, 0)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        self.pruned += removed
+        return removed
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'directory': self.directory,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'pruned': self.pruned,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TieredCache:
+    """Local LRU in front of an optional shared layer; shared hits are promoted locally"""
+
+    def __init__(self, maxsize=1024, ttl=None, shared=None, maxbytes=None):
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl, maxbytes=maxbytes)
+        self.shared = shared
+
+    @property
+    def enabled(self):
+        return self.local.maxsize > 0
+
+    def configure(self, maxsize=1024, ttl=None, shared_dir=None, maxbytes=None, shared_threshold=1000):
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl, maxbytes=maxbytes)
+        self.shared = None
+        if shared_dir and maxsize > 0:
+            self.shared = FileSystemCache(shared_dir, ttl=ttl, threshold=shared_threshold)
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            return default
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.shared is not None:
+            value = self.shared.get(key, _MISSING)
+            if value is not _MISSING:
+                self.local.set(key, value)
+                return value
+        return default
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        stats = {'local': self.local.stats()}
+        if self.shared is not None:
+            stats['shared'] = self.shared.stats()
+        return stats
+
+
+# Loan payment schedules, keyed by Loan.schedule_cache_key()
+schedule_cache = TieredCache()
+
+# Rendered report pages, keyed by app.reports.cache.report_key()
+report_cache = TieredCache()
+
+# Dashboard counters per branch, see app.main.stats
+dashboard_cache = TieredCache()
+
+
+def init_cache(app):
+    """Configure the module-level caches from app config"""
+    schedule_cache.configure(
+        maxsize=app.config.get('SCHEDULE_CACHE_SIZE', 2048),
+        ttl=app.config.get('SCHEDULE_CACHE_TTL', 900),
+        shared_dir=app.config.get('SCHEDULE_CACHE_DIR'),
+        shared_threshold=app.config.get('SCHEDULE_CACHE_DIR_THRESHOLD', 10000),
+    )
+    report_cache.configure(
+        maxsize=app.config.get('REPORT_CACHE_SIZE', 256),
+        ttl=app.config.get('REPORT_CACHE_TTL', 300),
+        shared_dir=app.config.get('REPORT_CACHE_DIR'),
+        shared_threshold=app.config.get('REPORT_CACHE_DIR_THRESHOLD', 1000),
+        maxbytes=app.config.get('REPORT_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+    )
+    dashboard_cache.configure(
+        maxsize=app.config.get('DASHBOARD_CACHE_SIZE', 128),
+        ttl=app.config.get('DASHBOARD_CACHE_TTL', 30),
+    )
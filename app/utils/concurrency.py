@@ -0,0 +1,38 @@
+"""Retrying writes that lose an optimistic version check
+
+Loan, Pawning and Investment carry a version_id that SQLAlchemy checks and
+bumps on every UPDATE. When two requests post against the same record, the
+one that commits second gets StaleDataError instead of silently overwriting
+the first one's balances. retry_on_conflict() rolls back, which expires
+every loaded object, and runs the work again on fresh rows.
+"""
+import random
+import time
+
+from flask import current_app
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import db
+
+
+def retry_on_conflict(work, attempts=None):
+    """Run work() and commit, retrying on StaleDataError up to VERSION_CONFLICT_ATTEMPTS times
+
+    work must load what it changes through the session (a retry sees only
+    expired objects) and must not commit. Returns work()'s result; other
+    exceptions propagate with the transaction left for the caller to roll
+    back.
+    """
+    attempts = attempts or current_app.config['VERSION_CONFLICT_ATTEMPTS']
+    for attempt in range(1, attempts + 1):
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except StaleDataError:
+            db.session.rollback()
+            if attempt == attempts:
+                raise
+            current_app.logger.info('Version conflict, retrying (attempt %d of %d)', attempt + 1, attempts)
+            # Jitter so the conflicting writers do not collide again
+            time.sleep(random.uniform(0, 0.01 * attempt))
@@ -0,0 +1,198 @@
+"""Streaming spreadsheet exports
+
+XlsxStream writes workbooks with openpyxl's write-only mode, so cells are
+never held as a worksheet in memory. Write-only sheets need their column
+widths before the first row, so appended rows are spooled to a temporary
+file while running maximum widths are kept, then replayed into the workbook
+when the export is finished. The saved file is sent to the client in chunks.
+
+csv_response() streams CSV, optionally gzip-compressed, straight from a row
+iterator: the header goes out at once and later rows as they are read.
+"""
+import csv
+import io
+import pickle
+import tempfile
+import zlib
+
+from flask import Response, stream_with_context
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+CSV_MIMETYPE = 'text/csv'
+
+GZIP_MIMETYPE = 'application/gzip'
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_chunks(query, size=500):
+    """Lists of up to size results from a query read with yield_per(size)"""
+    chunk = []
+    for item in query.yield_per(size):
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class StreamSheet:
+    """One worksheet of an XlsxStream
+
+    Widths are fitted as the old in-memory exports did: the longest value in
+    the column (10 when the column is empty) plus padding, capped at max_width.
+    Columns given in widths keep that width instead.
+    """
+
+    def __init__(self, stream, title, padding=4, max_width=40, widths=None):
+        self.stream = stream
+        self.title = title
+        self.padding = padding
+        self.max_width = max_width
+        self.widths = dict(widths or {})
+        self.row_heights = {}
+        self.freeze_panes = None
+        self.row_count = 0
+        self._max_lengths = []
+        self._spool = tempfile.TemporaryFile()
+
+    def append(self, values, style=None):
+        """Spool one row; style is a style name, or a list of names per cell"""
+        values = list(values)
+        for index, value in enumerate(values):
+            if index >= len(self._max_lengths):
+                self._max_lengths.append(None)
+            if value:
+                length = len(str(value))
+                if self._max_lengths[index] is None or length > self._max_lengths[index]:
+                    self._max_lengths[index] = length
+        pickle.dump((values, style), self._spool, pickle.HIGHEST_PROTOCOL)
+        self.row_count += 1
+        return self.row_count
+
+    def _rows(self):
+        self._spool.seek(0)
+        while True:
+            try:
+                yield pickle.load(self._spool)
+            except EOFError:
+                break
+
+    def _write(self, ws):
+        for index, length in enumerate(self._max_lengths, start=1):
+            width = self.widths.get(index)
+            if width is None:
+                width = min((10 if length is None else length) + self.padding, self.max_width)
+            ws.column_dimensions[get_column_letter(index)].width = width
+        # Write-only rows take their height when written, so set them all first
+        for row_number, height in self.row_heights.items():
+            ws.row_dimensions[row_number].height = height
+        if self.freeze_panes:
+            ws.freeze_panes = self.freeze_panes
+
+        styles = self.stream.styles
+        for values, style in self._rows():
+            if style is None:
+                ws.append(values)
+            else:
+                cells = []
+                for index, value in enumerate(values):
+                    name = style[index] if isinstance(style, list) else style
+                    cell = WriteOnlyCell(ws, value=value)
+                    for attribute, setting in styles.get(name, {}).items():
+                        setattr(cell, attribute, setting)
+                    cells.append(cell)
+                ws.append(cells)
+        self._spool.close()
+
+
+class XlsxStream:
+    """Write-only workbook assembled from spooled rows and streamed as a response"""
+
+    def __init__(self):
+        self.sheets = []
+        self.styles = {}
+
+    def add_style(self, name, **attributes):
+        """Register cell attributes (font, fill, border, alignment) under a name"""
+        self.styles[name] = attributes
+
+    def sheet(self, title, **options):
+        sheet = StreamSheet(self, title, **options)
+        self.sheets.append(sheet)
+        return sheet
+
+    def save(self, fileobj):
+        wb = Workbook(write_only=True)
+        for sheet in self.sheets:
+            sheet._write(wb.create_sheet(sheet.title))
+        wb.save(fileobj)
+
+    def response(self, filename):
+        """Save to a temporary file and stream it back in chunks"""
+        output = tempfile.TemporaryFile()
+        self.save(output)
+        output.seek(0)
+
+        def generate():
+            try:
+                while True:
+                    data = output.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    yield data
+            finally:
+                output.close()
+
+        response = Response(generate(), mimetype=XLSX_MIMETYPE)
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
+
+
+def iter_csv(header, rows, compress=False, batch_size=500):
+    """Encoded CSV for header and rows, one chunk per batch_size rows
+
+    With compress the chunks form a single gzip stream.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    def take():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else data
+
+    writer.writerow(header)
+    yield take()
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_size:
+            yield take()
+            pending = 0
+    data = take() if pending else b''
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
+
+
+def csv_response(header, rows, filename, compress=False):
+    """Streamed CSV (or .csv.gz with compress) attachment for a row iterator
+
+    rows is consumed while the response is sent, inside the request context.
+    """
+    if compress:
+        filename += '.gz'
+    response = Response(stream_with_context(iter_csv(header, rows, compress)),
+                        mimetype=GZIP_MIMETYPE if compress else CSV_MIMETYPE)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
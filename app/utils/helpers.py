@@ -5,7 +5,7 @@ from datetime import datetime
 import pytz
 from flask import current_app, session
 from werkzeug.utils import secure_filename
-from app.models import Customer, Loan, Investment, Pawning, Branch
+from app.models import Loan, Branch
 
 def get_system_timezone():
     """Get the configured system timezone from settings"""
@@ -107,34 +107,9 @@ def generate_customer_id(customer_type='customer', branch_id=None):
     
     prefix = type_prefixes.get(customer_type, 'C')
     
-    # Find the highest number for this prefix pattern in this branch
-    # This ensures we don't generate duplicate IDs regardless of customer type
-    try:
-        prefix_pattern = f"{branch_code}/{prefix}/%"
-        customers_with_prefix = Customer.query.filter(
-            Customer.customer_id.like(prefix_pattern),
-            Customer.branch_id == branch_id
-        ).all()
-        
-        if customers_with_prefix:
-            # Extract all numbers from customer IDs with this prefix
-            numbers = []
-            for customer in customers_with_prefix:
-                try:
-                    number = int(customer.customer_id.split('/')[-1])
-                    numbers.append(number)
-                except (ValueError, IndexError):
-                    pass
-            
-            if numbers:
-                new_number = max(numbers) + 1
-            else:
-                new_number = 1
-        else:
-            new_number = 1
-    except:
-        # Handle case where database is not available (e.g., testing)
-        new_number = 1
+    # Next number of this prefix, from its number_sequences row
+    from app.utils.sequences import next_number
+    new_number = next_number('customer', branch_code, prefix)
     
     return f"{branch_code}/{prefix}/{new_number:04d}"
 
@@ -190,72 +165,94 @@ def generate_loan_number(loan_type=None, branch_id=None):
     # Get loan type code
     type_code = get_loan_type_code(loan_type) if loan_type else 'ML'
     
-    # Find the last loan with the same year, branch, and type
-    # This ensures sequential numbering per branch, type, and year
-    try:
-        # Query pattern: "26/B01/WS/%"
-        pattern = f"{year}/{branch_code}/{type_code}/%"
-        last_loan = Loan.query.filter(
-            Loan.loan_number.like(pattern)
-        ).order_by(Loan.id.desc()).first()
-        
-        if last_loan:
-            # Extract the sequential number from the loan_number
-            try:
-                parts = last_loan.loan_number.split('/')
-                if len(parts) == 4:
-                    last_number = int(parts[3])
-                    new_number = last_number + 1
-                else:
-                    new_number = 1
-            except (ValueError, IndexError):
-                new_number = 1
-        else:
-            new_number = 1
-    except:
-        # Handle case where database is not available (e.g., testing)
-        new_number = 1
+    # Sequential numbering per branch, type, and year, from number_sequences
+    from app.utils.sequences import next_number
+    new_number = next_number('loan', branch_code, type_code, int(year))
     
     return f"{year}/{branch_code}/{type_code}/{new_number:05d}"
 
 def generate_investment_number(prefix='INV'):
     """Generate unique investment number"""
-    last_investment = Investment.query.order_by(Investment.id.desc()).first()
-    if last_investment:
-        last_number = int(last_investment.investment_number.replace(prefix, ''))
-        new_number = last_number + 1
-    else:
-        new_number = 1
-    
+    from app.utils.sequences import next_number
+    new_number = next_number('investment', type_code=prefix)
     return f"{prefix}{new_number:06d}"
 
 def generate_pawning_number(prefix='PWN'):
     """Generate unique pawning number"""
-    last_pawning = Pawning.query.order_by(Pawning.id.desc()).first()
-    if last_pawning:
-        last_number = int(last_pawning.pawning_number.replace(prefix, ''))
-        new_number = last_number + 1
-    else:
-        new_number = 1
-    
+    from app.utils.sequences import next_number
+    new_number = next_number('pawning', type_code=prefix)
     return f"{prefix}{new_number:06d}"
 
-def generate_receipt_number(entity_type='LOAN', entity_id=None):
+def generate_receipt_number(entity_type='LOAN', branch_id=None):
     """Generate unique receipt number for payments
     
     Args:
-        entity_type: Type of entity (LOAN, PWN, INV, etc.)
-        entity_id: ID of the related entity
+        entity_type: Type of entity (LOAN, PWN, etc.)
+        branch_id: Branch whose receipt sequence numbers the payment
     
     Returns:
-        Receipt number in format: LOAN-RCP-{id}-{timestamp}
-        Example: LOAN-RCP-123-20260217130530
+        Receipt number formatted with RECEIPT_NUMBER_FORMAT
+        Example: LOAN-B001-00000123
     """
-    timestamp = get_current_time().strftime("%Y%m%d%H%M%S")
-    if entity_id:
-        return f"{entity_type}-RCP-{entity_id}-{timestamp}"
-    else:
-        return f"{entity_type}-RCP-{timestamp}"
+    from app.utils.sequences import next_receipt_number
+    return next_receipt_number(entity_type, branch_id)
+
+def materialize_loan_installments(loan_query=None, only_missing=True):
+    """Write loan_installments rows for the loans in a query
+    
+    Args:
+        loan_query: Loan query to materialize (defaults to every loan)
+        only_missing: Skip loans that already have installment rows
+    
+    Returns:
+        Number of loans synced
+    """
+    from app.models import db
+    if loan_query is None:
+        loan_query = Loan.query
+    if only_missing:
+        loan_query = loan_query.filter(~Loan.installments.any())
+
+    synced = 0
+    for loan in loan_query.all():
+        loan.sync_installments()
+        synced += 1
+    if synced:
+        db.session.commit()
+    return synced
+
+def refresh_arrears_snapshots(loan_query=None, stale_only=False, chunk_size=500):
+    """Rewrite loan_arrears_snapshot rows for the loans in a query, in chunks
+    
+    Args:
+        loan_query: Loan query to refresh (defaults to every active loan)
+        stale_only: Only loans with no snapshot or one taken before today
+        chunk_size: Loans loaded, refreshed and committed together
+    
+    Returns:
+        Number of loans refreshed
+    """
+    from datetime import date
+    from sqlalchemy.orm import selectinload
+    from app.models import db, LoanArrearsSnapshot
+    from app.loans.financial_state import LoanFinancialState
+    if loan_query is None:
+        loan_query = Loan.query.filter(Loan.status == 'active')
+    if stale_only:
+        loan_query = loan_query.outerjoin(LoanArrearsSnapshot, LoanArrearsSnapshot.loan_id == Loan.id).filter(
+            db.or_(LoanArrearsSnapshot.id.is_(None), LoanArrearsSnapshot.as_of < date.today())
+        )
+
+    loan_ids = [loan_id for (loan_id,) in loan_query.with_entities(Loan.id).order_by(Loan.id).all()]
+    for start in range(0, len(loan_ids), chunk_size):
+        loans = Loan.query.filter(Loan.id.in_(loan_ids[start:start + chunk_size])).options(
+            selectinload(Loan.arrears_snapshot)
+        ).all()
+        states = LoanFinancialState.for_loans(loans, chunk_size=chunk_size)
+        for loan in loans:
+            loan.refresh_arrears_snapshot(states[loan.id])
+        db.session.commit()
+    return len(loan_ids)
 
 def format_currency(amount, currency_symbol='Rs.'):
     """Format amount as currency"""
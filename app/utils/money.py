@@ -0,0 +1,61 @@
+"""Integer-cents money arithmetic
+
+Amounts are carried as ``int`` cents and interest rates as ``int`` hundredths
+of a percent, so sums and comparisons are exact. Every division states its
+rounding rule explicitly:
+
+* ``div_half_up``  - nearest cent, ties away from zero (Decimal ROUND_HALF_UP)
+* ``div_up``       - away from zero (Decimal ROUND_UP)
+
+Values are converted at the edges only: ``to_cents`` on the way in and
+``cents_to_float`` / ``cents_to_decimal`` on the way out.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+_ONE = Decimal('1')
+
+
+def to_cents(value):
+    """Convert an amount (Decimal, float, int, str or None) to int cents, rounding half up"""
+    if value is None:
+        return 0
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value * 100
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return int((value * 100).quantize(_ONE, rounding=ROUND_HALF_UP))
+
+
+def rate_to_bp(rate):
+    """Convert a percentage rate (e.g. 12.5) to int hundredths of a percent (1250)"""
+    return to_cents(rate)
+
+
+def cents_to_decimal(cents):
+    """Return int cents as a 2dp Decimal"""
+    return Decimal(cents).scaleb(-2)
+
+
+def cents_to_float(cents):
+    """Return int cents as a float amount"""
+    return cents / 100
+
+
+def div_half_up(numerator, denominator):
+    """Integer division rounded to nearest, ties away from zero"""
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def div_up(numerator, denominator):
+    """Integer division rounded away from zero"""
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
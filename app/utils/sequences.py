@@ -0,0 +1,205 @@
+"""Receipt and document number sequences
+
+receipt_sequences holds the next unclaimed receipt number of each (branch,
+product). A worker claims a block of RECEIPT_NUMBER_BLOCK numbers with one
+UPDATE in a short transaction of its own and hands them out from memory, so
+posting a receipt needs no database round trip until the block runs out and
+concurrent workers never share a number. Numbers are formatted with
+RECEIPT_NUMBER_FORMAT.
+
+Receipt numbers are unique and increase within a worker, but the unused part
+of a block is skipped when the worker exits, and receipts of different
+workers interleave.
+
+number_sequences holds the last customer id, loan, pawning and investment
+number issued per prefix. next_number() increments it in the caller's
+transaction, so the row stays locked until the new record is committed and a
+rolled back creation gives its number back. A sequence row is created from
+the highest number already in use the first time it is needed;
+`python run.py seed-sequences` creates them all up front.
+"""
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, insert, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app import db
+from app.models import (Branch, Customer, Investment, Loan, NumberSequence, Pawning, ReceiptSequence,
+                        SystemSettings)
+
+# Sequence of receipts without a branch
+NO_BRANCH = 0
+NO_BRANCH_CODE = '000'
+
+
+class ReceiptBlocks:
+    """Receipt numbers this worker has claimed: [next, end) ranges per (branch_id, product)"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.ranges = {}
+        self.branch_codes = {}
+
+    def available(self, key):
+        return sum(end - start for start, end in self.ranges.get(key, ()))
+
+    def take(self, key):
+        ranges = self.ranges[key]
+        number = ranges[0][0]
+        ranges[0][0] += 1
+        if ranges[0][0] >= ranges[0][1]:
+            ranges.pop(0)
+        return number
+
+
+def _blocks():
+    return current_app.extensions.setdefault('receipt_blocks', ReceiptBlocks())
+
+
+def _insert_missing(connection, table, values, key_columns):
+    """Insert a sequence row unless one with the same key exists"""
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        stmt = (postgresql if dialect == 'postgresql' else sqlite).insert(table).values(**values)
+        connection.execute(stmt.on_conflict_do_nothing(index_elements=list(key_columns)))
+    elif dialect in ('mysql', 'mariadb'):
+        connection.execute(mysql.insert(table).values(**values).prefix_with('IGNORE'))
+    else:
+        key = and_(*(table.c[name] == values[name] for name in key_columns))
+        if connection.execute(select(table.c.id).where(key)).first() is None:
+            connection.execute(insert(table).values(**values))
+
+
+def _increment(connection, table, key, column, amount):
+    """Add amount to column of the row matching key; returns the new value, or None without a row
+
+    The UPDATE locks the row until the transaction ends, so the value read
+    back is this increment's.
+    """
+    stmt = update(table).where(key).values({column: table.c[column] + amount, 'updated_at': datetime.utcnow()})
+    if connection.dialect.update_returning:
+        return connection.execute(stmt.returning(table.c[column])).scalar()
+    if not connection.execute(stmt).rowcount:
+        return None
+    return connection.execute(select(table.c[column]).where(key)).scalar()
+
+
+def claim_block(branch_id, product, size):
+    """Advance a sequence by size in its own transaction; returns the first claimed number"""
+    table = ReceiptSequence.__table__
+    key = (table.c.branch_id == branch_id) & (table.c.product == product)
+    values = {'branch_id': branch_id, 'product': product, 'next_value': 1, 'updated_at': datetime.utcnow()}
+    with db.engine.begin() as connection:
+        _insert_missing(connection, table, values, ('branch_id', 'product'))
+        end = _increment(connection, table, key, 'next_value', size)
+    return end - size
+
+
+def reserve_receipt_numbers(product, branch_id, count):
+    """Make sure this worker holds at least count unused numbers of (branch, product)
+
+    Call before writing anything in the transaction that uses them: a claim
+    runs on a connection of its own, and SQLite allows only one writer.
+    """
+    blocks = _blocks()
+    key = (branch_id or NO_BRANCH, product)
+    with blocks.lock:
+        missing = count - blocks.available(key)
+        if missing > 0:
+            size = max(missing, current_app.config['RECEIPT_NUMBER_BLOCK'])
+            start = claim_block(key[0], product, size)
+            blocks.ranges.setdefault(key, []).append([start, start + size])
+        if key[0] not in blocks.branch_codes:
+            code = db.session.execute(select(Branch.branch_code).where(Branch.id == key[0])).scalar()
+            blocks.branch_codes[key[0]] = code or NO_BRANCH_CODE
+
+
+def next_receipt_number(product='LOAN', branch_id=None):
+    """Take the next receipt number of (branch, product), formatted with RECEIPT_NUMBER_FORMAT"""
+    blocks = _blocks()
+    key = (branch_id or NO_BRANCH, product)
+    with blocks.lock:
+        reserve_receipt_numbers(product, branch_id, 1)
+        number = blocks.take(key)
+        branch_code = blocks.branch_codes[key[0]]
+    return current_app.config['RECEIPT_NUMBER_FORMAT'].format(product=product, branch=branch_code, number=number)
+
+
+# Column holding each entity's numbers
+NUMBER_COLUMNS = {
+    'customer': Customer.customer_id,
+    'loan': Loan.loan_number,
+    'pawning': Pawning.pawning_number,
+    'investment': Investment.investment_number,
+}
+NUMBER_KEY = ('entity', 'branch_code', 'type_code', 'year')
+
+
+def number_prefix(entity, branch_code='', type_code='', year=0):
+    """Text before the sequential number: BR/C/ for customers, 26/B01/WS/ for loans, the prefix otherwise"""
+    if entity == 'customer':
+        return f'{branch_code}/{type_code}/'
+    if entity == 'loan':
+        return f'{year:02d}/{branch_code}/{type_code}/'
+    return type_code
+
+
+def highest_number(entity, branch_code='', type_code='', year=0):
+    """Highest sequential number already used with a prefix, from the entity's table"""
+    column = NUMBER_COLUMNS[entity]
+    prefix = number_prefix(entity, branch_code, type_code, year)
+    highest = 0
+    for value in db.session.scalars(select(column).where(column.startswith(prefix, autoescape=True))):
+        suffix = value[len(prefix):]
+        if suffix.isdigit():
+            highest = max(highest, int(suffix))
+    return highest
+
+
+def next_number(entity, branch_code='', type_code='', year=0):
+    """Increment a number sequence in the current transaction and return the new number"""
+    table = NumberSequence.__table__
+    values = dict(zip(NUMBER_KEY, (entity, branch_code, type_code, year)))
+    key = and_(*(table.c[name] == value for name, value in values.items()))
+    connection = db.session.connection()
+    number = _increment(connection, table, key, 'last_value', 1)
+    if number is None:
+        seed = highest_number(entity, branch_code, type_code, year)
+        _insert_missing(connection, table, dict(values, last_value=seed, updated_at=datetime.utcnow()), NUMBER_KEY)
+        number = _increment(connection, table, key, 'last_value', 1)
+    return number
+
+
+def seed_number_sequences():
+    """Create or raise every number sequence to the highest number in use; returns the number of sequences"""
+    highest = defaultdict(int)
+    for value in db.session.scalars(select(Customer.customer_id)):
+        parts = value.split('/')
+        if len(parts) == 3 and parts[2].isdigit():
+            key = ('customer', parts[0], parts[1], 0)
+            highest[key] = max(highest[key], int(parts[2]))
+    for value in db.session.scalars(select(Loan.loan_number)):
+        parts = value.split('/')
+        if len(parts) == 4 and parts[0].isdigit() and parts[3].isdigit():
+            key = ('loan', parts[1], parts[2], int(parts[0]))
+            highest[key] = max(highest[key], int(parts[3]))
+    settings = SystemSettings.get_settings()
+    for entity, prefix in (('pawning', settings.pawning_number_prefix or 'PWN'),
+                           ('investment', settings.investment_number_prefix or 'INV')):
+        highest[(entity, '', prefix, 0)] = highest_number(entity, type_code=prefix)
+
+    sequences = {
+        tuple(getattr(sequence, name) for name in NUMBER_KEY): sequence
+        for sequence in NumberSequence.query.all()
+    }
+    for key, value in highest.items():
+        sequence = sequences.get(key)
+        if sequence is None:
+            db.session.add(NumberSequence(**dict(zip(NUMBER_KEY, key)), last_value=value))
+        elif sequence.last_value < value:
+            sequence.last_value = value
+    db.session.commit()
+    return len(highest)
@@ -33,6 +33,49 @@ class Config:
     DEFAULT_THEME_COLOR = '#2c3e50'
     DEFAULT_APP_NAME = 'JAANmicro'
 
+    # Loan schedule cache: in-process LRU size/TTL (seconds) and an optional
+    # directory shared by all workers on the host, pruned to at most
+    # SCHEDULE_CACHE_DIR_THRESHOLD files
+    SCHEDULE_CACHE_SIZE = int(os.environ.get('SCHEDULE_CACHE_SIZE', 2048))
+    SCHEDULE_CACHE_TTL = int(os.environ.get('SCHEDULE_CACHE_TTL', 900))
+    SCHEDULE_CACHE_DIR = os.environ.get('SCHEDULE_CACHE_DIR')
+    SCHEDULE_CACHE_DIR_THRESHOLD = int(os.environ.get('SCHEDULE_CACHE_DIR_THRESHOLD', 10000))
+    # Seconds between holiday_versions checks outside requests (CLI, job worker);
+    # requests check the counter once each
+    HOLIDAY_CACHE_TTL = int(os.environ.get('HOLIDAY_CACHE_TTL', 60))
+
+    # Report page cache: entries and total bytes kept per worker, TTL
+    # (seconds) and an optional shared directory. Entries are also dropped
+    # when loans, payments, pawnings, investments or customers of their
+    # branches change
+    REPORT_CACHE_SIZE = int(os.environ.get('REPORT_CACHE_SIZE', 256))
+    REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 300))
+    REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR')
+    REPORT_CACHE_DIR_THRESHOLD = int(os.environ.get('REPORT_CACHE_DIR_THRESHOLD', 1000))
+    # Dashboard counters are reused per branch for this many seconds
+    DASHBOARD_CACHE_SIZE = int(os.environ.get('DASHBOARD_CACHE_SIZE', 128))
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 30))
+
+    # Background export jobs (run.py job-worker): where finished files are
+    # kept and for how long, how many unfinished jobs a user may queue, and
+    # how many jobs may run at once for one user and for one branch
+    JOB_OUTPUT_DIR = os.environ.get('JOB_OUTPUT_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_output')
+    JOB_FILE_TTL = int(os.environ.get('JOB_FILE_TTL', 24 * 3600))
+    JOB_QUEUE_LIMIT = int(os.environ.get('JOB_QUEUE_LIMIT', 5))
+    JOB_USER_CONCURRENCY = int(os.environ.get('JOB_USER_CONCURRENCY', 1))
+    JOB_BRANCH_CONCURRENCY = int(os.environ.get('JOB_BRANCH_CONCURRENCY', 2))
+    # Seconds after which a running job whose worker died is marked failed
+    JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 3600))
+
+    # Receipt numbers: format (fields product, branch and number) and how
+    # many numbers a worker claims from receipt_sequences at a time
+    RECEIPT_NUMBER_FORMAT = os.environ.get('RECEIPT_NUMBER_FORMAT') or '{product}-{branch}-{number:08d}'
+    RECEIPT_NUMBER_BLOCK = int(os.environ.get('RECEIPT_NUMBER_BLOCK', 50))
+    # Times a payment is attempted when a concurrent write to the same loan,
+    # pawning or investment wins the version check
+    VERSION_CONFLICT_ATTEMPTS = int(os.environ.get('VERSION_CONFLICT_ATTEMPTS', 3))
+
     # Internal messaging system toggle (keeps code in place but disables runtime use)
     MESSAGING_ENABLED = os.environ.get('MESSAGING_ENABLED', 'false').lower() == 'true'
     
@@ -66,6 +109,9 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SCHEDULE_CACHE_SIZE = 0  # each test reuses loan ids in a fresh database
+    REPORT_CACHE_SIZE = 0
+    DASHBOARD_CACHE_SIZE = 0
 
 config = {
     'development': DevelopmentConfig,
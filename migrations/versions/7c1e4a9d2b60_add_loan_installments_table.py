@@ -0,0 +1,54 @@
+"""Add loan_installments table
+
+Revision ID: 7c1e4a9d2b60
+Revises: 5d16b1ccafe8, f6c2a1b4d1e2
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e4a9d2b60'
+down_revision = ('5d16b1ccafe8', 'f6c2a1b4d1e2')
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('loan_installments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('loan_id', sa.Integer(), nullable=False),
+    sa.Column('installment_number', sa.Integer(), nullable=False),
+    sa.Column('due_date', sa.Date(), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('principal_amount', sa.Numeric(precision=15, scale=2), nullable=True),
+    sa.Column('interest_amount', sa.Numeric(precision=15, scale=2), nullable=True),
+    sa.Column('paid_amount', sa.Numeric(precision=15, scale=2), nullable=True),
+    sa.Column('remaining_amount', sa.Numeric(precision=15, scale=2), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('is_skipped', sa.Boolean(), nullable=True),
+    sa.Column('is_customized', sa.Boolean(), nullable=True),
+    sa.Column('reschedule_date', sa.Date(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['loan_id'], ['loans.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('loan_id', 'installment_number', name='unique_loan_installment')
+    )
+    with op.batch_alter_table('loan_installments', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_loan_installments_loan_id'), ['loan_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_loan_installments_due_date'), ['due_date'], unique=False)
+        batch_op.create_index('ix_loan_installments_due_date_loan_id', ['due_date', 'loan_id'], unique=False)
+
+    # Rows are backfilled from the live schedules with `python run.py sync-installments`;
+    # reports only read the table.
+
+
+def downgrade():
+    with op.batch_alter_table('loan_installments', schema=None) as batch_op:
+        batch_op.drop_index('ix_loan_installments_due_date_loan_id')
+        batch_op.drop_index(batch_op.f('ix_loan_installments_due_date'))
+        batch_op.drop_index(batch_op.f('ix_loan_installments_loan_id'))
+
+    op.drop_table('loan_installments')
@@ -0,0 +1,28 @@
+"""Add payments_version and overrides_version to loans
+
+Revision ID: 8d2f5b7e3a41
+Revises: 7c1e4a9d2b60
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f5b7e3a41'
+down_revision = '7c1e4a9d2b60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('payments_version', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('overrides_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.drop_column('overrides_version')
+        batch_op.drop_column('payments_version')
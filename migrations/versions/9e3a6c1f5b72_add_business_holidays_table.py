@@ -0,0 +1,42 @@
+"""Add business_holidays table
+
+Revision ID: 9e3a6c1f5b72
+Revises: 8d2f5b7e3a41
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3a6c1f5b72'
+down_revision = '8d2f5b7e3a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('business_holidays',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('holiday_date', sa.Date(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=True),
+    sa.Column('name', sa.String(length=200), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], ),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('holiday_date', 'branch_id', name='unique_branch_holiday')
+    )
+    with op.batch_alter_table('business_holidays', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_business_holidays_holiday_date'), ['holiday_date'], unique=False)
+        batch_op.create_index(batch_op.f('ix_business_holidays_branch_id'), ['branch_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('business_holidays', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_business_holidays_branch_id'))
+        batch_op.drop_index(batch_op.f('ix_business_holidays_holiday_date'))
+
+    op.drop_table('business_holidays')
@@ -0,0 +1,28 @@
+"""Add FIFO allocation cursor to loans
+
+Revision ID: a4b7d2e9c813
+Revises: 9e3a6c1f5b72
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4b7d2e9c813'
+down_revision = '9e3a6c1f5b72'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('allocation_installment', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('allocation_version', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.drop_column('allocation_version')
+        batch_op.drop_column('allocation_installment')
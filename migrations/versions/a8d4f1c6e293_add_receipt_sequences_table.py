@@ -0,0 +1,32 @@
+"""Add receipt_sequences table
+
+Revision ID: a8d4f1c6e293
+Revises: f7c3e2a9b418
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d4f1c6e293'
+down_revision = 'f7c3e2a9b418'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('receipt_sequences',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('product', sa.String(length=10), nullable=False),
+    sa.Column('next_value', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('branch_id', 'product', name='uq_receipt_sequences_key')
+    )
+
+
+def downgrade():
+    op.drop_table('receipt_sequences')
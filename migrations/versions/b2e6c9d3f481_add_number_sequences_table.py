@@ -0,0 +1,34 @@
+"""Add number_sequences table
+
+Revision ID: b2e6c9d3f481
+Revises: a8d4f1c6e293
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e6c9d3f481'
+down_revision = 'a8d4f1c6e293'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('number_sequences',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('branch_code', sa.String(length=20), nullable=False),
+    sa.Column('type_code', sa.String(length=10), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('last_value', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('entity', 'branch_code', 'type_code', 'year', name='uq_number_sequences_key')
+    )
+
+
+def downgrade():
+    op.drop_table('number_sequences')
@@ -0,0 +1,50 @@
+"""Add loan_arrears_snapshot table
+
+Revision ID: b5e8c3f1a927
+Revises: a4b7d2e9c813
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e8c3f1a927'
+down_revision = 'a4b7d2e9c813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('loan_arrears_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('loan_id', sa.Integer(), nullable=False),
+    sa.Column('as_of', sa.Date(), nullable=False),
+    sa.Column('total_overdue_amount', sa.Numeric(precision=15, scale=2), nullable=True),
+    sa.Column('overdue_installments', sa.Integer(), nullable=True),
+    sa.Column('partial_overdue_amount', sa.Numeric(precision=15, scale=2), nullable=True),
+    sa.Column('partial_overdue_installments', sa.Integer(), nullable=True),
+    sa.Column('oldest_overdue_date', sa.Date(), nullable=True),
+    sa.Column('days_overdue', sa.Integer(), nullable=True),
+    sa.Column('first_arrears_date', sa.Date(), nullable=True),
+    sa.Column('last_arrears_date', sa.Date(), nullable=True),
+    sa.Column('paid_installments', sa.Integer(), nullable=True),
+    sa.Column('last_payment_date', sa.Date(), nullable=True),
+    sa.Column('last_payment_amount', sa.Numeric(precision=15, scale=2), nullable=True),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['loan_id'], ['loans.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('loan_id')
+    )
+    with op.batch_alter_table('loan_arrears_snapshot', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_loan_arrears_snapshot_as_of'), ['as_of'], unique=False)
+        batch_op.create_index(batch_op.f('ix_loan_arrears_snapshot_total_overdue_amount'), ['total_overdue_amount'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('loan_arrears_snapshot', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_loan_arrears_snapshot_total_overdue_amount'))
+        batch_op.drop_index(batch_op.f('ix_loan_arrears_snapshot_as_of'))
+
+    op.drop_table('loan_arrears_snapshot')
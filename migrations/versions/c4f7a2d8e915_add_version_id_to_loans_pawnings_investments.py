@@ -0,0 +1,30 @@
+"""Add version_id to loans, pawnings and investments
+
+Revision ID: c4f7a2d8e915
+Revises: b2e6c9d3f481
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f7a2d8e915'
+down_revision = 'b2e6c9d3f481'
+branch_labels = None
+depends_on = None
+
+TABLES = ('loans', 'pawnings', 'investments')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version_id', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('version_id')
@@ -0,0 +1,29 @@
+"""Add report_generations table
+
+Revision ID: d3a9f6b2c714
+Revises: c7d2e4a9b613
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a9f6b2c714'
+down_revision = 'c7d2e4a9b613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_generations',
+    sa.Column('branch_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('generation', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('branch_id')
+    )
+
+
+def downgrade():
+    op.drop_table('report_generations')
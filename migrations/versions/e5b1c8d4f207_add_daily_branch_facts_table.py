@@ -0,0 +1,49 @@
+"""Add daily_branch_facts table
+
+Revision ID: e5b1c8d4f207
+Revises: d3a9f6b2c714
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b1c8d4f207'
+down_revision = 'd3a9f6b2c714'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_branch_facts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('fact_date', sa.Date(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('product_type', sa.String(length=20), nullable=False),
+    sa.Column('collector_id', sa.Integer(), nullable=False),
+    sa.Column('collection_count', sa.Integer(), nullable=False),
+    sa.Column('collections', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('principal', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('interest', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('penalties', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('disbursements', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('new_loans', sa.Integer(), nullable=False),
+    sa.Column('new_customers', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('fact_date', 'branch_id', 'product_type', 'collector_id', name='uq_daily_branch_facts_key')
+    )
+    with op.batch_alter_table('daily_branch_facts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_daily_branch_facts_branch_id'), ['branch_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_daily_branch_facts_fact_date'), ['fact_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('daily_branch_facts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_daily_branch_facts_fact_date'))
+        batch_op.drop_index(batch_op.f('ix_daily_branch_facts_branch_id'))
+
+    op.drop_table('daily_branch_facts')
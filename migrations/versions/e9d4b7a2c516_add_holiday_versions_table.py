@@ -0,0 +1,30 @@
+"""Add holiday_versions table
+
+Revision ID: e9d4b7a2c516
+Revises: c4f7a2d8e915
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9d4b7a2c516'
+down_revision = 'c4f7a2d8e915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    holiday_versions = op.create_table('holiday_versions',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(holiday_versions, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('holiday_versions')
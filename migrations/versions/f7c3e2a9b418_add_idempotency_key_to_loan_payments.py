@@ -0,0 +1,28 @@
+"""Add idempotency_key to loan_payments
+
+Revision ID: f7c3e2a9b418
+Revises: e5b1c8d4f207
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c3e2a9b418'
+down_revision = 'e5b1c8d4f207'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('loan_payments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_loan_payments_idempotency_key', ['idempotency_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('loan_payments', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_loan_payments_idempotency_key', type_='unique')
+        batch_op.drop_column('idempotency_key')
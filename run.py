@@ -63,6 +63,85 @@ def create_admin_user():
             db.session.rollback()
             print("Error: {}".format(e))
 
+def sync_installments():
+    """Rebuild the loan_installments table from the loan schedules"""
+    from app import create_app
+    from app.utils.helpers import materialize_loan_installments
+
+    only_missing = '--missing' in sys.argv
+    app = create_app(os.getenv('FLASK_ENV') or 'development')
+    with app.app_context():
+        synced = materialize_loan_installments(only_missing=only_missing)
+        print("Synced installments for {} loan(s).".format(synced))
+
+def refresh_arrears():
+    """Refresh the arrears snapshot of every active loan (run at end of day)"""
+    from app import create_app
+    from app.utils.helpers import refresh_arrears_snapshots
+
+    stale_only = '--stale' in sys.argv
+    app = create_app(os.getenv('FLASK_ENV') or 'development')
+    with app.app_context():
+        refreshed = refresh_arrears_snapshots(stale_only=stale_only)
+        print("Refreshed arrears snapshots for {} loan(s).".format(refreshed))
+
+def rebuild_facts():
+    """Recompute the daily_branch_facts table from payments, loans and customers"""
+    from app import create_app
+    from app.reports.facts import rebuild_facts as rebuild
+
+    app = create_app(os.getenv('FLASK_ENV') or 'development')
+    with app.app_context():
+        rows = rebuild()
+        print("Rebuilt {} daily branch fact row(s).".format(rows))
+
+def seed_sequences():
+    """Start the number_sequences table from the customer ids and loan, pawning and investment numbers in use"""
+    from app import create_app
+    from app.utils.sequences import seed_number_sequences
+
+    app = create_app(os.getenv('FLASK_ENV') or 'development')
+    with app.app_context():
+        sequences = seed_number_sequences()
+        print("Seeded {} number sequence(s).".format(sequences))
+
+def _int_option(name, default):
+    """Value of a `--name N` command-line option"""
+    if name in sys.argv[:-1]:
+        return int(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+def eod_close():
+    """Recompute every active loan's stored figures (end-of-day close)"""
+    from app import create_app
+    from app.loans.eod import close_day, PHASES
+
+    config_name = os.getenv('FLASK_ENV') or 'development'
+    workers = _int_option('--workers', os.cpu_count() or 1)
+    shard_size = _int_option('--shard-size', 1000)
+    app = create_app(config_name)
+    with app.app_context():
+        result = close_day(config_name, workers=workers, shard_size=shard_size)
+    print("Closed {loans} active loan(s) in {shards} shard(s): {updated} updated, {completed} completed.".format(**result))
+    print("Elapsed {:.2f}s ({:.1f} loans/s)".format(result['seconds'], result['loans_per_second']))
+    for phase in PHASES:
+        print("  {:<8} {:.2f}s".format(phase, result['timings'][phase]))
+
+def job_worker():
+    """Generate queued background exports (--once: stop when the queue is empty)"""
+    from app import create_app
+    from app.jobs.worker import work
+
+    once = '--once' in sys.argv
+    poll = _int_option('--poll', 2)
+    app = create_app(os.getenv('FLASK_ENV') or 'development')
+    with app.app_context():
+        try:
+            processed = work(once=once, poll=poll)
+        except KeyboardInterrupt:
+            return
+    print("Processed {} export job(s).".format(processed))
+
 if __name__ == '__main__':
     # Handle command-line arguments
     if len(sys.argv) > 1:
@@ -71,9 +150,21 @@ if __name__ == '__main__':
             create_admin_user()
         elif command == 'init-db':
             init_database()
+        elif command == 'sync-installments':
+            sync_installments()
+        elif command == 'refresh-arrears':
+            refresh_arrears()
+        elif command == 'rebuild-facts':
+            rebuild_facts()
+        elif command == 'seed-sequences':
+            seed_sequences()
+        elif command == 'eod-close':
+            eod_close()
+        elif command == 'job-worker':
+            job_worker()
         else:
             print("Unknown command: {}".format(command))
-            print("Available commands: create-admin, init-db")
+            print("Available commands: create-admin, init-db, sync-installments, refresh-arrears, rebuild-facts, seed-sequences, eod-close, job-worker")
             sys.exit(1)
     else:
         # Run the Flask development server
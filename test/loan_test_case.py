@@ -0,0 +1,73 @@
+"""Shared fixture for tests that need the app, a branch, an admin, a customer and loans."""
+from decimal import Decimal
+import unittest
+
+from app import create_app, db
+from app.models import Branch, Customer, Loan, User
+
+
+class LoanTestCase(unittest.TestCase):
+    """Pushes a 'testing' app on empty tables with branch B001, an admin and customer C001
+
+    Subclasses add their own rows after super().setUp() and commit them;
+    make_loan() builds the 9-week flat loan (9000 lent, 10800 payable, 1200 a
+    week) most tests start from.
+    """
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        self.branch = self.make_branch('B001', 'Main Branch')
+        self.admin = User(username='admin', email='admin@example.com', password_hash='test', full_name='Admin User',
+                          nic_number='ADMIN-NIC', role='admin', branch_id=self.branch.id, is_active=True)
+        db.session.add(self.admin)
+        db.session.flush()
+        self.customer = self.make_customer(self.branch)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def make_branch(self, code, name):
+        branch = Branch(branch_code=code, name=name)
+        db.session.add(branch)
+        db.session.flush()
+        return branch
+
+    def make_customer(self, branch, customer_id='C001', nic_number='CUSTOMER-NIC', **fields):
+        customer = Customer(customer_id=customer_id, branch_id=branch.id, full_name='Test Customer',
+                            nic_number=nic_number, phone_primary='0710000000', address_line1='Address',
+                            city='Colombo', district='Colombo', created_by=self.admin.id, **fields)
+        db.session.add(customer)
+        db.session.flush()
+        return customer
+
+    def make_loan(self, loan_number, customer=None, **fields):
+        """Flush a type1_9weeks loan of customer (default self.customer); fields override the defaults"""
+        customer = customer or self.customer
+        values = dict(
+            customer_id=customer.id,
+            branch_id=customer.branch_id,
+            loan_type='type1_9weeks',
+            loan_amount=Decimal('9000.00'),
+            disbursed_amount=Decimal('9000.00'),
+            total_payable=Decimal('10800.00'),
+            paid_amount=Decimal('0.00'),
+            interest_rate=Decimal('10.00'),
+            interest_type='flat',
+            duration_months=0,
+            duration_weeks=9,
+            installment_amount=Decimal('1200.00'),
+            installment_frequency='weekly',
+            status='active',
+            created_by=self.admin.id,
+        )
+        values.update(fields)
+        loan = Loan(loan_number=loan_number, **values)
+        db.session.add(loan)
+        db.session.flush()
+        return loan
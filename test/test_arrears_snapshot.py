@@ -0,0 +1,159 @@
+"""loan_arrears_snapshot refreshes and the snapshot-backed arrears report."""
+from datetime import date, timedelta
+from decimal import Decimal
+import csv
+import gzip
+import io
+import unittest
+from unittest import mock
+
+from app import db
+from app.models import LoanArrearsSnapshot, LoanPayment, Pawning
+from app.utils.helpers import refresh_arrears_snapshots
+from loan_test_case import LoanTestCase
+
+
+class ArrearsSnapshotTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.loans = []
+        for number, weeks_ago in [('ARR-001', 4), ('ARR-002', 7)]:
+            start = date.today() - timedelta(weeks=weeks_ago)
+            self.loans.append(self.make_loan(
+                number,
+                disbursement_date=start,
+                first_installment_date=start + timedelta(days=1),
+            ))
+        db.session.add(Pawning(
+            pawning_number='PWN-001',
+            customer_id=self.customer.id,
+            branch_id=self.branch.id,
+            item_description='Ring',
+            item_type='gold',
+            loan_amount=Decimal('1000.00'),
+            interest_rate=Decimal('3.00'),
+            duration_months=1,
+            pawning_date=date.today() - timedelta(days=60),
+            maturity_date=date.today() - timedelta(days=30),
+            status='active',
+            created_by=self.admin.id,
+        ))
+        db.session.commit()
+
+    def test_refresh_matches_arrears_details(self):
+        self.assertEqual(refresh_arrears_snapshots(), 2)
+
+        for loan in self.loans:
+            details = loan.get_arrears_details()
+            snapshot = loan.arrears_snapshot
+            self.assertEqual(snapshot.as_of, date.today())
+            self.assertEqual(snapshot.total_overdue_amount, details['total_overdue_amount'])
+            self.assertEqual(snapshot.num_arrears, details['overdue_installments'] + details['partial_overdue_installments'])
+            self.assertEqual(snapshot.days_overdue_on(date.today()), details['days_overdue'])
+            self.assertEqual(snapshot.first_arrears_date, details['oldest_overdue_date'])
+
+        # Fresh snapshots are left alone
+        self.assertEqual(refresh_arrears_snapshots(stale_only=True), 0)
+
+    def test_payment_resync_refreshes_snapshot(self):
+        loan = self.loans[0]
+        loan.sync_installments()
+        db.session.commit()
+        self.assertEqual(loan.arrears_snapshot.overdue_installments, 4)
+
+        db.session.add(LoanPayment(
+            loan_id=loan.id,
+            payment_date=date.today(),
+            payment_amount=Decimal('1800.00'),
+            payment_method='cash',
+        ))
+        loan.paid_amount = Decimal('1800.00')
+        loan.sync_installments()
+        db.session.commit()
+
+        snapshot = LoanArrearsSnapshot.query.filter_by(loan_id=loan.id).one()
+        self.assertEqual(snapshot.overdue_installments, 2)
+        self.assertEqual(snapshot.partial_overdue_installments, 1)
+        self.assertEqual(snapshot.paid_installments, 1)
+        self.assertEqual(snapshot.last_payment_amount, Decimal('1800.00'))
+
+    def _client(self):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.admin.id)
+            sess['_fresh'] = True
+        return client
+
+    def _sync_loans(self):
+        for loan in self.loans:
+            loan.sync_installments()
+        db.session.commit()
+
+    def _references(self, client, query):
+        html = client.get('/reports/arrears' + query).get_data(as_text=True)
+        return sorted((ref for ref in ('ARR-001', 'ARR-002', 'PWN-001') if ref in html), key=html.index)
+
+    def test_report_pages_follow_one_ordering(self):
+        self._sync_loans()
+        client = self._client()
+
+        def references(query):
+            return self._references(client, query)
+
+        self.assertEqual(references(''), ['ARR-002', 'ARR-001', 'PWN-001'])
+
+        paged = [references('?per_page=1&page={}'.format(page)) for page in (1, 2, 3)]
+        # Seven weeks overdue ranks ahead of four; the pawning counts as one
+        self.assertEqual(paged, [['ARR-002'], ['ARR-001'], ['PWN-001']])
+
+    def test_page_size_is_capped(self):
+        start = date.today() - timedelta(weeks=5)
+        for number in range(3, 7):
+            self.loans.append(self.make_loan(f'ARR-00{number}', disbursement_date=start,
+                                             first_installment_date=start + timedelta(days=1)))
+        self._sync_loans()
+        with mock.patch('app.reports.routes.ARREARS_PAGE_SIZE', 1):
+            html = self._client().get('/reports/arrears?per_page=10000000').get_data(as_text=True)
+        self.assertIn('Showing 1 to 5 of 7 entries', html)
+        self.assertIn('per_page=5', html)
+
+    def test_report_does_not_write_snapshots(self):
+        client = self._client()
+
+        # Loans without a snapshot wait for the next sync or end-of-day close
+        self.assertEqual(self._references(client, ''), ['PWN-001'])
+        self.assertEqual(LoanArrearsSnapshot.query.count(), 0)
+
+        self._sync_loans()
+        refreshed_at = [loan.arrears_snapshot.refreshed_at for loan in self.loans]
+        self.assertEqual(self._references(client, ''), ['ARR-002', 'ARR-001', 'PWN-001'])
+        self.assertEqual([loan.arrears_snapshot.refreshed_at for loan in self.loans], refreshed_at)
+
+    def test_date_range_needs_an_installment_due_inside_it(self):
+        self._sync_loans()
+        client = self._client()
+        first_due = self.loans[1].first_installment_date
+
+        # Between two due dates: inside ARR-002's arrears span but no installment falls due
+        gap = '?start_date={}&end_date={}'.format(
+            first_due + timedelta(weeks=2, days=1), first_due + timedelta(weeks=2, days=6))
+        self.assertNotIn('ARR-002', self._references(client, gap))
+
+        due = '?start_date={0}&end_date={0}'.format(first_due + timedelta(weeks=1))
+        self.assertIn('ARR-002', self._references(client, due))
+        self.assertNotIn('ARR-001', self._references(client, due))
+
+    def test_csv_export_merges_pawnings_by_overdue_amount(self):
+        self._sync_loans()
+        client = self._client()
+
+        response = client.get('/reports/export/arrears.csv.gz')
+        self.assertEqual(response.mimetype, 'application/gzip')
+        rows = list(csv.reader(io.StringIO(gzip.decompress(response.get_data()).decode('utf-8'))))
+
+        self.assertEqual([row[1] for row in rows[1:]], ['ARR-002', 'ARR-001', 'PWN-001'])
+        self.assertEqual(client.get('/reports/export/arrears').get_data(), gzip.decompress(response.get_data()))
+
+
+if __name__ == '__main__':
+    unittest.main()
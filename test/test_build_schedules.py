@@ -0,0 +1,63 @@
+"""Batch schedule generation must match per-loan schedules."""
+from datetime import date
+from decimal import Decimal
+import unittest
+
+from sqlalchemy import event
+
+from app import db
+from app.loans.business_calendar import holiday_version
+from app.models import Loan, LoanPayment, LoanScheduleOverride
+from loan_test_case import LoanTestCase
+
+
+class BuildSchedulesTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.loans = []
+        for idx, loan_type in enumerate(['54_daily', 'type1_9weeks', 'monthly_loan']):
+            loan = self.make_loan(
+                f'TEST-BATCH-{idx}',
+                loan_type=loan_type,
+                paid_amount=Decimal('2500.00'),
+                duration_months=6 if loan_type == 'monthly_loan' else 0,
+                duration_weeks=9 if loan_type == 'type1_9weeks' else None,
+                duration_days=54 if loan_type == '54_daily' else None,
+                installment_amount=Decimal('1200.00') if loan_type != '54_daily' else Decimal('200.00'),
+                disbursement_date=date(2026, 1, 5),
+                first_installment_date=date(2026, 1, 6),
+            )
+            db.session.add_all([
+                LoanPayment(loan_id=loan.id, payment_date=date(2026, 1, 6), payment_amount=Decimal('1500.00')),
+                LoanPayment(loan_id=loan.id, payment_date=date(2026, 1, 20), payment_amount=Decimal('1000.00')),
+                LoanScheduleOverride(loan_id=loan.id, installment_number=2, is_skipped=True, created_by=self.admin.id),
+            ])
+            self.loans.append(loan)
+        db.session.commit()
+
+    def test_batch_matches_per_loan_schedule(self):
+        schedules = Loan.build_schedules(self.loans)
+        for loan in self.loans:
+            self.assertEqual(schedules[loan.id], loan.generate_payment_schedule())
+
+    def test_batch_uses_constant_number_of_queries(self):
+        loans = Loan.query.all()
+        # The holiday snapshot is loaded once per worker, not per batch
+        holiday_version()
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            Loan.build_schedules(loans)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+        # One payments query and one overrides query for the whole loan set
+        self.assertEqual(len(statements), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
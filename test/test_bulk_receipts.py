@@ -0,0 +1,142 @@
+"""Bulk receipt posting and offline sync: per-loan grouping, per-row results, idempotency and parity."""
+from datetime import date, timedelta
+from decimal import Decimal
+import unittest
+
+from flask_login import login_user
+
+from app import db
+from app.loans.routes import _process_payment
+from app.models import ActivityLog, LoanInstallment, LoanPayment
+from loan_test_case import LoanTestCase
+
+
+class BulkReceiptTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.start = date.today() - timedelta(weeks=4)
+        self.bulk_loan = self._loan('BULK-001')
+        self.single_loan = self._loan('BULK-002')
+        db.session.commit()
+
+    def _loan(self, number):
+        return self.make_loan(number, disbursement_date=self.start,
+                              first_installment_date=self.start + timedelta(weeks=1))
+
+    def _client(self):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.admin.id)
+            sess['_fresh'] = True
+        return client
+
+    def _post(self, receipts):
+        return self._client().post('/loans/receipts/bulk', json={'receipts': receipts})
+
+    def _installments(self, loan):
+        return [
+            (row.installment_number, row.paid_amount, row.status)
+            for row in loan.installments.order_by(LoanInstallment.installment_number)
+        ]
+
+    def _payments(self, loan):
+        return [
+            (p.payment_date, p.payment_amount, p.principal_amount, p.interest_amount, p.balance_after)
+            for p in loan.payments.order_by(LoanPayment.payment_date, LoanPayment.id)
+        ]
+
+    def test_bulk_matches_individual_posting(self):
+        dates = [self.start + timedelta(weeks=week) for week in (1, 2, 3)]
+        amounts = ['1200.00', '1200.00', '500.00']
+
+        # Entered out of date order; the loan's receipts are applied by date
+        response = self._post([
+            {'loan_number': 'BULK-001', 'amount': amounts[2], 'payment_date': dates[2].isoformat()},
+            {'loan_id': self.bulk_loan.id, 'amount': amounts[0], 'payment_date': dates[0].isoformat()},
+            {'loan_number': 'BULK-001', 'amount': amounts[1], 'payment_date': dates[1].isoformat(),
+             'payment_method': 'bank_transfer', 'reference_number': 'TRX-1'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertTrue(body['success'])
+        self.assertEqual(body['posted'], 3)
+        self.assertEqual([result['row'] for result in body['results']], [0, 1, 2])
+        self.assertEqual(len({result['receipt_number'] for result in body['results']}), 3)
+
+        with self.app.test_request_context():
+            login_user(self.admin)
+            for payment_date, amount in zip(dates, amounts):
+                _process_payment(self.single_loan, Decimal(amount), payment_date, 'cash', None, None)
+
+        db.session.expire_all()
+        self.assertEqual(self._payments(self.bulk_loan), self._payments(self.single_loan))
+        self.assertEqual(self._installments(self.bulk_loan), self._installments(self.single_loan))
+        for field in ('paid_amount', 'outstanding_amount', 'advance_balance', 'status'):
+            self.assertEqual(getattr(self.bulk_loan, field), getattr(self.single_loan, field), field)
+        self.assertEqual(self.bulk_loan.paid_amount, Decimal('2900.00'))
+        self.assertEqual(ActivityLog.query.filter_by(entity_id=self.bulk_loan.id).count(), 3)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        response = self._post([
+            {'loan_number': 'NO-SUCH-LOAN', 'amount': '100'},
+            {'loan_number': 'BULK-001', 'amount': '0'},
+            {'loan_number': 'BULK-001', 'amount': '100', 'payment_method': 'barter'},
+            {'loan_number': 'BULK-001', 'amount': '100', 'payment_date': 'yesterday'},
+            {'loan_number': 'BULK-002', 'amount': '1200'},
+        ])
+        body = response.get_json()
+        self.assertFalse(body['success'])
+        self.assertEqual((body['posted'], body['failed']), (1, 4))
+        self.assertEqual([result['message'] for result in body['results'][:4]], [
+            'Loan not found', 'Amount must be greater than zero', 'Invalid payment method', 'Invalid payment date',
+        ])
+        self.assertTrue(body['results'][4]['success'])
+        self.assertEqual(self.bulk_loan.payments.count(), 0)
+        self.assertEqual(self.single_loan.payments.count(), 1)
+
+    def test_receipts_after_settlement_are_rejected(self):
+        response = self._post([
+            {'loan_number': 'BULK-001', 'amount': '10800'},
+            {'loan_number': 'BULK-001', 'amount': '100'},
+        ])
+        results = response.get_json()['results']
+        self.assertTrue(results[0]['success'])
+        self.assertEqual(results[1]['message'], 'Loan was fully paid by an earlier receipt')
+
+        db.session.expire_all()
+        self.assertEqual(self.bulk_loan.status, 'completed')
+        self.assertEqual(self.bulk_loan.payments.count(), 1)
+
+    def test_sync_retry_does_not_post_twice(self):
+        collections = [
+            {'idempotency_key': 'dev1-0001', 'loan_number': 'BULK-001', 'amount': '1200'},
+            {'idempotency_key': 'dev1-0002', 'loan_number': 'BULK-002', 'amount': '600'},
+            {'idempotency_key': 'dev1-0002', 'loan_number': 'BULK-002', 'amount': '600'},
+            {'loan_number': 'BULK-002', 'amount': '600'},
+        ]
+        client = self._client()
+        first = client.post('/loans/receipts/sync', json={'collections': collections}).get_json()
+        self.assertEqual((first['posted'], first['duplicates'], first['failed']), (2, 1, 1))
+        self.assertEqual(first['results'][2]['payment_id'], first['results'][1]['payment_id'])
+        self.assertEqual(first['results'][3]['message'], 'Idempotency key is required')
+        balances = {loan['loan_number']: loan for loan in first['loans']}
+        self.assertEqual(balances['BULK-001']['paid_amount'], 1200.0)
+        self.assertEqual(balances['BULK-002']['paid_amount'], 600.0)
+
+        # The client timed out and sends the batch again
+        retry = client.post('/loans/receipts/sync', json={'collections': collections[:2]}).get_json()
+        self.assertTrue(retry['success'])
+        self.assertEqual((retry['posted'], retry['duplicates']), (0, 2))
+        self.assertEqual([r['receipt_number'] for r in retry['results']],
+                         [r['receipt_number'] for r in first['results'][:2]])
+        self.assertEqual(LoanPayment.query.count(), 2)
+        self.assertEqual({loan['loan_number']: loan['paid_amount'] for loan in retry['loans']},
+                         {'BULK-001': 1200.0, 'BULK-002': 600.0})
+
+    def test_rejects_empty_and_oversized_requests(self):
+        self.assertEqual(self._post([]).status_code, 400)
+        self.assertEqual(self._post([{'loan_number': 'BULK-001', 'amount': '1'}] * 501).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+"""Business-day calendar arithmetic and holiday-aware daily schedules."""
+from datetime import date, timedelta
+from decimal import Decimal
+import unittest
+
+from sqlalchemy import insert, update
+
+from app import db
+from app.loans.business_calendar import BusinessCalendar, holiday_version, invalidate_holidays
+from app.models import BusinessHoliday, HolidayVersion, LoanInstallment, LoanScheduleOverride
+from loan_test_case import LoanTestCase
+
+
+class BusinessCalendarTest(unittest.TestCase):
+    def _step(self, calendar, start, count):
+        day = start
+        while not calendar.is_business_day(day):
+            day += timedelta(days=1)
+        for _ in range(count):
+            day += timedelta(days=1)
+            while not calendar.is_business_day(day):
+                day += timedelta(days=1)
+        return day
+
+    def test_add_business_days_matches_day_stepping(self):
+        holidays = [date(2026, 1, 14), date(2026, 1, 15), date(2026, 2, 4), date(2026, 1, 18)]
+        calendar = BusinessCalendar(rest_weekdays=(5, 6), holidays=holidays)
+        for offset in range(14):
+            start = date(2026, 1, 5) + timedelta(days=offset)
+            for count in range(40):
+                self.assertEqual(calendar.add_business_days(start, count), self._step(calendar, start, count))
+
+    def test_rest_day_start_rolls_forward(self):
+        calendar = BusinessCalendar(rest_weekdays=(6,))
+        self.assertEqual(calendar.add_business_days(date(2026, 1, 11), 0), date(2026, 1, 12))
+        self.assertFalse(calendar.is_business_day(date(2026, 1, 11)))
+
+    def test_business_days_between(self):
+        calendar = BusinessCalendar(rest_weekdays=(6,), holidays=[date(2026, 1, 14)])
+        # Mon 12th .. Mon 19th: six open weekdays less the holiday
+        self.assertEqual(calendar.business_days_between(date(2026, 1, 12), date(2026, 1, 19)), 5)
+
+
+class HolidayScheduleTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_branch = self.make_branch('B002', 'Other Branch')
+        self.loan = self._daily_loan('TEST-HOL-001', self.branch)
+        db.session.commit()
+        invalidate_holidays()
+
+    def tearDown(self):
+        invalidate_holidays()
+        super().tearDown()
+
+    def _daily_loan(self, loan_number, branch):
+        return self.make_loan(
+            loan_number,
+            branch_id=branch.id,
+            loan_type='54_daily',
+            loan_amount=Decimal('10000.00'),
+            disbursed_amount=Decimal('10000.00'),
+            total_payable=Decimal('12000.00'),
+            duration_weeks=None,
+            duration_days=54,
+            installment_amount=Decimal('222.22'),
+            installment_frequency='daily',
+            first_installment_date=date(2026, 1, 12),
+        )
+
+    def _add_holiday(self, holiday_date, branch_id=None):
+        db.session.add(BusinessHoliday(holiday_date=holiday_date, branch_id=branch_id, created_by=self.admin.id))
+        db.session.commit()
+        invalidate_holidays()
+
+    def test_holiday_moves_later_installments(self):
+        before = self.loan.generate_payment_schedule()
+        self._add_holiday(date(2026, 1, 14))
+        after = self.loan.generate_payment_schedule()
+
+        self.assertEqual(len(after), len(before))
+        self.assertEqual([row['due_date'] for row in after[:2]], [date(2026, 1, 12), date(2026, 1, 13)])
+        self.assertEqual(after[2]['due_date'], date(2026, 1, 15))
+        # Saturday 17th is a working day; Sunday 18th is not
+        self.assertEqual(after[5]['due_date'], date(2026, 1, 19))
+        self.assertNotIn(date(2026, 1, 14), [row['due_date'] for row in after])
+
+    def test_other_branch_holiday_is_ignored(self):
+        before = self.loan.generate_payment_schedule()
+        self._add_holiday(date(2026, 1, 14), branch_id=self.other_branch.id)
+
+        self.assertEqual(self.loan.generate_payment_schedule(), before)
+
+    def test_holiday_changes_schedule_cache_key(self):
+        key = self.loan.schedule_cache_key()
+        self._add_holiday(date(2026, 1, 14), branch_id=self.branch.id)
+
+        self.assertNotEqual(self.loan.schedule_cache_key(), key)
+
+    def test_holiday_writes_bump_the_shared_version(self):
+        self._add_holiday(date(2026, 1, 14))
+        self.assertEqual(db.session.get(HolidayVersion, 1).version, 1)
+        self.assertEqual(holiday_version(), 1)
+
+        db.session.delete(BusinessHoliday.query.one())
+        db.session.commit()
+        self.assertEqual(holiday_version(), 2)
+
+    def test_other_worker_holiday_is_seen_on_next_request(self):
+        with self.app.test_request_context():
+            before = self.loan.generate_payment_schedule()
+
+        # Another worker's write: no listener runs in this process
+        db.session.execute(insert(BusinessHoliday.__table__).values(holiday_date=date(2026, 1, 14)))
+        db.session.execute(insert(HolidayVersion.__table__).values(id=1, version=1))
+        db.session.commit()
+
+        with self.app.test_request_context():
+            after = self.loan.generate_payment_schedule()
+        self.assertEqual(after[2]['due_date'], date(2026, 1, 15))
+        self.assertNotEqual(after, before)
+
+        db.session.execute(BusinessHoliday.__table__.delete())
+        db.session.execute(update(HolidayVersion.__table__).values(version=2))
+        db.session.commit()
+        with self.app.test_request_context():
+            self.assertEqual(self.loan.generate_payment_schedule(), before)
+
+    def _materialized(self, loan):
+        return [(row.installment_number, row.due_date)
+                for row in loan.installments.order_by(LoanInstallment.installment_number)]
+
+    def _expected(self, loan):
+        return [(row['installment_number'], row['due_date']) for row in loan.generate_payment_schedule()]
+
+    def test_skip_all_resyncs_every_daily_loan_and_can_be_undone(self):
+        # Installment 3 of this loan is already skipped, so the bulk skip finds
+        # nothing to skip on the 14th, yet the holiday still moves its later rows
+        other = self._daily_loan('TEST-HOL-002', self.other_branch)
+        db.session.add(LoanScheduleOverride(loan_id=other.id, installment_number=3, is_skipped=True,
+                                            created_by=self.admin.id))
+        for loan in (self.loan, other):
+            loan.sync_installments()
+        db.session.commit()
+        original = {loan.id: self._materialized(loan) for loan in (self.loan, other)}
+
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.admin.id)
+            sess['_fresh'] = True
+
+        response = client.post('/loans/skip-all-daily-loans', json={'skip_date': '2026-01-14'})
+        self.assertTrue(response.get_json()['success'])
+        self.assertEqual(response.get_json()['already_skipped'], 1)
+        for loan in (self.loan, other):
+            db.session.refresh(loan)
+            self.assertEqual(self._materialized(loan), self._expected(loan))
+            self.assertNotEqual(self._materialized(loan), original[loan.id])
+
+        response = client.post('/loans/unskip-all-daily-loans', json={'skip_date': '2026-01-14'})
+        self.assertTrue(response.get_json()['success'])
+        self.assertEqual(response.get_json()['resynced_count'], 2)
+        self.assertEqual(BusinessHoliday.query.count(), 0)
+        for loan in (self.loan, other):
+            db.session.refresh(loan)
+            self.assertEqual(self._materialized(loan), original[loan.id])
+
+        response = client.post('/loans/unskip-all-daily-loans', json={'skip_date': '2026-01-14'})
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Collection report: SQL totals and keyset pages over loan and pawning payments."""
+from datetime import date, timedelta
+from decimal import Decimal
+import unittest
+from unittest import mock
+
+from flask_login import login_user
+
+from app import db
+from app.models import LoanPayment, Pawning, PawningPayment
+from app.reports.routes import _collection_page, _collection_union
+from loan_test_case import LoanTestCase
+
+
+class CollectionReportTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        loan = self.make_loan('COL-001', disbursed_amount=None, total_payable=None)
+        pawning = Pawning(pawning_number='PWN-001', customer_id=self.customer.id, branch_id=self.branch.id,
+                          item_description='Ring', loan_amount=Decimal('400.00'), interest_rate=Decimal('2.00'),
+                          duration_months=3, pawning_date=date.today(), maturity_date=date.today(),
+                          created_by=self.admin.id)
+        db.session.add(pawning)
+        db.session.flush()
+
+        today = date.today()
+        for number, (days_ago, method) in enumerate([(0, 'cash'), (1, 'cash'), (1, None), (2, 'bank_transfer')]):
+            db.session.add(LoanPayment(loan_id=loan.id, payment_date=today - timedelta(days=days_ago),
+                                       payment_amount=Decimal('100.00'), principal_amount=Decimal('80.00'),
+                                       interest_amount=Decimal('20.00'), payment_method=method,
+                                       receipt_number=f'L{number}', collected_by=self.admin.id))
+        for number, days_ago in enumerate([0, 1, 3]):
+            db.session.add(PawningPayment(pawning_id=pawning.id, payment_date=today - timedelta(days=days_ago),
+                                          payment_amount=Decimal('10.00'), interest_amount=Decimal('10.00'),
+                                          payment_method='cash', receipt_number=f'P{number}'))
+        db.session.commit()
+
+    def _client(self):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.admin.id)
+            sess['_fresh'] = True
+        return client
+
+    def test_keyset_pages_walk_both_ways(self):
+        with self.app.test_request_context('/reports/collections'):
+            login_user(self.admin)
+            payments = _collection_union('', '', '', '')
+            pages, after = [], None
+            while True:
+                rows, after, before = _collection_page(payments, after=after, per_page=3)
+                pages.append([row.receipt_number for row in rows])
+                if after is None:
+                    break
+            # Newest first; loans before pawnings on the same day, later receipts first
+            self.assertEqual(pages, [['L0', 'P0', 'L2'], ['L1', 'P1', 'L3'], ['P2']])
+
+            rows, after, before = _collection_page(payments, before=before, per_page=3)
+            self.assertEqual([row.receipt_number for row in rows], ['L1', 'P1', 'L3'])
+            rows, after, before = _collection_page(payments, before=before, per_page=3)
+            self.assertEqual([row.receipt_number for row in rows], ['L0', 'P0', 'L2'])
+            self.assertIsNone(before)
+
+    def test_totals_cover_every_page(self):
+        response = self._client().get('/reports/collections?per_page=2&collection_type=loan')
+        self.assertEqual(response.status_code, 200)
+        page = response.get_data(as_text=True)
+
+        self.assertIn('Showing 2 of 4 collections', page)
+        self.assertIn('COL-001', page)
+        self.assertNotIn('PWN-001', page)
+        self.assertIn('Not Specified', page)
+        self.assertIn('400.00', page)
+
+        pawnings = self._client().get('/reports/collections?collection_type=pawning').get_data(as_text=True)
+        self.assertIn('PWN-001', pawnings)
+        self.assertNotIn('of 3 collections', pawnings)
+
+    def test_malformed_cursor_gives_first_page(self):
+        client = self._client()
+        for cursor in ('garbage', 'garbage:loan', '2026-13-01:loan:1', f'{date.today()}:loan:abc'):
+            for direction in ('after', 'before'):
+                response = client.get(f'/reports/collections?per_page=3&{direction}={cursor}')
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Showing 3 of 7 collections', response.get_data(as_text=True))
+
+        with self.app.test_request_context('/reports/collections'):
+            login_user(self.admin)
+            rows, after, before = _collection_page(_collection_union('', '', '', ''), after='garbage', per_page=3)
+            self.assertEqual([row.receipt_number for row in rows], ['L0', 'P0', 'L2'])
+            self.assertIsNotNone(after)
+            self.assertIsNone(before)
+
+    def test_page_size_is_capped(self):
+        with mock.patch('app.reports.routes.COLLECTION_PAGE_SIZE', 1):
+            page = self._client().get('/reports/collections?per_page=10000000').get_data(as_text=True)
+        self.assertIn('Showing 5 of 7 collections', page)
+
+
+if __name__ == '__main__':
+    unittest.main()
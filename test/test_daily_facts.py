@@ -0,0 +1,101 @@
+"""Daily branch facts: flush-time deltas agree with a rebuild from source rows."""
+from datetime import date, timedelta
+from decimal import Decimal
+import unittest
+
+from app import db
+from app.models import DailyBranchFact, Investment, InvestmentTransaction, LoanPayment, Pawning, PawningPayment
+from app.reports.facts import fact_totals, rebuild_facts
+from loan_test_case import LoanTestCase
+
+
+def _facts():
+    return {
+        (fact.fact_date, fact.branch_id, fact.product_type, fact.collector_id): (
+            fact.collection_count, Decimal(fact.collections), Decimal(fact.principal), Decimal(fact.interest),
+            Decimal(fact.penalties), Decimal(fact.disbursements), fact.new_loans, fact.new_customers,
+        )
+        for fact in DailyBranchFact.query.all()
+        if fact.collection_count or fact.collections or fact.disbursements or fact.interest
+        or fact.new_loans or fact.new_customers
+    }
+
+
+class DailyBranchFactTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.loan = self.make_loan('F-001', disbursed_amount=None, total_payable=None, status='pending')
+        db.session.commit()
+        self.today = date.today()
+
+    def _pay(self, amount, payment_date):
+        payment = LoanPayment(loan_id=self.loan.id, payment_date=payment_date, payment_amount=amount,
+                              principal_amount=amount - Decimal('200.00'), interest_amount=Decimal('200.00'),
+                              collected_by=self.admin.id)
+        db.session.add(payment)
+        db.session.commit()
+        return payment
+
+    def test_flush_deltas_match_rebuild(self):
+        yesterday = self.today - timedelta(days=1)
+        self.loan.status = 'active'
+        self.loan.disbursed_amount = Decimal('9000.00')
+        self.loan.disbursement_date = yesterday
+        self.loan.approved_by = self.admin.id
+        db.session.commit()
+
+        first = self._pay(Decimal('1200.00'), self.today)
+        second = self._pay(Decimal('1200.00'), self.today)
+        removed = self._pay(Decimal('500.00'), yesterday)
+        # Edited without reading the old values first; they come from the database
+        second.payment_amount = Decimal('1000.00')
+        second.payment_date = yesterday
+        db.session.delete(removed)
+        db.session.commit()
+
+        pawning = Pawning(pawning_number='P-001', customer_id=self.customer.id, branch_id=self.branch.id,
+                          item_description='Ring', loan_amount=Decimal('400.00'), interest_rate=Decimal('2.00'),
+                          duration_months=3, pawning_date=self.today, maturity_date=self.today,
+                          created_by=self.admin.id)
+        investment = Investment(investment_number='I-001', customer_id=self.customer.id, branch_id=self.branch.id,
+                                investment_type='fixed_deposit', principal_amount=Decimal('5000.00'),
+                                interest_rate=Decimal('8.00'), start_date=self.today, created_by=self.admin.id)
+        db.session.add_all([pawning, investment])
+        db.session.flush()
+        db.session.add_all([
+            PawningPayment(pawning_id=pawning.id, payment_date=self.today, payment_amount=Decimal('50.00'),
+                           interest_amount=Decimal('50.00'), collected_by=self.admin.id),
+            InvestmentTransaction(investment_id=investment.id, transaction_date=self.today, transaction_type='deposit',
+                                  amount=Decimal('5000.00'), processed_by=self.admin.id),
+            InvestmentTransaction(investment_id=investment.id, transaction_date=self.today,
+                                  transaction_type='withdrawal', amount=Decimal('300.00'), processed_by=self.admin.id),
+        ])
+        db.session.commit()
+
+        totals = fact_totals(self.today, self.today)
+        self.assertEqual(totals['loan']['collection_count'], 1)
+        self.assertEqual(Decimal(totals['loan']['collections']), Decimal('1200.00'))
+        self.assertEqual(Decimal(fact_totals(yesterday, yesterday)['loan']['collections']), Decimal('1000.00'))
+        self.assertEqual(Decimal(fact_totals(yesterday, yesterday)['loan']['disbursements']), Decimal('9000.00'))
+        self.assertEqual(totals['loan']['new_loans'], 1)
+        self.assertEqual(totals['customer']['new_customers'], 1)
+        self.assertEqual((totals['pawning']['new_loans'], Decimal(totals['pawning']['interest'])), (1, Decimal('50.00')))
+        self.assertEqual(Decimal(totals['investment']['collections']), Decimal('5000.00'))
+        self.assertEqual(Decimal(totals['investment']['disbursements']), Decimal('300.00'))
+
+        incremental = _facts()
+        rebuild_facts()
+        self.assertEqual(_facts(), incremental)
+
+    def test_rolled_back_changes_leave_no_facts(self):
+        self.loan.status = 'active'
+        self.loan.disbursement_date = self.today
+        db.session.flush()
+        db.session.rollback()
+
+        self.assertEqual(fact_totals(self.today, self.today)['loan']['disbursements'], 0)
+        self.assertEqual(fact_totals(self.today, self.today)['loan']['new_loans'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Dashboard statistics: one aggregate statement, filtered per branch."""
+from datetime import date
+from decimal import Decimal
+import unittest
+
+from sqlalchemy import event
+
+from app import db
+from app.main.stats import compute_dashboard_stats, dashboard_stats
+from app.models import Investment, Loan, Pawning
+from app.utils.cache import dashboard_cache
+from loan_test_case import LoanTestCase
+
+
+class DashboardStatsTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.main = self.branch
+        self.other = self.make_branch('B002', 'Other Branch')
+        self.customer.kyc_verified = True
+        customers = [
+            self.customer,
+            self.make_customer(self.main, customer_id='C1', nic_number='NIC-1'),
+            self.make_customer(self.other, customer_id='C2', nic_number='NIC-2'),
+        ]
+
+        for number, customer in enumerate(customers):
+            for status, amount in [('active', '1000.00'), ('completed', '500.00'), ('pending', '700.00')]:
+                self.make_loan(
+                    f'L{number}-{status}', customer=customer, loan_amount=Decimal(amount),
+                    disbursed_amount=Decimal(amount), total_payable=None, installment_amount=Decimal('100.00'),
+                    status=status,
+                )
+            db.session.add(Pawning(
+                pawning_number=f'P{number}', customer_id=customer.id, branch_id=customer.branch_id,
+                item_description='Ring', item_type='gold', loan_amount=Decimal('200.00'),
+                outstanding_principal=Decimal('150.00'), interest_rate=Decimal('2.00'), duration_months=3,
+                pawning_date=date.today(), maturity_date=date.today(), status='active', created_by=self.admin.id,
+            ))
+        db.session.add(Investment(
+            investment_number='I1', customer_id=customers[-1].id, branch_id=self.other.id, investment_type='fixed_deposit',
+            principal_amount=Decimal('5000.00'), current_amount=Decimal('5100.00'), interest_rate=Decimal('8.00'),
+            start_date=date.today(), status='active', created_by=self.admin.id,
+        ))
+        db.session.commit()
+
+    def tearDown(self):
+        dashboard_cache.configure(maxsize=0)
+        super().tearDown()
+
+    def test_all_figures_come_from_one_statement(self):
+        statements = []
+
+        def count(*args):
+            statements.append(args)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            stats = compute_dashboard_stats()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual((stats['total_customers'], stats['kyc_pending'], stats['total_users']), (3, 2, 1))
+        self.assertEqual(stats['active_loans'], 3)
+        self.assertEqual(Decimal(stats['total_loan_outstanding']), Decimal('3000.00'))
+        self.assertEqual(Decimal(stats['total_loan_disbursed']), Decimal('4500.00'))
+        self.assertEqual((stats['active_pawnings'], Decimal(stats['total_pawning_outstanding'])), (3, Decimal('450.00')))
+        self.assertEqual((stats['active_investments'], Decimal(stats['total_investment_amount'])), (1, Decimal('5100.00')))
+
+    def test_branch_filter_applies_to_every_figure(self):
+        stats = compute_dashboard_stats(self.main.id)
+
+        self.assertEqual((stats['total_customers'], stats['kyc_pending']), (2, 1))
+        self.assertEqual(Decimal(stats['total_loan_disbursed']), Decimal('3000.00'))
+        self.assertEqual(stats['active_investments'], 0)
+        self.assertEqual(Decimal(stats['total_investment_amount']), Decimal('0'))
+
+    def test_cached_per_branch(self):
+        dashboard_cache.configure(maxsize=8, ttl=30)
+        self.assertEqual(dashboard_stats(self.main.id)['active_loans'], 2)
+        Loan.query.filter_by(loan_number='L0-pending').update({'status': 'active'})
+        db.session.commit()
+
+        self.assertEqual(dashboard_stats(self.main.id)['active_loans'], 2)
+        self.assertEqual(dashboard_stats(self.other.id)['active_loans'], 1)
+        dashboard_cache.clear()
+        self.assertEqual(dashboard_stats(self.main.id)['active_loans'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""End-of-day close: sharding and bulk write-back of derived loan fields."""
+from datetime import date, timedelta
+from decimal import Decimal
+import unittest
+
+from app import db
+from app.loans.eod import close_day, shard_ranges
+from app.models import Loan, LoanArrearsSnapshot, LoanPayment
+from loan_test_case import LoanTestCase
+
+
+class EodCloseTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        start = date.today() - timedelta(weeks=4)
+        self.loan_ids = []
+        for number, paid in [('EOD-001', Decimal('1500.00')), ('EOD-002', Decimal('10800.00')), ('EOD-003', Decimal('0.00'))]:
+            loan = self.make_loan(
+                number,
+                paid_amount=paid,
+                # Stale stored figures the close should correct
+                outstanding_amount=Decimal('10800.00'),
+                advance_balance=Decimal('50.00'),
+                disbursement_date=start,
+                first_installment_date=start + timedelta(days=1),
+            )
+            if paid:
+                db.session.add(LoanPayment(loan_id=loan.id, payment_date=start + timedelta(days=1), payment_amount=paid))
+            self.loan_ids.append(loan.id)
+        db.session.commit()
+
+    def test_shard_ranges_cover_ids(self):
+        self.assertEqual(shard_ranges([1, 2, 5, 9, 10], 2), [(1, 2), (5, 9), (10, 10)])
+        self.assertEqual(shard_ranges([], 2), [])
+
+    def test_close_rewrites_stale_fields(self):
+        result = close_day(shard_size=2)
+
+        self.assertEqual((result['loans'], result['shards'], result['completed']), (3, 2, 1))
+        partly_paid, settled, unpaid = (db.session.get(Loan, loan_id) for loan_id in self.loan_ids)
+        self.assertEqual(partly_paid.outstanding_amount, Decimal('9300.00'))
+        self.assertEqual(partly_paid.advance_balance, Decimal('0.00'))
+        self.assertEqual(settled.status, 'completed')
+        self.assertEqual(settled.closing_date, date.today() - timedelta(weeks=4, days=-1))
+        self.assertEqual(unpaid.outstanding_amount, Decimal('10800.00'))
+        self.assertEqual(LoanArrearsSnapshot.query.count(), 3)
+        self.assertEqual(unpaid.arrears_snapshot.overdue_installments, 4)
+
+        # A second close finds nothing to change
+        self.assertEqual(close_day()['updated'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
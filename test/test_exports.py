@@ -0,0 +1,62 @@
+"""XlsxStream: write-only workbooks sized and styled like the in-memory exports."""
+import gzip
+import io
+import unittest
+
+from flask import Flask
+from openpyxl import load_workbook
+from openpyxl.styles import Font
+
+from app.utils.exports import XLSX_MIMETYPE, XlsxStream, iter_csv
+
+
+class XlsxStreamTest(unittest.TestCase):
+    def test_widths_styles_and_layout(self):
+        stream = XlsxStream()
+        stream.add_style('header', font=Font(bold=True))
+        sheet = stream.sheet('Loans', padding=2, max_width=12, widths={3: 30})
+        sheet.row_heights[1] = 20
+        sheet.freeze_panes = 'A2'
+        sheet.append(['Loan', 'Customer', 'Note'], 'header')
+        sheet.append(['L-1', 'A very long customer name', None])
+        sheet.append([None, None, None])
+
+        output = io.BytesIO()
+        stream.save(output)
+        ws = load_workbook(output)['Loans']
+
+        self.assertEqual(ws.column_dimensions['A'].width, 6)
+        self.assertEqual(ws.column_dimensions['B'].width, 12)
+        self.assertEqual(ws.column_dimensions['C'].width, 30)
+        self.assertEqual(ws.row_dimensions[1].height, 20)
+        self.assertEqual(ws.freeze_panes, 'A2')
+        self.assertTrue(ws['A1'].font.b)
+        self.assertFalse(ws['A2'].font.b)
+        self.assertEqual(sheet.row_count, 3)
+
+    def test_response_streams_workbook(self):
+        stream = XlsxStream()
+        stream.sheet('Empty').append(['Only'])
+
+        with Flask(__name__).test_request_context():
+            response = stream.response('empty.xlsx')
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(response.mimetype, XLSX_MIMETYPE)
+            self.assertIn('filename=empty.xlsx', response.headers['Content-Disposition'])
+            ws = load_workbook(io.BytesIO(b''.join(response.response))).active
+        self.assertEqual(ws['A1'].value, 'Only')
+
+    def test_csv_chunks_form_one_gzip_stream(self):
+        rows = [[number, 'Receipt, {}'.format(number)] for number in range(5)]
+        plain = list(iter_csv(['No', 'Note'], rows, batch_size=2))
+        packed = list(iter_csv(['No', 'Note'], rows, compress=True, batch_size=2))
+
+        # Header first, then one chunk per two rows
+        self.assertEqual(plain[0], b'No,Note\r\n')
+        self.assertEqual(len(plain), 4)
+        self.assertIn(b'"Receipt, 4"', plain[-1])
+        self.assertEqual(gzip.decompress(b''.join(packed)), b''.join(plain))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Background export jobs: queueing, claiming limits, replaying and expiry."""
+from datetime import date, datetime, timedelta
+import os
+import shutil
+import tempfile
+import unittest
+
+from app import db
+from app.jobs.worker import claim_next, purge_expired, work
+from app.models import ExportJob, User
+from loan_test_case import LoanTestCase
+
+
+class ExportJobTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.output_dir = tempfile.mkdtemp()
+        self.app.config['JOB_OUTPUT_DIR'] = self.output_dir
+        self.staff = User(username='staff', email='staff@example.com', password_hash='test', full_name='Staff User',
+                          nic_number='STAFF-NIC', role='staff', branch_id=self.branch.id, is_active=True,
+                          can_view_reports=False)
+        db.session.add(self.staff)
+        start = date.today() - timedelta(weeks=3)
+        self.make_loan('JOB-001', disbursement_date=start, first_installment_date=start + timedelta(days=1))
+        db.session.commit()
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.output_dir)
+
+    def _client(self, user):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+            sess['_fresh'] = True
+        return client
+
+    def _job(self, user, status='queued', **fields):
+        job = ExportJob(user_id=user.id, branch_id=user.branch_id, endpoint='reports.export_loans_csv',
+                        title='Loan report (csv)', params='{"path": "/reports/export/loans.csv", "args": {}}',
+                        status=status, **fields)
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def test_queued_export_matches_direct_download(self):
+        client = self._client(self.admin)
+        response = client.get('/reports/export/loans.csv?background=1&status=active',
+                              headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+        self.assertEqual(client.get(f'/jobs/{job_id}/status').get_json()['status'], 'queued')
+
+        self.assertEqual(work(once=True), 1)
+
+        status = client.get(f'/jobs/{job_id}/status').get_json()
+        self.assertEqual(status['status'], 'done')
+        self.assertTrue(status['filename'].endswith('.csv'))
+        download = client.get(status['download_url'])
+        self.assertIn(b'JOB-001', download.data)
+        self.assertEqual(download.data, client.get('/reports/export/loans.csv?status=active').data)
+        # Jobs are private to their owner
+        other = self._job(self.staff)
+        self.assertEqual(client.get(f'/jobs/{other.id}/status').status_code, 404)
+
+    def test_queue_limit_per_user(self):
+        self.app.config['JOB_QUEUE_LIMIT'] = 1
+        client = self._client(self.admin)
+        headers = {'Accept': 'application/json'}
+        self.assertEqual(client.get('/reports/export/loans.csv?background=1', headers=headers).status_code, 202)
+        self.assertEqual(client.get('/reports/export/loans.csv?background=1', headers=headers).status_code, 429)
+        self.assertEqual(ExportJob.query.count(), 1)
+
+    def test_claim_respects_user_and_branch_concurrency(self):
+        self._job(self.admin, status='running', started_at=datetime.utcnow())
+        waiting = self._job(self.admin)
+        other = self._job(self.staff)
+
+        # The admin already has a running job; the staff user's job goes first
+        self.assertEqual(claim_next('test').id, other.id)
+        # Both branch slots are now taken
+        self.app.config['JOB_USER_CONCURRENCY'] = 2
+        self.assertIsNone(claim_next('test'))
+        self.app.config['JOB_BRANCH_CONCURRENCY'] = 3
+        self.assertEqual(claim_next('test').id, waiting.id)
+
+    def test_replay_uses_the_users_permissions(self):
+        job = self._job(self.staff)
+        work(once=True)
+
+        db.session.refresh(job)
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('HTTP 302', job.error)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    def test_expired_files_are_removed(self):
+        path = os.path.join(self.output_dir, 'old.csv')
+        with open(path, 'w') as output:
+            output.write('old')
+        job = self._job(self.admin, status='done', file_path=path, expires_at=datetime.utcnow() - timedelta(minutes=1))
+
+        self.assertEqual(purge_expired(), 1)
+        self.assertEqual(job.status, 'expired')
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
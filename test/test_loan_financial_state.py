@@ -0,0 +1,156 @@
+"""LoanFinancialState: one load of receipts and overrides for every derived figure."""
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+import unittest
+from unittest import mock
+
+from sqlalchemy import event
+
+from app import db
+from app.loans.business_calendar import holiday_version
+from app.loans.financial_state import LoanFinancialState
+from app.models import Loan, LoanPayment, LoanScheduleOverride
+from loan_test_case import LoanTestCase
+
+
+class LoanFinancialStateTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        start = date.today() - timedelta(days=60)
+        self.flat = self.make_loan(
+            'TEST-STATE-FLAT',
+            loan_type='type4_micro',
+            paid_amount=Decimal('2500.00'),
+            duration_months=3,
+            installment_frequency='monthly',
+            disbursement_date=start,
+            first_installment_date=start + timedelta(days=7),
+        )
+        self.reducing = self.make_loan(
+            'TEST-STATE-RB',
+            loan_type='business',
+            loan_amount=Decimal('12000.00'),
+            disbursed_amount=Decimal('12000.00'),
+            total_payable=Decimal('12780.00'),
+            paid_amount=Decimal('1065.00'),
+            interest_rate=Decimal('12.00'),
+            interest_type='reducing_balance',
+            duration_months=12,
+            duration_weeks=None,
+            installment_amount=Decimal('1065.00'),
+            installment_frequency='monthly',
+            disbursement_date=start,
+            first_installment_date=start + timedelta(days=30),
+        )
+        db.session.add_all([
+            LoanPayment(loan_id=self.flat.id, payment_date=start + timedelta(days=7), payment_amount=Decimal('1500.00'),
+                        principal_amount=Decimal('1250.00'), interest_amount=Decimal('250.00')),
+            LoanPayment(loan_id=self.flat.id, payment_date=start + timedelta(days=20), payment_amount=Decimal('1000.00'),
+                        principal_amount=Decimal('833.33'), interest_amount=Decimal('166.67')),
+            LoanScheduleOverride(loan_id=self.flat.id, installment_number=3, is_skipped=True, created_by=self.admin.id),
+            LoanPayment(loan_id=self.reducing.id, payment_date=start + timedelta(days=30), payment_amount=Decimal('1065.00'),
+                        principal_amount=Decimal('945.00'), interest_amount=Decimal('120.00')),
+        ])
+        db.session.commit()
+
+    def _statements(self, action):
+        # The holiday snapshot is loaded once per worker, not per loan
+        holiday_version()
+        Loan.query.all()
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            action()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        return statements
+
+    def test_figures_match_schedule(self):
+        state = self.flat.financial_state()
+        schedule = self.flat.generate_payment_schedule()
+
+        self.assertEqual(state.schedule, schedule)
+        self.assertEqual(state.outstanding, Decimal('8300.00'))
+        self.assertEqual(state.paid_principal, Decimal('2083.33'))
+        self.assertEqual(state.paid_installments, 2)
+        self.assertEqual(state.next_installment['installment_number'], 4)
+        self.assertEqual(state.next_installment_amount, 1100.0)
+        self.assertEqual(state.advance_balance, Decimal('0.00'))
+        self.assertEqual(state.arrears['overdue_installments'] + state.arrears['partial_overdue_installments'], 5)
+
+    def test_legacy_reducing_balance_accrues_from_last_receipt(self):
+        state = self.reducing.financial_state()
+        days = (date.today() - state.last_payment.payment_date).days
+        # 11055.00 outstanding principal at 12% a year
+        accrued = (Decimal('11055.00') * Decimal('0.12') * days / 365).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+        self.assertEqual(state.accrued_interest, accrued)
+        self.assertEqual(state.outstanding, Decimal('11055.00') + accrued)
+
+    def test_all_figures_from_one_load(self):
+        def read_everything():
+            state = self.flat.financial_state()
+            state.outstanding, state.accrued_interest, state.balance_due, state.arrears
+            state.advance_balance, state.next_installment_amount, state.paid_installments
+
+        # One payments query and one overrides query
+        self.assertEqual(len(self._statements(read_everything)), 2)
+
+    def test_iterator_matches_schedule(self):
+        self.assertEqual(list(self.flat.iter_payment_schedule()), self.flat.generate_payment_schedule())
+
+    def test_next_installment_stops_at_first_unpaid_row(self):
+        rows_read = []
+        iter_rows = self.flat.iter_payment_schedule
+
+        def counting(**kwargs):
+            for row in iter_rows(**kwargs):
+                rows_read.append(row['installment_number'])
+                yield row
+
+        with mock.patch.object(self.flat, 'iter_payment_schedule', counting):
+            state = self.flat.financial_state()
+            self.assertEqual(state.next_installment_amount, 1100.0)
+
+        self.assertEqual(rows_read, [1, 2, 3, 4])
+
+    def test_arrears_include_rows_moved_before_today(self):
+        db.session.add(LoanScheduleOverride(
+            loan_id=self.flat.id,
+            installment_number=10,
+            custom_due_date=date.today() - timedelta(days=1),
+            created_by=self.flat.created_by,
+        ))
+        db.session.commit()
+
+        streamed = self.flat.financial_state().arrears
+        built = self.flat.financial_state(schedule=self.flat.generate_payment_schedule()).arrears
+        self.assertEqual(streamed, built)
+        self.assertEqual(streamed['overdue_installments'] + streamed['partial_overdue_installments'], 6)
+
+    def test_balance_due_ignores_completed_status(self):
+        self.flat.status = 'completed'
+        state = self.flat.financial_state()
+
+        self.assertEqual(state.outstanding, Decimal('0'))
+        self.assertEqual(state.balance_due, Decimal('8300.00'))
+
+    def test_for_loans_matches_single_loan_states(self):
+        loans = Loan.query.order_by(Loan.id).all()
+        statements = self._statements(lambda: LoanFinancialState.for_loans(loans))
+        states = LoanFinancialState.for_loans(loans)
+
+        self.assertLessEqual(len(statements), 2)
+        for loan in loans:
+            single = loan.financial_state()
+            self.assertEqual(states[loan.id].schedule, single.schedule)
+            self.assertEqual(states[loan.id].outstanding, single.outstanding)
+            self.assertEqual(states[loan.id].arrears, single.arrears)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""Coverage for the materialized loan_installments table."""
+from datetime import date, timedelta
+from decimal import Decimal
+import unittest
+
+from app import db
+from app.models import Loan, LoanInstallment, LoanPayment, LoanScheduleOverride
+from app.utils.helpers import materialize_loan_installments
+from loan_test_case import LoanTestCase
+
+
+class LoanInstallmentSyncTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.loan = self.make_loan(
+            'TEST-INST-001',
+            disbursement_date=date(2026, 1, 6),
+            first_installment_date=date(2026, 1, 13),
+        )
+        db.session.commit()
+
+    def _rows(self):
+        return self.loan.installments.order_by(LoanInstallment.installment_number).all()
+
+    def _pay(self, amount, payment_date):
+        db.session.add(LoanPayment(
+            loan_id=self.loan.id,
+            payment_date=payment_date,
+            payment_amount=Decimal(amount),
+            payment_method='cash',
+        ))
+        self.loan.paid_amount = Decimal(str(self.loan.paid_amount)) + Decimal(amount)
+
+    def test_sync_materializes_schedule(self):
+        self.assertEqual(self.loan.sync_installments(), 9)
+        db.session.commit()
+
+        rows = self._rows()
+        schedule = self.loan.generate_payment_schedule()
+        self.assertEqual(len(rows), len(schedule))
+        for row, inst in zip(rows, schedule):
+            self.assertEqual(row.due_date, inst['due_date'])
+            self.assertEqual(row.amount, Decimal(str(inst['amount'])))
+            self.assertEqual(row.current_status, inst['status'])
+
+    def test_payment_rewrites_only_affected_rows(self):
+        self.loan.sync_installments()
+        db.session.commit()
+
+        self._pay('1500.00', date(2026, 1, 13))
+        self.assertEqual(self.loan.sync_installments(), 2)
+        db.session.commit()
+
+        rows = self._rows()
+        self.assertEqual(rows[0].status, 'paid')
+        self.assertEqual(rows[1].status, 'partial')
+        self.assertEqual(rows[1].paid_amount, Decimal('300.00'))
+        self.assertEqual(rows[1].remaining_amount, Decimal('900.00'))
+
+        # Nothing changed, nothing written
+        self.assertEqual(self.loan.sync_installments(), 0)
+
+    def test_skip_override_appends_makeup_row(self):
+        self.loan.sync_installments()
+        db.session.add(LoanScheduleOverride(
+            loan_id=self.loan.id,
+            installment_number=3,
+            is_skipped=True,
+            created_by=self.admin.id,
+        ))
+        self.loan.sync_installments()
+        db.session.commit()
+
+        rows = self._rows()
+        self.assertEqual(len(rows), 10)
+        self.assertTrue(rows[2].is_skipped)
+        self.assertEqual(rows[2].current_status, 'skipped')
+
+    def test_deactivated_loan_loses_rows(self):
+        self.loan.sync_installments()
+        self.loan.status = 'deactivated'
+        self.assertEqual(self.loan.sync_installments(), 9)
+        db.session.commit()
+        self.assertEqual(self.loan.installments.count(), 0)
+
+    def test_current_status_rolls_pending_to_overdue(self):
+        row = LoanInstallment(
+            due_date=date.today() - timedelta(days=1),
+            amount=Decimal('100.00'),
+            status='pending',
+            is_skipped=False,
+        )
+        self.assertEqual(row.current_status, 'overdue')
+
+    def test_materialize_only_missing(self):
+        self.assertEqual(materialize_loan_installments(Loan.query), 1)
+        self.assertEqual(materialize_loan_installments(Loan.query), 0)
+        self.assertEqual(self.loan.installments.count(), 9)
+
+    def test_daily_report_only_reads_materialized_rows(self):
+        from flask_login import login_user
+        from app.reports.routes import _get_daily_installment_rows
+
+        with self.app.test_request_context():
+            login_user(self.admin)
+            self.assertEqual(_get_daily_installment_rows(date(2026, 1, 1), date(2026, 12, 31)), [])
+            self.assertEqual(self.loan.installments.count(), 0)
+
+            self.loan.sync_installments()
+            db.session.commit()
+            self.assertEqual(len(_get_daily_installment_rows(date(2026, 1, 1), date(2026, 12, 31))), 9)
+
+    def _append(self, amount, payment_date):
+        """Model-level equivalent of _process_payment's incremental path."""
+        ready = self.loan.can_append_receipt(payment_date)
+        self._pay(amount, payment_date)
+        self.loan.touch_schedule(payments=True)
+        return ready and self.loan.append_receipt(Decimal(amount))
+
+    def test_appended_receipts_match_full_rebuild(self):
+        self.loan.sync_installments()
+        db.session.commit()
+
+        for amount, payment_date in [('1500.00', date(2026, 1, 13)), ('900.00', date(2026, 1, 20)),
+                                     ('3700.00', date(2026, 1, 20)), ('10.00', date(2026, 2, 3))]:
+            self.assertTrue(self._append(amount, payment_date))
+            db.session.flush()
+
+            schedule = self.loan.generate_payment_schedule()
+            for row, inst in zip(self._rows(), schedule):
+                self.assertEqual(row.paid_amount, Decimal(str(inst['paid_amount'])).quantize(Decimal('0.01')))
+                self.assertEqual(row.status, inst['status'])
+            self.assertEqual(self.loan.advance_balance, self.loan.calculate_available_advance_balance(schedule=schedule))
+            self.assertEqual(self.loan.sync_installments(schedule), 0)
+
+        self.assertEqual(self.loan.allocation_installment, 6)
+
+    def test_backdated_or_unsynced_receipts_need_full_rebuild(self):
+        self.loan.sync_installments()
+        db.session.commit()
+        self.assertTrue(self._append('1200.00', date(2026, 1, 20)))
+
+        self.assertFalse(self.loan.can_append_receipt(date(2026, 1, 14)))
+        self.assertTrue(self.loan.can_append_receipt(date(2026, 1, 20)))
+
+        # A receipt recorded without re-syncing leaves the cursor stale
+        self._pay('1200.00', date(2026, 1, 27))
+        self.loan.touch_schedule(payments=True)
+        self.assertFalse(self.loan.can_append_receipt(date(2026, 2, 3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Loan product registry resolution and per-product rules."""
+from datetime import date
+from decimal import Decimal
+import unittest
+
+from app.loans.products import DAILY_PRODUCT_CODES, PRODUCTS, resolve_product
+from app.models import Loan
+
+
+class LoanProductRegistryTest(unittest.TestCase):
+    def test_registered_products_are_shared_instances(self):
+        self.assertIs(resolve_product('type1_9weeks'), PRODUCTS['type1_9weeks'])
+        self.assertIs(Loan(loan_type='54_daily').product, PRODUCTS['54_daily'])
+
+    def test_daily_products(self):
+        self.assertEqual(sorted(DAILY_PRODUCT_CODES), ['54_daily', '54_daily_monday_friday', 'type4_daily'])
+
+    def test_skip_calendars(self):
+        saturday, sunday = date(2026, 1, 10), date(2026, 1, 11)
+        self.assertTrue(PRODUCTS['54_daily'].skips_due_date(sunday))
+        self.assertFalse(PRODUCTS['54_daily'].skips_due_date(saturday))
+        self.assertTrue(PRODUCTS['54_daily_monday_friday'].skips_due_date(saturday))
+
+    def test_interest_models(self):
+        self.assertTrue(PRODUCTS['type4_micro'].uses_flat_interest('reducing_balance'))
+        self.assertFalse(PRODUCTS['monthly_loan'].uses_flat_interest('reducing_balance'))
+        self.assertTrue(PRODUCTS['staff_loan'].uses_reducing_balance('reducing_balance'))
+        self.assertFalse(PRODUCTS['type1_9weeks'].uses_reducing_balance('reducing_balance'))
+
+    def test_schedule_frequency_needs_matching_duration(self):
+        self.assertEqual(PRODUCTS['type4_daily'].schedule_frequency(duration_days=26), 'Daily')
+        self.assertEqual(PRODUCTS['type4_daily'].schedule_frequency(duration_weeks=4), 'Monthly')
+        self.assertEqual(PRODUCTS['special_loan'].schedule_frequency(), 'One-Time')
+
+    def test_unregistered_code_uses_legacy_classification(self):
+        product = resolve_product('Legacy Daily')
+        self.assertIs(product, resolve_product('Legacy Daily'))
+        self.assertEqual(product.frequency, 'Daily')
+        self.assertTrue(product.flat_rate)
+        self.assertEqual(resolve_product('custom').frequency, 'Monthly')
+
+    def test_calculate_emi_follows_product_rule(self):
+        loan = Loan(
+            loan_type='type1_9weeks',
+            loan_amount=Decimal('10000.00'),
+            interest_rate=Decimal('10.00'),
+            interest_type='flat',
+            duration_weeks=9,
+        )
+        self.assertEqual(loan.calculate_emi(), 1334.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
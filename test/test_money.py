@@ -0,0 +1,101 @@
+"""Integer-cents helpers and the calculations built on them."""
+from datetime import date
+from decimal import Decimal
+import unittest
+
+from app.loans.routes import _calculate_loan_totals_for_principal
+from app.models import Loan
+from app.utils.money import to_cents, cents_to_decimal, cents_to_float, div_half_up, div_up
+
+
+class MoneyHelpersTest(unittest.TestCase):
+    def test_to_cents_rounds_half_up(self):
+        self.assertEqual(to_cents(Decimal('10.005')), 1001)
+        self.assertEqual(to_cents(Decimal('-10.005')), -1001)
+        self.assertEqual(to_cents(1200.1), 120010)
+        self.assertEqual(to_cents(12), 1200)
+        self.assertEqual(to_cents(None), 0)
+
+    def test_division_rounding(self):
+        self.assertEqual(div_half_up(5, 2), 3)
+        self.assertEqual(div_half_up(-5, 2), -3)
+        self.assertEqual(div_half_up(4, 3), 1)
+        self.assertEqual(div_up(1, 3), 1)
+        self.assertEqual(div_up(-1, 3), -1)
+        self.assertEqual(div_up(6, 3), 2)
+
+    def test_conversions_out(self):
+        self.assertEqual(cents_to_decimal(123456), Decimal('1234.56'))
+        self.assertEqual(str(cents_to_decimal(120000)), '1200.00')
+        self.assertEqual(cents_to_float(1), 0.01)
+
+
+class LoanTotalsTest(unittest.TestCase):
+    def test_type1_installment_rounds_up_to_whole_unit(self):
+        emi, total = _calculate_loan_totals_for_principal(10000, 10, 'type1_9weeks', 'flat', duration_weeks=9)
+        self.assertEqual(total, Decimal('12000.00'))
+        self.assertEqual(emi, Decimal('1334'))
+
+    def test_type4_daily_total_is_installment_times_days(self):
+        emi, total = _calculate_loan_totals_for_principal(10000, 10, 'type4_daily', 'flat', duration_months=1, duration_days=26)
+        self.assertEqual(emi, Decimal('423.08'))
+        self.assertEqual(total, Decimal('11000.08'))
+
+    def test_monthly_reducing_balance_emi(self):
+        emi, total = _calculate_loan_totals_for_principal(100000, 12, 'monthly_loan', 'reducing_balance', duration_months=12)
+        self.assertEqual(emi, Decimal('8884.88'))
+        self.assertEqual(total, Decimal('106618.56'))
+
+
+class CentsScheduleTest(unittest.TestCase):
+    def _loan(self, **kwargs):
+        values = dict(
+            loan_number='TEST-CENTS-001',
+            loan_type='type4_micro',
+            loan_amount=Decimal('10000.01'),
+            disbursed_amount=Decimal('10000.01'),
+            total_payable=Decimal('11000.03'),
+            paid_amount=Decimal('0.00'),
+            interest_rate=Decimal('10.00'),
+            interest_type='flat',
+            duration_months=1,
+            duration_weeks=7,
+            installment_amount=Decimal('1571.43'),
+            status='active',
+            first_installment_date=date(2026, 1, 6),
+        )
+        values.update(kwargs)
+        return Loan(**values)
+
+    def test_flat_schedule_rows_split_exactly(self):
+        schedule = self._loan().generate_payment_schedule(payments=[], overrides=[])
+
+        self.assertEqual(len(schedule), 7)
+        self.assertEqual(sum(to_cents(row['amount']) for row in schedule), 1100003)
+        self.assertEqual(schedule[-1]['amount'], 1571.45)
+        self.assertEqual(schedule[-1]['interest'], 142.88)
+        for row in schedule:
+            self.assertEqual(to_cents(row['principal']) + to_cents(row['interest']), to_cents(row['amount']))
+
+    def test_reducing_schedule_repays_principal_exactly(self):
+        loan = self._loan(
+            loan_type='monthly_loan',
+            interest_type='reducing_balance',
+            loan_amount=Decimal('100000.00'),
+            disbursed_amount=Decimal('100000.00'),
+            total_payable=Decimal('106618.56'),
+            interest_rate=Decimal('12.00'),
+            duration_months=12,
+            duration_weeks=None,
+            installment_amount=Decimal('8884.88'),
+        )
+        schedule = loan.generate_payment_schedule(payments=[], overrides=[])
+
+        self.assertEqual(schedule[0]['interest'], 1000.0)
+        self.assertEqual(schedule[0]['principal'], 7884.88)
+        self.assertEqual(sum(to_cents(row['principal']) for row in schedule), 10000000)
+        self.assertEqual(sum(to_cents(row['amount']) for row in schedule), 10661856)
+
+
+if __name__ == '__main__':
+    unittest.main()
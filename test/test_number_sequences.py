@@ -0,0 +1,60 @@
+"""Customer ids and loan, pawning and investment numbers from number_sequences."""
+import unittest
+
+from app import db
+from app.models import NumberSequence
+from app.utils.helpers import (generate_customer_id, generate_investment_number, generate_loan_number,
+                               generate_pawning_number, get_current_date)
+from app.utils.sequences import seed_number_sequences
+from loan_test_case import LoanTestCase
+
+
+class NumberSequenceTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.year = get_current_date().strftime('%y')
+        self.customer = self._customer('B001/C/0007')
+        self._customer('B001/G/0003')
+        self.make_loan(f'{self.year}/B001/WS/00012', disbursed_amount=None, total_payable=None, status='pending')
+        db.session.commit()
+
+    def _customer(self, customer_id):
+        return self.make_customer(self.branch, customer_id=customer_id, nic_number=f'NIC-{customer_id}')
+
+    def _last_value(self, entity, **key):
+        return db.session.query(NumberSequence.last_value).filter_by(entity=entity, **key).scalar()
+
+    def test_sequences_continue_from_numbers_in_use(self):
+        self.assertEqual(generate_customer_id('customer', self.branch.id), 'B001/C/0008')
+        self.assertEqual(generate_customer_id('customer', self.branch.id), 'B001/C/0009')
+        self.assertEqual(generate_customer_id('guarantor', self.branch.id), 'B001/G/0004')
+        self.assertEqual(generate_customer_id('investor', self.branch.id), 'B001/LB/0001')
+        self.assertEqual(generate_loan_number('type1_9weeks', self.branch.id), f'{self.year}/B001/WS/00013')
+        self.assertEqual(generate_loan_number('54_daily', self.branch.id), f'{self.year}/B001/DLS/00001')
+        self.assertEqual(generate_pawning_number('PWN'), 'PWN000001')
+        self.assertEqual(generate_pawning_number('PWN'), 'PWN000002')
+        self.assertEqual(generate_investment_number('INV'), 'INV000001')
+        self.assertEqual(self._last_value('customer', branch_code='B001', type_code='C'), 9)
+
+    def test_rolled_back_creation_gives_its_number_back(self):
+        self.assertEqual(generate_customer_id('customer', self.branch.id), 'B001/C/0008')
+        db.session.rollback()
+        self.assertEqual(generate_customer_id('customer', self.branch.id), 'B001/C/0008')
+        db.session.commit()
+        self.assertEqual(generate_customer_id('customer', self.branch.id), 'B001/C/0009')
+
+    def test_seed_from_existing_numbers(self):
+        db.session.add(NumberSequence(entity='customer', branch_code='B001', type_code='G', year=0, last_value=50))
+        db.session.commit()
+
+        self.assertEqual(seed_number_sequences(), 5)
+        self.assertEqual(self._last_value('customer', branch_code='B001', type_code='C'), 7)
+        self.assertEqual(self._last_value('loan', branch_code='B001', type_code='WS', year=int(self.year)), 12)
+        self.assertEqual(self._last_value('pawning', type_code='PWN'), 0)
+        # A sequence already past the numbers in use is left alone
+        self.assertEqual(self._last_value('customer', branch_code='B001', type_code='G'), 50)
+        self.assertEqual(generate_customer_id('guarantor', self.branch.id), 'B001/G/0051')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""Version checks on loan balances and retrying payments that lose them."""
+from datetime import date, timedelta
+from decimal import Decimal
+import unittest
+from unittest import mock
+
+from dateutil.relativedelta import relativedelta
+
+from flask_login import login_user
+from sqlalchemy import update
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import db
+from app.loans.routes import _process_payment
+from app.models import Loan, Pawning, PawningPayment
+from app.utils.concurrency import retry_on_conflict
+from app.utils.helpers import generate_receipt_number
+from loan_test_case import LoanTestCase
+
+
+class OptimisticLockingTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        start = date.today() - timedelta(weeks=4)
+        self.loan = self.make_loan('LOCK-001', disbursement_date=start, first_installment_date=start + timedelta(weeks=1))
+        db.session.commit()
+
+    def _concurrent_write(self, paid_amount):
+        """Another worker updates the loan after this session has read it"""
+        table = Loan.__table__
+        with db.engine.begin() as connection:
+            connection.execute(update(table).where(table.c.id == self.loan.id).values(
+                paid_amount=paid_amount, version_id=table.c.version_id + 1,
+            ))
+
+    def test_write_from_stale_read_is_rejected(self):
+        self.assertEqual(self.loan.version_id, 1)
+        self._concurrent_write(Decimal('500.00'))
+
+        self.loan.paid_amount = Decimal('1200.00')
+        with self.assertRaises(StaleDataError):
+            db.session.commit()
+        db.session.rollback()
+        self.assertEqual(self.loan.paid_amount, Decimal('500.00'))
+        self.assertEqual(self.loan.version_id, 2)
+
+    def test_payment_is_posted_again_from_fresh_balances(self):
+        self.assertEqual(self.loan.paid_amount, Decimal('0.00'))
+        self._concurrent_write(Decimal('500.00'))
+
+        with self.app.test_request_context():
+            login_user(self.admin)
+            payment = _process_payment(self.loan, Decimal('1200.00'), date.today(), 'cash', None, None)
+
+        db.session.expire_all()
+        self.assertEqual(self.loan.paid_amount, Decimal('1700.00'))
+        self.assertGreater(self.loan.version_id, 2)
+        self.assertEqual(self.loan.payments.count(), 1)
+        self.assertEqual(payment.loan_id, self.loan.id)
+
+    def test_retries_are_bounded(self):
+        calls = []
+
+        def work():
+            calls.append(1)
+            self._concurrent_write(self.loan.paid_amount)
+            self.loan.notes = f'attempt {len(calls)}'
+
+        with self.assertRaises(StaleDataError):
+            retry_on_conflict(work, attempts=3)
+        self.assertEqual(len(calls), 3)
+        self.assertIsNone(self.loan.notes)
+
+
+class PawningPaymentRetryTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.pawning = Pawning(
+            pawning_number='PWN-001', customer_id=self.customer.id, branch_id=self.branch.id,
+            item_description='Gold chain', loan_amount=Decimal('10000.00'), interest_rate=Decimal('3.00'),
+            interest_per_month=Decimal('300.00'), outstanding_principal=Decimal('10000.00'),
+            duration_months=6, pawning_date=date.today() - relativedelta(months=2, days=1),
+            maturity_date=date.today() + relativedelta(months=4), status='active', created_by=self.admin.id,
+        )
+        db.session.add(self.pawning)
+        db.session.commit()
+
+    def _post_with_concurrent_write(self, form, **values):
+        """Post a payment while another worker updates the pawning during the first attempt
+
+        Returns how many attempts reached the receipt number.
+        """
+        table = Pawning.__table__
+        calls = []
+
+        def receipt_number(prefix, branch_id):
+            calls.append(1)
+            if len(calls) == 1:
+                with db.engine.begin() as connection:
+                    connection.execute(update(table).where(table.c.id == self.pawning.id).values(
+                        version_id=table.c.version_id + 1, **values,
+                    ))
+            return generate_receipt_number(prefix, branch_id)
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.admin.id)
+            sess['_fresh'] = True
+        data = dict(payment_date=date.today().isoformat(), payment_method='cash', penalty_amount='0.00', **form)
+        with mock.patch('app.pawnings.routes.generate_receipt_number', receipt_number):
+            response = client.post(f'/pawnings/{self.pawning.id}/payment', data=data)
+        self.assertEqual(response.status_code, 302)
+        db.session.expire_all()
+        return len(calls)
+
+    def test_redemption_is_checked_against_the_reloaded_balance(self):
+        attempts = self._post_with_concurrent_write(
+            dict(payment_type='full_redemption', payment_amount='10600.00', interest_amount='600.00',
+                 principal_amount='10000.00', confirm_redemption='y'),
+            outstanding_principal=Decimal('6000.00'), principal_paid=Decimal('4000.00'),
+        )
+        self.assertEqual(attempts, 1)
+        self.assertEqual(PawningPayment.query.count(), 0)
+        self.assertEqual(self.pawning.status, 'active')
+        self.assertEqual(self.pawning.outstanding_principal, Decimal('6000.00'))
+
+    def test_interest_paid_by_the_other_writer_is_not_paid_again(self):
+        attempts = self._post_with_concurrent_write(
+            dict(payment_type='partial_redemption', payment_amount='1600.00', interest_amount='600.00',
+                 principal_amount='1000.00'),
+            total_interest_paid=Decimal('600.00'),
+        )
+        self.assertEqual(attempts, 1)
+        self.assertEqual(PawningPayment.query.count(), 0)
+        self.assertEqual(self.pawning.total_interest_paid, Decimal('600.00'))
+        self.assertEqual(self.pawning.outstanding_principal, Decimal('10000.00'))
+
+    def test_payment_still_posts_when_the_balances_allow_it(self):
+        attempts = self._post_with_concurrent_write(
+            dict(payment_type='partial_redemption', payment_amount='1600.00', interest_amount='600.00',
+                 principal_amount='1000.00'),
+            storage_notes='Moved to vault 2',
+        )
+        self.assertEqual(attempts, 2)
+        self.assertEqual(PawningPayment.query.count(), 1)
+        self.assertEqual(self.pawning.total_interest_paid, Decimal('600.00'))
+        self.assertEqual(self.pawning.outstanding_principal, Decimal('9000.00'))
+        self.assertEqual(self.pawning.storage_notes, 'Moved to vault 2')
+
+
+if __name__ == '__main__':
+    unittest.main()
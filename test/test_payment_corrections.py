@@ -0,0 +1,140 @@
+"""Receipt edits and deletions replayed from the first affected installment instead of rebuilt."""
+from datetime import date, timedelta
+from decimal import Decimal
+import unittest
+
+from flask_login import login_user
+
+from app import db
+from app.loans.routes import _process_payment
+from app.models import LoanInstallment, LoanPayment
+from loan_test_case import LoanTestCase
+
+
+class PaymentCorrectionTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        start = date.today() - timedelta(weeks=6)
+        self.loan = self.make_loan('FIX-001', disbursement_date=start, first_installment_date=start + timedelta(weeks=1))
+        db.session.commit()
+        self.loan.sync_installments()
+        db.session.commit()
+
+        with self.app.test_request_context():
+            login_user(self.admin)
+            for week, amount in enumerate(('1200.00', '1200.00', '1800.00', '1200.00', '600.00'), start=1):
+                _process_payment(self.loan, Decimal(amount), start + timedelta(weeks=week), 'cash', None, None)
+        self.payments = self.loan.payments.order_by(LoanPayment.payment_date).all()
+
+    def _client(self):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.admin.id)
+            sess['_fresh'] = True
+        return client
+
+    def _edit(self, payment, amount):
+        return self._client().post(f'/loans/payment/{payment.id}/edit', data={
+            'payment_date': payment.payment_date.isoformat(),
+            'payment_amount': amount,
+            'principal_amount': amount,
+            'interest_amount': '0',
+            'payment_method': 'cash',
+        })
+
+    def _mark_balances(self):
+        """Give every receipt a balance_after no rebuild would write"""
+        for payment in self.payments:
+            payment.balance_after = 1.0
+        db.session.commit()
+
+    def assertMatchesRebuild(self, loan=None):
+        db.session.expire_all()
+        loan = loan or self.loan
+        rows = {row.installment_number: row for row in loan.installments}
+        for inst in loan.generate_payment_schedule():
+            values = LoanInstallment.values_from_schedule(inst)
+            for field in ('paid_amount', 'remaining_amount', 'status'):
+                self.assertEqual(getattr(rows[inst['installment_number']], field), values[field],
+                                 (inst['installment_number'], field))
+        state = loan.financial_state()
+        self.assertEqual(loan.advance_balance, state.advance_balance)
+        self.assertEqual(Decimal(str(loan.outstanding_amount)), state.outstanding)
+        self.assertEqual(loan.arrears_snapshot.total_overdue_amount, state.arrears['total_overdue_amount'])
+        # The cursor stays usable for the next receipt
+        self.assertTrue(loan.can_append_receipt())
+
+    def _balances(self):
+        db.session.expire_all()
+        return [payment.balance_after for payment in self.loan.payments.order_by(LoanPayment.payment_date)]
+
+    def test_reduced_receipt_rebooks_only_later_receipts(self):
+        self._mark_balances()
+        self.assertEqual(self._edit(self.payments[1], '500.00').status_code, 302)
+
+        self.assertMatchesRebuild()
+        self.assertEqual(self.loan.paid_amount, Decimal('5300.00'))
+        self.assertEqual(self._balances(), [1.0, 9100.0, 7300.0, 6100.0, 5500.0])
+
+    def test_increased_receipt_is_allocated_forward(self):
+        self._mark_balances()
+        self._edit(self.payments[2], '2500.00')
+
+        self.assertMatchesRebuild()
+        self.assertEqual(self.loan.paid_amount, Decimal('6700.00'))
+        self.assertEqual(self._balances(), [1.0, 1.0, 5900.0, 4700.0, 4100.0])
+
+    def test_deleted_receipt_is_reversed(self):
+        self._mark_balances()
+        response = self._client().post(f'/loans/payment/{self.payments[2].id}/delete')
+        self.assertEqual(response.status_code, 302)
+
+        self.assertMatchesRebuild()
+        self.assertEqual(self.loan.paid_amount, Decimal('4200.00'))
+        self.assertEqual(self._balances(), [1.0, 1.0, 7200.0, 6600.0])
+
+    def test_stale_cursor_falls_back_to_full_rebuild(self):
+        self.loan.allocation_version = None
+        db.session.commit()
+        self._mark_balances()
+        self._edit(self.payments[3], '300.00')
+
+        self.assertMatchesRebuild()
+        self.assertEqual(self._balances(), [9600.0, 8400.0, 6600.0, 6300.0, 5700.0])
+
+    def test_cent_level_corrections_match_rebuild(self):
+        # Receipts a cent or two short of an installment close it within the
+        # two-cent tolerance, so allocation depends on where receipts end
+        for index, amount in [(0, '1199.98'), (1, '1199.99'), (2, '1800.03'), (0, '1199.97'), (3, '0.05')]:
+            self._edit(self.payments[index], amount)
+            self.assertMatchesRebuild()
+
+        self._client().post(f'/loans/payment/{self.payments[1].id}/delete')
+        self.assertMatchesRebuild()
+
+    def test_cent_level_daily_corrections_match_rebuild(self):
+        start = date.today() - timedelta(days=20)
+        loan = self.make_loan(
+            'FIX-002', loan_type='54_daily', loan_amount=Decimal('10000.00'), disbursed_amount=Decimal('10000.00'),
+            total_payable=Decimal('12000.00'), duration_weeks=None, duration_days=54,
+            installment_amount=Decimal('222.22'), installment_frequency='daily', first_installment_date=start,
+        )
+        db.session.commit()
+        loan.sync_installments()
+        db.session.commit()
+        with self.app.test_request_context():
+            login_user(self.admin)
+            for day, amount in enumerate(('222.21', '150.52', '71.69', '222.22', '444.43', '0.02'), start=1):
+                _process_payment(loan, Decimal(amount), start + timedelta(days=day), 'cash', None, None)
+        payments = loan.payments.order_by(LoanPayment.payment_date).all()
+
+        self._client().post(f'/loans/payment/{payments[1].id}/delete')
+        self.assertMatchesRebuild(loan)
+        for payment, amount in [(payments[0], '222.19'), (payments[2], '222.20'), (payments[4], '222.23')]:
+            self._edit(payment, amount)
+            self.assertMatchesRebuild(loan)
+
+
+if __name__ == '__main__':
+    unittest.main()
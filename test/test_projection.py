@@ -0,0 +1,74 @@
+"""Vectorized projection must agree with Loan.generate_payment_schedule."""
+from datetime import date
+from decimal import Decimal
+import unittest
+
+from app.loans.projection import project_loans
+from app.loans.routes import _calculate_loan_totals_for_principal
+from app.models import Loan
+
+
+def _loan(loan_id, loan_type, interest_type='flat', principal='10000.01', rate='10.00', months=3, weeks=None, days=None):
+    emi, total = _calculate_loan_totals_for_principal(
+        Decimal(principal), Decimal(rate), loan_type, interest_type, months, weeks, days,
+    )
+    return Loan(
+        id=loan_id,
+        loan_number=f'TEST-PROJ-{loan_id:03d}',
+        loan_type=loan_type,
+        interest_type=interest_type,
+        loan_amount=Decimal(principal),
+        disbursed_amount=Decimal(principal),
+        total_payable=total,
+        installment_amount=emi,
+        paid_amount=Decimal('0.00'),
+        interest_rate=Decimal(rate),
+        duration_months=months,
+        duration_weeks=weeks,
+        duration_days=days,
+        status='active',
+        first_installment_date=date(2026, 1, 31),
+    )
+
+
+class ProjectionTest(unittest.TestCase):
+    def setUp(self):
+        self.loans = [
+            _loan(1, 'type1_9weeks', weeks=9),
+            _loan(2, '54_daily', days=54),
+            _loan(3, '54_daily_monday_friday', days=54),
+            _loan(4, 'type4_micro', months=2, weeks=8),
+            _loan(5, 'type4_daily', months=1, days=26),
+            _loan(6, 'monthly_loan', 'reducing_balance', principal='150000.00', rate='18.00', months=12),
+            _loan(7, 'staff_loan', 'flat', months=6),
+            _loan(8, 'special_loan', months=1),
+        ]
+
+    def test_rows_match_generated_schedules(self):
+        projection = project_loans(self.loans)
+
+        for index, loan in enumerate(self.loans):
+            expected = [
+                {key: row[key] for key in ('installment_number', 'due_date', 'amount', 'principal', 'interest')}
+                for row in loan.generate_payment_schedule(payments=[], overrides=[])
+            ]
+            self.assertEqual(projection.rows(index), expected, loan.loan_type)
+
+    def test_due_through_sums_installments(self):
+        projection = project_loans(self.loans)
+        due = projection.due_through(date(2026, 2, 28))
+
+        schedule = self.loans[5].generate_payment_schedule(payments=[], overrides=[])
+        expected = sum(row['amount'] for row in schedule if row['due_date'] <= date(2026, 2, 28))
+        self.assertEqual(due[5], round(expected * 100))
+
+    def test_inactive_loans_project_nothing(self):
+        self.loans[0].status = 'pending'
+        projection = project_loans(self.loans)
+
+        self.assertEqual(projection.rows(0), [])
+        self.assertEqual(projection.due_through(date(2030, 1, 1))[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""Receipt numbers from per-branch sequences claimed in blocks."""
+import unittest
+
+from app import create_app, db
+from app.models import Branch, ReceiptSequence
+from app.utils.helpers import generate_receipt_number
+from app.utils.sequences import ReceiptBlocks, reserve_receipt_numbers
+
+
+class ReceiptSequenceTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['RECEIPT_NUMBER_BLOCK'] = 10
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        self.main = Branch(branch_code='B001', name='Main Branch')
+        self.other = Branch(branch_code='B002', name='Other Branch')
+        db.session.add_all([self.main, self.other])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _next_value(self, branch_id, product='LOAN'):
+        return db.session.query(ReceiptSequence.next_value).filter_by(branch_id=branch_id, product=product).scalar()
+
+    def test_numbers_come_from_claimed_blocks(self):
+        numbers = [generate_receipt_number('LOAN', self.main.id) for _ in range(12)]
+
+        self.assertEqual(numbers[0], 'LOAN-B001-00000001')
+        self.assertEqual(numbers[-1], 'LOAN-B001-00000012')
+        self.assertEqual(len(set(numbers)), 12)
+        # Twelve numbers took two blocks of ten
+        self.assertEqual(self._next_value(self.main.id), 21)
+
+    def test_sequences_are_per_branch_and_product(self):
+        self.app.config['RECEIPT_NUMBER_FORMAT'] = '{branch}/{product}/{number}'
+
+        self.assertEqual(generate_receipt_number('LOAN', self.main.id), 'B001/LOAN/1')
+        self.assertEqual(generate_receipt_number('PWN', self.main.id), 'B001/PWN/1')
+        self.assertEqual(generate_receipt_number('LOAN', self.other.id), 'B002/LOAN/1')
+        self.assertEqual(generate_receipt_number('LOAN'), '000/LOAN/1')
+
+    def test_workers_never_share_numbers(self):
+        first = [generate_receipt_number('LOAN', self.main.id) for _ in range(3)]
+        # Another worker starts with no blocks of its own
+        self.app.extensions['receipt_blocks'] = ReceiptBlocks()
+        second = [generate_receipt_number('LOAN', self.main.id) for _ in range(3)]
+
+        self.assertEqual(second[0], 'LOAN-B001-00000011')
+        self.assertFalse(set(first) & set(second))
+
+    def test_reserving_a_large_batch_claims_it_at_once(self):
+        reserve_receipt_numbers('LOAN', self.main.id, 25)
+        self.assertEqual(self._next_value(self.main.id), 26)
+        # Already held; nothing more is claimed
+        reserve_receipt_numbers('LOAN', self.main.id, 25)
+        self.assertEqual(self._next_value(self.main.id), 26)
+
+
+if __name__ == '__main__':
+    unittest.main()
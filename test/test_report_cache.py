@@ -0,0 +1,98 @@
+"""Report page cache: keys, refresh and invalidation by branch writes."""
+from datetime import date, timedelta
+from decimal import Decimal
+import unittest
+
+from app import db
+from app.models import LoanPayment, User
+from app.utils.cache import report_cache
+from loan_test_case import LoanTestCase
+
+
+class ReportCacheTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        report_cache.configure(maxsize=16, ttl=300)
+        self.main = self.branch
+        self.other = self.make_branch('B002', 'Other Branch')
+        self.customers = {
+            self.main.id: self.customer,
+            self.other.id: self.make_customer(self.other, customer_id='C002', nic_number='OTHER-NIC'),
+        }
+        self.main_loan = self._loan('RC-001', self.main)
+        self.other_loan = self._loan('RC-002', self.other)
+        db.session.commit()
+
+    def tearDown(self):
+        report_cache.configure(maxsize=0)
+        super().tearDown()
+
+    def _loan(self, number, branch):
+        start = date.today() - timedelta(weeks=2)
+        return self.make_loan(number, customer=self.customers[branch.id], disbursement_date=start,
+                              first_installment_date=start + timedelta(days=1))
+
+    def _client(self, branch=None):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.admin.id)
+            sess['_fresh'] = True
+            if branch is not None:
+                sess['current_branch_id'] = branch.id
+        return client
+
+    def test_second_request_is_served_from_cache(self):
+        client = self._client()
+        first = client.get('/reports/loans')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn(b'Computed at', first.data)
+        self.assertIn(b'RC-001', first.data)
+
+        hits = report_cache.stats()['local']['hits']
+        # Empty filters and argument order do not change the key
+        again = client.get('/reports/loans?status=&loan_purpose=')
+        self.assertEqual(report_cache.stats()['local']['hits'], hits + 1)
+        self.assertIn(b'RC-001', again.data)
+
+        client.get('/reports/loans?refresh=1')
+        self.assertEqual(report_cache.stats()['local']['hits'], hits + 1)
+        client.get('/reports/loans?status=completed')
+        self.assertEqual(report_cache.stats()['local']['size'], 2)
+
+    def test_writes_invalidate_only_their_branch(self):
+        client = self._client(branch=self.main)
+        self.assertNotIn(b'RC-003', client.get('/reports/loans').data)
+
+        # A payment on the other branch leaves the main branch's page cached
+        db.session.add(LoanPayment(loan_id=self.other_loan.id, payment_date=date.today(),
+                                   payment_amount=Decimal('1200.00')))
+        db.session.commit()
+        hits = report_cache.stats()['local']['hits']
+        client.get('/reports/loans')
+        self.assertEqual(report_cache.stats()['local']['hits'], hits + 1)
+
+        self._loan('RC-003', self.main)
+        db.session.commit()
+        self.assertIn(b'RC-003', client.get('/reports/loans').data)
+
+    def test_index_sections_follow_permissions(self):
+        staff = User(username='staff', email='staff@example.com', password_hash='test', full_name='Staff User',
+                     nic_number='STAFF-NIC', role='staff', branch_id=self.main.id, is_active=True,
+                     can_view_reports=False, can_view_collection_reports=True)
+        db.session.add(staff)
+        db.session.commit()
+
+        self.assertIn(b'Staff Loan Reports', self._client(branch=self.main).get('/reports/').data)
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(staff.id)
+            sess['_fresh'] = True
+        # A fresh app context, so the admin logged in above is not kept in g
+        with self.app.app_context():
+            page = client.get('/reports/')
+        self.assertEqual(page.status_code, 200)
+        self.assertNotIn(b'Staff Loan Reports', page.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
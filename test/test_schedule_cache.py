@@ -0,0 +1,101 @@
+"""Schedule cache behaviour: LRU bounds, counters and version-based invalidation."""
+from datetime import date
+from decimal import Decimal
+import os
+import tempfile
+import unittest
+
+from app import db
+from app.models import LoanPayment
+from app.utils.cache import LRUCache, FileSystemCache, schedule_cache
+from loan_test_case import LoanTestCase
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_byte_bound_evicts_oldest(self):
+        cache = LRUCache(maxsize=10, maxbytes=250)
+        cache.set('a', 'x' * 100)
+        cache.set('b', 'x' * 100)
+        cache.set('c', 'x' * 100)
+        cache.set('huge', 'x' * 1000)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('huge'))
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertLessEqual(cache.stats()['bytes'], 250)
+
+    def test_filesystem_layer_round_trips(self):
+        with tempfile.TemporaryDirectory() as directory:
+            writer = FileSystemCache(directory)
+            reader = FileSystemCache(directory)
+            writer.set(('schedule', 1), [{'amount': 10.0}])
+
+            self.assertEqual(reader.get(('schedule', 1)), [{'amount': 10.0}])
+            self.assertIsNone(reader.get(('schedule', 2)))
+
+    def test_filesystem_layer_prunes_superseded_entries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FileSystemCache(directory, threshold=10)
+            for version in range(25):
+                cache.set(('schedule', 1, version), version)
+
+            self.assertLessEqual(len(os.listdir(directory)), 10)
+            self.assertEqual(cache.stats()['pruned'], 15)
+
+            stale = os.path.join(directory, 'stale.tmp')
+            open(stale, 'w').close()
+            os.utime(stale, (0, 0))
+            cache.prune()
+            self.assertFalse(os.path.exists(stale))
+
+
+class ScheduleCacheTest(LoanTestCase):
+    def setUp(self):
+        super().setUp()
+        schedule_cache.configure(maxsize=16)
+        self.loan = self.make_loan('TEST-CACHE-001', first_installment_date=date(2026, 1, 13))
+        db.session.commit()
+
+    def tearDown(self):
+        schedule_cache.configure(maxsize=0)
+        super().tearDown()
+
+    def test_second_read_is_a_hit(self):
+        first = self.loan.get_payment_schedule()
+        second = self.loan.get_payment_schedule()
+
+        self.assertEqual(first, second)
+        self.assertEqual(schedule_cache.stats()['local']['hits'], 1)
+        self.assertEqual(schedule_cache.stats()['local']['misses'], 1)
+
+    def test_touch_schedule_invalidates(self):
+        self.loan.get_payment_schedule()
+        db.session.add(LoanPayment(loan_id=self.loan.id, payment_date=date(2026, 1, 13), payment_amount=Decimal('1200.00')))
+        self.loan.touch_schedule(payments=True)
+        db.session.commit()
+
+        schedule = self.loan.get_payment_schedule()
+        self.assertEqual(schedule[0]['paid_amount'], 1200.0)
+        self.assertEqual(schedule_cache.stats()['local']['hits'], 0)
+
+    def test_cached_rows_are_copies(self):
+        self.loan.get_payment_schedule()[0]['status'] = 'mutated'
+        self.assertNotEqual(self.loan.get_payment_schedule()[0]['status'], 'mutated')
+
+
+if __name__ == '__main__':
+    unittest.main()